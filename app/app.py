@@ -25,7 +25,7 @@ from app_utils.monitoring import (
     post_response_to_metric_service,
     get_metric_service_endpoint,
 )
-from app_utils.chroma import connect_vector_store, query_vector_store
+from app_utils.chroma import connect_vector_store, query_vector_store_many
 from app_utils.llm import build_memory_dict, query_llm, get_prediction_endpoint
 
 
@@ -136,14 +136,17 @@ def main() -> None:
                     # Placeholder for the thumbs up and thumbs down button
                     feedback_placeholder = st.empty()
 
+                    # Query all the collections in the vector store at once
+                    contexts = query_vector_store_many(
+                        chroma_client=chroma_client,
+                        query_text=prompt,
+                        collection_names=list(COLLECTION_NAME_MAP),
+                        n_results=N_CLOSEST_MATCHES,
+                        metric_service_endpoint=metric_service_endpoint,
+                    )
+
                     for collection, source in COLLECTION_NAME_MAP.items():
-                        # Query vector store
-                        context = query_vector_store(
-                            chroma_client=chroma_client,
-                            query_text=prompt,
-                            collection_name=collection,
-                            n_results=N_CLOSEST_MATCHES,
-                        )
+                        context = contexts[collection]
 
                         # Create a dict of prompt and context
                         message = {"prompt_query": prompt, "context": context}
@@ -183,12 +186,13 @@ def main() -> None:
                                 assistant_response,
                                 source,
                             )
-                            logging.info(result.text)
-                            readability_scores[source] = {
-                                "score": float(json.loads(result.text)["score"]),
-                                "question": str(prompt),
-                                "response": str(assistant_response),
-                            }
+                            if result is not None:
+                                logging.info(result.text)
+                                readability_scores[source] = {
+                                    "score": float(json.loads(result.text)["score"]),
+                                    "question": str(prompt),
+                                    "response": str(assistant_response),
+                                }
 
                     # Remove first conversation in memory if either exceeds the size limit
                     if len(mind_memory) > CONVERSATIONAL_MEMORY_SIZE:
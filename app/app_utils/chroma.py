@@ -1,30 +1,64 @@
 """Utility functions for interacting with Chroma store."""
-from typing import List, Optional, Union
+import logging
+from typing import Dict, List, Optional, Union
 
 import streamlit as st
-from chromadb.api.types import EmbeddingFunction
-from chromadb.utils import embedding_functions
+from app_utils.monitoring import get_query_drift_reporter
 from configs.prompt_template import DEFAULT_QUERY_INSTRUCTION
-from configs.service_config import DEFAULT_EMBED_MODEL, EMBED_MODEL_MAP
+from configs.service_config import (
+    DEFAULT_EMBED_MODEL,
+    EMBED_MODEL_MAP,
+    EMBEDDING_CACHE_CAPACITY,
+    EMBEDDING_CACHE_DIR,
+    ONNX_MODEL_DIR,
+)
 from utils.chroma_store import ChromaStore
+from utils.embedding import InstructorEmbedder
+from utils.text_splitter import merge_overlapping_chunks
 
 
-@st.cache_data(show_spinner=False)
-def _get_embedding_function(embed_model_type: str) -> Union[EmbeddingFunction, None]:
+# The embedder holds the model and a memory-mapped cache, so it is shared between sessions rather than copied
+@st.cache_resource(show_spinner=False)
+def _get_embedding_function(embed_model_type: str) -> Union[InstructorEmbedder, None]:
     """Load embedding function to be used by Chroma vector store.
 
+    Query embeddings are cached on disk, so repeated questions are not embedded again.
+
     Args:
         embed_model_type (str): String representation of the embedding model.
 
     Returns:
-        Union[EmbeddingFunction, None]: Embedding function if it exists, None otherwise.
+        Union[InstructorEmbedder, None]: Embedding function if it exists, None otherwise.
     """
     # Create a embedding function
-    model_name = EMBED_MODEL_MAP.get(embed_model_type, None)
-    if model_name is None:
+    model_config = EMBED_MODEL_MAP.get(embed_model_type, None)
+    if model_config is None:
         return None
-    return embedding_functions.InstructorEmbeddingFunction(
-        model_name=model_name, instruction=DEFAULT_QUERY_INSTRUCTION
+    return InstructorEmbedder(
+        model_name=model_config.model_name,
+        instruction=DEFAULT_QUERY_INSTRUCTION,
+        cache_dir=EMBEDDING_CACHE_DIR,
+        cache_capacity=EMBEDDING_CACHE_CAPACITY,
+        backend=model_config.backend,
+        onnx_dir=ONNX_MODEL_DIR,
+    )
+
+
+# The client reuses the collections its queries resolved to, so it is shared between sessions rather than created for each query
+@st.cache_resource(show_spinner=False)
+def _get_vector_store(chroma_server_host: str, chroma_server_port: str) -> ChromaStore:
+    """Create the Chroma vector store client of the app.
+
+    Args:
+        chroma_server_host (str): Chroma server host name
+        chroma_server_port (str): Chroma server port
+
+    Returns:
+        ChromaStore: ChromaStore interface object
+    """
+    return ChromaStore(
+        chroma_server_hostname=chroma_server_host,
+        chroma_server_port=chroma_server_port,
     )
 
 
@@ -41,12 +75,8 @@ def connect_vector_store(
         Optional[ChromaStore]: ChromaStore interface object. None when there is an exception.
     """
     try:
-        # Connect to vector store
-        chroma_client = ChromaStore(
-            chroma_server_hostname=chroma_server_host,
-            chroma_server_port=chroma_server_port,
-        )
-        return chroma_client
+        # Connect to vector store, which is retried on the next query if it fails as exceptions are not cached
+        return _get_vector_store(chroma_server_host, chroma_server_port)
     except Exception:
         return None
 
@@ -75,5 +105,65 @@ def query_vector_store(
         n_results=n_results,
         embedding_function=embedding_function,
     )
-    documents = " ".join(result_dict["documents"][0])  # type: ignore
+    if embedding_function is not None and embedding_function.cache is not None:
+        logging.info(
+            f"Query embedding cache hit rate: {embedding_function.cache.stats().hit_rate:.2%}"
+        )
+
+    # Overlapping chunks of the same page are merged, so their shared text is only sent to the LLM once
+    documents = " ".join(
+        merge_overlapping_chunks(
+            result_dict["documents"][0], result_dict["metadatas"][0]  # type: ignore
+        )
+    )
     return documents
+
+
+def query_vector_store_many(
+    chroma_client: ChromaStore,
+    query_text: str,
+    collection_names: List[str],
+    n_results: int,
+    metric_service_endpoint: Optional[str] = None,
+) -> Dict[str, str]:
+    """Query several collections concurrently to fetch the `n_results` closest documents from each.
+
+    Args:
+        chroma_client (ChromaStore): Chroma vector store client.
+        query_text (str): Query text.
+        collection_names (List[str]): Names of the collections to query
+        n_results (int): Number of closest documents to fetch from each collection
+        metric_service_endpoint (Optional[str], optional): Metric service endpoint the aggregates of a sample of the query embeddings are sent to, in the background. Defaults to None, which sends none.
+
+    Returns:
+        Dict[str, str]: String containing the closest documents to the query, keyed by collection name.
+
+    Raises:
+        ValueError: if the default embedding model is not supported
+    """
+    embedding_function = _get_embedding_function(DEFAULT_EMBED_MODEL)
+    if embedding_function is None:
+        raise ValueError(f"{DEFAULT_EMBED_MODEL} is not a supported embedding model")
+
+    result = chroma_client.query_many(
+        collection_names=collection_names,
+        query_texts=[query_text],
+        embedding_function=embedding_function,
+        n_results=n_results,
+    )
+    logging.info(
+        f"Queried {collection_names} in {result.total_seconds:.3f}s "
+        f"(embedding {result.embedding_seconds:.3f}s, collections {result.collection_seconds})"
+    )
+    if metric_service_endpoint:
+        get_query_drift_reporter(metric_service_endpoint).submit(result)
+
+    return {
+        collection_name: " ".join(
+            merge_overlapping_chunks(
+                collection_result["documents"][0],  # type: ignore
+                collection_result["metadatas"][0],  # type: ignore
+            )
+        )
+        for collection_name, collection_result in result.results.items()
+    }
@@ -1,16 +1,31 @@
 """Utility functions for interacting with the monitoring service."""
 import logging
-from typing import Any, Dict, Union
+import queue
+import random
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple, Union
 
+import numpy as np
+import numpy.typing as npt
 import requests
 import streamlit as st
-from configs.app_config import READABILITY_SCORE_THRESHOLD
+from configs.app_config import (
+    QUERY_DRIFT_BATCH_SIZE,
+    QUERY_DRIFT_QUEUE_SIZE,
+    QUERY_EMBEDDING_SAMPLE_RATE,
+    READABILITY_SCORE_THRESHOLD,
+)
 from configs.service_config import (
+    COLLECTION_NAME_MAP,
     METRIC_SERVICE_NAME,
     METRIC_SERVICE_NAMESPACE,
     METRIC_SERVICE_PORT,
+    METRIC_SERVICE_TIMEOUT,
 )
 from requests.models import Response
+from utils.chroma_store import MultiCollectionQueryResult
+from utils.sketch_store import SketchStore
 
 
 @st.cache_data(show_spinner=False)
@@ -27,7 +42,7 @@ def get_metric_service_endpoint() -> str:
 
 def post_response_to_metric_service(
     metric_service_endpoint: str, response: str, dataset: str
-) -> Response:
+) -> Optional[Response]:
     """Send the LLM's response to the metric service for readability computation using a POST request.
 
     Args:
@@ -36,12 +51,18 @@ def post_response_to_metric_service(
         dataset (str): the dataset that was used to generate the response.
 
     Returns:
-        Response: the post request response
+        Optional[Response]: the post request response, None if the metric service could not be reached
     """
     response_dict = {"response": response, "dataset": dataset.lower()}
-    result = requests.post(url=metric_service_endpoint, json=response_dict)
-
-    return result
+    try:
+        return requests.post(
+            url=metric_service_endpoint,
+            json=response_dict,
+            timeout=METRIC_SERVICE_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        logging.error(f"Failed to post response to metric service: {e}")
+        return None
 
 
 def post_feedback_data_to_metric_service(
@@ -56,7 +77,9 @@ def post_feedback_data_to_metric_service(
     # Store the response to metric database if user agrees to share.
     if st.session_state.data_sharing_consent:
         try:
-            result = requests.post(url=metric_service_endpoint, json=data)
+            result = requests.post(
+                url=metric_service_endpoint, json=data, timeout=METRIC_SERVICE_TIMEOUT
+            )
             logging.info(result.text)
         except requests.RequestException as e:
             logging.error(f"Failed to post data to metric service: {e}")
@@ -151,3 +174,188 @@ def create_score_threshold_collector(
                 f'<p style="color:#EBEBEB; font-size: 12px; font-style: italic;">We\'ve noticed that the readability score for the {source_text} response {verb} below our established threshold.</p>',
                 unsafe_allow_html=True,
             )
+
+
+@dataclass
+class QueryDriftAggregate:
+    """Dataclass for the running aggregates of the sampled queries of a data version of a collection."""
+
+    n_queries: int = 0
+    offset_sum: Optional[npt.NDArray[np.float64]] = None
+    nearest_distance_sum: float = 0.0
+    nearest_distance_sum_sq: float = 0.0
+    nearest_distance_max: float = 0.0
+
+    def add(self, offset: npt.NDArray[np.float64], nearest_distance: float) -> None:
+        """Add a query to the aggregates.
+
+        Args:
+            offset (npt.NDArray[np.float64]): the offset of the query embedding from the mean embedding of the corpus
+            nearest_distance (float): the distance from the query to its nearest chunk
+        """
+        self.n_queries += 1
+        self.offset_sum = (
+            offset if self.offset_sum is None else self.offset_sum + offset
+        )
+        self.nearest_distance_sum += nearest_distance
+        self.nearest_distance_sum_sq += nearest_distance**2
+        self.nearest_distance_max = max(self.nearest_distance_max, nearest_distance)
+
+
+class QueryDriftReporter:
+    """Send aggregates of a sample of the user query embeddings to the metric service, to monitor whether the queries drift away from the corpus.
+
+    Sampled query results are queued and aggregated by a background thread, so the user query is not slowed down.
+    Only the aggregates of every QUERY_DRIFT_BATCH_SIZE queries of a data version are sent, so no single query embedding leaves the app.
+    The queries of a batch which is not full yet are lost when the app stops.
+    """
+
+    def __init__(self, metric_service_endpoint: str) -> None:
+        """Start the thread aggregating the queued query results.
+
+        Args:
+            metric_service_endpoint (str): the metric service endpoint, which receives the query drift aggregates and stores the sketches of the corpus
+        """
+        self.metric_service_endpoint = metric_service_endpoint
+        self.sketch_store = SketchStore(
+            metric_service_endpoint, timeout=METRIC_SERVICE_TIMEOUT
+        )
+        self._queue: "queue.Queue[MultiCollectionQueryResult]" = queue.Queue(
+            maxsize=QUERY_DRIFT_QUEUE_SIZE
+        )
+        # Only used by the background thread
+        self._aggregates: Dict[Tuple[str, str], QueryDriftAggregate] = {}
+        self._corpus_means: Dict[Tuple[str, str], npt.NDArray[np.float64]] = {}
+        self._unversioned_collections: Set[str] = set()
+        threading.Thread(
+            target=self._run, name="query-drift-reporter", daemon=True
+        ).start()
+
+    def submit(self, result: MultiCollectionQueryResult) -> None:
+        """Queue the result of a query, if it is sampled, without waiting for it to be aggregated.
+
+        Args:
+            result (MultiCollectionQueryResult): the result of querying the collections with a single query text
+        """
+        if random.random() >= QUERY_EMBEDDING_SAMPLE_RATE:
+            return
+        try:
+            self._queue.put_nowait(result)
+        except queue.Full:
+            logging.warning("Query drift queue is full, dropping a sampled query")
+
+    def join(self) -> None:
+        """Wait until all the queued query results are aggregated."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        """Aggregate the queued query results until the app stops."""
+        while True:
+            result = self._queue.get()
+            try:
+                self._aggregate(result)
+            except Exception as e:
+                logging.error(f"Failed to aggregate query embedding: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _get_corpus_mean(
+        self, collection_name: str, data_version: str
+    ) -> Optional[npt.NDArray[np.float64]]:
+        """Load the mean embedding of a data version of a collection from its sketch.
+
+        The sketch of a data version never changes, so its mean is cached, while a data version which is not sketched yet is looked up again on its next query.
+
+        Args:
+            collection_name (str): Name of the collection
+            data_version (str): Data version of the collection
+
+        Returns:
+            Optional[npt.NDArray[np.float64]]: the mean embedding in the space of the stored embeddings, None if the data version was not sketched
+        """
+        key = (collection_name, data_version)
+        if key not in self._corpus_means:
+            sketch = self.sketch_store.load_sketch(collection_name, data_version)
+            if sketch is None:
+                return None
+            self._corpus_means[key] = sketch.mean
+        return self._corpus_means[key]
+
+    def _aggregate(self, result: MultiCollectionQueryResult) -> None:
+        """Add the query of a result to the aggregates of each data version it was answered from, and send the aggregates of full batches.
+
+        Args:
+            result (MultiCollectionQueryResult): the result of querying the collections with a single query text
+        """
+        for collection_name, collection_result in result.results.items():
+            data_version = result.data_versions.get(collection_name)
+            if data_version is None:
+                if collection_name not in self._unversioned_collections:
+                    self._unversioned_collections.add(collection_name)
+                    logging.warning(
+                        f"{collection_name} is not a versioned collection, so its query embeddings are not monitored"
+                    )
+                continue
+            distances = collection_result["distances"]
+            if not distances or not distances[0]:
+                continue
+            corpus_mean = self._get_corpus_mean(collection_name, data_version)
+            if corpus_mean is None:
+                logging.info(
+                    f"Skipping query embedding: data version {data_version} of {collection_name} was not sketched"
+                )
+                continue
+
+            # The sketch holds stored embeddings, so the query embedding is the one projected to query the collection
+            query_embedding = result.collection_query_embeddings[collection_name][0]
+            key = (collection_name, data_version)
+            aggregate = self._aggregates.setdefault(key, QueryDriftAggregate())
+            aggregate.add(
+                np.asarray(query_embedding, dtype=np.float64) - corpus_mean,
+                float(distances[0][0]),
+            )
+            if aggregate.n_queries >= QUERY_DRIFT_BATCH_SIZE:
+                self._post(collection_name, data_version, self._aggregates.pop(key))
+
+    def _post(
+        self, collection_name: str, data_version: str, aggregate: QueryDriftAggregate
+    ) -> None:
+        """Send the aggregates of a batch of queries to the metric service.
+
+        Args:
+            collection_name (str): Name of the collection queried
+            data_version (str): Data version of the collection
+            aggregate (QueryDriftAggregate): Aggregates of the queries
+        """
+        data = {
+            "dataset": COLLECTION_NAME_MAP[collection_name].lower(),
+            "data_version": data_version,
+            "n_queries": aggregate.n_queries,
+            "offset_sum": aggregate.offset_sum.tolist(),  # type: ignore
+            "nearest_distance_sum": aggregate.nearest_distance_sum,
+            "nearest_distance_sum_sq": aggregate.nearest_distance_sum_sq,
+            "nearest_distance_max": aggregate.nearest_distance_max,
+        }
+        try:
+            response = requests.post(
+                url=f"{self.metric_service_endpoint}/query_drift",
+                json=data,
+                timeout=METRIC_SERVICE_TIMEOUT,
+            )
+            logging.info(response.text)
+        except requests.RequestException as e:
+            logging.error(f"Failed to post query drift to metric service: {e}")
+
+
+# The reporter aggregates the queries of all sessions, so it is shared between them
+@st.cache_resource(show_spinner=False)
+def get_query_drift_reporter(metric_service_endpoint: str) -> QueryDriftReporter:
+    """Get the query drift reporter of the app.
+
+    Args:
+        metric_service_endpoint (str): the metric service endpoint, which receives the query drift aggregates and stores the sketches of the corpus
+
+    Returns:
+        QueryDriftReporter: the query drift reporter
+    """
+    return QueryDriftReporter(metric_service_endpoint)
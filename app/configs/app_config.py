@@ -3,3 +3,10 @@
 CONVERSATIONAL_MEMORY_SIZE = 3
 
 READABILITY_SCORE_THRESHOLD = 55.0
+
+# Fraction of user queries whose embeddings are sent to the metric service for query drift monitoring, 0 disables it
+QUERY_EMBEDDING_SAMPLE_RATE = 0.1
+# Number of sampled queries of a data version aggregated before the aggregates are sent, at least the metric service's MIN_AGGREGATED_QUERIES
+QUERY_DRIFT_BATCH_SIZE = 10
+# Largest number of sampled queries waiting to be aggregated, further queries are dropped rather than slowing the app down
+QUERY_DRIFT_QUEUE_SIZE = 100
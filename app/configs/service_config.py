@@ -1,15 +1,24 @@
 """Config variables for the 3 services."""
+import os
+
+from utils.embedding import EmbeddingModelConfig
+
 # Setup for chroma vector store
 CHROMA_SERVER_HOST_NAME = "chroma-service.default"
 CHROMA_SERVER_PORT = "8000"
-DEFAULT_EMBED_MODEL = "base"  # ["base", "large", "xl"]
+DEFAULT_EMBED_MODEL = "base"  # ["base", "large", "xl", "base-onnx", "base-int8"]
 N_CLOSEST_MATCHES = 3
 EMBED_MODEL_MAP = {
-    "xl": "hkunlp/instructor-xl",
-    "large": "hkunlp/instructor-large",
-    "base": "hkunlp/instructor-base",
+    "xl": EmbeddingModelConfig("hkunlp/instructor-xl"),
+    "large": EmbeddingModelConfig("hkunlp/instructor-large"),
+    "base": EmbeddingModelConfig("hkunlp/instructor-base"),
+    "base-onnx": EmbeddingModelConfig("hkunlp/instructor-base", backend="onnx"),
+    "base-int8": EmbeddingModelConfig("hkunlp/instructor-base", backend="onnx-int8"),
 }
 COLLECTION_NAME_MAP = {"mind_data": "Mind", "nhs_data": "NHS"}
+EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".embedding_cache")
+EMBEDDING_CACHE_CAPACITY = 10_000
+ONNX_MODEL_DIR = os.path.join(os.path.expanduser("~"), ".onnx_models")
 
 # Seldon configuration
 SELDON_SERVICE_NAME = "llm-default-transformer"
@@ -20,3 +29,5 @@ SELDON_PORT = 9000
 METRIC_SERVICE_NAME = "monitoring-service"
 METRIC_SERVICE_NAMESPACE = "default"
 METRIC_SERVICE_PORT = "5000"
+# Seconds to wait for the metric service, so monitoring never holds up a response
+METRIC_SERVICE_TIMEOUT = 5
@@ -0,0 +1 @@
+"""Benchmarks for the embedding and retrieval components."""
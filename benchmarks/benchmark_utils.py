@@ -0,0 +1,89 @@
+"""Shared helpers for the benchmarks."""
+import time
+from typing import Callable, List, Tuple, TypeVar
+
+import numpy as np
+import numpy.typing as npt
+
+T = TypeVar("T")
+
+
+def exact_nearest_neighbours(
+    corpus: npt.NDArray[np.float32],
+    queries: npt.NDArray[np.float32],
+    k: int,
+    space: str = "l2",
+) -> npt.NDArray[np.int64]:
+    """Find the exact `k` nearest neighbours of each query by brute force.
+
+    Args:
+        corpus (npt.NDArray[np.float32]): Embeddings to search, of shape (n, d)
+        queries (npt.NDArray[np.float32]): Query embeddings, of shape (q, d)
+        k (int): Number of neighbours to return
+        space (str, optional): Distance function, one of "l2", "ip" or "cosine". Defaults to "l2".
+
+    Returns:
+        npt.NDArray[np.int64]: Indices into the corpus of shape (q, k), closest first
+
+    Raises:
+        ValueError: if the space is not supported
+    """
+    if space == "l2":
+        # The squared norm of the queries does not change the ranking
+        distances = np.sum(corpus**2, axis=1) - 2 * queries @ corpus.T
+    elif space == "ip":
+        distances = -(queries @ corpus.T)
+    elif space == "cosine":
+        normalised_corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+        normalised_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        distances = -(normalised_queries @ normalised_corpus.T)
+    else:
+        raise ValueError(f"{space} is not supported")
+
+    k = min(k, corpus.shape[0])
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1).astype(np.int64)
+
+
+def recall_at_k(
+    approximate: npt.NDArray[np.int64], exact: npt.NDArray[np.int64]
+) -> float:
+    """Fraction of the exact nearest neighbours which were also found by the approximate search.
+
+    Args:
+        approximate (npt.NDArray[np.int64]): Neighbours found by the approximate search, of shape (q, k)
+        exact (npt.NDArray[np.int64]): Exact neighbours, of shape (q, k)
+
+    Returns:
+        float: the mean recall@k over all queries
+    """
+    hits = [
+        len(set(found.tolist()) & set(expected.tolist()))
+        for found, expected in zip(approximate, exact)
+    ]
+    return float(np.sum(hits) / exact.size)
+
+
+def timed(function: Callable[[], T], repeat: int = 1) -> Tuple[T, List[float]]:
+    """Call a function several times and record how long each call took.
+
+    Args:
+        function (Callable[[], T]): Function to call
+        repeat (int, optional): Number of calls. Defaults to 1.
+
+    Returns:
+        Tuple[T, List[float]]: the result of the last call and the duration of each call in seconds
+
+    Raises:
+        ValueError: if `repeat` is less than 1
+    """
+    if repeat < 1:
+        raise ValueError(f"The function must be called at least once, got {repeat}")
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return result, durations
@@ -0,0 +1,180 @@
+"""Benchmark the embedding backends of the Instructor models against the full-precision PyTorch baseline.
+
+Chunks of the scraped Mind and NHS corpora are embedded with each backend. The throughput of each backend is reported
+together with the cosine similarity between its embeddings and the PyTorch embeddings of the same chunks.
+
+Usage:
+    python -m benchmarks.embedding_backend_benchmark --model hkunlp/instructor-base --n-chunks 512
+"""
+import os
+import statistics
+from typing import Dict, List, Tuple, Union
+
+import click
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from config import DATA_DIR
+from steps.data_embedding_steps.embed_data_step.embed_data_step import (
+    DEFAULT_EMBED_INSTRUCTION,
+)
+from utils.embedding import DEFAULT_BATCH_SIZE, EMBEDDING_BACKENDS, InstructorEmbedder
+from utils.text_splitter import TextSplitter
+
+from benchmarks.benchmark_utils import timed
+from benchmarks.text_splitter_benchmark import CORPORA
+
+
+def load_chunks(data_postfix: str, n_chunks: int) -> List[str]:
+    """Chunk the Mind and NHS corpora as the data embedding pipeline does and take an equal share of chunks from each.
+
+    Args:
+        data_postfix (str): Postfix of the CSV files in the data directory
+        n_chunks (int): Total number of chunks
+
+    Returns:
+        List[str]: the chunks
+    """
+    chunks: List[str] = []
+    for name, (chunk_size, chunk_overlap) in CORPORA.items():
+        df = pd.read_csv(os.path.join(DATA_DIR, f"{name}_data_{data_postfix}.csv"))
+        splitter = TextSplitter(chunk_size, chunk_overlap)
+        corpus_chunks = [
+            chunk
+            for text in df["text_scraped"].dropna().astype(str)
+            for chunk in splitter.iter_split_text(text)
+        ]
+        chunks.extend(corpus_chunks[: n_chunks // len(CORPORA)])
+    return chunks
+
+
+def cosine_agreement(
+    embeddings: npt.NDArray[np.float32], baseline: npt.NDArray[np.float32]
+) -> Tuple[float, float]:
+    """Cosine similarity between the embeddings of the same texts by two backends.
+
+    Args:
+        embeddings (npt.NDArray[np.float32]): Embeddings of shape (n, d)
+        baseline (npt.NDArray[np.float32]): Baseline embeddings of the same texts, of shape (n, d)
+
+    Returns:
+        Tuple[float, float]: the mean and minimum cosine similarity over the texts
+    """
+    similarities = np.sum(embeddings * baseline, axis=1) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(baseline, axis=1)
+    )
+    return float(np.mean(similarities)), float(np.min(similarities))
+
+
+def benchmark_backend(
+    model_name: str,
+    backend: str,
+    chunks: List[str],
+    batch_size: int,
+    num_threads: int,
+    repeat: int,
+) -> Tuple[npt.NDArray[np.float32], Dict[str, Union[str, float]]]:
+    """Time embedding chunks with a backend.
+
+    The embedder is created without a cache, so every chunk is embedded by the model in every run.
+
+    Args:
+        model_name (str): Name of the Instructor model
+        backend (str): Backend to time, one of EMBEDDING_BACKENDS
+        chunks (List[str]): Chunks to embed
+        batch_size (int): Number of chunks embedded in a single forward pass
+        num_threads (int): Number of threads used by the backend
+        repeat (int): Number of timed runs
+
+    Returns:
+        Tuple[npt.NDArray[np.float32], Dict[str, Union[str, float]]]: the embeddings and the measurements
+    """
+    embedder = InstructorEmbedder(
+        model_name,
+        DEFAULT_EMBED_INSTRUCTION,
+        batch_size=batch_size,
+        num_threads=num_threads,
+        backend=backend,
+    )
+    # Warm up, which also triggers the ONNX export on the first run
+    embedder.embed(chunks[:batch_size])
+
+    embeddings, durations = timed(lambda: embedder.embed(chunks), repeat)
+    seconds = statistics.median(durations)
+    return embeddings, {
+        "backend": backend,
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(len(chunks) / seconds, 1),
+    }
+
+
+@click.command()
+@click.option("--model", "model_name", default="hkunlp/instructor-base")
+@click.option(
+    "--backend",
+    "backends",
+    multiple=True,
+    type=click.Choice(EMBEDDING_BACKENDS),
+    help="Backend to compare with the PyTorch baseline. Can be repeated, defaults to all.",
+)
+@click.option(
+    "--data-postfix",
+    default="validated",
+    help="Postfix of the CSV files in the data directory, 'raw' or 'validated'.",
+)
+@click.option("--n-chunks", default=512, help="Number of chunks to embed.")
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE)
+@click.option("--num-threads", default=os.cpu_count() or 1)
+@click.option("--repeat", default=3, help="Number of timed runs of each backend.")
+def main(
+    model_name: str,
+    backends: Tuple[str, ...],
+    data_postfix: str,
+    n_chunks: int,
+    batch_size: int,
+    num_threads: int,
+    repeat: int,
+) -> None:
+    """Compare the throughput and cosine agreement of the embedding backends with the PyTorch baseline.
+
+    Args:
+        model_name (str): Name of the Instructor model
+        backends (Tuple[str, ...]): Backends to compare with the baseline
+        data_postfix (str): Postfix of the CSV files in the data directory
+        n_chunks (int): Number of chunks to embed
+        batch_size (int): Number of chunks embedded in a single forward pass
+        num_threads (int): Number of threads used by each backend
+        repeat (int): Number of timed runs of each backend
+    """
+    chunks = load_chunks(data_postfix, n_chunks)
+    baseline, baseline_result = benchmark_backend(
+        model_name, "torch", chunks, batch_size, num_threads, repeat
+    )
+
+    results: List[Dict[str, Union[str, float]]] = []
+    for backend in backends or EMBEDDING_BACKENDS:
+        embeddings, result = (
+            (baseline, baseline_result)
+            if backend == "torch"
+            else benchmark_backend(
+                model_name, backend, chunks, batch_size, num_threads, repeat
+            )
+        )
+        mean_cosine, min_cosine = cosine_agreement(embeddings, baseline)
+        results.append(
+            {
+                **result,
+                "speedup": round(
+                    float(baseline_result["seconds"]) / float(result["seconds"]), 2
+                ),
+                "mean_cosine": round(mean_cosine, 4),
+                "min_cosine": round(min_cosine, 4),
+            }
+        )
+
+    click.echo(f"{len(chunks)} chunks embedded with {model_name}")
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Benchmark HNSW index parameters on the embeddings of a collection.
+
+For every combination of parameters, the embeddings are indexed in a temporary local Chroma collection and queried with a sample of the embeddings.
+The benchmark reports recall@k against exact search, query latency and the estimated memory used by the index.
+
+Usage:
+    python -m benchmarks.hnsw_benchmark --collection mind_data --m 8 --m 16 --search-ef 10 --search-ef 50
+"""
+import functools
+import itertools
+import statistics
+import tempfile
+from typing import Dict, Tuple, Union
+
+import chromadb
+import click
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from utils.chroma_store import ChromaStore, HNSWConfig
+
+from benchmarks.benchmark_utils import exact_nearest_neighbours, recall_at_k, timed
+
+UPLOAD_BATCH_SIZE = 1000
+
+
+def estimate_index_memory(n_embeddings: int, dimension: int, m: int) -> int:
+    """Estimate the memory used by an HNSW index from the memory layout of hnswlib.
+
+    Every element stores its vector, its label and up to 2 * M links on the base layer.
+    About 1 / M of the elements are also on the upper layers with up to M links each.
+
+    Args:
+        n_embeddings (int): Number of indexed embeddings
+        dimension (int): Dimension of the embeddings
+        m (int): The M parameter of the index
+
+    Returns:
+        int: the estimated memory in bytes
+    """
+    base_layer = n_embeddings * (4 * dimension + 8 + 4 * (2 * m + 1))
+    upper_layers = (n_embeddings // m) * 4 * (m + 1)
+    return base_layer + upper_layers
+
+
+def benchmark_config(
+    corpus: npt.NDArray[np.float32],
+    queries: npt.NDArray[np.float32],
+    exact: npt.NDArray[np.int64],
+    k: int,
+    config: HNSWConfig,
+) -> Dict[str, Union[str, int, float]]:
+    """Build an index with the given parameters and measure its recall and latency.
+
+    Args:
+        corpus (npt.NDArray[np.float32]): Embeddings to index
+        queries (npt.NDArray[np.float32]): Query embeddings
+        exact (npt.NDArray[np.int64]): Exact nearest neighbours of the queries
+        k (int): Number of neighbours to retrieve
+        config (HNSWConfig): Index parameters
+
+    Returns:
+        Dict[str, Union[str, int, float]]: the parameters and the measurements
+    """
+    with tempfile.TemporaryDirectory() as persist_directory:
+        client = chromadb.PersistentClient(path=persist_directory)
+        collection = client.create_collection(
+            "hnsw-benchmark", metadata=config.to_metadata()
+        )
+
+        def build() -> None:
+            for start in range(0, len(corpus), UPLOAD_BATCH_SIZE):
+                batch = corpus[start : start + UPLOAD_BATCH_SIZE]
+                collection.add(
+                    ids=[str(i) for i in range(start, start + len(batch))],
+                    embeddings=batch.tolist(),
+                )
+
+        _, build_durations = timed(build)
+
+        approximate = np.full(exact.shape, -1, dtype=np.int64)
+        latencies = []
+        for i, query in enumerate(queries):
+            result, durations = timed(
+                functools.partial(
+                    collection.query,
+                    query_embeddings=[query.tolist()],
+                    n_results=k,
+                    include=["distances"],
+                )
+            )
+            latencies.extend(durations)
+            found = [int(chunk_id) for chunk_id in result["ids"][0]]
+            approximate[i, : len(found)] = found
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "space": config.space,
+        "M": config.M,
+        "construction_ef": config.construction_ef,
+        "search_ef": config.search_ef,
+        f"recall@{k}": round(recall_at_k(approximate, exact), 4),
+        "p50_latency_ms": round(statistics.median(latencies_ms), 3),
+        "p95_latency_ms": round(latencies_ms[int(0.95 * (len(latencies_ms) - 1))], 3),
+        "build_s": round(build_durations[0], 2),
+        "index_memory_mb": round(
+            estimate_index_memory(len(corpus), corpus.shape[1], config.M) / 2**20, 2
+        ),
+    }
+
+
+@click.command()
+@click.option(
+    "--collection", "-c", default="mind_data", help="Collection to benchmark."
+)
+@click.option("--host", default="localhost", help="Chroma server hostname.")
+@click.option("--port", default="8000", help="Chroma server port.")
+@click.option("--space", default="l2", help="Distance function of the index.")
+@click.option("--m", "m_values", multiple=True, type=int, default=(8, 16, 32))
+@click.option(
+    "--construction-ef", "construction_efs", multiple=True, type=int, default=(100, 200)
+)
+@click.option(
+    "--search-ef", "search_efs", multiple=True, type=int, default=(10, 50, 100)
+)
+@click.option("--n-queries", default=200, help="Number of sampled queries.")
+@click.option("--k", default=5, help="Number of neighbours to retrieve.")
+@click.option("--seed", default=42, help="Seed for sampling the queries.")
+def main(
+    collection: str,
+    host: str,
+    port: str,
+    space: str,
+    m_values: Tuple[int, ...],
+    construction_efs: Tuple[int, ...],
+    search_efs: Tuple[int, ...],
+    n_queries: int,
+    k: int,
+    seed: int,
+) -> None:
+    """Sweep HNSW parameters on the embeddings of a collection.
+
+    Args:
+        collection (str): Collection or alias to benchmark
+        host (str): Chroma server hostname
+        port (str): Chroma server port
+        space (str): Distance function of the index
+        m_values (Tuple[int, ...]): Values of M to try
+        construction_efs (Tuple[int, ...]): Values of construction_ef to try
+        search_efs (Tuple[int, ...]): Values of search_ef to try
+        n_queries (int): Number of embeddings sampled from the collection as queries
+        k (int): Number of neighbours to retrieve
+        seed (int): Seed for sampling the queries
+    """
+    store = ChromaStore(chroma_server_hostname=host, chroma_server_port=port)
+    corpus = store.fetch_embeddings(store.resolve_alias(collection))
+    click.echo(f"Fetched {corpus.shape[0]} embeddings of dimension {corpus.shape[1]}")
+
+    rng = np.random.default_rng(seed)
+    queries = corpus[
+        rng.choice(len(corpus), size=min(n_queries, len(corpus)), replace=False)
+    ]
+    exact = exact_nearest_neighbours(corpus, queries, k, space)
+
+    results = [
+        benchmark_config(
+            corpus,
+            queries,
+            exact,
+            k,
+            HNSWConfig(
+                space=space, M=m, construction_ef=construction_ef, search_ef=search_ef
+            ),
+        )
+        for m, construction_ef, search_ef in itertools.product(
+            m_values, construction_efs, search_efs
+        )
+    ]
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Benchmark projections of the embeddings of a collection to fewer dimensions.
+
+A sample of the embeddings is held out as queries. For every projection method and output dimension, the projection is fitted
+on the rest of the embeddings as the data embedding pipeline would, and the projected queries are searched exactly in the
+projected corpus. The benchmark reports recall@k against exact search in the full-dimension corpus and the memory saved.
+
+Usage:
+    python -m benchmarks.projection_benchmark --collection mind_data --dimension 128 --dimension 256
+"""
+import itertools
+from typing import Dict, Tuple, Union
+
+import click
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from utils.chroma_store import ChromaStore
+from utils.embedding_projection import (
+    DEFAULT_FIT_SIZE,
+    PROJECTION_METHODS,
+    EmbeddingProjection,
+    ProjectionConfig,
+)
+
+from benchmarks.benchmark_utils import exact_nearest_neighbours, recall_at_k, timed
+from benchmarks.hnsw_benchmark import estimate_index_memory
+
+# M of the HNSW index the memory estimate is made for, Chroma's default
+INDEX_M = 16
+
+
+def benchmark_projection(
+    corpus: npt.NDArray[np.float32],
+    queries: npt.NDArray[np.float32],
+    exact: npt.NDArray[np.int64],
+    k: int,
+    space: str,
+    config: ProjectionConfig,
+) -> Dict[str, Union[str, int, float]]:
+    """Fit a projection and measure the recall of exact search in the projected corpus.
+
+    Args:
+        corpus (npt.NDArray[np.float32]): Full-dimension embeddings to search
+        queries (npt.NDArray[np.float32]): Full-dimension query embeddings
+        exact (npt.NDArray[np.int64]): Nearest neighbours of the queries in the full-dimension corpus
+        k (int): Number of neighbours to retrieve
+        space (str): Distance function of the index
+        config (ProjectionConfig): Projection to fit
+
+    Returns:
+        Dict[str, Union[str, int, float]]: the projection parameters and the measurements
+    """
+    projection, fit_durations = timed(
+        lambda: EmbeddingProjection.fit(config, corpus[: config.fit_size])
+    )
+    projected = exact_nearest_neighbours(
+        projection.apply(corpus), projection.apply(queries), k, space
+    )
+    return {
+        "method": config.method,
+        "dimension": config.output_dimension,
+        f"recall@{k}": round(recall_at_k(projected, exact), 4),
+        "fit_s": round(fit_durations[0], 3),
+        "bytes_per_vector": 4 * config.output_dimension,
+        "index_memory_mb": round(
+            estimate_index_memory(len(corpus), config.output_dimension, INDEX_M)
+            / 2**20,
+            2,
+        ),
+    }
+
+
+@click.command()
+@click.option(
+    "--collection", "-c", default="mind_data", help="Collection to benchmark."
+)
+@click.option("--host", default="localhost", help="Chroma server hostname.")
+@click.option("--port", default="8000", help="Chroma server port.")
+@click.option("--space", default="l2", help="Distance function of the index.")
+@click.option(
+    "--method",
+    "methods",
+    multiple=True,
+    type=click.Choice(PROJECTION_METHODS),
+    help="Projection method. Can be repeated, defaults to all.",
+)
+@click.option(
+    "--dimension", "dimensions", multiple=True, type=int, default=(64, 128, 256)
+)
+@click.option("--fit-size", default=DEFAULT_FIT_SIZE)
+@click.option("--n-queries", default=200, help="Number of held out queries.")
+@click.option("--k", default=5, help="Number of neighbours to retrieve.")
+@click.option("--seed", default=42, help="Seed for sampling the queries.")
+def main(
+    collection: str,
+    host: str,
+    port: str,
+    space: str,
+    methods: Tuple[str, ...],
+    dimensions: Tuple[int, ...],
+    fit_size: int,
+    n_queries: int,
+    k: int,
+    seed: int,
+) -> None:
+    """Compare the recall of projected embeddings of a collection with its full-dimension embeddings.
+
+    Args:
+        collection (str): Collection or alias to benchmark, which must hold full-dimension embeddings
+        host (str): Chroma server hostname
+        port (str): Chroma server port
+        space (str): Distance function of the index
+        methods (Tuple[str, ...]): Projection methods to try
+        dimensions (Tuple[int, ...]): Output dimensions to try
+        fit_size (int): Number of embeddings a PCA projection is fitted on
+        n_queries (int): Number of embeddings held out of the corpus as queries
+        k (int): Number of neighbours to retrieve
+        seed (int): Seed for sampling the queries
+    """
+    store = ChromaStore(chroma_server_hostname=host, chroma_server_port=port)
+    if store.load_projection(collection) is not None:
+        raise click.UsageError(f"{collection} already holds projected embeddings")
+    embeddings = store.fetch_embeddings(store.resolve_alias(collection))
+    click.echo(
+        f"Fetched {embeddings.shape[0]} embeddings of dimension {embeddings.shape[1]}"
+    )
+
+    rng = np.random.default_rng(seed)
+    permutation = rng.permutation(len(embeddings))
+    queries = embeddings[permutation[:n_queries]]
+    corpus = embeddings[permutation[n_queries:]]
+    exact = exact_nearest_neighbours(corpus, queries, k, space)
+
+    results = [
+        {
+            "method": "none",
+            "dimension": corpus.shape[1],
+            f"recall@{k}": 1.0,
+            "fit_s": 0.0,
+            "bytes_per_vector": 4 * corpus.shape[1],
+            "index_memory_mb": round(
+                estimate_index_memory(len(corpus), corpus.shape[1], INDEX_M) / 2**20,
+                2,
+            ),
+        }
+    ]
+    for method, dimension in itertools.product(
+        methods or PROJECTION_METHODS, dimensions
+    ):
+        if dimension > corpus.shape[1]:
+            continue
+        results.append(
+            benchmark_projection(
+                corpus,
+                queries,
+                exact,
+                k,
+                space,
+                ProjectionConfig(
+                    method=method,
+                    output_dimension=dimension,
+                    fit_size=max(fit_size, dimension),
+                ),
+            )
+        )
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Benchmark chunking the scraped NHS and Mind corpora with the TextSplitter.
+
+The merge engine of `TextSplitter` is compared against the previous implementation, which built lists eagerly, evicted splits by slicing a list and searched with uncompiled patterns.
+Both must produce identical chunks, the benchmark fails otherwise.
+
+Usage:
+    python -m benchmarks.text_splitter_benchmark --data-postfix validated --repeat 3
+"""
+import os
+import re
+import statistics
+from typing import Dict, Iterable, List, Tuple, Union
+
+import click
+import pandas as pd
+from config import DATA_DIR
+from utils.text_splitter import DEFAULT_SEPARATORS, TextSplitter, join_docs
+
+from benchmarks.benchmark_utils import timed
+
+# Chunking parameters of each corpus in the data embedding pipeline
+CORPORA = {"mind": (780, 50), "nhs": (2000, 50)}
+
+
+class ReferenceTextSplitter(TextSplitter):
+    """The previous TextSplitter implementation, kept as the baseline for the benchmark."""
+
+    def merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+        """Merge splits into larger chunks, evicting splits by slicing the current chunk.
+
+        Args:
+            splits (Iterable[str]): Splits to merge.
+            separator (str): Separator to use for merging.
+
+        Returns:
+            List[str]: Merged splits.
+        """
+        separator_len = len(separator)
+        docs = []
+        current_doc: List[str] = []
+        total = 0
+
+        for split in splits:
+            _len = len(split)
+            separator_length = separator_len if len(current_doc) > 0 else 0
+            total_length = total + _len + separator_length
+
+            if total_length > self.chunk_size and len(current_doc) > 0:
+                doc = join_docs(current_doc, separator)
+                if doc is not None:
+                    docs.append(doc)
+
+                while total > self.chunk_overlap or (
+                    total_length > self.chunk_size and total > 0
+                ):
+                    separator_length = separator_len if len(current_doc) > 1 else 0
+                    total -= len(current_doc[0]) + separator_length
+                    current_doc = current_doc[1:]
+                    total_length = total + _len + (separator_len if len(current_doc) > 0 else 0)  # fmt: skip
+
+            current_doc.append(split)
+            total += _len + (separator_len if len(current_doc) > 1 else 0)
+
+        doc = join_docs(current_doc, separator)
+        if doc is not None:
+            docs.append(doc)
+
+        return docs
+
+    def recursively_merge_and_split(
+        self, splits: List[str], new_separators: List[str]
+    ) -> List[str]:
+        """Recursively merge and split splits, building the list of chunks eagerly.
+
+        Args:
+            splits (List[str]): List of splits to merge and split.
+            new_separators (List[str]): List of separators
+
+        Returns:
+            List[str]: Final merged and split chunks.
+        """
+        final_chunks = []
+        _good_splits = []
+        for split in splits:
+            if len(split) < self.chunk_size:
+                _good_splits.append(split)
+            else:
+                if _good_splits:
+                    final_chunks.extend(self.merge_splits(_good_splits, ""))
+                    _good_splits = []
+
+                if not new_separators:
+                    final_chunks.append(split)
+                else:
+                    final_chunks.extend(self.split_text(split, new_separators))
+
+        if _good_splits:
+            final_chunks.extend(self.merge_splits(_good_splits, ""))
+        return final_chunks
+
+    def split_text(
+        self, text: str, separators: List[str] = DEFAULT_SEPARATORS
+    ) -> List[str]:
+        """Split text, searching for each separator with an uncompiled pattern.
+
+        Args:
+            text (str): Input text to split
+            separators (List[str], optional): List of separator to use for splitting. Defaults to DEFAULT_SEPARATORS.
+
+        Returns:
+            List[str]: List of chunks
+        """
+        separator = separators[-1]
+        new_separators = []
+        for i, sep in enumerate(separators):
+            if sep == "":  # noqa : PLC1901
+                separator = sep
+                break
+            if re.search(sep, text):
+                separator = sep
+                new_separators = separators[i + 1 :]
+                break
+
+        _splits = re.split(f"({separator})", text)
+        splits = [_splits[i] + _splits[i + 1] for i in range(1, len(_splits), 2)]
+        if len(_splits) % 2 == 0:
+            splits += _splits[-1:]
+        splits = [s for s in [_splits[0]] + splits if s]
+
+        return self.recursively_merge_and_split(splits, new_separators)
+
+
+def chunk_corpus(
+    splitter: TextSplitter, texts: List[str], separators: List[str]
+) -> List[List[str]]:
+    """Chunk every text of a corpus.
+
+    Args:
+        splitter (TextSplitter): Splitter to use
+        texts (List[str]): Texts of the corpus
+        separators (List[str]): Separators to split with
+
+    Returns:
+        List[List[str]]: the chunks of each text
+    """
+    return [splitter.split_text(text, separators) for text in texts]
+
+
+def benchmark_corpus(
+    name: str, texts: List[str], separators: List[str], repeat: int
+) -> Dict[str, Union[str, int, float]]:
+    """Time chunking a corpus with the reference and current splitters and check they agree.
+
+    Args:
+        name (str): Name of the corpus, a key of CORPORA
+        texts (List[str]): Texts of the corpus
+        separators (List[str]): Separators to split with
+        repeat (int): Number of timed runs of each splitter
+
+    Returns:
+        Dict[str, Union[str, int, float]]: the corpus and the measurements
+
+    Raises:
+        AssertionError: if the two splitters produce different chunks
+    """
+    chunk_size, chunk_overlap = CORPORA[name]
+    reference_chunks, reference_durations = timed(
+        lambda: chunk_corpus(
+            ReferenceTextSplitter(chunk_size, chunk_overlap), texts, separators
+        ),
+        repeat,
+    )
+    chunks, durations = timed(
+        lambda: chunk_corpus(
+            TextSplitter(chunk_size, chunk_overlap), texts, separators
+        ),
+        repeat,
+    )
+    if chunks != reference_chunks:
+        raise AssertionError(f"Chunks of the {name} corpus differ from the reference")
+
+    reference_seconds = statistics.median(reference_durations)
+    seconds = statistics.median(durations)
+    return {
+        "corpus": name,
+        "separators": repr(separators),
+        "documents": len(texts),
+        "characters": sum(map(len, texts)),
+        "chunks": sum(map(len, chunks)),
+        "reference_s": round(reference_seconds, 3),
+        "current_s": round(seconds, 3),
+        "speedup": round(reference_seconds / seconds, 2) if seconds else float("nan"),
+    }
+
+
+@click.command()
+@click.option(
+    "--data-postfix",
+    default="validated",
+    help="Postfix of the CSV files in the data directory, 'raw' or 'validated'.",
+)
+@click.option(
+    "--separator",
+    "separator_sets",
+    multiple=True,
+    help="Comma separated separators to split with, e.g. ' ,'. Can be repeated.",
+)
+@click.option("--repeat", default=3, help="Number of timed runs of each splitter.")
+def main(data_postfix: str, separator_sets: Tuple[str, ...], repeat: int) -> None:
+    r"""Compare the chunking time of the reference and current TextSplitter on the NHS and Mind corpora.
+
+    By default the corpora are split with the separators of the pipeline, ["\n\n", "\n", " ", ""],
+    and with only the fine-grained [" ", ""] separators.
+
+    Args:
+        data_postfix (str): Postfix of the CSV files in the data directory
+        separator_sets (Tuple[str, ...]): Comma separated separators to split with
+        repeat (int): Number of timed runs of each splitter
+    """
+    separators_to_try = [separators.split(",") for separators in separator_sets] or [
+        DEFAULT_SEPARATORS,
+        [" ", ""],
+    ]
+
+    results = []
+    for name in CORPORA:
+        df = pd.read_csv(os.path.join(DATA_DIR, f"{name}_data_{data_postfix}.csv"))
+        texts = df["text_scraped"].dropna().astype(str).tolist()
+        for separators in separators_to_try:
+            results.append(benchmark_corpus(name, texts, separators, repeat))
+
+    click.echo(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
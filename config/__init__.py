@@ -1,4 +1,16 @@
 """Module initialiser for configuration submodule."""
-from .config import DATA_DIR, PROJECT_ROOT_DIR, VALIDATED_FILE_NAME_POSTFIX
+from .config import (
+    CHROMA_PERSIST_DIR,
+    DATA_DIR,
+    EMBEDDING_CACHE_DIR,
+    PROJECT_ROOT_DIR,
+    VALIDATED_FILE_NAME_POSTFIX,
+)
 
-__all__ = ["DATA_DIR", "VALIDATED_FILE_NAME_POSTFIX", "PROJECT_ROOT_DIR"]
+__all__ = [
+    "DATA_DIR",
+    "VALIDATED_FILE_NAME_POSTFIX",
+    "PROJECT_ROOT_DIR",
+    "EMBEDDING_CACHE_DIR",
+    "CHROMA_PERSIST_DIR",
+]
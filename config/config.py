@@ -7,3 +7,7 @@ PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT_DIR, "data/")
 
 VALIDATED_FILE_NAME_POSTFIX = "_data_validated.csv"
+
+EMBEDDING_CACHE_DIR = os.path.join(PROJECT_ROOT_DIR, ".embedding_cache/")
+
+CHROMA_PERSIST_DIR = os.path.join(PROJECT_ROOT_DIR, ".chroma/")
@@ -1,4 +1,5 @@
 """A metric service interface for computing readability and handling post and get requests."""
+import base64
 import logging
 from typing import Any, List, Tuple
 
@@ -6,7 +7,10 @@ from flask import Flask, Response, jsonify, request
 from metric_service import (
     compute_readability,
     validate_data,
+    validate_drift_attribution_data,
+    validate_embedding_sketch_data,
     validate_llm_response,
+    validate_query_drift_data,
 )
 from utils.metric_database import DatabaseInterface
 
@@ -141,6 +145,79 @@ def readability_threshold() -> Response:
     )
 
 
+@app.route("/query_drift", methods=["POST"])
+def query_drift() -> Response:
+    """Receives and validates the aggregates of a batch of sampled user queries from a POST request, and then adds them to the query drift aggregates of the current time bucket if they're valid.
+
+    No query embedding is received, only the aggregates of at least MIN_AGGREGATED_QUERIES queries.
+
+    Returns:
+        Response: a tuple containing a success message and the HTTP status code.
+    """
+    query_drift_data_dict = request.get_json()
+
+    try:
+        validated_data = validate_query_drift_data(query_drift_data_dict)
+        db_interface.insert_query_drift_data(validated_data)
+    except Exception as e:
+        return jsonify({"status_code": 400, "message": f"Validation error: {str(e)}"})
+
+    return jsonify(
+        {
+            "status_code": 200,
+            "dataset": validated_data["dataset"],
+            "message": "Query drift data has been successfully aggregated.",
+        }
+    )
+
+
+@app.route("/drift_attribution", methods=["POST"])
+def drift_attribution() -> Response:
+    """Receives and validates a drift attribution report from a POST request, and then inserts a row for each of its sources into the database if it's valid.
+
+    Returns:
+        Response: a tuple containing a success message and the HTTP status code.
+    """
+    drift_attribution_data_dict = request.get_json()
+
+    try:
+        validated_data = validate_drift_attribution_data(drift_attribution_data_dict)
+        db_interface.insert_drift_attribution_data(validated_data)
+    except Exception as e:
+        return jsonify({"status_code": 400, "message": f"Validation error: {str(e)}"})
+
+    return jsonify(
+        {
+            "status_code": 200,
+            "n_sources": len(validated_data["sources"]),
+            "message": "Drift attribution data has been successfully inserted.",
+        }
+    )
+
+
+@app.route("/embedding_sketch", methods=["POST"])
+def embedding_sketch() -> Response:
+    """Receives and validates the sketch of the embeddings of a data version from a POST request, and then stores it in the database if it's valid.
+
+    Returns:
+        Response: a tuple containing a success message and the HTTP status code.
+    """
+    embedding_sketch_data_dict = request.get_json()
+
+    try:
+        validated_data = validate_embedding_sketch_data(embedding_sketch_data_dict)
+        db_interface.insert_embedding_sketch_data(validated_data)
+    except Exception as e:
+        return jsonify({"status_code": 400, "message": f"Validation error: {str(e)}"})
+
+    return jsonify(
+        {
+            "status_code": 200,
+            "message": "Embedding sketch has been successfully inserted.",
+        }
+    )
+
+
 @app.route("/query_readability", methods=["GET"])
 def query_readability() -> List[Tuple[Any, ...]]:
     """This function queries the "Readability" relation using the db_interface's query_relation method and returns the results as a list of tuple.
@@ -181,6 +258,49 @@ def query_readability_threshold() -> List[Tuple[Any, ...]]:
     return db_interface.query_relation(relation_name="readability_threshold")
 
 
+@app.route("/query_query_drift", methods=["GET"])
+def query_query_drift() -> List[Tuple[Any, ...]]:
+    """This function queries the "query_drift" relation using the db_interface's query_relation method and returns the results as a list of tuple.
+
+    Returns:
+        List[Tuple[Any, ...]]: the query result
+    """
+    return db_interface.query_relation(relation_name="query_drift")
+
+
+@app.route("/query_drift_attribution", methods=["GET"])
+def query_drift_attribution() -> List[Tuple[Any, ...]]:
+    """This function queries the "drift_attribution" relation using the db_interface's query_relation method and returns the results as a list of tuple.
+
+    Returns:
+        List[Tuple[Any, ...]]: the query result
+    """
+    return db_interface.query_relation(relation_name="drift_attribution")
+
+
+@app.route("/query_embedding_sketch", methods=["GET"])
+def query_embedding_sketch() -> Response:
+    """This function fetches the sketch of the data version and collection given by the "data_version" and "collection_name" query parameters.
+
+    Returns:
+        Response: the base64 encoded sketch, or a 404 status code if the data version was not sketched.
+    """
+    collection_name = request.args.get("collection_name", "")
+    data_version = request.args.get("data_version", "")
+    sketch = db_interface.fetch_embedding_sketch(collection_name, data_version)
+    if sketch is None:
+        return jsonify(
+            {
+                "status_code": 404,
+                "message": f"No sketch of {data_version} of {collection_name}.",
+            }
+        )
+
+    return jsonify(
+        {"status_code": 200, "sketch": base64.b64encode(sketch).decode("ascii")}
+    )
+
+
 @app.route("/")
 def hello() -> str:
     """The message for default route.
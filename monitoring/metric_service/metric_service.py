@@ -1,8 +1,14 @@
-"""Functions for the metric service for computing readability and validate llm response and embedding drift data."""
-from typing import Any, Dict, Tuple, Type, Union
+"""Functions for the metric service for computing readability and validate llm response, embedding drift, query drift, drift attribution and embedding sketch data."""
+import base64
+import binascii
+from typing import Any, Dict, List, Tuple, Type, Union
 
 import textstat
 
+SOURCE_STATUSES = ("unchanged", "changed", "added", "removed")
+# Fewest queries whose aggregates are accepted at once, so that the aggregates do not disclose any single query embedding
+MIN_AGGREGATED_QUERIES = 10
+
 
 def compute_readability(llm_response: str) -> float:
     """This function compute a readability score using the Flesch–Kincaid readability tests.
@@ -130,3 +136,139 @@ def validate_user_feedback_data(data: Dict[str, str]) -> Dict[str, str]:
             )
 
     return data
+
+
+def validate_query_drift_data(
+    data: Dict[str, Any]
+) -> Dict[str, Union[str, int, float, List[float]]]:
+    """Validate that the given query drift data dictionary, aggregating a batch of sampled user queries, has the required keys and values of correct types.
+
+    Args:
+        data (Dict[str, Any]): a dictionary containing the dataset and data version queried, the number of queries, the sum of the offsets of their embeddings
+            from the corpus mean, and the sum, sum of squares and maximum of their distances to the nearest chunk.
+
+    Raises:
+        KeyError: raise if any of the required keys is not found in the dictionary.
+        TypeError: raise if the value associated with any of the keys is of incorrect type, or the offset sum is not a list of numbers.
+        ValueError: raise if fewer than MIN_AGGREGATED_QUERIES queries are aggregated, if the offset sum is empty or if a distance is negative.
+
+    Returns:
+        Dict[str, Union[str, int, float, List[float]]]: the validated query drift data dictionary, with the offset sum as floats.
+    """
+    required_keys_types = {
+        "dataset": str,
+        "data_version": str,
+        "n_queries": int,
+        "offset_sum": list,
+        "nearest_distance_sum": float,
+        "nearest_distance_sum_sq": float,
+        "nearest_distance_max": float,
+    }
+    validate_data(data, required_keys_types)
+
+    if data["n_queries"] < MIN_AGGREGATED_QUERIES:
+        raise ValueError(
+            f"'n_queries' must be at least {MIN_AGGREGATED_QUERIES}, got {data['n_queries']}."
+        )
+    offset_sum = data["offset_sum"]
+    if not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in offset_sum
+    ):
+        raise TypeError("'offset_sum' must be a list of numbers.")
+    if len(offset_sum) == 0:
+        raise ValueError("'offset_sum' must not be empty.")
+    for key in (
+        "nearest_distance_sum",
+        "nearest_distance_sum_sq",
+        "nearest_distance_max",
+    ):
+        if data[key] < 0:
+            raise ValueError(f"'{key}' must not be negative.")
+
+    return {**data, "offset_sum": [float(value) for value in offset_sum]}
+
+
+def validate_drift_attribution_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate that the given drift attribution data dictionary, and each of its sources, has the required keys and values of correct types.
+
+    Args:
+        data (Dict[str, Any]): a dictionary containing the data versions and dataset compared, and the sources by decreasing contribution.
+
+    Raises:
+        KeyError: raise if any of the required keys is not found in the dictionary or one of its sources.
+        TypeError: raise if the value associated with any of the keys is of incorrect type.
+        ValueError: raise if the status of a source is not one of SOURCE_STATUSES.
+
+    Returns:
+        Dict[str, Any]: the validated drift attribution data dictionary.
+    """
+    validate_data(
+        data,
+        {
+            "reference_dataset": str,
+            "current_dataset": str,
+            "dataset": str,
+            "sources": list,
+        },
+    )
+
+    optional_keys_types = {
+        "centroid_shift": float,
+        "chunk_distance": float,
+        "nearest_source": str,
+        "nearest_source_distance": float,
+    }
+    for source in data["sources"]:
+        if not isinstance(source, dict):
+            raise TypeError("Each source must be a dictionary.")
+        validate_data(
+            source,
+            {
+                "source": str,
+                "status": str,
+                "n_reference": int,
+                "n_current": int,
+                "contribution": float,
+            },
+        )
+        if source["status"] not in SOURCE_STATUSES:
+            raise ValueError(
+                f"'{source['status']}' is not a source status, expected one of {SOURCE_STATUSES}."
+            )
+        for key, expected_type in optional_keys_types.items():
+            if source.get(key) is not None and not isinstance(
+                source[key], expected_type
+            ):
+                raise TypeError(
+                    f"'{key}' has incorrect type, expected {expected_type.__name__} or None."
+                )
+
+    return data
+
+
+def validate_embedding_sketch_data(
+    data: Dict[str, Any]
+) -> Dict[str, Union[str, bytes]]:
+    """Validate that the given embedding sketch data dictionary has the required keys and values of correct types, and decode the sketch.
+
+    Args:
+        data (Dict[str, Any]): a dictionary containing the collection name, the data version and the base64 encoded sketch.
+
+    Raises:
+        KeyError: raise if any of the required keys is not found in the dictionary.
+        TypeError: raise if the value associated with any of the keys is of incorrect type.
+        ValueError: raise if the sketch is empty or not base64 encoded.
+
+    Returns:
+        Dict[str, Union[str, bytes]]: the validated embedding sketch data dictionary, with the sketch decoded.
+    """
+    validate_data(data, {"collection_name": str, "data_version": str, "sketch": str})
+    try:
+        sketch = base64.b64decode(data["sketch"], validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"'sketch' is not base64 encoded: {e}")
+    if not sketch:
+        raise ValueError("'sketch' must not be empty.")
+
+    return {**data, "sketch": sketch}
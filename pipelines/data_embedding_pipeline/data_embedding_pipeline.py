@@ -1,11 +1,28 @@
 """Data embedding pipeline."""
-from steps.data_embedding_steps import compute_embedding_drift, embed_data
+from steps.data_embedding_steps import (
+    compute_drift_attribution,
+    compute_embedding_drift,
+    embed_datasets,
+)
 from steps.generic_steps import load_data
 from zenml import pipeline
 from zenml.logger import get_logger
 
 logger = get_logger(__name__)
 
+# HNSW index parameters of new collections, see benchmarks/hnsw_benchmark.py for the recall and latency trade-off
+HNSW_CONFIG = {"space": "l2", "M": 16, "construction_ef": 100, "search_ef": 10}
+MIND_COLLECTION = {
+    "collection_name": "mind_data",
+    "chunk_size": 780,
+    "chunk_overlap": 50,
+}
+NHS_COLLECTION = {
+    "collection_name": "nhs_data",
+    "chunk_size": 2000,
+    "chunk_overlap": 50,
+}
+
 
 @pipeline
 def data_embedding_pipeline() -> None:
@@ -13,38 +30,47 @@ def data_embedding_pipeline() -> None:
 
     Steps:
         load_data: A ZenML step which loads the data from a specified DVC data version.
-        embed_data: A ZenML step which embeds the text data into vectors and pushes to the vector database.
+        embed_datasets: A ZenML step which embeds the Mind and NHS text data into vectors with one model and pushes them to the vector database.
         compute_embedding_drift: A ZenML step which computes the embedding drift between the current and reference data versions.
+        compute_drift_attribution: A ZenML step which attributes the embedding drift to the pages which changed between the data versions.
     """
     current_data_version, reference_data_version, mind_df, nhs_df = load_data()
 
-    embed_data(
+    embed_datasets(
         mind_df,
+        nhs_df,
         embed_model_type="base",
         data_version=current_data_version,
+        mind_collection=MIND_COLLECTION,
+        nhs_collection=NHS_COLLECTION,
+        reference_data_version=reference_data_version,
+        chunking={"deduplicate": True},
+        upload={"versioned": True, "hnsw_config": HNSW_CONFIG},
+    )
+
+    _ = compute_embedding_drift(
+        after="embed_datasets",
         collection_name="mind_data",
-        chunk_size=780,
-        chunk_overlap=50,
+        reference_data_version=reference_data_version,
+        current_data_version=current_data_version,
     )
 
-    embed_data(
-        nhs_df,
-        embed_model_type="base",
-        data_version=current_data_version,
+    _ = compute_embedding_drift(
+        after="embed_datasets",
         collection_name="nhs_data",
-        chunk_size=2000,
-        chunk_overlap=50,
+        reference_data_version=reference_data_version,
+        current_data_version=current_data_version,
     )
 
-    _ = compute_embedding_drift(
-        after="embed_data",
+    _ = compute_drift_attribution(
+        after="embed_datasets",
         collection_name="mind_data",
         reference_data_version=reference_data_version,
         current_data_version=current_data_version,
     )
 
-    _ = compute_embedding_drift(
-        after="embed_data",
+    _ = compute_drift_attribution(
+        after="embed_datasets",
         collection_name="nhs_data",
         reference_data_version=reference_data_version,
         current_data_version=current_data_version,
@@ -1,12 +1,16 @@
 """Run all pipelines."""
 import click
+from config import CHROMA_PERSIST_DIR
 from pipelines.data_embedding_pipeline import data_embedding_pipeline
 from pipelines.data_preparation_pipeline import data_preparation_pipeline
 from pipelines.data_scraping_pipeline import data_scraping_pipeline
+from utils.chroma_store import DEFAULT_RETAINED_VERSIONS, ChromaStore
 from zenml.logger import get_logger
 
 logger = get_logger(__name__)
 
+SYNC_COLLECTIONS = ["mind_data", "nhs_data"]
+
 
 def run_data_scrapping_pipeline() -> None:
     """Run all steps in the data scrapping pipeline."""
@@ -32,19 +36,48 @@ def run_data_embedding_pipeline() -> None:
     pipeline()
 
 
+def sync_collections() -> None:
+    """Push the collections in the local, embedded Chroma database to the chroma server."""
+    local_store = ChromaStore(persist_directory=CHROMA_PERSIST_DIR)
+    # Switch hostname to chroma-service.default if the chroma server runs on k8s
+    server_store = ChromaStore(
+        chroma_server_hostname="localhost", chroma_server_port="8000"
+    )
+
+    local_collections = local_store.list_collection_names()
+    for collection_name in SYNC_COLLECTIONS:
+        if local_store.resolve_alias(collection_name) not in local_collections:
+            logger.warning(f"{collection_name} not found in {CHROMA_PERSIST_DIR}")
+            continue
+
+        pushed = local_store.push_collection(collection_name, server_store)
+        deleted = server_store.garbage_collect_versions(
+            collection_name, retain=DEFAULT_RETAINED_VERSIONS
+        )
+        logger.info(
+            f"Pushed {pushed} to the chroma server, deleted old versions {deleted}"
+        )
+
+
 @click.command()
 @click.option("--scrape", "-s", is_flag=True, help="Run data scraping pipeline.")
 @click.option(
     "--prepare", "-p", is_flag=True, help="Run the data preparation pipeline."
 )
 @click.option("--embed", "-e", is_flag=True, help="Run the data embedding pipeline.")
-def main(scrape: bool, prepare: bool, embed: bool) -> None:
+@click.option(
+    "--sync",
+    is_flag=True,
+    help="Push the collections in the local Chroma database to the chroma server.",
+)
+def main(scrape: bool, prepare: bool, embed: bool, sync: bool) -> None:
     """Run all pipelines.
 
     Args:
         scrape (bool): run the data scraping pipeline when True.
         prepare (bool): run the data preparation pipeline when True.
         embed (bool): run the data embedding pipeline when True.
+        sync (bool): push the local Chroma database to the chroma server when True.
         deploy (bool): run the deployment pipeline when True.
     """
     if scrape:
@@ -59,6 +92,10 @@ def main(scrape: bool, prepare: bool, embed: bool) -> None:
         logger.info("Running the data embedding pipeline.")
         run_data_embedding_pipeline()
 
+    if sync:
+        logger.info("Pushing the local Chroma database to the chroma server.")
+        sync_collections()
+
 
 if __name__ == "__main__":
     """Main."""
@@ -1,8 +1,17 @@
 """Initialiser for data embedding steps."""
 
+from .compute_drift_attribution_step.compute_drift_attribution_step import (
+    compute_drift_attribution,
+)
 from .compute_embedding_drift_step.compute_embedding_drift_step import (
     compute_embedding_drift,
 )
 from .embed_data_step.embed_data_step import embed_data
+from .embed_datasets_step.embed_datasets_step import embed_datasets
 
-__all__ = ["embed_data", "compute_embedding_drift"]
+__all__ = [
+    "embed_data",
+    "embed_datasets",
+    "compute_embedding_drift",
+    "compute_drift_attribution",
+]
@@ -0,0 +1,147 @@
+"""Compute drift attribution step."""
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+import requests
+from steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step import (
+    CHROMA_SERVER_HOSTNAME,
+    CHROMA_SERVER_PORT,
+    COLLECTION_NAME_MAP,
+    MONITORING_METRICS_HOST_NAME,
+    MONITORING_METRICS_PORT,
+    physical_collections,
+)
+from utils.chroma_store import ChromaStore
+from utils.drift_attribution import (
+    DEFAULT_TOP_K,
+    DriftAttribution,
+    SourceCentroids,
+    attribute_drift,
+)
+from zenml import step
+from zenml.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def build_drift_attribution_payload(
+    reference_data_version: str,
+    current_data_version: str,
+    attribution: DriftAttribution,
+    dataset: str,
+    top_k: int,
+) -> Dict[str, Any]:
+    """Construct a payload for sending the sources contributing most to the drift to the metric service via post request.
+
+    Args:
+        reference_data_version (str): the version identifier for the reference data.
+        current_data_version (str): the version identifier for the current data.
+        attribution (DriftAttribution): the drift attributed to the sources of the data versions.
+        dataset (str): the dataset the drift is attributed for.
+        top_k (int): the number of sources to send.
+
+    Returns:
+        Dict[str, Any]: a dictionary containing the data versions, the dataset and the top sources by decreasing contribution.
+    """
+    return {
+        "reference_dataset": reference_data_version,
+        "current_dataset": current_data_version,
+        "dataset": dataset,
+        "sources": [asdict(source) for source in attribution.top(top_k)],
+    }
+
+
+@step
+def compute_drift_attribution(
+    collection_name: str,
+    reference_data_version: str,
+    current_data_version: str,
+    chroma_persist_directory: Optional[str] = None,
+    top_k: int = DEFAULT_TOP_K,
+    match_chunks: bool = True,
+) -> float:
+    """Attribute the drift between the current and reference datasets of a collection to the pages their chunks come from.
+
+    The embeddings of each version are streamed page by page and summed by the `source` of the chunks, so only one vector per
+    page is held. The shift of the mean of the collection is broken down into a contribution per page, and pages are reported as
+    changed, added or removed. The new chunks of changed pages are matched to the chunks of the page in the reference version,
+    and added and removed pages to the closest page of the other version, which shows pages that have moved.
+    The `top_k` pages contributing most are logged and sent to our monitoring service via post request.
+
+    Args:
+        collection_name (str): the name of the collection
+        reference_data_version (str): the reference data version
+        current_data_version (str): the current data version
+        chroma_persist_directory (Optional[str]): directory of an embedded Chroma database to read from instead of the chroma server. Defaults to None.
+        top_k (int): the number of pages to report. Defaults to DEFAULT_TOP_K.
+        match_chunks (bool): match the new chunks of changed pages to the chunks of the reference version, which fetches the embeddings of changed pages again. Defaults to True.
+
+    Returns:
+        float: the Euclidean distance between the means of the reference and current datasets, which the contributions add up to.
+
+    Raises:
+        ValueError: if either version is not in a versioned collection
+    """
+    chroma_client = ChromaStore(
+        chroma_server_hostname=CHROMA_SERVER_HOSTNAME,
+        chroma_server_port=CHROMA_SERVER_PORT,
+        persist_directory=chroma_persist_directory,
+    )
+    physical_names = physical_collections(
+        chroma_client, collection_name, reference_data_version, current_data_version
+    )
+    summaries = []
+    for physical_name, data_version in zip(
+        physical_names, (reference_data_version, current_data_version)
+    ):
+        summary = SourceCentroids()
+        for ids, sources, embeddings in chroma_client.iter_labelled_embeddings(
+            physical_name, "source", where={"data_version": data_version}
+        ):
+            summary.update(ids, sources, embeddings)
+        summaries.append(summary)
+
+    reference_name, current_name = physical_names
+    attribution = attribute_drift(
+        summaries[0],
+        summaries[1],
+        fetch_reference=(
+            lambda ids: chroma_client.fetch_embeddings_by_ids(reference_name, ids)
+        )
+        if match_chunks
+        else None,
+        fetch_current=(
+            lambda ids: chroma_client.fetch_embeddings_by_ids(current_name, ids)
+        )
+        if match_chunks
+        else None,
+    )
+
+    top_sources = attribution.top(top_k)
+    logger.info(
+        f"The Euclidean distance between the means of {reference_data_version} and {current_data_version} of {collection_name} is "
+        f"{attribution.centroid_euclidean}, of which the top {len(top_sources)} pages contribute "
+        f"{sum(source.contribution for source in top_sources)}"
+    )
+    for source in top_sources:
+        logger.info(
+            f"{source.status} {source.source}: contribution {source.contribution}, chunks {source.n_reference} -> {source.n_current}, "
+            f"centroid shift {source.centroid_shift}, chunk distance {source.chunk_distance}, "
+            f"nearest page {source.nearest_source} at {source.nearest_source_distance}"
+        )
+
+    payload = build_drift_attribution_payload(
+        reference_data_version,
+        current_data_version,
+        attribution,
+        COLLECTION_NAME_MAP[collection_name],
+        top_k,
+    )
+    response = requests.post(
+        f"http://{MONITORING_METRICS_HOST_NAME}:{MONITORING_METRICS_PORT}/drift_attribution",
+        json=payload,
+    )
+
+    logger.info(response.text)
+
+    return attribution.centroid_euclidean
@@ -1,10 +1,17 @@
 """Compute embedding drift step."""
-from statistics import mean
-from typing import Dict, List, Union
+from typing import Dict, Optional, Tuple, Union
 
 import requests
-from scipy.spatial import distance
 from utils.chroma_store import ChromaStore
+from utils.drift_sampling import (
+    DEFAULT_CONFIDENCE,
+    DEFAULT_INITIAL_SAMPLE_SIZE,
+    DEFAULT_MAX_SAMPLE_SIZE,
+    DEFAULT_TOLERANCE,
+    approximate_drift,
+)
+from utils.embedding_drift import EmbeddingDrift, compare_sketches, compute_drift
+from utils.sketch_store import SketchStore
 from zenml import step
 from zenml.logger import get_logger
 
@@ -19,141 +26,298 @@ CHROMA_SERVER_PORT = "8000"
 COLLECTION_NAME_MAP = {"mind_data": "mind", "nhs_data": "nhs"}
 
 
-def validate_embeddings(
-    reference_embeddings: List[List[float]], current_embeddings: List[List[float]]
-) -> None:
-    """Validate that reference and current embeddings are both lists of lists of floats.
+def build_embedding_drift_payload(
+    reference_data_version: str,
+    current_data_version: str,
+    distance: float,
+    dataset: str,
+) -> Dict[str, Union[str, float, bool]]:
+    """Construct a payload for send the embedding drift data to the metric service via post request.
 
     Args:
-        reference_embeddings (List[List[float]]): reference dataset embeddings to validate
-        current_embeddings (List[List[float]]): current dataset embeddings to validate
+        reference_data_version (str): the version identifier for the reference data.
+        current_data_version (str): the version identifier for the current data.
+        distance (float): the computed Euclidean distance between the embeddings of the reference and current data.
+        dataset (str): the dataset used for computing embedding drift.
 
-    Raises:
-        TypeError: raise if reference or current embeddings are not lists of lists of floats.
+    Returns:
+        Dict[str, Union[str, float, bool]]: a dictionary containing the 4 items required by the metric service embedding drift relation.
     """
-    for name, embeddings in [
-        ("reference", reference_embeddings),
-        ("current", current_embeddings),
-    ]:
-        if not isinstance(embeddings, list) or not all(
-            isinstance(sublist, list)
-            and all(isinstance(item, float) for item in sublist)
-            for sublist in embeddings
-        ):
-            raise TypeError(
-                f"The {name} embeddings should be a list of lists of floats."
-            )
+    drifted = distance > 0
+
+    return {
+        "reference_dataset": reference_data_version,
+        "current_dataset": current_data_version,
+        "distance": distance,
+        "drifted": drifted,
+        "dataset": dataset,
+    }
 
 
-def calculate_means(embeddings: List[List[float]]) -> List[float]:
-    """Calculate the mean of each list of embeddings.
+def physical_collections(
+    chroma_client: ChromaStore,
+    collection_name: str,
+    reference_data_version: str,
+    current_data_version: str,
+) -> Tuple[str, str]:
+    """Find the physical collections holding the chunks of two data versions of a collection.
+
+    Chunk IDs are derived from their content, so uploading a data version to a collection which is not versioned relabels
+    the chunks it shares with earlier versions, and incremental uploads delete the chunks it no longer has. Only the latest
+    version can then be read back, so different versions must each be in their own versioned collection.
 
     Args:
-        embeddings (List[List[float]]): a list of lists, where each inner list contains floats
+        chroma_client (ChromaStore): the Chroma store holding the versions
+        collection_name (str): the name of the collection
+        reference_data_version (str): the reference data version
+        current_data_version (str): the current data version
 
     Returns:
-        List[float]: the mean of each list of embeddings.
+        Tuple[str, str]: the names of the collections of the reference and current versions
+
+    Raises:
+        ValueError: if the versions differ and either of them is not in a versioned collection
     """
-    return [mean(embedding) for embedding in embeddings]
+    reference_name, current_name = (
+        chroma_client.collection_for_data_version(collection_name, data_version)
+        for data_version in (reference_data_version, current_data_version)
+    )
+    if reference_data_version != current_data_version and collection_name in (
+        reference_name,
+        current_name,
+    ):
+        raise ValueError(
+            f"{reference_data_version} and {current_data_version} of {collection_name} are not both in versioned collections, "
+            "so their chunks cannot be told apart. Embed the data versions with versioned=True, or sketch both of them to compare their sketches"
+        )
+    return reference_name, current_name
 
 
-def calculate_euclidean_distance(
-    reference_embeddings: List[List[float]], current_embeddings: List[List[float]]
-) -> float:
-    """Calculate the Euclidean distance between the mean of reference embeddings and the mean of current embeddings.
+def _warn_if_projected_differently(
+    chroma_client: ChromaStore,
+    collection_name: str,
+    reference_data_version: str,
+    current_data_version: str,
+) -> None:
+    """Warn if the embeddings of two data versions were projected with different fits, as they are then in different spaces.
 
     Args:
-        reference_embeddings (List[List[float]]): a list of lists, where each inner list contains floats of reference embeddings
-        current_embeddings (List[List[float]]): a list of lists, where each inner list contains floats of current embeddings
+        chroma_client (ChromaStore): the Chroma store holding the versions
+        collection_name (str): the name of the collection
+        reference_data_version (str): the reference data version
+        current_data_version (str): the current data version
+    """
+    projections = {
+        projection.to_string() if projection is not None else None
+        for projection in (
+            chroma_client.load_projection(
+                chroma_client.collection_for_data_version(collection_name, data_version)
+            )
+            for data_version in (reference_data_version, current_data_version)
+        )
+    }
+    if len(projections) > 1:
+        logger.warning(
+            f"{reference_data_version} and {current_data_version} of {collection_name} are projected differently, so their embeddings are not comparable"
+        )
 
-    Raises:
-        ValueError: raise if the len of the reference dataset embedding mean does not equal the length current dataset
 
-    Returns:
-        float: the Euclidean distance between the mean of reference embeddings and the mean of current embeddings
-    """
-    reference_lengths = [len(embedding) for embedding in reference_embeddings]
-    current_lengths = [len(embedding) for embedding in current_embeddings]
+def _exact_drift(
+    chroma_client: ChromaStore,
+    collection_name: str,
+    reference_data_version: str,
+    current_data_version: str,
+    mmd_samples: Optional[int],
+    use_sketches: bool,
+) -> EmbeddingDrift:
+    """Compute the drift between two data versions from their sketches if both exist, and from all their embeddings otherwise.
 
-    if reference_lengths != current_lengths:
-        raise ValueError(
-            "The length of the reference embeddings mean list should equal to the length of the current embeddings mean list"
-        )
+    Args:
+        chroma_client (ChromaStore): the Chroma store holding the versions
+        collection_name (str): the name of the collection
+        reference_data_version (str): the reference data version
+        current_data_version (str): the current data version
+        mmd_samples (Optional[int]): maximum number of embeddings of each version the maximum mean discrepancy is computed on, None to skip it.
+        use_sketches (bool): compare the sketches of the data versions when both exist.
 
-    reference_embeddings_mean = calculate_means(reference_embeddings)
-    current_embeddings_mean = calculate_means(current_embeddings)
+    Returns:
+        EmbeddingDrift: the drift
 
-    return float(distance.euclidean(reference_embeddings_mean, current_embeddings_mean))
+    Raises:
+        ValueError: if the sketches of the versions were projected with different fits
+    """
+    sketch_store = SketchStore(
+        f"http://{MONITORING_METRICS_HOST_NAME}:{MONITORING_METRICS_PORT}"
+    )
+    reference_sketch, current_sketch = (
+        sketch_store.load_sketch(collection_name, data_version)
+        if use_sketches
+        else None
+        for data_version in (reference_data_version, current_data_version)
+    )
+    if reference_sketch is not None and current_sketch is not None:
+        return compare_sketches(reference_sketch, current_sketch, mmd_samples)
+
+    logger.info(
+        f"{collection_name} has no sketch of {reference_data_version} or {current_data_version}, fetching their embeddings"
+    )
+    physical_collections(
+        chroma_client, collection_name, reference_data_version, current_data_version
+    )
+    (
+        reference_embeddings,
+        current_embeddings,
+    ) = chroma_client.fetch_reference_and_current_embeddings(
+        collection_name, reference_data_version, current_data_version
+    )
+    _warn_if_projected_differently(
+        chroma_client, collection_name, reference_data_version, current_data_version
+    )
+    return compute_drift(reference_embeddings, current_embeddings, mmd_samples)
 
 
-def build_embedding_drift_payload(
+def _approximate_drift(
+    chroma_client: ChromaStore,
+    collection_name: str,
     reference_data_version: str,
     current_data_version: str,
-    distance: float,
-    dataset: str,
-) -> Dict[str, Union[str, float, bool]]:
-    """Construct a payload for send the embedding drift data to the metric service via post request.
+    sample_size: int,
+    max_sample_size: int,
+    tolerance: float,
+    confidence: float,
+    mmd_samples: Optional[int],
+) -> EmbeddingDrift:
+    """Estimate the drift between two data versions from samples of their embeddings, stratified by the source of the chunks.
 
     Args:
-        reference_data_version (str): the version identifier for the reference data.
-        current_data_version (str): the version identifier for the current data.
-        distance (float): the computed Euclidean distance between the embeddings of the reference and current data.
-        dataset (str): the dataset used for computing embedding drift.
+        chroma_client (ChromaStore): the Chroma store holding the versions
+        collection_name (str): the name of the collection
+        reference_data_version (str): the reference data version
+        current_data_version (str): the current data version
+        sample_size (int): number of embeddings first sampled from each version
+        max_sample_size (int): largest number of embeddings sampled from each version
+        tolerance (float): width of the confidence interval of the distance, relative to the distance, at which sampling stops
+        confidence (float): confidence level of the intervals
+        mmd_samples (Optional[int]): maximum number of sampled embeddings of each version the maximum mean discrepancy is computed on, None to skip it.
 
     Returns:
-        Dict[str, Union[str, float, bool]]: a dictionary containing the 4 items required by the metric service embedding drift relation.
+        EmbeddingDrift: the estimated drift, with confidence intervals
     """
-    drifted = distance > 0
-
-    return {
-        "reference_dataset": reference_data_version,
-        "current_dataset": current_data_version,
-        "distance": distance,
-        "drifted": drifted,
-        "dataset": dataset,
-    }
+    physical_names = physical_collections(
+        chroma_client, collection_name, reference_data_version, current_data_version
+    )
+    reference_ids, current_ids = (
+        chroma_client.group_ids_by_metadata(
+            physical_name, "source", where={"data_version": data_version}
+        )
+        for physical_name, data_version in zip(
+            physical_names, (reference_data_version, current_data_version)
+        )
+    )
+    _warn_if_projected_differently(
+        chroma_client, collection_name, reference_data_version, current_data_version
+    )
+    reference_name, current_name = physical_names
+    return approximate_drift(
+        reference_ids,
+        current_ids,
+        lambda ids: chroma_client.fetch_embeddings_by_ids(reference_name, ids),
+        lambda ids: chroma_client.fetch_embeddings_by_ids(current_name, ids),
+        initial_sample_size=sample_size,
+        max_sample_size=max_sample_size,
+        tolerance=tolerance,
+        confidence=confidence,
+        mmd_samples=mmd_samples,
+    )
 
 
 @step
 def compute_embedding_drift(
-    collection_name: str, reference_data_version: str, current_data_version: str
+    collection_name: str,
+    reference_data_version: str,
+    current_data_version: str,
+    chroma_persist_directory: Optional[str] = None,
+    mmd_samples: Optional[int] = None,
+    use_sketches: bool = True,
+    approximate: bool = False,
+    sample_size: int = DEFAULT_INITIAL_SAMPLE_SIZE,
+    max_sample_size: int = DEFAULT_MAX_SAMPLE_SIZE,
+    tolerance: float = DEFAULT_TOLERANCE,
+    confidence: float = DEFAULT_CONFIDENCE,
 ) -> float:
     """Compute the measure of 'drift' in data embeddings between the current and reference datasets, identified by the given collection name.
 
-    This function calculates the Euclidean distance between the mean values of the reference and current embeddings
+    This function calculates the Euclidean distance between the per-dimension means of the reference and current embeddings, which may differ in number.
     This distance signifies the 'drift' or variation in the data distribution between the reference and current datasets, which will be visualised over time using a plot of the distance
+    The cosine distance between the means, and optionally the maximum mean discrepancy of subsampled embeddings, are logged with it.
+    If both data versions were sketched by the embed step, they are compared from their sketches without fetching any embedding,
+    which also works for versions whose collections have been garbage collected. The MMD is then computed on the reservoir samples
+    of the sketches, and the Fréchet distance between the versions is logged as well.
+    In approximate mode, the distances are instead estimated from samples of the embeddings stratified by source, which grow until
+    their bootstrap confidence interval is tight enough, so the cost of the check does not grow with the collection.
     This function will also prepare and send the embedding drift data to our monitoring service via post request
 
     Args:
         collection_name (str): the name of the collection to compute
         reference_data_version (str): the reference data version
         current_data_version (str): the current data version
+        chroma_persist_directory (Optional[str]): directory of an embedded Chroma database to read from instead of the chroma server. Defaults to None.
+        mmd_samples (Optional[int]): maximum number of embeddings of each version the maximum mean discrepancy is computed on. Defaults to None, which skips it.
+        use_sketches (bool): compare the sketches of the data versions when both exist. Defaults to True.
+        approximate (bool): estimate the drift from stratified samples of the embeddings, whether or not the versions were sketched. Defaults to False.
+        sample_size (int): number of embeddings first sampled from each version in approximate mode. Defaults to DEFAULT_INITIAL_SAMPLE_SIZE.
+        max_sample_size (int): largest number of embeddings sampled from each version in approximate mode. Defaults to DEFAULT_MAX_SAMPLE_SIZE.
+        tolerance (float): width of the confidence interval of the distance, relative to the distance, at which sampling stops. Defaults to DEFAULT_TOLERANCE.
+        confidence (float): confidence level of the intervals in approximate mode. Defaults to DEFAULT_CONFIDENCE.
 
     Returns:
         float: the Euclidean distance representing the drift between the reference and current datasets. 0 if reference and current embeddings are the same.
+
+    Raises:
+        ValueError: if the embeddings of different versions would be read from a collection which is not versioned,
+            or if the sketches of the versions were projected with different fits
     """
     # Create a chromadb client
     chroma_client = ChromaStore(
         chroma_server_hostname=CHROMA_SERVER_HOSTNAME,
         chroma_server_port=CHROMA_SERVER_PORT,
+        persist_directory=chroma_persist_directory,
     )
-    (
-        reference_embeddings,
-        current_embeddings,
-    ) = chroma_client.fetch_reference_and_current_embeddings(
-        collection_name, reference_data_version, current_data_version
-    )
-    validate_embeddings(reference_embeddings, current_embeddings)
-    distance = calculate_euclidean_distance(reference_embeddings, current_embeddings)
+    if approximate:
+        drift = _approximate_drift(
+            chroma_client,
+            collection_name,
+            reference_data_version,
+            current_data_version,
+            sample_size,
+            max_sample_size,
+            tolerance,
+            confidence,
+            mmd_samples,
+        )
+    else:
+        drift = _exact_drift(
+            chroma_client,
+            collection_name,
+            reference_data_version,
+            current_data_version,
+            mmd_samples,
+            use_sketches,
+        )
 
     logger.info(
-        f"The Euclidean distance between the mean of reference embeddings and the mean of current embeddings is: {distance}"
+        f"Between {drift.n_reference} reference and {drift.n_current} current embeddings, the Euclidean distance between the means is {drift.centroid_euclidean}, "
+        f"the cosine distance between the means is {drift.centroid_cosine}, the squared MMD is {drift.mmd} and the squared Fréchet distance is {drift.frechet}"
     )
+    if drift.euclidean_interval is not None:
+        logger.info(
+            f"The {confidence:.0%} confidence intervals of the Euclidean and cosine distances are {drift.euclidean_interval} and {drift.cosine_interval}"
+        )
 
     payload = build_embedding_drift_payload(
         reference_data_version,
         current_data_version,
-        distance,
+        drift.centroid_euclidean,
         COLLECTION_NAME_MAP[collection_name],
     )
     response = requests.post(
@@ -163,4 +327,4 @@ def compute_embedding_drift(
 
     logger.info(response.text)
 
-    return float(distance)
+    return drift.centroid_euclidean
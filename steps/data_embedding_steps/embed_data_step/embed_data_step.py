@@ -1,24 +1,165 @@
 """Embed data step."""
-import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
 import pandas as pd
-from chromadb.utils import embedding_functions
+from config import EMBEDDING_CACHE_DIR
+from steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step import (
+    MONITORING_METRICS_HOST_NAME,
+    MONITORING_METRICS_PORT,
+)
 from utils.chroma_store import ChromaStore
-from utils.text_splitter import TextSplitter
+from utils.chunking import ChunkingOptions, DatasetChunker
+from utils.collection_upload import CollectionUpload, UploadOptions, upload_collections
+from utils.embedding import DEFAULT_BATCH_SIZE, EmbeddingModelConfig, InstructorEmbedder
+from utils.sketch_store import SketchStore
 from zenml import step
 from zenml.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+# The "-onnx" and "-int8" models run with ONNX Runtime, see benchmarks/embedding_backend_benchmark.py for their speed and agreement with PyTorch
 EMBED_MODEL_MAP = {
-    "xl": "hkunlp/instructor-xl",
-    "large": "hkunlp/instructor-large",
-    "base": "hkunlp/instructor-base",
+    "xl": EmbeddingModelConfig("hkunlp/instructor-xl"),
+    "large": EmbeddingModelConfig("hkunlp/instructor-large"),
+    "base": EmbeddingModelConfig("hkunlp/instructor-base"),
+    "base-onnx": EmbeddingModelConfig("hkunlp/instructor-base", backend="onnx"),
+    "base-int8": EmbeddingModelConfig("hkunlp/instructor-base", backend="onnx-int8"),
 }
 DEFAULT_EMBED_INSTRUCTION = "Represent the document for retrieval: "
 
 
+@dataclass
+class EmbedderOptions:
+    """Dataclass for how the embedding model is run, apart from its type and batch size.
+
+    Attributes:
+        num_threads (Optional[int]): Number of torch threads used for embedding, per process with `workers`. None keeps the torch default,
+            or shares the CPU cores between the embedding processes.
+        cache_dir (Optional[str]): Directory of the on-disk embedding cache, None disables caching
+        workers (Optional[int]): Number of processes embedding chunks, None uses all CPU cores
+    """
+
+    num_threads: Optional[int] = None
+    cache_dir: Optional[str] = EMBEDDING_CACHE_DIR
+    workers: Optional[int] = 1
+
+
+def load_embedder(
+    embed_model_type: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    options: Optional[EmbedderOptions] = None,
+) -> InstructorEmbedder:
+    """Load the embedding model used to embed chunks.
+
+    Args:
+        embed_model_type (str): Name of embedding model to use, a key of EMBED_MODEL_MAP
+        batch_size (int): Number of chunks embedded at once. Defaults to DEFAULT_BATCH_SIZE.
+        options (Optional[EmbedderOptions]): How the model is run. Defaults to None, which uses the defaults of `EmbedderOptions`.
+
+    Returns:
+        InstructorEmbedder: the embedder
+
+    Raises:
+        ValueError: if `embed_model_type` is not supported
+    """
+    model_config = EMBED_MODEL_MAP.get(embed_model_type, None)
+    if model_config is None:
+        raise ValueError(
+            f"{embed_model_type} is not supported. The list of supported models is {EMBED_MODEL_MAP.keys()}"
+        )
+
+    options = options or EmbedderOptions()
+    return InstructorEmbedder(
+        model_name=model_config.model_name,
+        instruction=DEFAULT_EMBED_INSTRUCTION,
+        batch_size=batch_size,
+        num_threads=options.num_threads,
+        cache_dir=options.cache_dir,
+        backend=model_config.backend,
+        n_workers=options.workers,
+    )
+
+
+def close_embedder(embedder: InstructorEmbedder) -> None:
+    """Shut down the embedding workers and close the embedding cache.
+
+    Args:
+        embedder (InstructorEmbedder): Embedder to close
+    """
+    embedder.close()
+    if embedder.cache is not None:
+        embedder.cache.close()
+        cache_stats = embedder.cache.stats()
+        logger.info(
+            f"Embedding cache hit rate {cache_stats.hit_rate:.2%} ({cache_stats.hits} hits, {cache_stats.misses} misses, {cache_stats.evictions} evictions)"
+        )
+
+
+def connect_chroma(chroma_persist_directory: Optional[str] = None) -> ChromaStore:
+    """Connect to the vector database which chunks are uploaded to.
+
+    Args:
+        chroma_persist_directory (Optional[str]): Directory of an embedded Chroma database to use instead of the chroma server. Defaults to None.
+
+    Returns:
+        ChromaStore: the vector database
+    """
+    # Switch hostname to chroma-service.default if running the pipeline on k8s
+    return ChromaStore(
+        chroma_server_hostname="localhost",
+        chroma_server_port="8000",
+        persist_directory=chroma_persist_directory,
+    )
+
+
+def connect_sketch_store() -> SketchStore:
+    """Connect to the metric service which stores the sketches of the embeddings.
+
+    Returns:
+        SketchStore: the sketch store
+    """
+    return SketchStore(
+        f"http://{MONITORING_METRICS_HOST_NAME}:{MONITORING_METRICS_PORT}"
+    )
+
+
+def make_chunker(
+    df: pd.DataFrame,
+    data_version: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    options: ChunkingOptions,
+    embedder: InstructorEmbedder,
+) -> DatasetChunker:
+    """Set up the splitting of a dataset into chunks, measured with the tokenizer of the embedding model when the length unit is tokens.
+
+    Args:
+        df (pd.DataFrame): Pages to split, with "text_scraped" and "url" columns
+        data_version (str): Data version of the pages
+        chunk_size (int): Size of chunks to split the pages into
+        chunk_overlap (int): Number of characters, or tokens, to overlap between chunks
+        options (ChunkingOptions): How the pages are split
+        embedder (InstructorEmbedder): Embedder of the chunks
+
+    Returns:
+        DatasetChunker: the chunker
+    """
+    # The tokenizer is only read when it is needed, as it loads the model
+    if options.length_unit != "tokens":
+        return DatasetChunker(df, data_version, chunk_size, chunk_overlap, options)
+    return DatasetChunker(
+        df,
+        data_version,
+        chunk_size,
+        chunk_overlap,
+        options,
+        tokenizer=embedder.tokenizer,
+        max_tokens=embedder.max_text_tokens,
+    )
+
+
 @step
 def embed_data(
     df: pd.DataFrame,
@@ -27,6 +168,12 @@ def embed_data(
     collection_name: str,
     chunk_size: int,
     chunk_overlap: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    reference_data_version: Optional[str] = None,
+    embedding: Optional[Dict[str, Any]] = None,
+    chunking: Optional[Dict[str, Any]] = None,
+    upload: Optional[Dict[str, Any]] = None,
+    chroma_persist_directory: Optional[str] = None,
 ) -> None:
     """Embeds each row of the given DataFrame and uploads to the vector database.
 
@@ -36,55 +183,44 @@ def embed_data(
         data_version (str): Data version of input dataset
         collection_name (str): Name of collection for input dataset
         chunk_size (int): Size of chunks to split input text into
-        chunk_overlap (int): Number of characters to overlap between chunks
+        chunk_overlap (int): Number of characters, or tokens, to overlap between chunks
+        batch_size (int): Number of chunks embedded and upserted at once. Defaults to DEFAULT_BATCH_SIZE.
+        reference_data_version (Optional[str]): Data version copied out of `collection_name` on its first versioned upload, if it is not versioned yet. Defaults to None.
+        embedding (Optional[Dict[str, Any]]): How the embedding model is run, see `EmbedderOptions`. Defaults to None.
+        chunking (Optional[Dict[str, Any]]): How the pages are split into chunks, see `ChunkingOptions`. Defaults to None.
+        upload (Optional[Dict[str, Any]]): How the chunks are uploaded, see `UploadOptions`, with `hnsw_config` and `projection` as dictionaries. Defaults to None.
+        chroma_persist_directory (Optional[str]): Directory of an embedded Chroma database to upload to instead of the chroma server. Defaults to None.
 
     Raises:
-        ValueError: if `embed_model_type` is not supported or invalid
+        ValueError: if any of the parameters is invalid, or if the collection holds embeddings which are projected differently
     """
-    texts = df["text_scraped"].values.tolist()
-    src_urls = df["url"].values.tolist()
-
-    logger.info(f"Using chunk_size={chunk_size} and chunk_overlap={chunk_overlap}")
-    text_splitter = TextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-    # Create metadata and UUID based on the number of chunks
-    # Split text into chunks
-    chunks, metadatas = [], []
-    for text, url in zip(texts, src_urls):
-        split_chunks = text_splitter.split_text(text)
-        chunks.extend(split_chunks)
-        metadatas.extend(
-            [
-                {"source": url, "data_version": data_version}
-                for _ in range(len(split_chunks))
-            ]
-        )
-
-    uuids = [str(uuid.uuid4()) for _ in range(len(chunks))]
-
-    logger.info(f"Split {len(texts)} texts into {len(chunks)} chunks")
-
-    model_name = EMBED_MODEL_MAP.get(embed_model_type, None)
-    if model_name is None:
-        raise ValueError(
-            f"{embed_model_type} is not supported. The list of supported models is {EMBED_MODEL_MAP.keys()}"
-        )
-
-    # Create a embedding function
-    ef = embedding_functions.InstructorEmbeddingFunction(
-        model_name=model_name, instruction=DEFAULT_EMBED_INSTRUCTION
+    chunking_options = ChunkingOptions(**(chunking or {}))
+    upload_options = UploadOptions.from_parameters(
+        upload,
+        data_version=data_version,
+        batch_size=batch_size,
+        reference_data_version=reference_data_version,
     )
-
-    # Create a chromadb client
-    # Switch hostname to chroma-service.default if running the pipeline on k8s
-    chroma_client = ChromaStore(
-        chroma_server_hostname="localhost", chroma_server_port="8000"
-    )
-
-    chroma_client.add_texts(
-        collection_name=collection_name,
-        texts=chunks,
-        ids=uuids,
-        metadatas=metadatas,  # type: ignore
-        embedding_function=ef,
+    embedder = load_embedder(
+        embed_model_type, batch_size, EmbedderOptions(**(embedding or {}))
     )
+    # The workers are shut down and the cached embeddings kept when the upload fails, so that a rerun reuses them
+    try:
+        collection_upload = CollectionUpload(
+            make_chunker(
+                df,
+                data_version,
+                chunk_size,
+                chunk_overlap,
+                chunking_options,
+                embedder,
+            ),
+            collection_name,
+            upload_options,
+            embedder,
+            connect_chroma(chroma_persist_directory),
+            connect_sketch_store(),
+        )
+        upload_collections([collection_upload], embedder)
+    finally:
+        close_embedder(embedder)
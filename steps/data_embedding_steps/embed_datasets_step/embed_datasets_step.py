@@ -0,0 +1,114 @@
+"""Embed datasets step."""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from steps.data_embedding_steps.embed_data_step.embed_data_step import (
+    EmbedderOptions,
+    close_embedder,
+    connect_chroma,
+    connect_sketch_store,
+    load_embedder,
+    make_chunker,
+)
+from utils.chunking import ChunkingOptions
+from utils.collection_upload import CollectionUpload, UploadOptions, upload_collections
+from utils.embedding import DEFAULT_BATCH_SIZE
+from zenml import step
+from zenml.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CollectionConfig:
+    """Dataclass for the collection a dataset is uploaded to and how the dataset is chunked."""
+
+    collection_name: str
+    chunk_size: int
+    chunk_overlap: int
+
+
+@step
+def embed_datasets(
+    mind_df: pd.DataFrame,
+    nhs_df: pd.DataFrame,
+    embed_model_type: str,
+    data_version: str,
+    mind_collection: Dict[str, Any],
+    nhs_collection: Dict[str, Any],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    reference_data_version: Optional[str] = None,
+    embedding: Optional[Dict[str, Any]] = None,
+    chunking: Optional[Dict[str, Any]] = None,
+    upload: Optional[Dict[str, Any]] = None,
+    chroma_persist_directory: Optional[str] = None,
+) -> None:
+    """Embeds the Mind and NHS datasets with a single embedding model and uploads each to its own collection.
+
+    The model is loaded once. Each dataset is chunked with its own parameters and uploaded as by `embed_data`,
+    but the windows of chunks of both datasets are embedded together, so one pool of embedding workers is kept busy for the whole step.
+
+    Args:
+        mind_df (pd.DataFrame): Mind data frame to be embedded
+        nhs_df (pd.DataFrame): NHS data frame to be embedded
+        embed_model_type (str): Name of embedding model to use
+        data_version (str): Data version of the input datasets
+        mind_collection (Dict[str, Any]): Collection name, chunk size and chunk overlap of the Mind dataset, see `CollectionConfig`
+        nhs_collection (Dict[str, Any]): Collection name, chunk size and chunk overlap of the NHS dataset, see `CollectionConfig`
+        batch_size (int): Number of chunks embedded and upserted at once. Defaults to DEFAULT_BATCH_SIZE.
+        reference_data_version (Optional[str]): Data version copied out of each collection on its first versioned upload, if it is not versioned yet. Defaults to None.
+        embedding (Optional[Dict[str, Any]]): How the embedding model is run, see `EmbedderOptions`. Defaults to None.
+        chunking (Optional[Dict[str, Any]]): How the pages of both datasets are split into chunks, see `ChunkingOptions`. Defaults to None.
+        upload (Optional[Dict[str, Any]]): How the chunks are uploaded to both collections, see `UploadOptions`, with `hnsw_config` and `projection` as dictionaries.
+            A projection is fitted separately for each collection. Defaults to None.
+        chroma_persist_directory (Optional[str]): Directory of an embedded Chroma database to upload to instead of the chroma server. Defaults to None.
+
+    Raises:
+        ValueError: if any of the parameters is invalid, if both datasets use the same collection, or if a collection holds embeddings which are projected differently
+    """
+    collections = [
+        (mind_df, CollectionConfig(**mind_collection)),
+        (nhs_df, CollectionConfig(**nhs_collection)),
+    ]
+    if len({config.collection_name for _, config in collections}) < len(collections):
+        raise ValueError("Each dataset must be uploaded to a different collection")
+
+    chunking_options = ChunkingOptions(**(chunking or {}))
+    upload_options = UploadOptions.from_parameters(
+        upload,
+        data_version=data_version,
+        batch_size=batch_size,
+        reference_data_version=reference_data_version,
+    )
+    embedder = load_embedder(
+        embed_model_type, batch_size, EmbedderOptions(**(embedding or {}))
+    )
+    # The workers are shut down and the cached embeddings kept when an upload fails, so that a rerun reuses them
+    try:
+        chroma_client = connect_chroma(chroma_persist_directory)
+        sketch_store = connect_sketch_store()
+        uploads = [
+            CollectionUpload(
+                make_chunker(
+                    df,
+                    data_version,
+                    config.chunk_size,
+                    config.chunk_overlap,
+                    chunking_options,
+                    embedder,
+                ),
+                config.collection_name,
+                upload_options,
+                embedder,
+                chroma_client,
+                sketch_store,
+            )
+            for df, config in collections
+        ]
+        upload_collections(uploads, embedder)
+    finally:
+        close_embedder(embedder)
+    logger.info(
+        f"Embedded {sum(upload.n_embedded for upload in uploads)} chunks into {[upload.collection_name for upload in uploads]} with one {embed_model_type} model"
+    )
@@ -0,0 +1,11 @@
+"""Testing fixtures for the Streamlit app, whose modules import `app_utils` and `configs` from the app directory."""
+import importlib.util
+import os
+import sys
+
+# Appended rather than prepended, so that app/app.py does not shadow the app package
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "app"))
+
+# The app dependencies are only installed in the app image
+if importlib.util.find_spec("streamlit") is None:
+    collect_ignore_glob = ["test_app_utils/test_*.py"]
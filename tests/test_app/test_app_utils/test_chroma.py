@@ -0,0 +1,38 @@
+"""Test suite for the Chroma utils of the app."""
+from unittest import mock
+
+from app_utils.chroma import query_vector_store_many
+from utils.chroma_store import MultiCollectionQueryResult
+
+
+def test_query_vector_store_many_submits_result_to_reporter():
+    """Test that the query result is handed to the query drift reporter rather than sent before the documents are returned."""
+    result = MultiCollectionQueryResult(
+        results={
+            "nhs_data": {
+                "documents": [["first chunk"]],
+                "metadatas": [[{"source": "https://www.nhs.uk/page"}]],
+                "distances": [[0.5]],
+            }  # type: ignore
+        },
+        embedding_seconds=0.0,
+        collection_seconds={"nhs_data": 0.0},
+        total_seconds=0.0,
+    )
+    chroma_client = mock.MagicMock()
+    chroma_client.query_many.return_value = result
+
+    with mock.patch("app_utils.chroma._get_embedding_function"), mock.patch(
+        "app_utils.chroma.get_query_drift_reporter"
+    ) as mock_get_reporter:
+        contexts = query_vector_store_many(
+            chroma_client,
+            "query",
+            ["nhs_data"],
+            n_results=1,
+            metric_service_endpoint="http://metric-service",
+        )
+
+    assert contexts == {"nhs_data": "first chunk"}
+    mock_get_reporter.assert_called_once_with("http://metric-service")
+    mock_get_reporter.return_value.submit.assert_called_once_with(result)
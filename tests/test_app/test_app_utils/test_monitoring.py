@@ -0,0 +1,110 @@
+"""Test suite for the query drift monitoring of the app."""
+from typing import Iterator, List, Optional
+from unittest import mock
+
+import numpy as np
+import pytest
+from app_utils.monitoring import QueryDriftReporter
+from utils.chroma_store import MultiCollectionQueryResult
+
+
+def make_result(
+    query_embedding: List[float], data_version: Optional[str] = "v1"
+) -> MultiCollectionQueryResult:
+    """Make the result of querying the NHS collection with a single query.
+
+    Args:
+        query_embedding (List[float]): the projected query embedding the collection was queried with
+        data_version (Optional[str]): the data version the alias resolved to, None if the collection is not versioned
+
+    Returns:
+        MultiCollectionQueryResult: the query result
+    """
+    return MultiCollectionQueryResult(
+        results={"nhs_data": {"distances": [[0.5, 0.7]]}},  # type: ignore
+        embedding_seconds=0.0,
+        collection_seconds={"nhs_data": 0.0},
+        total_seconds=0.0,
+        query_embeddings=[[9.0, 9.0, 9.0]],
+        collection_query_embeddings={"nhs_data": [query_embedding]},
+        data_versions={"nhs_data": data_version},
+    )
+
+
+@pytest.fixture
+def sketch_store() -> Iterator[mock.MagicMock]:
+    """Mock sketch store whose corpus mean is [1, 1].
+
+    Yields:
+        Iterator[mock.MagicMock]: the mock sketch store
+    """
+    with mock.patch("app_utils.monitoring.SketchStore") as mock_sketch_store:
+        mock_sketch_store.return_value.load_sketch.return_value.mean = np.ones(2)
+        yield mock_sketch_store.return_value
+
+
+def test_query_drift_reporter_sends_aggregates_of_full_batches(
+    sketch_store: mock.MagicMock,
+):
+    """Test that only the aggregates of full batches of queries are sent, from the embeddings and data versions the queries resolved.
+
+    Args:
+        sketch_store (mock.MagicMock): mock sketch store
+    """
+    with mock.patch("app_utils.monitoring.random.random", return_value=0.0), mock.patch(
+        "app_utils.monitoring.QUERY_DRIFT_BATCH_SIZE", 2
+    ), mock.patch("app_utils.monitoring.requests.post") as mock_post:
+        reporter = QueryDriftReporter("http://metric-service")
+        for query_embedding in ([1.0, 2.0], [3.0, 1.0], [2.0, 2.0]):
+            reporter.submit(make_result(query_embedding))
+        reporter.join()
+
+    mock_post.assert_called_once()
+    assert mock_post.call_args.kwargs["url"] == "http://metric-service/query_drift"
+    assert mock_post.call_args.kwargs["json"] == {
+        "dataset": "nhs",
+        "data_version": "v1",
+        "n_queries": 2,
+        "offset_sum": [2.0, 1.0],
+        "nearest_distance_sum": 1.0,
+        "nearest_distance_sum_sq": 0.5,
+        "nearest_distance_max": 0.5,
+    }
+    # The corpus mean is loaded once
+    sketch_store.load_sketch.assert_called_once_with("nhs_data", "v1")
+
+
+def test_query_drift_reporter_skips_unsampled_and_unversioned_queries(
+    sketch_store: mock.MagicMock,
+):
+    """Test that queries which are not sampled, or were answered from a collection which is not versioned, are not aggregated.
+
+    Args:
+        sketch_store (mock.MagicMock): mock sketch store
+    """
+    with mock.patch("app_utils.monitoring.random.random", return_value=0.99):
+        reporter = QueryDriftReporter("http://metric-service")
+        reporter.submit(make_result([1.0, 2.0]))
+    assert reporter._queue.empty()
+
+    with mock.patch("app_utils.monitoring.random.random", return_value=0.0):
+        reporter.submit(make_result([1.0, 2.0], data_version=None))
+        reporter.join()
+    assert not reporter._aggregates
+    sketch_store.load_sketch.assert_not_called()
+
+
+def test_query_drift_reporter_drops_queries_when_full(sketch_store: mock.MagicMock):
+    """Test that submitting a query does not wait when the queue is full.
+
+    Args:
+        sketch_store (mock.MagicMock): mock sketch store
+    """
+    with mock.patch("app_utils.monitoring.random.random", return_value=0.0), mock.patch(
+        "app_utils.monitoring.QUERY_DRIFT_QUEUE_SIZE", 1
+    ), mock.patch("app_utils.monitoring.threading.Thread"):
+        reporter = QueryDriftReporter("http://metric-service")
+        reporter.submit(make_result([1.0, 2.0]))
+        reporter.submit(make_result([3.0, 1.0]))
+
+    assert reporter._queue.qsize() == 1
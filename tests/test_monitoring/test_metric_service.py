@@ -5,14 +5,17 @@ import pytest
 from monitoring.metric_service.metric_service import (
     compute_readability,
     validate_data,
+    validate_drift_attribution_data,
+    validate_embedding_sketch_data,
     validate_llm_response,
+    validate_query_drift_data,
 )
 
 
 @pytest.mark.parametrize(
     "response, expectation",
     [
-        (int(123), pytest.raises(TypeError)),
+        (123, pytest.raises(TypeError)),
         (
             {"incorrect key": "mock response", "dataset": "mock_dataset"},
             pytest.raises(ValueError),
@@ -21,9 +24,9 @@ from monitoring.metric_service.metric_service import (
             {"response": "mock response", "incorrect key": "mock_dataset"},
             pytest.raises(ValueError),
         ),
-        ({"response": int(123), "dataset": "mock_dataset"}, pytest.raises(TypeError)),
+        ({"response": 123, "dataset": "mock_dataset"}, pytest.raises(TypeError)),
         ({"response": "", "dataset": "mock_dataset"}, pytest.raises(ValueError)),
-        ({"response": "mock response", "dataset": int(123)}, pytest.raises(TypeError)),
+        ({"response": "mock response", "dataset": 123}, pytest.raises(TypeError)),
         ({"response": "mock response", "dataset": ""}, pytest.raises(ValueError)),
         ({"response": "mock response", "dataset": "mock_dataset"}, does_not_raise()),
     ],
@@ -127,3 +130,136 @@ def test_validate_user_feedback_data(
 
     with expectation:
         validate_data(test_data, required_keys_types)
+
+
+@pytest.mark.parametrize(
+    "n_queries, offset_sum, nearest_distance_max, expectation",
+    [
+        (10, [0.1, -2, 0.0], 0.5, does_not_raise()),
+        (9, [0.1, -2, 0.0], 0.5, pytest.raises(ValueError)),
+        (10, [0.1, "0.2"], 0.5, pytest.raises(TypeError)),
+        (10, [0.1, True], 0.5, pytest.raises(TypeError)),
+        (10, "0.1", 0.5, pytest.raises(TypeError)),
+        (10, [], 0.5, pytest.raises(ValueError)),
+        (10, [0.1], -0.5, pytest.raises(ValueError)),
+    ],
+)
+def test_validate_query_drift_data(
+    n_queries: int,
+    offset_sum: list,
+    nearest_distance_max: float,
+    expectation: pytest.raises,
+) -> None:
+    """Test whether the validate_query_drift_data function would raise the expected error when the aggregates of a batch of queries are incorrect.
+
+    Args:
+        n_queries (int): the mock number of aggregated queries
+        offset_sum (list): the mock sum of the embedding offsets
+        nearest_distance_max (float): the mock largest distance to the nearest chunk
+        expectation (pytest.raises): exception to raise
+    """
+    data = {
+        "dataset": "nhs",
+        "data_version": "v1",
+        "n_queries": n_queries,
+        "offset_sum": offset_sum,
+        "nearest_distance_sum": 2.5,
+        "nearest_distance_sum_sq": 1.0,
+        "nearest_distance_max": nearest_distance_max,
+    }
+
+    with expectation:
+        validated_data = validate_query_drift_data(data)
+        assert validated_data["offset_sum"] == [0.1, -2.0, 0.0]
+
+
+@pytest.mark.parametrize(
+    "source, expectation",
+    [
+        (
+            {
+                "source": "https://www.mind.org.uk/page",
+                "status": "changed",
+                "n_reference": 2,
+                "n_current": 3,
+                "contribution": 0.1,
+                "centroid_shift": 0.2,
+                "chunk_distance": None,
+            },
+            does_not_raise(),
+        ),
+        (
+            {
+                "source": "https://www.mind.org.uk/page",
+                "status": "moved",
+                "n_reference": 2,
+                "n_current": 3,
+                "contribution": 0.1,
+            },
+            pytest.raises(ValueError),
+        ),
+        (
+            {
+                "source": "https://www.mind.org.uk/page",
+                "status": "added",
+                "n_reference": 0,
+                "n_current": 3,
+                "contribution": 0.1,
+                "nearest_source": 1,
+            },
+            pytest.raises(TypeError),
+        ),
+        (
+            {
+                "source": "https://www.mind.org.uk/page",
+                "status": "added",
+                "n_current": 3,
+                "contribution": 0.1,
+            },
+            pytest.raises(KeyError),
+        ),
+        ("https://www.mind.org.uk/page", pytest.raises(TypeError)),
+    ],
+)
+def test_validate_drift_attribution_data(
+    source: dict, expectation: pytest.raises
+) -> None:
+    """Test whether the validate_drift_attribution_data function would raise the expected error when a source is incorrect.
+
+    Args:
+        source (dict): the mock source
+        expectation (pytest.raises): exception to raise
+    """
+    data = {
+        "reference_dataset": "v1",
+        "current_dataset": "v2",
+        "dataset": "mind",
+        "sources": [source],
+    }
+
+    with expectation:
+        validate_drift_attribution_data(data)
+
+
+@pytest.mark.parametrize(
+    "sketch, expectation",
+    [
+        ("c2tldGNo", does_not_raise()),
+        ("", pytest.raises(ValueError)),
+        ("not base64!", pytest.raises(ValueError)),
+        (b"c2tldGNo", pytest.raises(TypeError)),
+    ],
+)
+def test_validate_embedding_sketch_data(
+    sketch: str, expectation: pytest.raises
+) -> None:
+    """Test whether the validate_embedding_sketch_data function decodes the sketch, and would raise the expected error when it is incorrect.
+
+    Args:
+        sketch (str): the mock base64 encoded sketch
+        expectation (pytest.raises): exception to raise
+    """
+    data = {"collection_name": "nhs_data", "data_version": "v1", "sketch": sketch}
+
+    with expectation:
+        assert validate_embedding_sketch_data(data)["sketch"] == b"sketch"
@@ -0,0 +1,62 @@
+"""Unit tests for the compute drift attribution step."""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from steps.data_embedding_steps.compute_drift_attribution_step.compute_drift_attribution_step import (
+    compute_drift_attribution,
+)
+
+
+def test_compute_drift_attribution_step():
+    """Test that the compute_drift_attribution step streams both versions and posts the top pages to the metric service."""
+    embeddings = {"a1": [0.0, 0.0], "a2": [0.0, 2.0], "b1": [4.0, 0.0]}
+
+    with patch(
+        "steps.data_embedding_steps.compute_drift_attribution_step.compute_drift_attribution_step.ChromaStore"
+    ) as mock_chroma, patch(
+        "steps.data_embedding_steps.compute_drift_attribution_step.compute_drift_attribution_step.requests.post"
+    ) as mock_post_requests:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.collection_for_data_version.side_effect = [
+            "mind_data-v1",
+            "mind_data-v2",
+        ]
+        mock_chroma_instance.iter_labelled_embeddings.side_effect = [
+            iter([(["a1"], ["page-a"], np.array([embeddings["a1"]]))]),
+            iter(
+                [
+                    (["a2"], ["page-a"], np.array([embeddings["a2"]])),
+                    (["b1"], ["page-b"], np.array([embeddings["b1"]])),
+                ]
+            ),
+        ]
+        mock_chroma_instance.fetch_embeddings_by_ids.side_effect = (
+            lambda collection_name, ids: np.array([embeddings[i] for i in ids])
+        )
+        mock_post_requests.return_value.text = "OK"
+
+        distance = compute_drift_attribution("mind_data", "v1", "v2", top_k=1)
+
+        assert distance == np.hypot(2.0, 1.0)
+        payload = mock_post_requests.call_args.kwargs["json"]
+        assert payload["dataset"] == "mind"
+        assert [source["source"] for source in payload["sources"]] == ["page-b"]
+        assert payload["sources"][0]["status"] == "added"
+        mock_chroma_instance.fetch_embeddings_by_ids.assert_any_call(
+            "mind_data-v2", ["a2"]
+        )
+
+
+def test_compute_drift_attribution_step_rejects_shared_collection():
+    """Test that data versions which are not in versioned collections are rejected, as their chunks cannot be told apart."""
+    with patch(
+        "steps.data_embedding_steps.compute_drift_attribution_step.compute_drift_attribution_step.ChromaStore"
+    ) as mock_chroma:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.collection_for_data_version.return_value = "mind_data"
+
+        with pytest.raises(ValueError):
+            compute_drift_attribution("mind_data", "v1", "v2")
+
+        mock_chroma_instance.iter_labelled_embeddings.assert_not_called()
@@ -1,90 +1,13 @@
 """Unit tests for the compute embedding drift step."""
-from contextlib import nullcontext as does_not_raise
-from typing import List
 from unittest.mock import patch
 
+import numpy as np
 import pytest
 from steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step import (
     build_embedding_drift_payload,
-    calculate_euclidean_distance,
-    calculate_means,
     compute_embedding_drift,
-    validate_embeddings,
 )
-
-
-@pytest.mark.parametrize(
-    "reference_embeddings, current_embeddings, expectation",
-    [
-        (int(123), [[1.0, 2.1, 3.2], [3.1, 4.2, 5.3]], pytest.raises(TypeError)),
-        (
-            [[1.1, 2.2, 3.3], ["a", "a", True]],
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]],
-            pytest.raises(TypeError),
-        ),
-        (
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]],
-            [(1.1, 2.2), (3.1, 4.1, 5.1)],
-            pytest.raises(TypeError),
-        ),
-        ([[1, 2, 3], [3, 4, 5]], [[1, 2, 3], [3, 4, 5]], pytest.raises(TypeError)),
-        (
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]],
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1], [4.1, 5.1, 6.1]],
-            does_not_raise(),
-        ),
-        (
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]],
-            [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]],
-            does_not_raise(),
-        ),
-    ],
-)
-def test_validate_embeddings(
-    reference_embeddings: List[List[float]],
-    current_embeddings: List[List[float]],
-    expectation: pytest.raises,
-):
-    """Test whether the validate_embeddings functions raises an error when either the reference or the current embeddings are not correct.
-
-    Args:
-        reference_embeddings (List[List[float]]): the mock reference dataset embeddings to check
-        current_embeddings (List[List[float]]): the mock current dataset embeddings to check
-        expectation (pytest.raises): exception to raise
-    """
-    with expectation:
-        validate_embeddings(reference_embeddings, current_embeddings)
-
-
-def test_calculate_means():
-    """Test that the calculate_means function is able to return expected result."""
-    test_list = [[1, 1, 1], [2, 2, 2], [1.5, 2.5, 3.5]]
-    expected_result = [1, 2, 2.5]
-
-    result = calculate_means(test_list)
-
-    assert result == expected_result
-
-
-def test_calculate_euclidean_distance_raise_value_error():
-    """Test that the calculate_euclidean_distance function raises the expected error when the embedding length does not equal between the reference and the current dataset."""
-    mock_reference_embedding = [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
-    mock_current_embedding = [[1.1, 2.2], [3.1, 4.1]]
-
-    with pytest.raises(ValueError):
-        calculate_euclidean_distance(mock_reference_embedding, mock_current_embedding)
-
-
-def test_calculate_euclidean_distance_expected_result():
-    """Test that the calculate_euclidean_distance function is able to compute the correct Euclidean distance."""
-    mock_reference_embedding = [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
-    mock_current_embedding = [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
-
-    result = calculate_euclidean_distance(
-        mock_reference_embedding, mock_current_embedding
-    )
-
-    assert result == 0
+from utils.embedding_sketch import EmbeddingSketch
 
 
 def test_build_embedding_drift_payload():
@@ -102,8 +25,10 @@ def test_build_embedding_drift_payload():
 
 def test_compute_embedding_drift_step():
     """Test that the compute_embedding_drift step returns the expected output."""
-    mock_reference_embedding = [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
-    mock_current_embedding = [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
+    mock_reference_embedding = np.array([[1.1, 2.2, 3.3], [3.1, 4.1, 5.1]])
+    mock_current_embedding = np.array(
+        [[1.1, 2.2, 3.3], [3.1, 4.1, 5.1], [1.1, 2.2, 3.3], [3.1, 4.1, 5.1]]
+    )
 
     with patch(
         "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.ChromaStore"
@@ -111,8 +36,12 @@ def test_compute_embedding_drift_step():
         "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.requests.post"
     ) as mock_post_requests, patch(
         "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.COLLECTION_NAME_MAP"
-    ) as mock_collection_name_map:
+    ) as mock_collection_name_map, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.SketchStore"
+    ) as mock_sketch_store:
         mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_sketch_store.return_value.load_sketch.return_value = None
         mock_chroma_instance.fetch_reference_and_current_embeddings.return_value = (
             mock_reference_embedding,
             mock_current_embedding,
@@ -130,3 +59,124 @@ def test_compute_embedding_drift_step():
 
         assert isinstance(distance, float)
         assert distance == 0
+
+
+def test_compute_embedding_drift_step_from_sketches():
+    """Test that the compute_embedding_drift step compares the sketches of the data versions without fetching their embeddings."""
+    reference_sketch = EmbeddingSketch.from_embeddings(
+        np.array([[1.0, 0.0], [3.0, 0.0]], dtype=np.float32)
+    )
+    current_sketch = EmbeddingSketch.from_embeddings(
+        np.array([[2.0, 3.0], [2.0, 5.0], [2.0, 4.0]], dtype=np.float32)
+    )
+
+    with patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.ChromaStore"
+    ) as mock_chroma, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.requests.post"
+    ) as mock_post_requests, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.COLLECTION_NAME_MAP"
+    ), patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.SketchStore"
+    ) as mock_sketch_store:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_sketch_store.return_value.load_sketch.side_effect = [
+            reference_sketch,
+            current_sketch,
+        ]
+        mock_post_requests.return_value.text = "OK"
+
+        distance = compute_embedding_drift(
+            "mock_collection_name", "v1", "v2", mmd_samples=2
+        )
+
+        assert distance == 4
+        mock_chroma_instance.fetch_reference_and_current_embeddings.assert_not_called()
+
+
+def test_compute_embedding_drift_step_rejects_differently_projected_sketches():
+    """Test that the compute_embedding_drift step refuses to compare sketches of versions projected with different fits."""
+    reference_sketch = EmbeddingSketch.from_embeddings(np.zeros((2, 2)))
+    current_sketch = EmbeddingSketch.from_embeddings(np.ones((2, 2)))
+    reference_sketch.projection = "reference-fit"
+    current_sketch.projection = "current-fit"
+
+    with patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.ChromaStore"
+    ), patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.requests.post"
+    ) as mock_post_requests, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.SketchStore"
+    ) as mock_sketch_store:
+        mock_sketch_store.return_value.load_sketch.side_effect = [
+            reference_sketch,
+            current_sketch,
+        ]
+
+        with pytest.raises(ValueError):
+            compute_embedding_drift("mock_collection_name", "v1", "v2")
+
+        mock_post_requests.assert_not_called()
+
+
+def test_compute_embedding_drift_step_approximate():
+    """Test that the compute_embedding_drift step samples the embeddings of each version by source in approximate mode."""
+    embeddings = {
+        "r1": [0.0, 0.0],
+        "r2": [2.0, 0.0],
+        "c1": [1.0, 3.0],
+        "c2": [1.0, 5.0],
+    }
+
+    with patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.ChromaStore"
+    ) as mock_chroma, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.requests.post"
+    ) as mock_post_requests, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.COLLECTION_NAME_MAP"
+    ), patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.SketchStore"
+    ) as mock_sketch_store:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.group_ids_by_metadata.side_effect = [
+            {"page-1": ["r1"], "page-2": ["r2"]},
+            {"page-1": ["c1", "c2"]},
+        ]
+        mock_chroma_instance.fetch_embeddings_by_ids.side_effect = (
+            lambda collection_name, ids: np.array([embeddings[i] for i in ids])
+        )
+        mock_post_requests.return_value.text = "OK"
+
+        distance = compute_embedding_drift(
+            "mock_collection_name", "v1", "v2", approximate=True
+        )
+
+        # Both versions are smaller than the first sample, so they are sampled whole
+        assert distance == 4
+        mock_sketch_store.return_value.load_sketch.assert_not_called()
+        mock_chroma_instance.fetch_reference_and_current_embeddings.assert_not_called()
+
+
+def test_compute_embedding_drift_step_rejects_shared_collection():
+    """Test that the compute_embedding_drift step rejects versions of a collection which is not versioned, unless both are sketched."""
+    with patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.ChromaStore"
+    ) as mock_chroma, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.requests.post"
+    ) as mock_post_requests, patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.COLLECTION_NAME_MAP"
+    ), patch(
+        "steps.data_embedding_steps.compute_embedding_drift_step.compute_embedding_drift_step.SketchStore"
+    ) as mock_sketch_store:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_sketch_store.return_value.load_sketch.return_value = None
+        mock_chroma_instance.collection_for_data_version.side_effect = (
+            lambda collection_name, data_version: collection_name
+        )
+
+        with pytest.raises(ValueError):
+            compute_embedding_drift("mock_collection_name", "v1", "v2")
+
+        mock_chroma_instance.fetch_reference_and_current_embeddings.assert_not_called()
+        mock_post_requests.assert_not_called()
@@ -0,0 +1,503 @@
+"""Unit tests for the embed data step."""
+from typing import Iterator
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from steps.data_embedding_steps.embed_data_step.embed_data_step import embed_data
+from utils.chunking import make_chunk_id
+from utils.embedding_projection import EmbeddingProjection, ProjectionConfig
+
+EMBED_DATA_STEP = "steps.data_embedding_steps.embed_data_step.embed_data_step"
+
+
+@pytest.fixture(autouse=True)
+def mock_sketch_store() -> Iterator[MagicMock]:
+    """Sketches are saved through a mocked metric service.
+
+    Yields:
+        Iterator[MagicMock]: the mocked sketch store.
+    """
+    with patch(f"{EMBED_DATA_STEP}.SketchStore") as mock_store:
+        yield mock_store.return_value
+
+
+def test_embed_data_incremental(mock_sketch_store: MagicMock):
+    """Test that incremental mode embeds only new chunks, relabels unchanged chunks and deletes removed chunks.
+
+    Args:
+        mock_sketch_store (MagicMock): the mocked sketch store
+    """
+    df = pd.DataFrame(
+        {"text_scraped": ["unchanged", "new"], "url": ["www.nhs.uk", "www.nhs.uk"]}
+    )
+    unchanged_id = make_chunk_id("unchanged", "www.nhs.uk", 100, 0)
+    new_id = make_chunk_id("new", "www.nhs.uk", 100, 0)
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.list_collection_names.return_value = ["nhs_data"]
+        mock_chroma_instance.get_ids.return_value = [unchanged_id, "removed"]
+        mock_chroma_instance.fetch_embeddings_by_ids.return_value = np.zeros(
+            (1, 3), dtype=np.float32
+        )
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v2",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            upload={"incremental": True, "resume": False},
+        )
+
+        mock_embedder.return_value.embed_batches.assert_called_once_with([["new"]])
+        mock_chroma_instance.update_metadatas.assert_called_once_with(
+            collection_name="nhs_data",
+            ids=[unchanged_id],
+            metadatas=[
+                {
+                    "source": "www.nhs.uk",
+                    "data_version": "v2",
+                    "start_index": 0,
+                    "end_index": 9,
+                }
+            ],
+        )
+        mock_chroma_instance.delete_ids.assert_called_once_with(
+            collection_name="nhs_data", ids=["removed"]
+        )
+        assert mock_chroma_instance.add_texts.call_args.kwargs["ids"] == [new_id]
+
+        # The sketch of the new data version covers the unchanged chunk as well as the new one
+        (
+            collection_name,
+            data_version,
+            sketch,
+        ) = mock_sketch_store.save_sketch.call_args.args
+        assert (collection_name, data_version, sketch.count) == ("nhs_data", "v2", 2)
+        np.testing.assert_allclose(sketch.mean, [0.5, 0.5, 0.5])
+        assert sketch.projection is None
+
+
+def test_embed_data_versioned_incremental():
+    """Test that versioned mode copies unchanged chunks from the active version and switches the alias when done."""
+    df = pd.DataFrame(
+        {"text_scraped": ["unchanged", "new"], "url": ["www.nhs.uk", "www.nhs.uk"]}
+    )
+    unchanged_id = make_chunk_id("unchanged", "www.nhs.uk", 100, 0)
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.create_versioned_collection.return_value = "nhs_data-v2"
+        mock_chroma_instance.resolve_alias.return_value = "nhs_data-v1"
+        mock_chroma_instance.list_collection_names.return_value = ["nhs_data-v1"]
+        mock_chroma_instance.get_ids.return_value = [unchanged_id, "removed"]
+        mock_chroma_instance.fetch_embeddings_by_ids.return_value = np.zeros(
+            (1, 3), dtype=np.float32
+        )
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v2",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            upload={
+                "incremental": True,
+                "versioned": True,
+                "retain_versions": 3,
+                "resume": False,
+            },
+        )
+
+        mock_chroma_instance.fetch_embeddings_by_ids.assert_called_once_with(
+            "nhs_data-v1", [unchanged_id]
+        )
+        mock_chroma_instance.update_metadatas.assert_not_called()
+        mock_chroma_instance.delete_ids.assert_not_called()
+        assert {
+            call.kwargs["collection_name"]
+            for call in mock_chroma_instance.add_texts.call_args_list
+        } == {"nhs_data-v2"}
+        mock_chroma_instance.swap_alias.assert_called_once_with(
+            "nhs_data", "nhs_data-v2"
+        )
+        mock_chroma_instance.garbage_collect_versions.assert_called_once_with(
+            "nhs_data", retain=3
+        )
+
+
+def test_embed_data_migrates_legacy_collection():
+    """Test that the first versioned upload copies the reference version out of a collection which is not versioned before uploading."""
+    df = pd.DataFrame({"text_scraped": ["new"], "url": ["www.nhs.uk"]})
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.migrate_legacy_collection.return_value = "nhs_data-v1"
+        mock_chroma_instance.create_versioned_collection.return_value = "nhs_data-v2"
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v2",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            reference_data_version="v1",
+            upload={"versioned": True, "resume": False},
+        )
+
+        calls = [call[0] for call in mock_chroma_instance.mock_calls]
+        mock_chroma_instance.migrate_legacy_collection.assert_called_once_with(
+            "nhs_data", "v1"
+        )
+        # The reference version is created first, so it is older than the new version when garbage collecting
+        assert calls.index("migrate_legacy_collection") < calls.index(
+            "create_versioned_collection"
+        )
+        mock_chroma_instance.swap_alias.assert_called_once_with(
+            "nhs_data", "nhs_data-v2"
+        )
+
+
+def test_embed_data_deduplicate():
+    """Test that near-duplicate chunks are not embedded and their sources are recorded on the chunk which is kept."""
+    boilerplate = (
+        "Call the Samaritans on 116 123 for free at any time of the day or night."
+    )
+    df = pd.DataFrame(
+        {
+            "text_scraped": [boilerplate, boilerplate, "Something else entirely."],
+            "url": ["www.nhs.uk/a", "www.nhs.uk/b", "www.nhs.uk/c"],
+        }
+    )
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            chunking={"deduplicate": True},
+            upload={"resume": False},
+        )
+
+        uploaded = [
+            text
+            for call in mock_chroma_instance.add_texts.call_args_list
+            for text in call.kwargs["texts"]
+        ]
+        assert sorted(uploaded) == sorted([boilerplate, "Something else entirely."])
+
+        kept_id = make_chunk_id(boilerplate, "www.nhs.uk/a", 100, 0)
+        update = mock_chroma_instance.update_metadatas.call_args.kwargs
+        assert update["ids"] == [kept_id]
+        assert update["metadatas"][0]["duplicate_sources"] == '["www.nhs.uk/b"]'
+
+
+def test_embed_data_resumes_interrupted_upload():
+    """Test that the chunks of the data version which an interrupted run uploaded to the collection are not uploaded again."""
+    df = pd.DataFrame(
+        {"text_scraped": ["uploaded", "pending"], "url": ["www.nhs.uk", "www.nhs.uk"]}
+    )
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.get_ids.return_value = []
+        mock_chroma_instance.fetch_embeddings_by_ids.return_value = np.ones(
+            (1, 3), dtype=np.float32
+        )
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        # Let the first run fail after uploading the first batch
+        mock_chroma_instance.add_texts.side_effect = [None, ConnectionError]
+        with pytest.raises(ConnectionError):
+            embed_data.entrypoint(
+                df,
+                embed_model_type="base",
+                data_version="v1",
+                collection_name="nhs_data",
+                chunk_size=100,
+                chunk_overlap=0,
+                batch_size=1,
+            )
+        first_ids = mock_chroma_instance.add_texts.call_args_list[0].kwargs["ids"]
+
+        mock_chroma_instance.add_texts.reset_mock(side_effect=True)
+        mock_chroma_instance.get_ids.return_value = first_ids
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            batch_size=1,
+        )
+
+        mock_chroma_instance.get_ids.assert_called_with(
+            "nhs_data", where={"data_version": "v1"}
+        )
+        resumed_ids = [
+            chunk_id
+            for call in mock_chroma_instance.add_texts.call_args_list
+            for chunk_id in call.kwargs["ids"]
+        ]
+        assert len(resumed_ids) == 1
+        assert resumed_ids[0] not in first_ids
+
+
+def test_embed_data_projects_embeddings(mock_sketch_store: MagicMock):
+    """Test that embeddings are projected before they are uploaded and that the projection is saved with the collection and its sketch.
+
+    Args:
+        mock_sketch_store (MagicMock): the mocked sketch store
+    """
+    df = pd.DataFrame(
+        {"text_scraped": ["first", "second"], "url": ["www.nhs.uk", "www.nhs.uk"]}
+    )
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.get_ids.return_value = []
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 4), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            batch_size=1,
+            upload={
+                "resume": False,
+                "projection": {"method": "truncate", "output_dimension": 2},
+            },
+        )
+
+        (
+            collection_name,
+            projection,
+        ), _ = mock_chroma_instance.save_projection.call_args
+        assert collection_name == "nhs_data"
+        assert (projection.method, projection.output_dimension) == ("truncate", 2)
+        uploaded = [
+            embedding
+            for call in mock_chroma_instance.add_texts.call_args_list
+            for embedding in call.kwargs["embeddings"]
+        ]
+        assert len(uploaded) == 2
+        np.testing.assert_allclose(uploaded, np.full((2, 2), np.sqrt(0.5)), rtol=1e-6)
+        _, _, sketch = mock_sketch_store.save_sketch.call_args.args
+        assert sketch.projection == projection.fingerprint()
+
+
+def test_embed_data_fits_pca_on_strided_sample():
+    """Test that the PCA projection is fitted on chunks sampled across the whole data version, which are uploaded first."""
+    texts = [f"page {i}" for i in range(6)]
+    df = pd.DataFrame({"text_scraped": texts, "url": ["www.nhs.uk"] * len(texts)})
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.get_ids.return_value = []
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.array([[float(text[-1]), 1.0] for text in batch], dtype=np.float32)
+            for batch in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            batch_size=1,
+            upload={
+                "resume": False,
+                "projection": {"method": "pca", "output_dimension": 1, "fit_size": 2},
+            },
+        )
+
+        uploaded = [
+            text
+            for call in mock_chroma_instance.add_texts.call_args_list
+            for text in call.kwargs["texts"]
+        ]
+        assert uploaded[:2] == ["page 0", "page 3"]
+        assert sorted(uploaded) == texts
+
+
+def test_embed_data_reuses_projection_of_active_version():
+    """Test that a new version reuses the projection of the active version when it is configured alike, instead of fitting its own."""
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+    active_projection = EmbeddingProjection.fit(
+        ProjectionConfig(method="pca", output_dimension=1, fit_size=2),
+        np.array([[0.0, 0.0], [2.0, 0.0]], dtype=np.float32),
+    )
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.create_versioned_collection.return_value = "nhs_data-v2"
+        mock_chroma_instance.resolve_alias.return_value = "nhs_data-v1"
+        mock_chroma_instance.load_projection.side_effect = lambda collection_name: (
+            active_projection if collection_name == "nhs_data-v1" else None
+        )
+        mock_chroma_instance.list_collection_names.return_value = ["nhs_data-v1"]
+        mock_chroma_instance.get_ids.return_value = []
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.array([[3.0, 5.0]] * len(batch), dtype=np.float32) for batch in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v2",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            upload={
+                "resume": False,
+                "versioned": True,
+                "projection": {
+                    "method": "pca",
+                    "output_dimension": 1,
+                    "fit_size": 1000,
+                },
+            },
+        )
+
+        mock_chroma_instance.save_projection.assert_called_once_with(
+            "nhs_data-v2", active_projection
+        )
+        np.testing.assert_allclose(
+            mock_chroma_instance.add_texts.call_args.kwargs["embeddings"],
+            active_projection.apply(np.array([[3.0, 5.0]], dtype=np.float32)),
+        )
+
+
+def test_embed_data_rejects_differently_projected_collection():
+    """Test that embeddings are not uploaded to a collection which holds embeddings projected differently, and that the embedder is still closed."""
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.list_collection_names.return_value = ["nhs_data"]
+        mock_chroma_instance.get_ids.return_value = ["existing"]
+        mock_embedder.return_value.cache = None
+
+        with pytest.raises(ValueError):
+            embed_data.entrypoint(
+                df,
+                embed_model_type="base",
+                data_version="v1",
+                collection_name="nhs_data",
+                chunk_size=100,
+                chunk_overlap=0,
+                upload={
+                    "resume": False,
+                    "projection": {
+                        "method": "pca",
+                        "output_dimension": 2,
+                        "fit_size": 2,
+                    },
+                },
+            )
+        mock_chroma_instance.add_texts.assert_not_called()
+        mock_embedder.return_value.close.assert_called_once()
+
+
+def test_embed_data_uploads_without_metric_service(mock_sketch_store: MagicMock):
+    """Test that the upload does not fail when the sketch cannot be saved.
+
+    Args:
+        mock_sketch_store (MagicMock): the mocked sketch store
+    """
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+    mock_sketch_store.save_sketch.side_effect = requests.ConnectionError()
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_chroma_instance.get_ids.return_value = []
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_data.entrypoint(
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            collection_name="nhs_data",
+            chunk_size=100,
+            chunk_overlap=0,
+            upload={"resume": False},
+        )
+
+        mock_sketch_store.save_sketch.assert_called_once()
+        assert mock_chroma_instance.add_texts.call_args.kwargs["ids"] == [
+            make_chunk_id("text", "www.nhs.uk", 100, 0)
+        ]
@@ -0,0 +1,80 @@
+"""Unit tests for the embed datasets step."""
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from steps.data_embedding_steps.embed_datasets_step.embed_datasets_step import (
+    embed_datasets,
+)
+
+EMBED_DATA_STEP = "steps.data_embedding_steps.embed_data_step.embed_data_step"
+
+
+def test_embed_datasets_shares_model():
+    """Test that both datasets are embedded by one model in the same calls, and uploaded to their own collections with their own chunk sizes."""
+    mind_df = pd.DataFrame({"text_scraped": ["aaaa bbbb"], "url": ["www.mind.org.uk"]})
+    nhs_df = pd.DataFrame({"text_scraped": ["cccc dddd"], "url": ["www.nhs.uk"]})
+
+    with patch(f"{EMBED_DATA_STEP}.ChromaStore") as mock_chroma, patch(
+        f"{EMBED_DATA_STEP}.InstructorEmbedder"
+    ) as mock_embedder, patch(f"{EMBED_DATA_STEP}.SketchStore") as mock_sketch_store:
+        mock_chroma_instance = mock_chroma.return_value
+        mock_chroma_instance.load_projection.return_value = None
+        mock_embedder.return_value.cache = None
+        mock_embedder.return_value.embed_batches.side_effect = lambda batches: (
+            np.ones((len(texts), 3), dtype=np.float32) for texts in batches
+        )
+
+        embed_datasets.entrypoint(
+            mind_df,
+            nhs_df,
+            embed_model_type="base",
+            data_version="v1",
+            mind_collection={
+                "collection_name": "mind_data",
+                "chunk_size": 100,
+                "chunk_overlap": 0,
+            },
+            nhs_collection={
+                "collection_name": "nhs_data",
+                "chunk_size": 5,
+                "chunk_overlap": 0,
+            },
+            upload={"resume": False},
+        )
+
+        mock_embedder.assert_called_once()
+        mock_embedder.return_value.embed_batches.assert_called_once()
+        uploaded = {
+            call.kwargs["collection_name"]: call.kwargs["texts"]
+            for call in mock_chroma_instance.add_texts.call_args_list
+        }
+        assert uploaded["mind_data"] == ["aaaa bbbb"]
+        assert sorted(
+            text
+            for call in mock_chroma_instance.add_texts.call_args_list
+            if call.kwargs["collection_name"] == "nhs_data"
+            for text in call.kwargs["texts"]
+        ) == ["cccc", "dddd"]
+        assert sorted(
+            call.args[0]
+            for call in mock_sketch_store.return_value.save_sketch.call_args_list
+        ) == ["mind_data", "nhs_data"]
+
+
+def test_embed_datasets_same_collection():
+    """Test that uploading both datasets to the same collection raises a ValueError."""
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+    collection = {"collection_name": "nhs_data", "chunk_size": 100, "chunk_overlap": 0}
+
+    with pytest.raises(ValueError):
+        embed_datasets.entrypoint(
+            df,
+            df,
+            embed_model_type="base",
+            data_version="v1",
+            mind_collection=collection,
+            nhs_collection=collection,
+            upload={"resume": False},
+        )
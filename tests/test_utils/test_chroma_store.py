@@ -1,13 +1,17 @@
 """Test suite for testing chroma_store utility."""
+import os
 import tempfile
+from unittest import mock
 
 import chromadb
+import numpy as np
 import pytest
 from chromadb.api import API
 from chromadb.api.models.Collection import Collection
 from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
 from chromadb.config import Settings
-from utils.chroma_store import ChromaStore
+from utils.chroma_store import ChromaStore, HNSWConfig
+from utils.embedding_projection import EmbeddingProjection, ProjectionConfig
 
 
 @pytest.fixture
@@ -43,7 +47,7 @@ class MockEmbeddingFunction(EmbeddingFunction):
         Returns:
             Embeddings: Return fixed embedding
         """
-        return [[float(1.0)] * 2 + [float(i)] for i in range(len(texts))]
+        return [[1.0] * 2 + [float(i)] for i in range(len(texts))]
 
 
 @pytest.mark.parametrize(
@@ -104,9 +108,7 @@ def test_add_texts(local_persist_api: API):
         "bdd740fb-0667-4ad1-9c80-317fa3b1799d",
     ]
     input_texts = ["a", "b"]
-    expected_embeddings = [
-        [float(1.0)] * 2 + [float(i)] for i in range(len(input_texts))
-    ]
+    expected_embeddings = [[1.0] * 2 + [float(i)] for i in range(len(input_texts))]
 
     store = ChromaStore()
     store._client = local_persist_api
@@ -255,9 +257,486 @@ def test_fetch_reference_and_current_embeddings(local_persist_api: API):
         current_data_version="test_version",
     )
 
-    assert isinstance(reference_embeddings, list)
-    assert isinstance(current_embeddings, list)
-    assert len(reference_embeddings) == 3
-    assert len(current_embeddings) == 3
-    assert all(len(item) == 3 for item in reference_embeddings)
-    assert all(len(item) == 3 for item in current_embeddings)
+    assert reference_embeddings.shape == (3, 3)
+    assert current_embeddings.shape == (3, 3)
+    assert reference_embeddings.dtype == np.float32
+
+
+def test_get_update_and_delete_ids(local_persist_api: API):
+    """Test fetching IDs, relabelling metadata and deleting documents by ID.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    uuids = ["chunk-a", "chunk-b"]
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    store.add_texts(
+        collection_name="test_ids",
+        texts=["a", "b"],
+        embedding_function=MockEmbeddingFunction(),
+        ids=uuids,
+        metadatas=[{"data_version": "v1"}, {"data_version": "v1"}],
+    )
+
+    assert set(store.get_ids("test_ids")) == set(uuids)
+
+    store.update_metadatas(
+        "test_ids", ids=["chunk-a"], metadatas=[{"data_version": "v2"}]
+    )
+    assert store.get_ids("test_ids", where={"data_version": "v2"}) == ["chunk-a"]
+    assert store.group_ids_by_metadata("test_ids", "data_version", page_size=1) == {
+        "v1": ["chunk-b"],
+        "v2": ["chunk-a"],
+    }
+
+    store.delete_ids("test_ids", ids=["chunk-b"])
+    assert store.get_ids("test_ids") == ["chunk-a"]
+
+
+def test_iter_and_fetch_embeddings(local_persist_api: API):
+    """Test that embeddings are streamed in pages and materialised as a float32 array.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    store.add_texts(
+        collection_name="test_paginated",
+        texts=["foo", "dummy", "I like apples"],
+        embedding_function=MockEmbeddingFunction(),
+        ids=["page-a", "page-b", "page-c"],
+        metadatas=[{"data_version": "v1"}] * 3,
+    )
+
+    blocks = list(store.iter_embeddings("test_paginated", page_size=2))
+    assert [block.shape for block in blocks] == [(2, 3), (1, 3)]
+    assert all(block.dtype == np.float32 for block in blocks)
+
+    labelled = list(
+        store.iter_labelled_embeddings("test_paginated", "data_version", page_size=2)
+    )
+    assert [labels for _, labels, _ in labelled] == [["v1", "v1"], ["v1"]]
+    assert sorted(chunk_id for ids, _, _ in labelled for chunk_id in ids) == [
+        "page-a",
+        "page-b",
+        "page-c",
+    ]
+
+    embeddings = store.fetch_embeddings(
+        "test_paginated", where={"data_version": "v1"}, page_size=2
+    )
+    assert embeddings.shape == (3, 3)
+
+    missing = store.fetch_embeddings("test_paginated", where={"data_version": "v2"})
+    assert missing.shape == (0, 0)
+
+
+def test_add_texts_with_embeddings(local_persist_api: API):
+    """Test adding documents with precomputed embeddings using `add_texts` function.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    uuids = [
+        "bdd840fb-0667-4ad1-9c80-317fa3b1799d",
+        "bdd940fb-0667-4ad1-9c80-317fa3b1799d",
+    ]
+    input_texts = ["c", "d"]
+    precomputed_embeddings = [[0.5, 0.5, 0.5], [2.0, 2.0, 2.0]]
+
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    store.add_texts(
+        collection_name="test_precomputed",
+        texts=input_texts,
+        embedding_function=MockEmbeddingFunction(),
+        ids=uuids,
+        embeddings=precomputed_embeddings,
+    )
+    data = store._collection.get(ids=uuids, include=["embeddings", "documents"])
+
+    assert data["documents"] == input_texts
+
+    assert data["embeddings"] == precomputed_embeddings
+
+
+def test_versioned_collection_name():
+    """Test that data versions are turned into valid collection names."""
+    store = ChromaStore()
+
+    assert (
+        store.versioned_collection_name("mind_data", "data/second_version")
+        == "mind_data-data-second-version"
+    )
+    long_name = store.versioned_collection_name("mind_data", "v" * 100)
+    assert store.validate_collection_name(long_name).is_valid
+
+
+def test_versioned_collections_alias_swap_and_garbage_collection(
+    local_persist_api: API,
+):
+    """Test that an alias resolves to the active version and old versions are garbage collected.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    assert store.resolve_alias("alias_test") == "alias_test"
+
+    names = []
+    for version in ["v1", "v2", "v3"]:
+        name = store.create_versioned_collection("alias_test", version)
+        store.add_texts(
+            collection_name=name,
+            texts=[f"document {version}"],
+            ids=[f"id-{version}"],
+            metadatas=[{"data_version": version}],
+            embeddings=[[1.0, 1.0, 1.0]],
+        )
+        store.swap_alias("alias_test", name)
+        names.append(name)
+
+    assert store.resolve_alias("alias_test") == names[-1]
+    assert store.active_data_version("alias_test") == "v3"
+    assert store.active_data_version(names[0]) is None
+    assert [name for name, _ in store.list_versioned_collections("alias_test")] == names
+    assert store.collection_for_data_version("alias_test", "v1") == names[0]
+
+    results = store.query_collection(
+        collection_name="alias_test", query_embeddings=[[1.0, 1.0, 1.0]], n_results=1
+    )
+    assert results["documents"][0] == ["document v3"]
+
+    assert store.garbage_collect_versions("alias_test", retain=2) == [names[0]]
+    assert names[0] not in store.list_collection_names()
+    assert store.collection_for_data_version("alias_test", "v1") == "alias_test"
+
+
+def test_migrate_legacy_collection(local_persist_api: API):
+    """Test that the first versioned upload of a collection which is not versioned can still find its reference version.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+    store.add_texts(
+        collection_name="legacy_test",
+        texts=["document v0", "document v1"],
+        ids=["id-v0", "id-v1"],
+        metadatas=[{"data_version": "v0"}, {"data_version": "v1"}],
+        embeddings=[[0.0, 0.0, 0.0], [1.0, 1.0, 1.0]],
+    )
+
+    assert store.migrate_legacy_collection("legacy_test", "v9") is None
+    assert "legacy_test-v9" not in store.list_collection_names()
+
+    migrated = store.migrate_legacy_collection("legacy_test", "v1")
+    current = store.create_versioned_collection("legacy_test", "v2")
+    store.add_texts(
+        collection_name=current,
+        texts=["document v2"],
+        ids=["id-v2"],
+        metadatas=[{"data_version": "v2"}],
+        embeddings=[[2.0, 2.0, 2.0]],
+    )
+    store.swap_alias("legacy_test", current)
+
+    assert migrated == "legacy_test-v1"
+    assert store.get_ids(migrated) == ["id-v1"]
+    assert store.list_versioned_collections("legacy_test") == [
+        (migrated, "v1"),
+        (current, "v2"),
+    ]
+    assert store.collection_for_data_version("legacy_test", "v1") == migrated
+    assert store.collection_for_data_version("legacy_test", "v2") == current
+    assert store.garbage_collect_versions("legacy_test", retain=2) == []
+    # Once the alias exists, the collection is not migrated again
+    assert store.migrate_legacy_collection("legacy_test", "v0") is None
+
+
+def test_resolve_alias_without_alias_collection_over_http():
+    """Test that an alias resolves to itself when an HTTP client has no alias collection.
+
+    The HTTP client raises a bare Exception rather than ValueError for a missing collection.
+    """
+    client = mock.MagicMock()
+    client.list_collections.return_value = []
+    client.get_collection.side_effect = Exception('{"error":"ValueError"}')
+
+    store = ChromaStore()
+    store._client = client
+
+    assert store.resolve_alias("alias_test") == "alias_test"
+    client.get_collection.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [{"space": "manhattan"}, {"M": 0}, {"construction_ef": 0}, {"search_ef": -1}],
+)
+def test_hnsw_config_invalid(parameters: dict):
+    """Test that invalid index parameters raise a ValueError.
+
+    Args:
+        parameters (dict): Invalid index parameters
+    """
+    with pytest.raises(ValueError):
+        HNSWConfig(**parameters)
+
+
+def test_create_collection_with_hnsw_config(local_persist_api: API):
+    """Test that the index parameters are stored in the collection metadata.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    config = HNSWConfig(space="cosine", M=32, construction_ef=200, search_ef=50)
+    store.create_collection("test_hnsw", hnsw_config=config)
+
+    assert store._collection.metadata == {
+        "hnsw:space": "cosine",
+        "hnsw:M": 32,
+        "hnsw:construction_ef": 200,
+        "hnsw:search_ef": 50,
+    }
+
+
+def test_create_collection_keeps_existing_hnsw_config(
+    local_persist_api: API, caplog: pytest.LogCaptureFixture
+):
+    """Test that getting an existing collection with other index parameters keeps its metadata and logs a warning.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+        caplog (pytest.LogCaptureFixture): fixture capturing the logs
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+    name = store.create_versioned_collection(
+        "test_hnsw", "v1", hnsw_config=HNSWConfig(M=32)
+    )
+    metadata = store._client.get_collection(name).metadata
+
+    store.create_versioned_collection("test_hnsw", "v1", hnsw_config=HNSWConfig(M=32))
+    assert "cannot be changed" not in caplog.text
+
+    store.create_versioned_collection("test_hnsw", "v1", hnsw_config=HNSWConfig(M=16))
+    assert store._client.get_collection(name).metadata == metadata
+    assert "cannot be changed" in caplog.text
+
+
+def test_query_many(local_persist_api: API):
+    """Test querying several collections at once using `query_many` function.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    for collection_name, texts in [
+        ("test_many_a", ["apple", "banana"]),
+        ("test_many_b", ["cherry", "damson"]),
+    ]:
+        store.add_texts(
+            collection_name=collection_name,
+            texts=texts,
+            ids=[f"{collection_name}-{text}" for text in texts],
+            embedding_function=MockEmbeddingFunction(),
+        )
+
+    result = store.query_many(
+        collection_names=["test_many_a", "test_many_b"],
+        query_texts=["fruit"],
+        embedding_function=MockEmbeddingFunction(),
+        n_results=1,
+    )
+
+    # The mock embeds the only query text like the first document of each collection
+    assert result.results["test_many_a"]["documents"][0] == ["apple"]
+    assert result.results["test_many_b"]["documents"][0] == ["cherry"]
+    assert set(result.collection_seconds) == {"test_many_a", "test_many_b"}
+    assert len(result.query_embeddings) == 1
+    assert result.collection_query_embeddings["test_many_a"] == result.query_embeddings
+    assert result.data_versions == {"test_many_a": None, "test_many_b": None}
+    assert result.total_seconds >= result.embedding_seconds
+
+
+def test_query_resolution_is_reused_and_never_creates(local_persist_api: API):
+    """Test that queries reuse the collection an alias resolved to until it is swapped, and do not create missing collections.
+
+    Args:
+        local_persist_api (API): Local chroma server for testing
+    """
+    store = ChromaStore()
+    store._client = local_persist_api
+
+    with pytest.raises(ValueError):
+        store.query_collection("misspelt_test", query_embeddings=[[1.0, 1.0, 1.0]])
+    assert "misspelt_test" not in store.list_collection_names()
+
+    for version in ["v1", "v2"]:
+        name = store.create_versioned_collection("resolution_test", version)
+        store.add_texts(
+            collection_name=name,
+            texts=[f"document {version}"],
+            ids=[f"id-{version}"],
+            embeddings=[[1.0, 1.0, 1.0]],
+        )
+    store.swap_alias(
+        "resolution_test", store.versioned_collection_name("resolution_test", "v1")
+    )
+
+    store.query_many(["resolution_test"], ["query"], MockEmbeddingFunction())
+    with mock.patch.object(
+        store, "list_collection_names", wraps=store.list_collection_names
+    ) as mock_list:
+        result = store.query_many(
+            ["resolution_test"], ["query"], MockEmbeddingFunction(), n_results=1
+        )
+    assert result.results["resolution_test"]["documents"][0] == ["document v1"]
+    mock_list.assert_not_called()
+
+    store.swap_alias(
+        "resolution_test", store.versioned_collection_name("resolution_test", "v2")
+    )
+    result = store.query_many(
+        ["resolution_test"], ["query"], MockEmbeddingFunction(), n_results=1
+    )
+    assert result.results["resolution_test"]["documents"][0] == ["document v2"]
+    assert result.data_versions == {"resolution_test": "v2"}
+
+
+def test_push_collection_between_persistent_stores(directory_for_testing: str):
+    """Test that a versioned collection in an embedded database is pushed, with its alias, to another store.
+
+    Args:
+        directory_for_testing (str): Temporary directory for the embedded databases
+    """
+    local_store = ChromaStore(
+        persist_directory=os.path.join(directory_for_testing, "local")
+    )
+    server_store = ChromaStore(
+        persist_directory=os.path.join(directory_for_testing, "server")
+    )
+
+    config = HNSWConfig(space="cosine")
+    name = local_store.create_versioned_collection(
+        "push_test", "v1", hnsw_config=config
+    )
+    local_store.add_texts(
+        collection_name=name,
+        texts=["first", "second", "third"],
+        ids=["id1", "id2", "id3"],
+        metadatas=[{"data_version": "v1"}] * 3,
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+    )
+    local_store.swap_alias("push_test", name)
+
+    assert local_store.push_collection("push_test", server_store, page_size=2) == name
+
+    assert server_store.resolve_alias("push_test") == name
+    assert sorted(server_store.get_ids(name)) == ["id1", "id2", "id3"]
+    np.testing.assert_array_equal(
+        server_store.fetch_embeddings_by_ids(name, ["id3", "id1"]),
+        [[1.0, 1.0], [1.0, 0.0]],
+    )
+    assert server_store._client.get_collection(name).metadata["hnsw:space"] == "cosine"
+
+
+@pytest.mark.parametrize("extension", ["parquet", "npz"])
+def test_export_and_restore_snapshot(directory_for_testing: str, extension: str):
+    """Test that a data version exported to a snapshot is restored, with its alias, into an empty store.
+
+    Args:
+        directory_for_testing (str): Temporary directory for the embedded databases and the snapshot
+        extension (str): Snapshot format
+    """
+    store = ChromaStore(persist_directory=os.path.join(directory_for_testing, "old"))
+    name = store.create_versioned_collection(
+        "snapshot_test", "v1", hnsw_config=HNSWConfig(M=32)
+    )
+    store.add_texts(
+        collection_name=name,
+        texts=["first", "second", "third"],
+        ids=["id1", "id2", "id3"],
+        metadatas=[{"data_version": "v1", "source": "a"}] * 3,
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+    )
+    store.swap_alias("snapshot_test", name)
+
+    path = os.path.join(directory_for_testing, f"snapshot.{extension}")
+    assert (
+        store.export_snapshot("snapshot_test", path, data_version="v1", page_size=2)
+        == 3
+    )
+
+    new_store = ChromaStore(
+        persist_directory=os.path.join(directory_for_testing, "new")
+    )
+    assert new_store.restore_snapshot(path, batch_size=2) == name
+
+    assert new_store.resolve_alias("snapshot_test") == name
+    assert new_store._client.get_collection(name).metadata["hnsw:M"] == 32
+    np.testing.assert_array_equal(
+        new_store.fetch_embeddings_by_ids(name, ["id2", "id3"]),
+        [[0.0, 1.0], [1.0, 1.0]],
+    )
+
+
+def test_query_and_push_projected_collection(directory_for_testing: str):
+    """Test that queries of a projected collection are projected like its embeddings, and that the projection is pushed with the collection.
+
+    Args:
+        directory_for_testing (str): Temporary directory for the embedded databases
+    """
+    store = ChromaStore(persist_directory=os.path.join(directory_for_testing, "local"))
+    target = ChromaStore(
+        persist_directory=os.path.join(directory_for_testing, "server")
+    )
+
+    projection = EmbeddingProjection.fit(
+        ProjectionConfig(method="truncate", output_dimension=2), np.ones((1, 3))
+    )
+    store.save_projection("projected", projection)
+    store.add_texts(
+        collection_name="projected",
+        texts=["diagonal", "axis"],
+        ids=["id1", "id2"],
+        embeddings=[[0.7071, 0.7071], [1.0, 0.0]],
+    )
+
+    # The mock embeds the query as [1, 1, 0], which is [0.7071, 0.7071] once projected
+    result = store.query_collection(
+        "projected",
+        query_texts=["query"],
+        n_results=1,
+        embedding_function=MockEmbeddingFunction(),
+    )
+    assert result["documents"][0] == ["diagonal"]
+    np.testing.assert_allclose(
+        store.project_queries("projected", [[1.0, 1.0, 0.0]]),
+        [[0.7071, 0.7071]],
+        atol=1e-4,
+    )
+    assert store.load_projection("not_projected") is None
+
+    store.push_collection("projected", target)
+    pushed = target.load_projection("projected")
+    assert pushed is not None and pushed.matches(
+        ProjectionConfig(method="truncate", output_dimension=2)
+    )
+
+    store.delete_collection("projected")
+    assert store.load_projection("projected") is None
@@ -0,0 +1,94 @@
+"""Test suite for the splitting of datasets into chunks."""
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from utils.chunking import (
+    DUPLICATE_SOURCES_KEY,
+    ChunkingOptions,
+    DatasetChunker,
+    make_chunk_id,
+    split_strided_sample,
+)
+
+HELPLINE = (
+    "If you need urgent help, call 111 or contact the Samaritans on 116 123. "
+    "They are free to call, and open at any time of the day or night."
+)
+
+
+def test_make_chunk_id_is_deterministic():
+    """Test that the chunk ID depends only on the chunk content, source and chunking parameters."""
+    chunk_id = make_chunk_id("some text", "www.nhs.uk", 100, 10)
+
+    assert chunk_id == make_chunk_id("some text", "www.nhs.uk", 100, 10)
+    assert chunk_id != make_chunk_id("some text", "www.mind.org.uk", 100, 10)
+    assert chunk_id != make_chunk_id("some text", "www.nhs.uk", 200, 10)
+    assert chunk_id != make_chunk_id("some text", "www.nhs.uk", 100, 0)
+    assert chunk_id != make_chunk_id("other text", "www.nhs.uk", 100, 10)
+    assert chunk_id == make_chunk_id("some text", "www.nhs.uk", 100, 10, "characters")
+    assert chunk_id != make_chunk_id("some text", "www.nhs.uk", 100, 10, "tokens")
+
+
+def testsplit_strided_sample():
+    """Test that the sample is spread evenly over the items, and that both parts keep their order."""
+    assert split_strided_sample(list(range(10)), 3) == (
+        [0, 3, 6],
+        [1, 2, 4, 5, 7, 8, 9],
+    )
+    assert split_strided_sample([0, 1], 3) == ([0, 1], [])
+
+
+def test_chunking_options_unsupported_length_unit():
+    """Test that an unsupported length unit raises a ValueError."""
+    with pytest.raises(ValueError):
+        ChunkingOptions(length_unit="words")
+
+
+def test_dataset_chunker_skips_repeated_chunks():
+    """Test that a chunk repeated on a page is yielded once, with the ID of its content, source and chunking parameters."""
+    df = pd.DataFrame({"text_scraped": ["aaaa\n\naaaa"], "url": ["www.nhs.uk"]})
+    chunker = DatasetChunker(df, "v1", 5, 0, ChunkingOptions())
+
+    chunks = list(chunker.iter_chunks())
+
+    assert [(chunk_id, chunk) for chunk_id, chunk, _ in chunks] == [
+        (make_chunk_id("aaaa", "www.nhs.uk", 5, 0), "aaaa")
+    ]
+    assert chunks[0][2]["data_version"] == "v1"
+    assert chunker.seen_ids == {chunks[0][0]}
+
+
+def test_dataset_chunker_drops_near_duplicates():
+    """Test that near-duplicates are dropped and their sources recorded in the metadata of the chunk which is kept."""
+    df = pd.DataFrame(
+        {
+            "text_scraped": [HELPLINE, HELPLINE.upper(), HELPLINE],
+            "url": ["www.nhs.uk/a", "www.nhs.uk/b", "www.nhs.uk/c"],
+        }
+    )
+    chunker = DatasetChunker(df, "v1", 1000, 0, ChunkingOptions(deduplicate=True))
+
+    chunks = list(chunker.iter_chunks())
+
+    assert len(chunks) == 1
+    kept_id, _, metadata = chunks[0]
+    assert json.loads(metadata[DUPLICATE_SOURCES_KEY]) == [
+        "www.nhs.uk/b",
+        "www.nhs.uk/c",
+    ]
+    assert chunker.updated_ids == {kept_id}
+    assert len(chunker.seen_ids) == 3
+
+
+def test_dataset_chunker_caps_token_chunk_size():
+    """Test that a chunk size in tokens is capped at the model window, and that measuring tokens needs a tokenizer."""
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+    options = ChunkingOptions(length_unit="tokens")
+
+    chunker = DatasetChunker(df, "v1", 1000, 0, options, MagicMock(), max_tokens=500)
+
+    assert chunker.chunk_size == 500
+    with pytest.raises(ValueError):
+        DatasetChunker(df, "v1", 1000, 0, options)
@@ -0,0 +1,57 @@
+"""Test suite for columnar collection snapshots."""
+import os
+
+import numpy as np
+import pytest
+from utils.collection_snapshot import (
+    SnapshotBatch,
+    read_snapshot,
+    snapshot_format,
+    write_snapshot,
+)
+
+
+@pytest.mark.parametrize("extension", ["parquet", "npz"])
+def test_snapshot_round_trip(directory_for_testing: str, extension: str):
+    """Test that records written to a snapshot are read back in order and re-batched.
+
+    Args:
+        directory_for_testing (str): temporary directory for the snapshot
+        extension (str): snapshot format
+    """
+    path = os.path.join(directory_for_testing, f"snapshot.{extension}")
+    batches = [
+        SnapshotBatch(
+            ids=["a", "b"],
+            documents=["first", "second"],
+            metadatas=[{"source": "x", "data_version": "v1"}, {"source": "y"}],
+            embeddings=np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32),
+        ),
+        SnapshotBatch(
+            ids=["c"],
+            documents=["third"],
+            metadatas=[{"source": "z"}],
+            embeddings=np.array([[5.0, 6.0]], dtype=np.float32),
+        ),
+    ]
+    header = {"collection_name": "test", "collection_metadata": {"hnsw:M": 32}}
+
+    assert write_snapshot(path, header, batches) == 3
+
+    read_header, read_batches = read_snapshot(path, batch_size=2)
+    read_batches = list(read_batches)
+
+    assert read_header["collection_metadata"] == {"hnsw:M": 32}
+    assert [batch.ids for batch in read_batches] == [["a", "b"], ["c"]]
+    assert read_batches[0].metadatas[0] == {"source": "x", "data_version": "v1"}
+    assert read_batches[1].documents == ["third"]
+    np.testing.assert_array_equal(
+        np.concatenate([batch.embeddings for batch in read_batches]),
+        [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]],
+    )
+
+
+def test_snapshot_format_invalid():
+    """Test that an unsupported snapshot extension raises a ValueError."""
+    with pytest.raises(ValueError):
+        snapshot_format("snapshot.csv")
@@ -0,0 +1,48 @@
+"""Test suite for the upload of chunks to collections."""
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from utils.chroma_store import HNSWConfig
+from utils.chunking import ChunkingOptions, DatasetChunker
+from utils.collection_upload import CollectionUpload, UploadOptions
+from utils.embedding_projection import ProjectionConfig
+
+
+def test_upload_options_from_parameters():
+    """Test that the HNSW and projection configs of step parameters are converted, and that separate parameters take precedence."""
+    options = UploadOptions.from_parameters(
+        {
+            "versioned": True,
+            "hnsw_config": {"M": 8},
+            "projection": {"method": "truncate", "output_dimension": 2},
+            "batch_size": 4,
+        },
+        data_version="v1",
+        batch_size=16,
+    )
+
+    assert options.data_version == "v1"
+    assert options.batch_size == 16
+    assert options.versioned
+    assert options.hnsw_config == HNSWConfig(M=8)
+    assert options.projection == ProjectionConfig(method="truncate", output_dimension=2)
+    assert UploadOptions.from_parameters(None, data_version="v1") == UploadOptions(
+        data_version="v1"
+    )
+
+
+def test_collection_upload_needs_sketch_store():
+    """Test that sketching the embeddings without a sketch store raises a ValueError before the collection is created."""
+    df = pd.DataFrame({"text_scraped": ["text"], "url": ["www.nhs.uk"]})
+    chroma_client = MagicMock()
+
+    with pytest.raises(ValueError):
+        CollectionUpload(
+            DatasetChunker(df, "v1", 100, 0, ChunkingOptions()),
+            "nhs_data",
+            UploadOptions(data_version="v1"),
+            MagicMock(),
+            chroma_client,
+        )
+    chroma_client.create_collection.assert_not_called()
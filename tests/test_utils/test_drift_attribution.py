@@ -0,0 +1,106 @@
+"""Test suite for the drift attribution utilities."""
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+from utils.drift_attribution import SourceCentroids, attribute_drift
+from utils.embedding_drift import compute_drift
+
+# Chunk ID: (source, embedding)
+REFERENCE: Dict[str, Tuple[str, List[float]]] = {
+    "a1": ("page-a", [0.0, 0.0]),
+    "a2": ("page-a", [2.0, 0.0]),
+    "b1": ("page-b", [0.0, 4.0]),
+    "b2": ("page-b", [0.0, 6.0]),
+    "c1": ("page-c", [10.0, 10.0]),
+}
+CURRENT: Dict[str, Tuple[str, List[float]]] = {
+    "a1": ("page-a", [0.0, 0.0]),
+    "a2": ("page-a", [2.0, 0.0]),
+    "b1": ("page-b", [0.0, 4.0]),
+    "b3": ("page-b", [3.0, 6.0]),
+    "d1": ("page-d", [9.0, 11.0]),
+}
+
+
+def summarise(chunks: Dict[str, Tuple[str, List[float]]]) -> SourceCentroids:
+    """Summarise a data version in pages of two chunks.
+
+    Args:
+        chunks (Dict[str, Tuple[str, List[float]]]): Source and embedding of each chunk, keyed by ID
+
+    Returns:
+        SourceCentroids: the summary of the version
+    """
+    summary = SourceCentroids()
+    ids = list(chunks)
+    for start in range(0, len(ids), 2):
+        page = ids[start : start + 2]
+        summary.update(
+            page,
+            [chunks[chunk_id][0] for chunk_id in page],
+            np.array([chunks[chunk_id][1] for chunk_id in page], dtype=np.float32),
+        )
+    return summary
+
+
+def test_source_centroids():
+    """Test that the sums of a source are accumulated across pages."""
+    summary = summarise(REFERENCE)
+
+    assert summary.count == 5
+    assert summary.ids["page-b"] == ["b1", "b2"]
+    np.testing.assert_allclose(summary.centroid("page-b"), [0.0, 5.0])
+    np.testing.assert_allclose(summary.sum("page-c"), [10.0, 10.0])
+
+
+def test_attribute_drift():
+    """Test that the drift is broken down into contributions which add up to it, with the status and matches of each source."""
+    fetched: List[List[str]] = []
+
+    def fetch(chunks: Dict[str, Tuple[str, List[float]]], ids: List[str]) -> np.ndarray:
+        fetched.append(ids)
+        return np.array([chunks[chunk_id][1] for chunk_id in ids], dtype=np.float32)
+
+    attribution = attribute_drift(
+        summarise(REFERENCE),
+        summarise(CURRENT),
+        lambda ids: fetch(REFERENCE, ids),
+        lambda ids: fetch(CURRENT, ids),
+    )
+    exact = compute_drift(
+        [embedding for _, embedding in REFERENCE.values()],
+        [embedding for _, embedding in CURRENT.values()],
+    )
+    sources = {source.source: source for source in attribution.sources}
+
+    assert attribution.centroid_euclidean == pytest.approx(exact.centroid_euclidean)
+    assert sum(source.contribution for source in attribution.sources) == pytest.approx(
+        attribution.centroid_euclidean
+    )
+    assert [source.contribution for source in attribution.sources] == sorted(
+        (source.contribution for source in attribution.sources), reverse=True
+    )
+    assert {name: source.status for name, source in sources.items()} == {
+        "page-a": "unchanged",
+        "page-b": "changed",
+        "page-c": "removed",
+        "page-d": "added",
+    }
+    assert sources["page-a"].contribution == pytest.approx(0.0)
+    assert sources["page-b"].centroid_shift == pytest.approx(np.hypot(1.5, 0.0))
+    # b3 is closest to b2, at a distance of 3
+    assert sources["page-b"].chunk_distance == pytest.approx(3.0)
+    assert sources["page-c"].centroid_shift is None
+    assert sources["page-d"].nearest_source == "page-c"
+    assert sources["page-d"].nearest_source_distance == pytest.approx(np.sqrt(2))
+    # Only the chunks of the changed page are fetched
+    assert fetched == [["b3"], ["b1", "b2"]]
+    assert "page-a" not in [source.source for source in attribution.top()]
+    assert len(attribution.top(1)) == 1
+
+
+def test_attribute_drift_without_chunks():
+    """Test that versions without chunks are rejected."""
+    with pytest.raises(ValueError):
+        attribute_drift(SourceCentroids(), summarise(CURRENT))
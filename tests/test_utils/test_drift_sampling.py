@@ -0,0 +1,227 @@
+"""Test suite for the approximate drift utilities."""
+from typing import Dict, List
+
+import numpy as np
+import pytest
+from utils.drift_sampling import StratifiedSampler, allocate_sample, approximate_drift
+from utils.embedding_drift import compute_drift
+
+
+def make_version(
+    sizes: Dict[str, int], shift: float, seed: int
+) -> Dict[str, np.ndarray]:
+    """Create the embeddings of a data version, whose sources are centred at different points.
+
+    Args:
+        sizes (Dict[str, int]): Number of chunks of each source
+        shift (float): Offset of every embedding along the first dimension
+        seed (int): Seed of the embeddings
+
+    Returns:
+        Dict[str, np.ndarray]: embeddings keyed by chunk ID
+    """
+    rng = np.random.default_rng(seed)
+    embeddings = {}
+    for i, (source, size) in enumerate(sizes.items()):
+        centre = np.zeros(8)
+        centre[i + 1] = 4.0
+        centre[0] = shift
+        for j, embedding in enumerate(rng.normal(centre, 1.0, size=(size, 8))):
+            embeddings[f"{source}-{j}"] = embedding.astype(np.float32)
+    return embeddings
+
+
+def make_pages(n_pages: int, shift: float, seed: int) -> Dict[str, np.ndarray]:
+    """Create the embeddings of a data version with many small pages, centred at random points.
+
+    Args:
+        n_pages (int): Number of pages, each of one to three chunks
+        shift (float): Offset of every embedding along the first dimension
+        seed (int): Seed of the embeddings
+
+    Returns:
+        Dict[str, np.ndarray]: embeddings keyed by chunk ID
+    """
+    rng = np.random.default_rng(seed)
+    embeddings = {}
+    for page in range(n_pages):
+        centre = rng.normal(0.0, 2.0, size=8)
+        centre[0] += shift
+        for j in range(rng.integers(1, 4)):
+            embeddings[f"page{page:04d}-{j}"] = rng.normal(centre, 1.0).astype(
+                np.float32
+            )
+    return embeddings
+
+
+def group_by_source(embeddings: Dict[str, np.ndarray]) -> Dict[str, List[str]]:
+    """Group chunk IDs by the source prefix of the ID.
+
+    Args:
+        embeddings (Dict[str, np.ndarray]): embeddings keyed by chunk ID
+
+    Returns:
+        Dict[str, List[str]]: chunk IDs keyed by source
+    """
+    groups: Dict[str, List[str]] = {}
+    for chunk_id in embeddings:
+        groups.setdefault(chunk_id.split("-")[0], []).append(chunk_id)
+    return groups
+
+
+@pytest.mark.parametrize(
+    "sizes, sample_size, offsets, expected",
+    [
+        ([10, 30, 60], 10, [0.0, 0.5, 0.9], [1, 3, 6]),
+        ([1, 1, 8], 5, [0.2, 0.7, 0.5], [1, 0, 4]),
+        ([3, 2], 100, [0.9, 0.9], [3, 2]),
+        ([3, 2], 0, [0.0, 0.5], [0, 0]),
+    ],
+)
+def test_allocate_sample(
+    sizes: List[int], sample_size: int, offsets: List[float], expected: List[int]
+):
+    """Test that samples are split in proportion to the strata, without exceeding them.
+
+    Args:
+        sizes (List[int]): Sizes of the strata
+        sample_size (int): Total sample size
+        offsets (List[float]): Offsets of the strata
+        expected (List[int]): Expected allocation
+    """
+    allocation = allocate_sample(np.array(sizes), sample_size, np.array(offsets))
+
+    assert allocation.tolist() == expected
+
+
+def test_allocate_sample_is_unbiased_and_nested():
+    """Test that random rounding allocates the quotas on average, and larger samples never allocate less."""
+    sizes = np.array([1, 1, 1, 2, 5])
+    offsets = np.random.default_rng(0).random((20000, len(sizes)))
+
+    allocations = np.stack(
+        [allocate_sample(sizes, 3, stratum_offsets) for stratum_offsets in offsets]
+    )
+    larger = np.stack(
+        [allocate_sample(sizes, 6, stratum_offsets) for stratum_offsets in offsets]
+    )
+
+    np.testing.assert_allclose(allocations.mean(axis=0), sizes * 0.3, atol=0.02)
+    assert (larger >= allocations).all()
+
+
+def test_stratified_sampler_extends_samples():
+    """Test that larger samples extend smaller ones, and that the weights of the sample sum to 1."""
+    sampler = StratifiedSampler({"a": ["a1", "a2", "a3", "a4"], "b": ["b1", "b2"]})
+
+    first = sampler.extend(3)
+    second = sampler.extend(6)
+
+    assert len(first) == 3 and len(second) == 3
+    assert sorted(first + second) == ["a1", "a2", "a3", "a4", "b1", "b2"]
+    assert sampler.exhausted
+    np.testing.assert_allclose(sampler.row_weights(), np.full(6, 1 / 6))
+    assert sampler.extend(10) == []
+
+
+def test_approximate_drift_stops_early_with_interval():
+    """Test that the approximate drift stops before sampling everything, and its interval covers the exact drift."""
+    reference = make_version({"a": 3000, "b": 500, "c": 1500}, shift=0.0, seed=0)
+    current = make_version({"a": 1000, "b": 2500, "c": 1500}, shift=0.5, seed=1)
+    fetched: Dict[str, List[str]] = {"reference": [], "current": []}
+
+    def fetch(version: str, ids: List[str]) -> np.ndarray:
+        fetched[version].extend(ids)
+        embeddings = reference if version == "reference" else current
+        return np.stack([embeddings[chunk_id] for chunk_id in ids])
+
+    drift = approximate_drift(
+        group_by_source(reference),
+        group_by_source(current),
+        lambda ids: fetch("reference", ids),
+        lambda ids: fetch("current", ids),
+        initial_sample_size=200,
+        max_sample_size=4000,
+        tolerance=0.2,
+    )
+    exact = compute_drift(list(reference.values()), list(current.values()))
+
+    assert drift.n_reference < len(reference) and drift.n_current < len(current)
+    # Every chunk is fetched at most once, even across rounds
+    assert len(set(fetched["reference"])) == drift.n_reference
+    assert len(set(fetched["current"])) == drift.n_current
+    assert drift.euclidean_interval is not None and drift.cosine_interval is not None
+    lower, upper = drift.euclidean_interval
+    assert lower <= exact.centroid_euclidean <= upper
+    assert upper - lower <= 0.2 * drift.centroid_euclidean
+    assert drift.centroid_euclidean == pytest.approx(exact.centroid_euclidean, rel=0.2)
+
+
+def test_approximate_drift_interval_covers_exact_drift_with_many_pages():
+    """Test that the interval covers the exact drift when there are more pages than sampled chunks."""
+    reference = make_pages(1000, shift=0.0, seed=0)
+    current = make_pages(1000, shift=0.3, seed=1)
+
+    drift = approximate_drift(
+        group_by_source(reference),
+        group_by_source(current),
+        lambda ids: np.stack([reference[chunk_id] for chunk_id in ids]),
+        lambda ids: np.stack([current[chunk_id] for chunk_id in ids]),
+        initial_sample_size=100,
+        max_sample_size=400,
+        tolerance=0.2,
+    )
+    exact = compute_drift(list(reference.values()), list(current.values()))
+
+    assert drift.n_reference < len(reference) and drift.n_current < len(current)
+    assert drift.euclidean_interval is not None
+    lower, upper = drift.euclidean_interval
+    assert lower < upper
+    assert lower <= exact.centroid_euclidean <= upper
+
+
+def test_approximate_drift_is_exact_for_small_versions():
+    """Test that versions smaller than the initial sample are compared whole, without intervals."""
+    reference = make_version({"a": 20, "b": 10}, shift=0.0, seed=0)
+    current = make_version({"a": 5, "b": 30}, shift=1.0, seed=1)
+
+    drift = approximate_drift(
+        group_by_source(reference),
+        group_by_source(current),
+        lambda ids: np.stack([reference[chunk_id] for chunk_id in ids]),
+        lambda ids: np.stack([current[chunk_id] for chunk_id in ids]),
+        initial_sample_size=100,
+        mmd_samples=50,
+    )
+    exact = compute_drift(list(reference.values()), list(current.values()))
+
+    assert (drift.n_reference, drift.n_current) == (30, 35)
+    assert drift.euclidean_interval is None and drift.mmd is not None
+    assert drift.centroid_euclidean == pytest.approx(exact.centroid_euclidean)
+    assert drift.centroid_cosine == pytest.approx(exact.centroid_cosine, abs=1e-6)
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [
+        {"initial_sample_size": 1},
+        {"initial_sample_size": 100, "max_sample_size": 50},
+        {"tolerance": 0},
+        {"confidence": 1.0},
+        {"n_bootstrap": 0},
+    ],
+)
+def test_approximate_drift_invalid_parameters(parameters: dict):
+    """Test that invalid sampling parameters are rejected.
+
+    Args:
+        parameters (dict): Invalid parameters of approximate_drift
+    """
+    with pytest.raises(ValueError):
+        approximate_drift(
+            {"a": ["a1"]},
+            {"a": ["a1"]},
+            lambda ids: np.ones((len(ids), 2)),
+            lambda ids: np.ones((len(ids), 2)),
+            **parameters,
+        )
@@ -0,0 +1,212 @@
+"""Test suite for the client-side batch embedding utilities."""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from utils.embedding import (
+    EmbeddingModelConfig,
+    InstructorEmbedder,
+    length_sorted_batches,
+)
+from utils.onnx_encoder import onnx_model_path
+
+
+class MockInstructor:
+    """Mock Instructor model which embeds a text as its length."""
+
+    def __init__(self, model_name: str):
+        """Constructor for the mock model.
+
+        Args:
+            model_name (str): Name of the model
+        """
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Dimension of the mock embeddings.
+
+        Returns:
+            int: the embedding dimension
+        """
+        return 2
+
+    def encode(self, sentences: List[List[str]], **kwargs) -> np.ndarray:
+        """Embed each [instruction, text] pair as [len(text), 1.0].
+
+        Args:
+            sentences (List[List[str]]): Pairs of instruction and text
+            **kwargs (Dict): Additional keyword arguments
+
+        Returns:
+            np.ndarray: the mock embeddings
+        """
+        return np.array([[float(len(text)), 1.0] for _, text in sentences])
+
+
+@pytest.mark.parametrize(
+    "texts, batch_size, expected_batches",
+    [
+        (["aaa", "a", "aa"], 2, [[1, 2], [0]]),
+        (["aaa", "a", "aa"], 3, [[1, 2, 0]]),
+        ([], 2, []),
+    ],
+)
+def test_length_sorted_batches(
+    texts: List[str], batch_size: int, expected_batches: List[List[int]]
+):
+    """Test that texts are batched by length.
+
+    Args:
+        texts (List[str]): Texts to batch
+        batch_size (int): Maximum number of texts in a batch
+        expected_batches (List[List[int]]): Expected indices in each batch
+    """
+    assert list(length_sorted_batches(texts, batch_size)) == expected_batches
+
+
+def test_length_sorted_batches_invalid_batch_size():
+    """Test that a batch size less than 1 raises a ValueError."""
+    with pytest.raises(ValueError):
+        list(length_sorted_batches(["a"], 0))
+
+
+def test_instructor_embedder_keeps_input_order():
+    """Test that embeddings are returned in the order of the input texts."""
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor):
+        embedder = InstructorEmbedder("mock", "Represent: ", batch_size=2)
+
+    embeddings = embedder.embed(["aaa", "a", "aa"])
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.tolist() == [[3.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+    assert embedder(["aa"]) == [[2.0, 1.0]]
+
+
+def test_instructor_embedder_uses_cache(directory_for_testing: str):
+    """Test that cached texts are not embedded again.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor):
+        embedder = InstructorEmbedder(
+            "mock", "Represent: ", cache_dir=directory_for_testing
+        )
+
+    embedder.embed_batch(["aa"])
+    with patch.object(
+        embedder._model, "encode", wraps=embedder._model.encode
+    ) as encode:
+        embeddings = embedder.embed_batch(["aa", "aaa"])
+
+    assert embeddings.tolist() == [[2.0, 1.0], [3.0, 1.0]]
+    encode.assert_called_once()
+    assert [text for _, text in encode.call_args.args[0]] == ["aaa"]
+    assert embedder.cache.stats().hits == 1
+
+
+def test_instructor_embedder_without_cache_when_locked(directory_for_testing: str):
+    """Test that an embedder whose cache is open elsewhere embeds without a cache.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor):
+        embedder = InstructorEmbedder(
+            "mock", "Represent: ", cache_dir=directory_for_testing
+        )
+        other_embedder = InstructorEmbedder(
+            "mock", "Represent: ", cache_dir=directory_for_testing
+        )
+
+    assert embedder.cache is not None
+    assert other_embedder.cache is None
+    assert other_embedder.embed_batch(["aa"]).tolist() == [[2.0, 1.0]]
+
+
+def test_instructor_embedder_worker_pool(directory_for_testing: str):
+    """Test that a pool of workers embeds only the texts which are not cached and returns the batches in order.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    # Threads stand in for the worker processes, which would not see the mock model
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor), patch(
+        "utils.embedding.ProcessPoolExecutor",
+        lambda max_workers, mp_context, initializer, initargs: ThreadPoolExecutor(
+            max_workers, initializer=initializer, initargs=initargs
+        ),
+    ), InstructorEmbedder(
+        "mock", "Represent: ", cache_dir=directory_for_testing, n_workers=2
+    ) as embedder:
+        embedder.embed_batch(["aa"])
+        embeddings = list(embedder.embed_batches([["aaaa", "aa"], [], ["a"]]))
+
+    assert [batch.tolist() for batch in embeddings] == [
+        [[4.0, 1.0], [2.0, 1.0]],
+        [],
+        [[1.0, 1.0]],
+    ]
+    assert embedder.cache.stats().hits == 1
+    # Only the workers load the model, the dimension of the cache is read from one of them
+    assert embedder._loaded_model is None
+    assert embedder._executor is None
+
+
+def test_instructor_embedder_invalid_n_workers():
+    """Test that less than one worker raises a ValueError."""
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor), pytest.raises(ValueError):
+        InstructorEmbedder("mock", "Represent: ", n_workers=0)
+
+
+def test_embedding_model_config_invalid_backend():
+    """Test that an unsupported backend raises a ValueError."""
+    with pytest.raises(ValueError):
+        EmbeddingModelConfig("hkunlp/instructor-base", backend="tensorrt")
+
+
+def test_instructor_embedder_onnx_backend(directory_for_testing: str):
+    """Test that the ONNX backends embed with the ONNX encoder and cache their embeddings apart from the PyTorch ones.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    onnx_encoder = MagicMock()
+    onnx_encoder.return_value.encode.side_effect = lambda pairs: np.array(
+        [[float(len(text)), 0.0] for _, text in pairs], dtype=np.float32
+    )
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor), patch(
+        "utils.embedding.OnnxEncoder", onnx_encoder
+    ):
+        torch_embedder = InstructorEmbedder(
+            "mock", "Represent: ", cache_dir=directory_for_testing
+        )
+        int8_embedder = InstructorEmbedder(
+            "mock", "Represent: ", cache_dir=directory_for_testing, backend="onnx-int8"
+        )
+
+    torch_embedder.embed_batch(["aa"])
+    torch_embedder.cache.flush()
+
+    assert int8_embedder.embed_batch(["aa"]).tolist() == [[2.0, 0.0]]
+    assert onnx_encoder.call_args.kwargs["quantise"] is True
+    assert int8_embedder.cache.stats().misses == 1
+
+
+def test_instructor_embedder_invalid_backend():
+    """Test that an unsupported backend raises a ValueError."""
+    with patch("utils.embedding.INSTRUCTOR", MockInstructor), pytest.raises(ValueError):
+        InstructorEmbedder("mock", "Represent: ", backend="tensorrt")
+
+
+def test_onnx_model_path():
+    """Test that the full-precision and int8 exports of a model are stored side by side."""
+    assert onnx_model_path("onnx", "hkunlp/instructor-base") == os.path.join(
+        "onnx", "hkunlp--instructor-base", "encoder.onnx"
+    )
+    assert onnx_model_path(
+        "onnx", "hkunlp/instructor-base", quantise=True
+    ) == os.path.join("onnx", "hkunlp--instructor-base", "encoder-int8.onnx")
@@ -0,0 +1,172 @@
+"""Test suite for the on-disk embedding cache."""
+import numpy as np
+import pytest
+from utils import embedding_cache
+from utils.embedding_cache import EmbeddingCache
+
+
+def test_cache_miss_then_hit(directory_for_testing: str):
+    """Test that stored embeddings are returned by later lookups and counted as hits.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    cache = EmbeddingCache(directory_for_testing, "model", "Represent: ", dimension=2)
+
+    assert cache.get_many(["a"]) == [None]
+
+    cache.put_many(["a", "b"], np.array([[1.0, 2.0], [3.0, 4.0]]))
+    cached_a, cached_b, cached_c = cache.get_many(["a", "b", "c"])
+
+    assert cached_a.tolist() == [1.0, 2.0]
+    assert cached_b.tolist() == [3.0, 4.0]
+    assert cached_c is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (2, 2, 2)
+    assert stats.hit_rate == 0.5
+
+
+def test_cache_persists_between_instances(directory_for_testing: str):
+    """Test that a reopened cache still contains the embeddings stored before.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    cache = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=2, dtype="float16"
+    )
+    cache.put_many(["a"], np.array([[0.5, 1.5]]))
+    cache.close()
+
+    reopened = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=2, dtype="float16"
+    )
+
+    assert len(reopened) == 1
+    assert reopened.get_many(["a"])[0].tolist() == [0.5, 1.5]
+
+
+def test_cache_is_keyed_by_model_and_instruction(directory_for_testing: str):
+    """Test that the same text embedded with another model or instruction is not a hit.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    EmbeddingCache(directory_for_testing, "model", "Represent: ", dimension=2).put_many(
+        ["a"], np.array([[0.5, 1.5]])
+    )
+
+    other_model = EmbeddingCache(directory_for_testing, "other", "Represent: ", 2)
+    other_instruction = EmbeddingCache(directory_for_testing, "model", "Query: ", 2)
+
+    assert other_model.get_many(["a"]) == [None]
+    assert other_instruction.get_many(["a"]) == [None]
+
+
+def test_cache_evicts_least_recently_used(directory_for_testing: str):
+    """Test that the least recently used embedding is evicted once the cache is full.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    cache = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=1, capacity=2
+    )
+    cache.put_many(["a"], np.array([[1.0]]))
+    cache.put_many(["b"], np.array([[2.0]]))
+    cache.get_many(["a"])
+
+    cache.put_many(["c"], np.array([[3.0]]))
+
+    assert cache.get_many(["b"]) == [None]
+    assert cache.get_many(["a"])[0].tolist() == [1.0]
+    assert cache.get_many(["c"])[0].tolist() == [3.0]
+    assert cache.stats().evictions == 1
+
+
+def test_cache_evicts_only_occupied_slots(directory_for_testing: str):
+    """Test that a partly full cache given more new texts than it has free slots only evicts cached embeddings.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    cache = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=1, capacity=4
+    )
+    cache.put_many(["a", "b"], np.array([[1.0], [2.0]]))
+    cache.get_many(["b"])
+
+    cache.put_many(["c", "d", "e"], np.array([[3.0], [4.0], [5.0]]))
+
+    assert cache.get_many(["a"]) == [None]
+    assert [embedding[0] for embedding in cache.get_many(["b", "c", "d", "e"])] == [
+        2.0,
+        3.0,
+        4.0,
+        5.0,
+    ]
+    assert len(cache) == 4
+    assert cache.stats().evictions == 1
+
+
+def test_cache_grows_up_to_capacity(
+    directory_for_testing: str, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a cache starts small, grows as embeddings are stored and keeps them when it is reopened.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+        monkeypatch (pytest.MonkeyPatch): fixture to shrink the initial size of the cache
+    """
+    monkeypatch.setattr(embedding_cache, "INITIAL_CACHE_ROWS", 2)
+    cache = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=1, capacity=5
+    )
+    assert len(cache._keys) == 2
+
+    cache.put_many(["a", "b", "c"], np.array([[1.0], [2.0], [3.0]]))
+    assert len(cache._keys) == 4
+    cache.put_many(["d", "e", "f"], np.array([[4.0], [5.0], [6.0]]))
+    assert len(cache._keys) == 5
+    cache.close()
+
+    reopened = EmbeddingCache(
+        directory_for_testing, "model", "Represent: ", dimension=1, capacity=5
+    )
+    assert len(reopened) == 5
+    assert reopened.stats().evictions == 0
+    assert [
+        embedding[0] for embedding in reopened.get_many(["b", "c", "d", "e", "f"])
+    ] == [
+        2.0,
+        3.0,
+        4.0,
+        5.0,
+        6.0,
+    ]
+
+
+def test_cache_has_a_single_writer(directory_for_testing: str):
+    """Test that a cache cannot be opened twice until it is closed.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    cache = EmbeddingCache(directory_for_testing, "model", "Represent: ", dimension=2)
+
+    with pytest.raises(RuntimeError):
+        EmbeddingCache(directory_for_testing, "model", "Represent: ", dimension=2)
+
+    cache.close()
+    EmbeddingCache(directory_for_testing, "model", "Represent: ", dimension=2)
+
+
+def test_cache_invalid_dtype(directory_for_testing: str):
+    """Test that an unsupported dtype raises a ValueError.
+
+    Args:
+        directory_for_testing (str): temporary directory for the cache
+    """
+    with pytest.raises(ValueError):
+        EmbeddingCache(directory_for_testing, "model", "Represent: ", 2, dtype="int8")
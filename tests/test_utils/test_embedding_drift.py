@@ -0,0 +1,124 @@
+"""Test suite for the embedding drift utilities."""
+from contextlib import nullcontext as does_not_raise
+from typing import Any
+
+import numpy as np
+import pytest
+from utils.embedding_drift import (
+    as_embedding_array,
+    centroid_distances,
+    compare_sketches,
+    compute_drift,
+    maximum_mean_discrepancy,
+)
+from utils.embedding_sketch import EmbeddingSketch
+
+
+@pytest.mark.parametrize(
+    "embeddings, expectation",
+    [
+        (123, pytest.raises(TypeError)),
+        ([[1.1, 2.2], ["a", True]], pytest.raises(TypeError)),
+        ([[1.1, 2.2], [3.1, 4.1, 5.1]], pytest.raises(TypeError)),
+        ([1.1, 2.2], pytest.raises(TypeError)),
+        (np.empty((0, 3)), pytest.raises(ValueError)),
+        ([[1, 2, 3], [3, 4, 5]], does_not_raise()),
+        (np.ones((2, 3), dtype=np.float64), does_not_raise()),
+    ],
+)
+def test_as_embedding_array(embeddings: Any, expectation: Any):
+    """Test that embeddings which are not a non-empty two-dimensional array of numbers are rejected.
+
+    Args:
+        embeddings (Any): the embeddings to check
+        expectation (Any): exception to raise
+    """
+    with expectation:
+        assert as_embedding_array(embeddings, "reference").dtype == np.float32
+
+
+def test_centroid_distances_of_different_sizes():
+    """Test that the centroids are per-dimension means, so versions of different sizes can be compared."""
+    reference = np.array([[1.0, 0.0], [3.0, 0.0]], dtype=np.float32)
+    current = np.array([[0.0, 1.0], [0.0, 2.0], [0.0, 3.0]], dtype=np.float32)
+
+    euclidean, cosine = centroid_distances(reference, current)
+
+    assert euclidean == pytest.approx(np.sqrt(8))
+    assert cosine == pytest.approx(1.0)
+    assert centroid_distances(reference, reference) == (0.0, pytest.approx(0.0))
+
+
+def test_maximum_mean_discrepancy_detects_shift():
+    """Test that the MMD is close to 0 for samples of the same distribution and larger for shifted samples."""
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(300, 8)).astype(np.float32)
+    same = rng.normal(size=(400, 8)).astype(np.float32)
+    shifted = (rng.normal(size=(400, 8)) + 1).astype(np.float32)
+
+    assert abs(maximum_mean_discrepancy(reference, same)) < 0.01
+    assert maximum_mean_discrepancy(reference, shifted, max_samples=200) > 0.1
+    with pytest.raises(ValueError):
+        maximum_mean_discrepancy(reference[:1], same)
+
+
+def test_compute_drift():
+    """Test that the drift is computed for versions of different sizes and rejected for different dimensions."""
+    reference = np.ones((5, 4), dtype=np.float32)
+    current = np.ones((7, 4), dtype=np.float32)
+
+    drift = compute_drift(reference, current, mmd_samples=4)
+
+    assert (drift.n_reference, drift.n_current) == (5, 7)
+    assert drift.centroid_euclidean == 0
+    assert drift.mmd == pytest.approx(0)
+    assert compute_drift(reference, current).mmd is None
+    with pytest.raises(ValueError):
+        compute_drift(reference, np.ones((5, 3)))
+
+
+def test_compare_sketches_matches_embeddings():
+    """Test that the drift computed from sketches matches the drift computed from the embeddings, and the exact Fréchet distance at full rank."""
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(300, 5)).astype(np.float32)
+    current = (rng.normal(size=(200, 5)) * 2 + 1).astype(np.float32)
+
+    drift = compare_sketches(
+        EmbeddingSketch.from_embeddings(reference, rank=5),
+        EmbeddingSketch.from_embeddings(current, rank=5),
+    )
+    exact = compute_drift(reference, current)
+
+    assert (drift.n_reference, drift.n_current) == (300, 200)
+    assert drift.centroid_euclidean == pytest.approx(exact.centroid_euclidean)
+    assert drift.centroid_cosine == pytest.approx(exact.centroid_cosine)
+
+    reference_covariance, current_covariance = (
+        np.cov(embeddings.T.astype(np.float64), bias=True)
+        for embeddings in (reference, current)
+    )
+    eigenvalues, eigenvectors = np.linalg.eigh(reference_covariance)
+    root = (eigenvectors * np.sqrt(eigenvalues)) @ eigenvectors.T
+    cross = np.sqrt(np.linalg.eigvalsh(root @ current_covariance @ root)).sum()
+    expected = (
+        np.sum((reference.mean(axis=0) - current.mean(axis=0)) ** 2)
+        + np.trace(reference_covariance)
+        + np.trace(current_covariance)
+        - 2 * cross
+    )
+    assert drift.frechet == pytest.approx(expected, rel=1e-4)
+
+
+def test_compare_sketches_rejects_different_projections():
+    """Test that sketches of embeddings projected with different fits are not compared."""
+    reference = EmbeddingSketch.from_embeddings(np.zeros((2, 3)))
+    current = EmbeddingSketch.from_embeddings(np.ones((2, 3)))
+    current.projection = "fingerprint"
+
+    with pytest.raises(ValueError):
+        compare_sketches(reference, current)
+
+    reference.projection = "fingerprint"
+    assert compare_sketches(reference, current).centroid_euclidean == pytest.approx(
+        np.sqrt(3)
+    )
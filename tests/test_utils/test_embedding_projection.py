@@ -0,0 +1,125 @@
+"""Test suite for the projections of embeddings."""
+import numpy as np
+import pytest
+from utils.embedding_projection import EmbeddingProjection, ProjectionConfig
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [
+        {"method": "random"},
+        {"output_dimension": 0},
+        {"output_dimension": 8, "fit_size": 4},
+    ],
+)
+def test_projection_config_invalid(parameters: dict):
+    """Test that invalid projection parameters are rejected.
+
+    Args:
+        parameters (dict): Invalid projection parameters
+    """
+    with pytest.raises(ValueError):
+        ProjectionConfig(**parameters)
+
+
+def test_pca_projection_keeps_the_largest_variance():
+    """Test that a PCA projection keeps the directions of largest variance, so distances within them are preserved."""
+    rng = np.random.default_rng(0)
+    # Embeddings which vary mostly in two of their eight dimensions
+    embeddings = rng.normal(size=(200, 8)) * np.array([5, 3] + [0.01] * 6)
+    embeddings = embeddings @ np.linalg.qr(rng.normal(size=(8, 8)))[0]
+
+    projection = EmbeddingProjection.fit(
+        ProjectionConfig(method="pca", output_dimension=2, fit_size=200), embeddings
+    )
+    projected = projection.apply(embeddings)
+
+    assert projected.shape == (200, 2)
+    assert projected.dtype == np.float32
+    np.testing.assert_allclose(
+        np.linalg.norm(projected[:10] - projected[10:20], axis=1),
+        np.linalg.norm(embeddings[:10] - embeddings[10:20], axis=1),
+        atol=0.05,
+    )
+
+
+def test_truncate_projection_renormalises():
+    """Test that a truncating projection keeps the leading dimensions and normalises them."""
+    projection = EmbeddingProjection.fit(
+        ProjectionConfig(method="truncate", output_dimension=2), np.ones((1, 4))
+    )
+
+    np.testing.assert_allclose(
+        projection.apply(np.array([[3.0, 4.0, 1.0, 1.0]])), [[0.6, 0.8]]
+    )
+    with pytest.raises(ValueError):
+        projection.apply(np.ones((1, 3)))
+
+
+def test_projection_fit_invalid():
+    """Test that a projection cannot have more dimensions than the embeddings, or a PCA projection be fitted on too few embeddings."""
+    with pytest.raises(ValueError):
+        EmbeddingProjection.fit(
+            ProjectionConfig(method="truncate", output_dimension=8), np.ones((1, 4))
+        )
+    with pytest.raises(ValueError):
+        EmbeddingProjection.fit(
+            ProjectionConfig(method="pca", output_dimension=4), np.ones((2, 8))
+        )
+
+
+@pytest.mark.parametrize("method", ["pca", "truncate"])
+def test_projection_serialisation_round_trip(method: str):
+    """Test that a deserialised projection projects embeddings like the original.
+
+    Args:
+        method (str): Projection method
+    """
+    embeddings = np.random.default_rng(0).normal(size=(16, 8)).astype(np.float32)
+    projection = EmbeddingProjection.fit(
+        ProjectionConfig(method=method, output_dimension=4, fit_size=16), embeddings
+    )
+
+    restored = EmbeddingProjection.from_string(projection.to_string())
+
+    assert restored.method == method
+    assert (restored.input_dimension, restored.output_dimension) == (8, 4)
+    np.testing.assert_array_equal(
+        restored.apply(embeddings), projection.apply(embeddings)
+    )
+
+
+def test_projection_matches_ignores_fit_size():
+    """Test that a projection matches configs which only differ in their fit size, and not ones with another method or output dimension."""
+    embeddings = np.random.default_rng(0).normal(size=(16, 8)).astype(np.float32)
+    projection = EmbeddingProjection.fit(
+        ProjectionConfig(method="pca", output_dimension=4, fit_size=16), embeddings
+    )
+
+    assert projection.matches(
+        ProjectionConfig(method="pca", output_dimension=4, fit_size=1000)
+    )
+    assert not projection.matches(
+        ProjectionConfig(method="pca", output_dimension=2, fit_size=16)
+    )
+    assert not projection.matches(
+        ProjectionConfig(method="truncate", output_dimension=4, fit_size=16)
+    )
+
+
+def test_projection_fingerprint_identifies_the_fit():
+    """Test that a projection keeps its fingerprint when serialised, and that another fit has another fingerprint."""
+    rng = np.random.default_rng(0)
+    config = ProjectionConfig(method="pca", output_dimension=4, fit_size=16)
+    projection = EmbeddingProjection.fit(
+        config, rng.normal(size=(16, 8)).astype(np.float32)
+    )
+    refitted = EmbeddingProjection.fit(
+        config, rng.normal(size=(16, 8)).astype(np.float32)
+    )
+
+    assert (
+        EmbeddingProjection.from_string(projection.to_string()).fingerprint()
+        == projection.fingerprint()
+    )
+    assert refitted.fingerprint() != projection.fingerprint()
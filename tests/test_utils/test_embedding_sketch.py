@@ -0,0 +1,69 @@
+"""Test suite for the sketches of embeddings."""
+import numpy as np
+import pytest
+from utils.embedding_sketch import EmbeddingSketch, EmbeddingSketcher
+
+
+def test_sketch_does_not_depend_on_batching():
+    """Test that the mean and covariance of a sketch built batch by batch are those of all the embeddings."""
+    embeddings = np.random.default_rng(0).normal(size=(500, 6)).astype(np.float32)
+
+    sketcher = EmbeddingSketcher(rank=6, sample_size=50)
+    for start in range(0, len(embeddings), 37):
+        sketcher.update(embeddings[start : start + 37])
+    sketch = sketcher.sketch()
+
+    covariance = np.cov(embeddings.T.astype(np.float64), bias=True)
+    assert sketch.count == 500
+    np.testing.assert_allclose(sketch.mean, embeddings.mean(axis=0), atol=1e-6)
+    assert sketch.trace == pytest.approx(np.trace(covariance))
+    np.testing.assert_allclose(
+        (sketch.components * sketch.eigenvalues) @ sketch.components.T,
+        covariance,
+        atol=1e-5,
+    )
+    assert sketch.sample.shape == (50, 6)
+    # Every sampled embedding is one of the embeddings
+    assert all((embeddings == row).all(axis=1).any() for row in sketch.sample)
+
+
+def test_sketch_keeps_leading_eigenpairs():
+    """Test that a low-rank sketch keeps the eigenpairs of largest variance."""
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(1000, 4)) * np.array([4.0, 1.0, 2.0, 0.1])
+
+    sketch = EmbeddingSketch.from_embeddings(embeddings, rank=2)
+
+    assert sketch.components.shape == (4, 2)
+    np.testing.assert_allclose(sketch.eigenvalues, [16, 4], rtol=0.1)
+    np.testing.assert_allclose(np.abs(sketch.components[[0, 2]]), np.eye(2), atol=0.05)
+
+
+def test_sketch_serialisation_round_trip():
+    """Test that a deserialised sketch holds the same statistics."""
+    sketch = EmbeddingSketch.from_embeddings(
+        np.random.default_rng(0).normal(size=(20, 3)), rank=2, sample_size=5
+    )
+
+    restored = EmbeddingSketch.from_string(sketch.to_string())
+
+    assert (restored.count, restored.trace) == (sketch.count, sketch.trace)
+    for name in ["mean", "eigenvalues", "components", "sample"]:
+        np.testing.assert_array_equal(getattr(restored, name), getattr(sketch, name))
+    assert restored.projection is None
+
+    sketch.projection = "fingerprint"
+    assert EmbeddingSketch.from_string(sketch.to_string()).projection == "fingerprint"
+
+
+def test_sketcher_invalid():
+    """Test that invalid sketch parameters, mismatched dimensions and empty sketches are rejected."""
+    with pytest.raises(ValueError):
+        EmbeddingSketcher(rank=0)
+
+    sketcher = EmbeddingSketcher()
+    with pytest.raises(ValueError):
+        sketcher.sketch()
+    sketcher.update(np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        sketcher.update(np.ones((2, 4)))
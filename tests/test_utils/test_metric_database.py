@@ -5,7 +5,12 @@ from unittest import mock
 from unittest.mock import patch
 
 import pytest
-from utils.metric_database import DatabaseCredentials, DatabaseInterface, SQLQueries
+from utils.metric_database import (
+    QUERY_DRIFT_BUCKET,
+    DatabaseCredentials,
+    DatabaseInterface,
+    SQLQueries,
+)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -174,6 +179,16 @@ def test_database_interface():
             SQLQueries.create_readability_threshold_relation_query()
         )
 
+        db_interface.create_relation("query_drift")
+        mock_execute_query.assert_called_with(
+            SQLQueries.create_query_drift_relation_query()
+        )
+
+        db_interface.create_relation("drift_attribution")
+        mock_execute_query.assert_called_with(
+            SQLQueries.create_drift_attribution_relation_query()
+        )
+
         db_interface.insert_datasets_data()
         mock_execute_query.assert_called_with(
             SQLQueries.insert_datasets_data(),
@@ -223,6 +238,51 @@ def test_database_interface():
             mock_readability_threshold_data,
         )
 
+        mock_query_drift_data = {
+            "dataset": "nhs",
+            "data_version": "v1",
+            "n_queries": 10,
+            "offset_sum": [0.1, -0.2],
+            "nearest_distance_sum": 5.0,
+            "nearest_distance_sum_sq": 2.5,
+            "nearest_distance_max": 0.5,
+        }
+        db_interface.insert_query_drift_data(mock_query_drift_data)
+        mock_execute_query.assert_called_with(
+            SQLQueries.insert_query_drift_data(),
+            {"bucket": QUERY_DRIFT_BUCKET, **mock_query_drift_data},
+        )
+
+        mock_drift_attribution_source = {
+            "source": "https://www.nhs.uk/page",
+            "status": "added",
+            "n_reference": 0,
+            "n_current": 2,
+            "contribution": 0.1,
+            "centroid_shift": None,
+            "chunk_distance": None,
+            "nearest_source": "https://www.nhs.uk/other-page",
+            "nearest_source_distance": 0.2,
+        }
+        db_interface.insert_drift_attribution_data(
+            {
+                "reference_dataset": "1.1",
+                "current_dataset": "1.2",
+                "dataset": "nhs",
+                "sources": [mock_drift_attribution_source],
+            }
+        )
+        mock_execute_query.assert_called_with(
+            SQLQueries.insert_drift_attribution_data(),
+            {
+                "reference_dataset": "1.1",
+                "current_dataset": "1.2",
+                "dataset": "nhs",
+                "rank": 1,
+                **mock_drift_attribution_source,
+            },
+        )
+
         db_interface.query_relation("readability")
         mock_execute_query.assert_called_with(
             SQLQueries.get_data_from_relation(),
@@ -257,3 +317,38 @@ def test_database_interface():
             {"relation_name": "readability_threshold"},
             fetch=True,
         )
+
+
+def test_database_interface_embedding_sketch():
+    """Test that the embedding sketch methods of the database interface are called with the expected queries."""
+    with patch("psycopg2.pool.SimpleConnectionPool", return_value=None), patch.object(
+        DatabaseInterface, "check_relation_existence", return_value=True
+    ), patch.object(
+        DatabaseInterface, "execute_query", return_value=None
+    ) as mock_execute_query:
+        db_interface = DatabaseInterface()
+
+        db_interface.create_relation("embedding_sketch")
+        mock_execute_query.assert_called_with(
+            SQLQueries.create_embedding_sketch_relation_query()
+        )
+
+        mock_embedding_sketch_data = {
+            "collection_name": "nhs_data",
+            "data_version": "v1",
+            "sketch": b"sketch",
+        }
+        db_interface.insert_embedding_sketch_data(mock_embedding_sketch_data)
+        mock_execute_query.assert_called_with(
+            SQLQueries.insert_embedding_sketch_data(),
+            mock_embedding_sketch_data,
+        )
+
+        assert db_interface.fetch_embedding_sketch("nhs_data", "v1") is None
+        mock_execute_query.assert_called_with(
+            SQLQueries.get_embedding_sketch(),
+            {"collection_name": "nhs_data", "data_version": "v1"},
+            fetch=True,
+        )
+        mock_execute_query.return_value = [(memoryview(b"sketch"),)]
+        assert db_interface.fetch_embedding_sketch("nhs_data", "v1") == b"sketch"
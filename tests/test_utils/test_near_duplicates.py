@@ -0,0 +1,40 @@
+"""Test suite for near-duplicate detection."""
+import pytest
+from utils.near_duplicates import NearDuplicateIndex, shingle
+
+HELPLINE = (
+    "If you need urgent help, call 111 or contact the Samaritans on 116 123. "
+    "They are free to call, and open at any time of the day or night."
+)
+
+
+def test_shingle():
+    """Test that texts are shingled into lowercase word n-grams."""
+    assert shingle("One two, THREE four", size=3) == {"one two three", "two three four"}
+    assert shingle("Too short", size=3) == {"too short"}
+
+
+def test_near_duplicate_index():
+    """Test that near-duplicates are matched to the first indexed text and other texts are indexed."""
+    index = NearDuplicateIndex(threshold=0.8)
+
+    assert index.find_or_add("helpline", HELPLINE) is None
+    assert index.find_or_add("copy", HELPLINE.upper()) == "helpline"
+    assert (
+        index.find_or_add("other", "Sleep problems can affect your mental health.")
+        is None
+    )
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize(
+    "parameters", [{"threshold": 0}, {"threshold": 1.5}, {"num_bands": 5}]
+)
+def test_near_duplicate_index_invalid(parameters: dict):
+    """Test that invalid parameters raise a ValueError.
+
+    Args:
+        parameters (dict): Invalid parameters of the index
+    """
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(**parameters)
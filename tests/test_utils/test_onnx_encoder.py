@@ -0,0 +1,172 @@
+"""Test suite for the ONNX Runtime encoder."""
+import os
+from typing import Dict, List
+
+import numpy as np
+import pytest
+import torch
+from utils.onnx_encoder import OnnxEncoder, onnx_model_path
+
+pytest.importorskip("onnx")
+
+
+class TinyTransformer(torch.nn.Module):
+    """Tiny stand-in for the Hugging Face encoder of an Instructor model."""
+
+    def __init__(self):
+        """Constructor for the tiny encoder."""
+        super().__init__()
+        torch.manual_seed(0)
+        self.embedding = torch.nn.Embedding(16, 8)
+        self.linear = torch.nn.Linear(8, 4)
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        return_dict: bool = True,
+    ) -> List[torch.Tensor]:
+        """Compute the token embeddings.
+
+        Args:
+            input_ids (torch.Tensor): Token IDs of shape (batch, sequence)
+            attention_mask (torch.Tensor): Attention mask of shape (batch, sequence)
+            return_dict (bool): Unused, the outputs are always returned as a tuple
+
+        Returns:
+            List[torch.Tensor]: the token embeddings of shape (batch, sequence, 4)
+        """
+        token_embeddings = torch.tanh(self.linear(self.embedding(input_ids)))
+        return [token_embeddings * attention_mask.unsqueeze(-1)]
+
+
+class TinyTransformerModule(torch.nn.Module):
+    """First module of the tiny Instructor model, which holds the transformer as a sentence-transformers model does."""
+
+    def __init__(self):
+        """Constructor for the module."""
+        super().__init__()
+        self.auto_model = TinyTransformer()
+
+
+class MeanPooling(torch.nn.Module):
+    """Pooling module of the tiny Instructor model, which averages the token embeddings under the attention mask."""
+
+    def forward(self, features: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """Pool the token embeddings.
+
+        Args:
+            features (Dict[str, torch.Tensor]): Token embeddings and attention mask
+
+        Returns:
+            Dict[str, torch.Tensor]: the features with the sentence embedding
+        """
+        mask = features["attention_mask"].unsqueeze(-1).float()
+        features["sentence_embedding"] = (features["token_embeddings"] * mask).sum(
+            dim=1
+        ) / mask.sum(dim=1)
+        return features
+
+
+class TinyInstructor(torch.nn.Sequential):
+    """Tiny Instructor model tokenising each character as a token."""
+
+    def __init__(self):
+        """Constructor for the tiny model."""
+        super().__init__(TinyTransformerModule(), MeanPooling())
+
+    def tokenize(self, pairs: List[List[str]]) -> Dict[str, torch.Tensor]:
+        """Tokenise [instruction, text] pairs.
+
+        Args:
+            pairs (List[List[str]]): Pairs of instruction and text
+
+        Returns:
+            Dict[str, torch.Tensor]: padded token IDs, attention mask and number of instruction tokens of each pair
+        """
+        token_ids = [
+            [ord(character) % 15 + 1 for character in instruction + text]
+            for instruction, text in pairs
+        ]
+        length = max(map(len, token_ids))
+        return {
+            "input_ids": torch.tensor(
+                [ids + [0] * (length - len(ids)) for ids in token_ids]
+            ),
+            "attention_mask": torch.tensor(
+                [[1] * len(ids) + [0] * (length - len(ids)) for ids in token_ids]
+            ),
+            "context_masks": torch.tensor(
+                [len(instruction) for instruction, _ in pairs]
+            ),
+        }
+
+    def embed(self, pairs: List[List[str]]) -> np.ndarray:
+        """Embed pairs with PyTorch, leaving the instruction tokens out of the pooled embedding.
+
+        Args:
+            pairs (List[List[str]]): Pairs of instruction and text
+
+        Returns:
+            np.ndarray: the embeddings
+        """
+        features = self.tokenize(pairs)
+        with torch.no_grad():
+            (token_embeddings,) = self[0].auto_model(
+                features["input_ids"], features["attention_mask"]
+            )
+        attention_mask = features["attention_mask"].clone()
+        for i, context_length in enumerate(features["context_masks"].tolist()):
+            attention_mask[i, :context_length] = 0
+        return (
+            self[1](
+                {"token_embeddings": token_embeddings, "attention_mask": attention_mask}
+            )["sentence_embedding"]
+            .numpy()
+            .astype(np.float32)
+        )
+
+
+def test_onnx_encoder_matches_pytorch(directory_for_testing: str):
+    """Test that the exported encoder embeds texts of other lengths and batch sizes as PyTorch does.
+
+    Args:
+        directory_for_testing (str): temporary directory for the ONNX exports
+    """
+    model = TinyInstructor().eval()
+    pairs = [
+        ["Represent: ", "a"],
+        ["Represent: ", "a much longer text than the export example"],
+        ["Query: ", "text"],
+    ]
+
+    encoder = OnnxEncoder(model, "tiny/model", onnx_dir=directory_for_testing)
+
+    assert os.path.exists(onnx_model_path(directory_for_testing, "tiny/model"))
+    np.testing.assert_allclose(encoder.encode(pairs), model.embed(pairs), atol=1e-5)
+
+
+def test_onnx_encoder_quantised(directory_for_testing: str):
+    """Test that the int8 encoder is exported next to the full-precision one and embeds close to PyTorch.
+
+    Args:
+        directory_for_testing (str): temporary directory for the ONNX exports
+    """
+    model = TinyInstructor().eval()
+    pairs = [["Represent: ", "a text"], ["Represent: ", "another text"]]
+
+    encoder = OnnxEncoder(
+        model, "tiny/model", onnx_dir=directory_for_testing, quantise=True
+    )
+
+    assert encoder.path == onnx_model_path(
+        directory_for_testing, "tiny/model", quantise=True
+    )
+    assert os.path.exists(onnx_model_path(directory_for_testing, "tiny/model"))
+    embeddings = encoder.encode(pairs)
+    expected = model.embed(pairs)
+    assert embeddings.shape == expected.shape
+    cosine = (embeddings * expected).sum(axis=1) / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(expected, axis=1)
+    )
+    assert (cosine > 0.9).all()
@@ -0,0 +1,60 @@
+"""Test suite for the sketch store."""
+from unittest import mock
+
+import numpy as np
+import pytest
+from utils.embedding_sketch import EmbeddingSketch
+from utils.sketch_store import SketchStore
+
+
+def test_sketch_store_round_trip():
+    """Test that a sketch is sent to and loaded from the metric service by collection and data version."""
+    sketch = EmbeddingSketch.from_embeddings(np.array([[1.0, 2.0], [3.0, 4.0]]))
+    sketch.projection = "fingerprint"
+    store = SketchStore("http://metric-service")
+
+    with mock.patch("utils.sketch_store.requests.post") as mock_post:
+        mock_post.return_value.json.return_value = {"status_code": 200}
+        store.save_sketch("nhs_data", "v1", sketch)
+
+    assert mock_post.call_args.args == ("http://metric-service/embedding_sketch",)
+    sent = mock_post.call_args.kwargs["json"]
+    assert (sent["collection_name"], sent["data_version"]) == ("nhs_data", "v1")
+
+    with mock.patch("utils.sketch_store.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = {
+            "status_code": 200,
+            "sketch": sent["sketch"],
+        }
+        restored = store.load_sketch("nhs_data", "v1")
+
+    mock_get.assert_called_once_with(
+        "http://metric-service/query_embedding_sketch",
+        params={"collection_name": "nhs_data", "data_version": "v1"},
+        timeout=store.timeout,
+    )
+    assert restored is not None
+    assert (restored.count, restored.projection) == (2, "fingerprint")
+    np.testing.assert_array_equal(restored.mean, [2.0, 3.0])
+
+
+def test_sketch_store_missing_and_rejected_sketches():
+    """Test that a data version without a sketch loads as None, and that a rejected sketch raises."""
+    store = SketchStore("http://metric-service")
+
+    with mock.patch("utils.sketch_store.requests.get") as mock_get:
+        mock_get.return_value.json.return_value = {
+            "status_code": 404,
+            "message": "No sketch",
+        }
+        assert store.load_sketch("nhs_data", "v2") is None
+
+    with mock.patch("utils.sketch_store.requests.post") as mock_post:
+        mock_post.return_value.json.return_value = {
+            "status_code": 400,
+            "message": "Validation error",
+        }
+        with pytest.raises(ValueError):
+            store.save_sketch(
+                "nhs_data", "v1", EmbeddingSketch.from_embeddings(np.ones((2, 2)))
+            )
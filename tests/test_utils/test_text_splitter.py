@@ -1,8 +1,15 @@
 """Test suite to test TextSplitter class and other utility functions."""
-from typing import List
+from typing import Iterator, List
 
 import pytest
-from utils.text_splitter import TextSplitter, join_docs, split_text_with_regex
+from utils.text_splitter import (
+    PENDING_CHUNKS_PER_WORKER,
+    TextSplitter,
+    TokenCounter,
+    join_docs,
+    merge_overlapping_chunks,
+    split_text_with_regex,
+)
 
 newline_string = """dummy text
 is dummy"""
@@ -121,6 +128,7 @@ def test_merge_splits_no_overlap(
         (["dummy text", "\nis dummy"], "\n\n", 12, 4, ["dummy text", "is dummy"]),
         (["dummy text", "\n\nis dummy"], "\n", 12, 4, ["dummy text", "is dummy"]),
         (["dummy text", "\n\nis dummy"], "\n\n", 12, 4, ["dummy text", "is dummy"]),
+        (iter(["ab", "cd", "ef", "gh"]), " ", 7, 3, ["ab cd", "cd ef", "ef gh"]),
     ],
 )
 def test_merge_splits_with_overlap(
@@ -195,3 +203,162 @@ def test_split_text_with_overlap(
         text_splitter.split_text(text, separators=["\n\n", "\n", " ", ""])
         == expected_list
     )
+
+
+class MockTokenizer:
+    """Mock tokenizer which splits texts into words and counts its calls."""
+
+    def __init__(self):
+        """Constructor for the mock tokenizer."""
+        self.n_calls = 0
+
+    def __call__(self, texts: List[str], add_special_tokens: bool = True) -> dict:
+        """Tokenize texts into one token per word.
+
+        Args:
+            texts (List[str]): Texts to tokenize
+            add_special_tokens (bool): Unused. Defaults to True.
+
+        Returns:
+            dict: the token IDs of each text
+        """
+        self.n_calls += 1
+        return {"input_ids": [text.split() for text in texts]}
+
+
+def test_token_counter_caches_counts():
+    """Test that TokenCounter counts tokens in one batch and caches the counts."""
+    tokenizer = MockTokenizer()
+    counter = TokenCounter(tokenizer, cache_size=2)
+
+    assert counter.count_many(["a b", "c", "a b"]) == [2, 1, 2]
+    assert counter("c") == 1
+    assert tokenizer.n_calls == 1
+
+    counter("d e f")
+    assert len(counter._counts) == 2
+
+
+def test_split_text_in_tokens():
+    """Test that chunk sizes are measured with the length function."""
+    text_splitter = TextSplitter(
+        chunk_size=3, chunk_overlap=0, length_function=TokenCounter(MockTokenizer())
+    )
+
+    assert text_splitter.split_text("one two three four five six seven") == [
+        "one two three",
+        "four five six",
+        "seven",
+    ]
+
+
+def test_iter_split_documents():
+    """Test that chunks are yielded lazily, in order, with a copy of the metadata of their document."""
+    text_splitter = TextSplitter(chunk_size=10, chunk_overlap=0)
+    metadatas = [{"source": "a"}, {"source": "b"}]
+
+    chunks = text_splitter.iter_split_documents(
+        iter(["dummy text is dummy", "short"]), iter(metadatas)
+    )
+    assert next(chunks) == ("dummy text", {"source": "a"})
+
+    remaining = list(chunks)
+    assert remaining == [("is dummy", {"source": "a"}), ("short", {"source": "b"})]
+    assert remaining[0][1] is not metadatas[0]
+
+
+def test_iter_split_documents_in_parallel():
+    """Test that splitting documents in worker processes yields the same chunks in the same order."""
+    text_splitter = TextSplitter(chunk_size=10, chunk_overlap=2)
+    texts = [f"document {i} " * (i + 1) for i in range(20)]
+    metadatas = [{"source": str(i)} for i in range(20)]
+
+    serial = list(text_splitter.iter_split_documents(texts, metadatas))
+    parallel = list(
+        text_splitter.iter_split_documents(texts, metadatas, n_workers=2, chunksize=3)
+    )
+
+    assert parallel == serial
+
+
+def test_iter_split_documents_reads_documents_lazily():
+    """Test that parallel splitting only reads a window of documents ahead of the chunks it yields."""
+    text_splitter = TextSplitter(chunk_size=10, chunk_overlap=0)
+    n_read = 0
+
+    def texts() -> Iterator[str]:
+        nonlocal n_read
+        for i in range(100):
+            n_read += 1
+            yield f"doc {i}"
+
+    chunks = text_splitter.iter_split_documents(texts(), n_workers=2, chunksize=3)
+
+    assert next(chunks) == ("doc 0", {})
+    assert n_read == 2 * PENDING_CHUNKS_PER_WORKER * 3
+    assert len(list(chunks)) == 99
+
+
+def test_iter_split_documents_invalid_workers():
+    """Test that a number of workers less than 1 raises a ValueError."""
+    text_splitter = TextSplitter(chunk_size=10, chunk_overlap=0)
+
+    with pytest.raises(ValueError):
+        list(text_splitter.iter_split_documents(["text"], n_workers=0))
+
+
+def test_split_spans():
+    """Test that the span of each chunk selects the chunk from the source text."""
+    text = "dummy text\n\nis dummy text is dummy"
+    text_splitter = TextSplitter(chunk_size=12, chunk_overlap=6)
+
+    chunks = text_splitter.split_text(text)
+    spans = text_splitter.split_spans(text)
+
+    assert [text[start:end] for start, end in spans] == chunks
+    assert [start for start, _ in spans] == sorted(start for start, _ in spans)
+
+
+def test_split_spans_of_repeated_chunks():
+    """Test that identical chunks each get the span of their own occurrence."""
+    text = "same same\n\nsame same\n\nother same"
+    text_splitter = TextSplitter(chunk_size=5, chunk_overlap=0)
+
+    spans = text_splitter.split_spans(text)
+
+    assert spans == [(0, 4), (5, 9), (11, 15), (16, 20), (22, 26), (26, 27), (28, 32)]
+    assert [text[start:end] for start, end in spans] == text_splitter.split_text(text)
+
+
+def test_iter_split_documents_with_spans():
+    """Test that spans are added to the metadata of each chunk when requested."""
+    text_splitter = TextSplitter(chunk_size=10, chunk_overlap=0)
+
+    chunks = list(
+        text_splitter.iter_split_documents(
+            ["dummy text is dummy"], [{"source": "a"}], add_spans=True
+        )
+    )
+
+    assert chunks == [
+        ("dummy text", {"source": "a", "start_index": 0, "end_index": 10}),
+        ("is dummy", {"source": "a", "start_index": 11, "end_index": 19}),
+    ]
+
+
+def test_merge_overlapping_chunks():
+    """Test that overlapping chunks of the same source are merged and other chunks are kept in rank order."""
+    text = "one two three four five"
+    chunks = ["three four", "one two three", "unspanned", "three four five"]
+    metadatas = [
+        {"source": "a", "start_index": 8, "end_index": 18},
+        {"source": "a", "start_index": 0, "end_index": 13},
+        None,
+        {"source": "b", "start_index": 8, "end_index": 23},
+    ]
+
+    assert merge_overlapping_chunks(chunks, metadatas) == [
+        text[:18],
+        "unspanned",
+        "three four five",
+    ]
@@ -1,23 +1,48 @@
 """ChromaDB vector store class."""
+import hashlib
 import ipaddress
-from dataclasses import dataclass
-from typing import Any, List, Optional, Tuple
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import chromadb
+import numpy as np
+import numpy.typing as npt
 from chromadb.api.models.Collection import Collection
 from chromadb.api.types import (
     CollectionMetadata,
     EmbeddingFunction,
+    Embeddings,
+    GetResult,
+    Include,
     Metadata,
     OneOrMany,
     QueryResult,
     Where,
+    maybe_cast_one_to_many,
 )
 from chromadb.errors import InvalidDimensionException
 
+from utils.collection_snapshot import SnapshotBatch, read_snapshot, write_snapshot
+from utils.embedding_projection import EmbeddingProjection
+
+logger = logging.getLogger(__name__)
+
 MIN_COLLECTION_NAME_LENGTH = 3
 MAX_COLLECTION_NAME_LENGTH = 64
 DEFAULT_N_RESULTS = 5
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_RETAINED_VERSIONS = 2
+# Collection holding one record per alias which points to the active physical collection
+ALIAS_COLLECTION_NAME = "collection-aliases"
+# Collection holding one record per physical collection whose embeddings are projected, see `EmbeddingProjection`
+PROJECTION_COLLECTION_NAME = "collection-projections"
+# Seconds the physical collection a query resolved a collection name to is reused for, so an alias swap is seen by queries within this delay
+QUERY_RESOLUTION_TTL = 30.0
+HNSW_SPACES = ("l2", "ip", "cosine")
 
 
 @dataclass
@@ -28,6 +53,77 @@ class CollectionNameValidationOutcome:
     err_msg: str
 
 
+@dataclass(frozen=True)
+class HNSWConfig:
+    """Dataclass for the HNSW index parameters of a collection.
+
+    The defaults are Chroma's defaults. The parameters are fixed when a collection is created.
+
+    Attributes:
+        space (str): Distance function of the index, one of "l2", "ip" or "cosine"
+        M (int): Maximum number of neighbours of each node in the graph, higher values improve recall and use more memory
+        construction_ef (int): Size of the candidate list while building the index, higher values improve recall and slow down inserts
+        search_ef (int): Size of the candidate list while querying, higher values improve recall and slow down queries
+    """
+
+    space: str = "l2"
+    M: int = 16
+    construction_ef: int = 100
+    search_ef: int = 10
+
+    def __post_init__(self) -> None:
+        """Validate the index parameters.
+
+        Raises:
+            ValueError: if the space is not supported or a parameter is less than 1
+        """
+        if self.space not in HNSW_SPACES:
+            raise ValueError(
+                f"{self.space} is not supported. The list of supported spaces is {HNSW_SPACES}"
+            )
+        for name in ("M", "construction_ef", "search_ef"):
+            if getattr(self, name) < 1:
+                raise ValueError(
+                    f"{name} must be at least 1, got {getattr(self, name)}"
+                )
+
+    def to_metadata(self) -> Dict[str, Union[str, int]]:
+        """Convert the index parameters to the collection metadata understood by Chroma.
+
+        Returns:
+            Dict[str, Union[str, int]]: the "hnsw:" prefixed collection metadata
+        """
+        return {
+            "hnsw:space": self.space,
+            "hnsw:M": self.M,
+            "hnsw:construction_ef": self.construction_ef,
+            "hnsw:search_ef": self.search_ef,
+        }
+
+
+@dataclass
+class MultiCollectionQueryResult:
+    """Dataclass for the results of querying several collections at once.
+
+    Attributes:
+        results (Dict[str, QueryResult]): Query results keyed by collection name
+        embedding_seconds (float): Time spent embedding the query texts
+        collection_seconds (Dict[str, float]): Time spent querying each collection
+        total_seconds (float): Wall-clock time of the whole query
+        query_embeddings (Optional[Embeddings]): Embeddings of the query texts computed by the embedding model, before any projection
+        collection_query_embeddings (Dict[str, Embeddings]): Query embeddings each collection was queried with, projected like its embeddings
+        data_versions (Dict[str, Optional[str]]): Data version each alias resolved to, None for a collection which is not an alias
+    """
+
+    results: Dict[str, QueryResult]
+    embedding_seconds: float
+    collection_seconds: Dict[str, float]
+    total_seconds: float
+    query_embeddings: Optional[Embeddings] = None
+    collection_query_embeddings: Dict[str, Embeddings] = field(default_factory=dict)
+    data_versions: Dict[str, Optional[str]] = field(default_factory=dict)
+
+
 class ChromaStore:
     """ChromaStore class for ChromaDB vector store."""
 
@@ -35,17 +131,27 @@ class ChromaStore:
         self,
         chroma_server_hostname: str = "chroma-service.default",
         chroma_server_port: str = "8000",
+        persist_directory: Optional[str] = None,
     ) -> None:
-        """Initialise chroma client by connecting it to chroma server.
+        """Initialise chroma client by connecting it to chroma server, or by opening an embedded database.
 
         Args:
             chroma_server_hostname (str, optional): Hostname for chroma server. Defaults to "chroma-service.default".
             chroma_server_port (str, optional): Port for chroma server. Defaults to 8000.
+            persist_directory (Optional[str], optional): Directory of an embedded, persistent Chroma database which runs in this process.
+                If given, the chroma server is not used. Defaults to None.
         """
-        self._client = chromadb.HttpClient(
-            host=chroma_server_hostname, port=chroma_server_port
-        )
+        if persist_directory is not None:
+            self._client = chromadb.PersistentClient(path=persist_directory)
+        else:
+            self._client = chromadb.HttpClient(
+                host=chroma_server_hostname, port=chroma_server_port
+            )
         self._collection: Optional[Collection] = None
+        # The projection of a physical collection is saved before its first embedding and never changes, so it is only fetched once
+        self._projections: Dict[str, Optional[EmbeddingProjection]] = {}
+        # Time of resolution, physical name and collection of each collection name queried, see `_resolve_query_collection`
+        self._query_collections: Dict[str, Tuple[float, str, Collection]] = {}
 
     def validate_collection_name(
         self, collection_name: str
@@ -95,13 +201,16 @@ class ChromaStore:
         collection_name: str,
         embedding_function: Optional[EmbeddingFunction] = None,
         metadata: Optional[CollectionMetadata] = None,
+        hnsw_config: Optional[HNSWConfig] = None,
     ) -> Collection:
         """Function to create or get a collection.
 
         Args:
             collection_name (str): Name of collection
             embedding_function (Optional[EmbeddingFunction], optional): Embedding function to use. Defaults to None.
-            metadata (Optional[CollectionMetadata], optional): Additional metadata for collection. Defaults to None.
+            metadata (Optional[CollectionMetadata], optional): Additional metadata for collection, used if the collection is created. Defaults to None.
+            hnsw_config (Optional[HNSWConfig], optional): Index parameters used if the collection is created, a warning is logged if an existing
+                collection has other ones. Defaults to None, which uses Chroma's defaults.
 
         Returns:
             Collection: a collection retrieved or created
@@ -115,10 +224,51 @@ class ChromaStore:
 
         # If you supply an embedding function, you must supply it every time you get the collection.
         # By default, all-MiniLM-L6-v2 model is as embedding function
-        return self._client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=embedding_function,
-            metadata=metadata,
+        try:
+            collection = self._client.get_collection(
+                name=collection_name, embedding_function=embedding_function
+            )
+        except ValueError:
+            if hnsw_config is not None:
+                metadata = {**(metadata or {}), **hnsw_config.to_metadata()}
+            # Chroma replaces the metadata of an existing collection with the metadata given here, so it is only given on creation
+            return self._client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=embedding_function,
+                metadata=metadata,
+            )
+
+        if hnsw_config is not None:
+            # Parameters which were not given on creation have Chroma's defaults
+            existing_config = {
+                **HNSWConfig().to_metadata(),
+                **{
+                    key: value
+                    for key, value in (collection.metadata or {}).items()
+                    if key.startswith("hnsw:")
+                },
+            }
+            if existing_config != hnsw_config.to_metadata():
+                logger.warning(
+                    f"{collection_name} already exists with index parameters {existing_config}, which cannot be changed to {hnsw_config.to_metadata()}"
+                )
+        return collection
+
+    def create_collection(
+        self,
+        collection_name: str,
+        embedding_function: Optional[EmbeddingFunction] = None,
+        hnsw_config: Optional[HNSWConfig] = None,
+    ) -> None:
+        """Create a collection with the given index parameters, if it does not exist yet.
+
+        Args:
+            collection_name (str): Name of collection
+            embedding_function (Optional[EmbeddingFunction], optional): Embedding function to use. Defaults to None.
+            hnsw_config (Optional[HNSWConfig], optional): Index parameters of the collection. Defaults to None, which uses Chroma's defaults.
+        """
+        self._collection = self._get_or_create_collection(
+            collection_name, embedding_function, hnsw_config=hnsw_config
         )
 
     def list_collection_names(self) -> List[str]:
@@ -132,10 +282,399 @@ class ChromaStore:
             return []
         return [collection.name for collection in collections]
 
+    def versioned_collection_name(self, alias: str, data_version: str) -> str:
+        """Name of the physical collection holding a data version of a logical collection.
+
+        Args:
+            alias (str): Name of the logical collection, e.g. "mind_data"
+            data_version (str): Data version, e.g. "data/second_version"
+
+        Returns:
+            str: a valid collection name derived from the alias and the data version
+        """
+        slug = re.sub(r"[^a-z0-9]+", "-", data_version.lower()).strip("-")
+        name = f"{alias}-{slug}"
+        if not self.validate_collection_name(name).is_valid:
+            # Fall back to a hash if the version does not make a valid name, e.g. because it is too long
+            name = f"{alias}-{hashlib.sha256(data_version.encode('utf-8')).hexdigest()[:12]}"
+        return name
+
+    def create_versioned_collection(
+        self,
+        alias: str,
+        data_version: str,
+        embedding_function: Optional[EmbeddingFunction] = None,
+        hnsw_config: Optional[HNSWConfig] = None,
+    ) -> str:
+        """Create the physical collection for a data version of a logical collection.
+
+        The collection is not visible through the alias until `swap_alias` is called.
+
+        Args:
+            alias (str): Name of the logical collection
+            data_version (str): Data version stored in the collection
+            embedding_function (Optional[EmbeddingFunction], optional): Embedding function to use. Defaults to None.
+            hnsw_config (Optional[HNSWConfig], optional): Index parameters of the collection. Defaults to None, which uses Chroma's defaults.
+
+        Returns:
+            str: name of the physical collection
+        """
+        collection_name = self.versioned_collection_name(alias, data_version)
+        self._collection = self._get_or_create_collection(
+            collection_name,
+            embedding_function,
+            metadata={
+                "alias": alias,
+                "data_version": data_version,
+                "created_at": time.time(),
+            },
+            hnsw_config=hnsw_config,
+        )
+        return collection_name
+
+    def _get_alias_collection(self) -> Collection:
+        """Get or create the collection which stores the aliases.
+
+        Returns:
+            Collection: the alias collection
+        """
+        return self._client.get_or_create_collection(name=ALIAS_COLLECTION_NAME)
+
+    def resolve_alias(self, alias: str) -> str:
+        """Resolve a logical collection name to the physical collection it points to.
+
+        Args:
+            alias (str): Name of the logical collection
+
+        Returns:
+            str: name of the active physical collection, or `alias` itself if it is not an alias
+        """
+        return self._resolve_alias(alias, self.list_collection_names())
+
+    def _resolve_alias(self, alias: str, collection_names: List[str]) -> str:
+        """Resolve a logical collection name to the physical collection it points to, given the names of the existing collections.
+
+        Args:
+            alias (str): Name of the logical collection
+            collection_names (List[str]): Names of all the collections
+
+        Returns:
+            str: name of the active physical collection, or `alias` itself if it is not an alias
+        """
+        # A missing collection raises ValueError locally but a bare Exception over HTTP, so check it exists first
+        if ALIAS_COLLECTION_NAME not in collection_names:
+            # No alias has been created yet
+            return alias
+
+        records = self._client.get_collection(ALIAS_COLLECTION_NAME).get(
+            ids=[alias], include=["metadatas"]
+        )
+        if not records["ids"]:
+            return alias
+        return str(records["metadatas"][0]["collection"])
+
+    def swap_alias(self, alias: str, collection_name: str) -> None:
+        """Point an alias to a physical collection.
+
+        The alias is a single record which is replaced in one write, so readers see either the old or the new collection.
+
+        Args:
+            alias (str): Name of the logical collection
+            collection_name (str): Name of the physical collection to activate
+
+        Raises:
+            ValueError: if `collection_name` is not present in Chroma server
+        """
+        if collection_name not in self.list_collection_names():
+            raise ValueError(f"Collection name {collection_name} not found")
+
+        self._get_alias_collection().upsert(
+            ids=[alias],
+            embeddings=[[0.0]],
+            documents=[collection_name],
+            metadatas=[{"collection": collection_name, "updated_at": time.time()}],
+        )
+        self._query_collections.pop(alias, None)
+
+    def save_projection(
+        self, collection_name: str, projection: EmbeddingProjection
+    ) -> None:
+        """Store the projection of the embeddings of a physical collection, which is then applied to the queries of the collection.
+
+        Args:
+            collection_name (str): Name of the physical collection
+            projection (EmbeddingProjection): Projection of its embeddings
+        """
+        self._client.get_or_create_collection(name=PROJECTION_COLLECTION_NAME).upsert(
+            ids=[collection_name],
+            embeddings=[[0.0]],
+            documents=[projection.to_string()],
+            metadatas=[
+                {
+                    "method": projection.method,
+                    "input_dimension": projection.input_dimension,
+                    "output_dimension": projection.output_dimension,
+                }
+            ],
+        )
+        self._projections[collection_name] = projection
+
+    def load_projection(self, collection_name: str) -> Optional[EmbeddingProjection]:
+        """Load the projection of the embeddings of a collection.
+
+        Args:
+            collection_name (str): Name of the collection or alias
+
+        Returns:
+            Optional[EmbeddingProjection]: the projection, None if the embeddings of the collection are not projected
+        """
+        return self._load_physical_projection(self.resolve_alias(collection_name))
+
+    def _load_physical_projection(
+        self, collection_name: str
+    ) -> Optional[EmbeddingProjection]:
+        """Load the projection of a physical collection, caching it once it can no longer change.
+
+        Args:
+            collection_name (str): Name of the physical collection
+
+        Returns:
+            Optional[EmbeddingProjection]: the projection, None if the embeddings of the collection are not projected
+        """
+        if collection_name in self._projections:
+            return self._projections[collection_name]
+
+        projection = None
+        collection_names = self.list_collection_names()
+        if PROJECTION_COLLECTION_NAME in collection_names:
+            records = self._client.get_collection(PROJECTION_COLLECTION_NAME).get(
+                ids=[collection_name], include=["documents"]
+            )
+            if records["ids"]:
+                projection = EmbeddingProjection.from_string(records["documents"][0])
+
+        # An empty collection may still be given a projection by the upload which fills it
+        if projection is not None or (
+            collection_name in collection_names
+            and self._client.get_collection(collection_name).count() > 0
+        ):
+            self._projections[collection_name] = projection
+        return projection
+
+    def _delete_projection(self, collection_name: str) -> None:
+        """Delete the projection of a deleted physical collection, if it has one.
+
+        Args:
+            collection_name (str): Name of the physical collection
+        """
+        self._projections.pop(collection_name, None)
+        if PROJECTION_COLLECTION_NAME in self.list_collection_names():
+            self._client.get_collection(PROJECTION_COLLECTION_NAME).delete(
+                ids=[collection_name]
+            )
+
+    def _forget_collection(self, collection_name: str) -> None:
+        """Delete the projection of a deleted physical collection and stop queries from resolving to it.
+
+        Args:
+            collection_name (str): Name of the physical collection
+        """
+        self._delete_projection(collection_name)
+        self._query_collections = {
+            name: resolution
+            for name, resolution in self._query_collections.items()
+            if resolution[1] != collection_name
+        }
+
+    def _project_queries(
+        self, collection_name: str, query_embeddings: Embeddings
+    ) -> Embeddings:
+        """Apply the projection of a collection to query embeddings, so that they are comparable with the embeddings of the collection.
+
+        Args:
+            collection_name (str): Name of the physical collection
+            query_embeddings (Embeddings): Embeddings of the queries, computed by the embedding model
+
+        Returns:
+            Embeddings: the projected query embeddings, or the query embeddings if the collection is not projected
+        """
+        projection = self._load_physical_projection(collection_name)
+        if projection is None:
+            return query_embeddings
+        return projection.apply(np.asarray(query_embeddings, dtype=np.float32)).tolist()
+
+    def project_queries(
+        self, collection_name: str, query_embeddings: Embeddings
+    ) -> Embeddings:
+        """Apply the projection of a collection or alias to query embeddings, as is done when the collection is queried.
+
+        Args:
+            collection_name (str): Name of the collection or alias
+            query_embeddings (Embeddings): Embeddings of the queries, computed by the embedding model
+
+        Returns:
+            Embeddings: the projected query embeddings, or the query embeddings if the collection is not projected
+        """
+        return self._project_queries(
+            self.resolve_alias(collection_name), query_embeddings
+        )
+
+    def active_data_version(self, alias: str) -> Optional[str]:
+        """Data version of the physical collection an alias points to.
+
+        Args:
+            alias (str): Name of the logical collection
+
+        Returns:
+            Optional[str]: the data version, None if `alias` is not an alias of a versioned collection
+        """
+        collection_name = self.resolve_alias(alias)
+        if collection_name == alias:
+            return None
+        metadata = self._client.get_collection(collection_name).metadata or {}
+        data_version = metadata.get("data_version")
+        return str(data_version) if data_version is not None else None
+
+    def list_versioned_collections(self, alias: str) -> List[Tuple[str, str]]:
+        """List the physical collections of a logical collection, oldest first.
+
+        Args:
+            alias (str): Name of the logical collection
+
+        Returns:
+            List[Tuple[str, str]]: pairs of collection name and data version
+        """
+        versions = [
+            (
+                collection.metadata["created_at"],
+                collection.name,
+                collection.metadata["data_version"],
+            )
+            for collection in self._client.list_collections()
+            if collection.metadata and collection.metadata.get("alias") == alias
+        ]
+        return [(name, data_version) for _, name, data_version in sorted(versions)]
+
+    def garbage_collect_versions(
+        self, alias: str, retain: int = DEFAULT_RETAINED_VERSIONS
+    ) -> List[str]:
+        """Delete all but the `retain` most recent physical collections of a logical collection.
+
+        The collection the alias points to is never deleted.
+
+        Args:
+            alias (str): Name of the logical collection
+            retain (int, optional): Number of most recent data versions to keep. Defaults to DEFAULT_RETAINED_VERSIONS.
+
+        Returns:
+            List[str]: names of the deleted collections
+
+        Raises:
+            ValueError: if `retain` is less than 1
+        """
+        if retain < 1:
+            raise ValueError(f"At least one version must be retained, got {retain}")
+
+        active = self.resolve_alias(alias)
+        names = [name for name, _ in self.list_versioned_collections(alias)]
+        expired = [name for name in names[:-retain] if name != active]
+        for name in expired:
+            self._client.delete_collection(name)
+            self._forget_collection(name)
+        return expired
+
+    def migrate_legacy_collection(
+        self, alias: str, data_version: str, page_size: int = DEFAULT_PAGE_SIZE
+    ) -> Optional[str]:
+        """Copy a data version of a collection which was uploaded before versioned collections into its own versioned collection.
+
+        The first versioned upload turns the name of such a collection into an alias, after which its data versions can only be found
+        by `collection_for_data_version` once they are copied. Nothing is copied if the alias already exists.
+
+        Args:
+            alias (str): Name of the collection which is not versioned, and of the alias of its versioned collections
+            data_version (str): Data version to copy, found by the "data_version" metadata of the documents
+            page_size (int, optional): Number of documents copied at once. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            Optional[str]: name of the versioned collection, None if there is no collection to migrate or no document of the data version
+        """
+        collection_names = self.list_collection_names()
+        versioned_name = self.versioned_collection_name(alias, data_version)
+        if (
+            alias not in collection_names
+            or versioned_name in collection_names
+            or self.resolve_alias(alias) != alias
+        ):
+            return None
+
+        target = self._get_or_create_collection(
+            versioned_name,
+            metadata={
+                **(self._client.get_collection(alias).metadata or {}),
+                "alias": alias,
+                "data_version": data_version,
+                "created_at": time.time(),
+            },
+        )
+        projection = self._load_physical_projection(alias)
+        if projection is not None:
+            self.save_projection(versioned_name, projection)
+        if not self._copy_documents(
+            alias, target, {"data_version": data_version}, page_size
+        ):
+            self.delete_collection(versioned_name)
+            return None
+        return versioned_name
+
+    def collection_for_data_version(
+        self, collection_name: str, data_version: str
+    ) -> str:
+        """Find the physical collection which stores a data version of a collection.
+
+        Args:
+            collection_name (str): Name of the logical collection
+            data_version (str): Data version to find
+
+        Returns:
+            str: the versioned collection if it exists, otherwise `collection_name`, in which data versions are told apart by their "data_version" metadata.
+        """
+        versioned_name = self.versioned_collection_name(collection_name, data_version)
+        if versioned_name in self.list_collection_names():
+            return versioned_name
+        return collection_name
+
+    def _resolve_query_collection(self, collection_name: str) -> Tuple[str, Collection]:
+        """Resolve a collection or alias to the physical collection it queries, without creating it.
+
+        The resolution is reused for QUERY_RESOLUTION_TTL seconds, so repeated queries do not look up the alias and the collection again.
+
+        Args:
+            collection_name (str): Name of the collection or alias
+
+        Returns:
+            Tuple[str, Collection]: the name of the physical collection and the collection
+
+        Raises:
+            ValueError: if the collection does not exist
+        """
+        now = time.monotonic()
+        cached = self._query_collections.get(collection_name)
+        if cached is not None and now - cached[0] < QUERY_RESOLUTION_TTL:
+            return cached[1], cached[2]
+
+        collection_names = self.list_collection_names()
+        physical_name = self._resolve_alias(collection_name, collection_names)
+        if physical_name not in collection_names:
+            raise ValueError(f"Collection name {collection_name} not found")
+        collection = self._client.get_collection(physical_name, embedding_function=None)
+        self._query_collections[collection_name] = (now, physical_name, collection)
+        return physical_name, collection
+
     def query_collection(
         self,
         collection_name: str,
-        query_texts: Optional[List[str]] = None,
+        query_texts: Optional[OneOrMany[str]] = None,
         n_results: int = DEFAULT_N_RESULTS,
         where: Optional[Where] = None,
         embedding_function: Optional[EmbeddingFunction] = None,
@@ -145,7 +684,7 @@ class ChromaStore:
 
         Args:
             collection_name (str): Name of the collection
-            query_texts (Optional[List[str]], optional): List of query texts. Defaults to None.
+            query_texts (Optional[OneOrMany[str]], optional): Query text or list of query texts. Defaults to None.
             n_results (int, optional): Number of closest matches to return. Defaults to DEFAULT_N_RESULTS.
             where (Optional[Where], optional): Additional filtering using where. Defaults to None.
             embedding_function (Optional[EmbeddingFunction], optional):  Embedding function to use. Defaults to None.
@@ -155,17 +694,29 @@ class ChromaStore:
             QueryResult: a QueryResult object containing the results.
 
         Raises:
-            InvalidDimensionException: If the dimension of the embedding function does not match the dimension of the collection
+            ValueError: If the collection does not exist, if query texts are given without an embedding function,
+                or if the dimension of the embedding function does not match the dimension of the collection
         """
-        self._collection = self._get_or_create_collection(
-            collection_name, embedding_function
-        )
+        # Query the active data version if the collection name is an alias
+        physical_name, collection = self._resolve_query_collection(collection_name)
+        self._collection = collection
+
+        # Queries are embedded here rather than by Chroma, as the embeddings of a projected collection are compared with projected queries
+        if query_texts is not None:
+            if embedding_function is None:
+                raise ValueError(
+                    f"An embedding function is needed to query {collection_name} with texts"
+                )
+            kwargs["query_embeddings"] = embedding_function(
+                maybe_cast_one_to_many(query_texts)
+            )
+        if kwargs.get("query_embeddings") is not None:
+            kwargs["query_embeddings"] = self._project_queries(
+                physical_name, kwargs["query_embeddings"]
+            )
 
-        # Chroma will embed each query_text with the collection's embedding function
-        # and then query using generated embeddings
         try:
-            return self._collection.query(
-                query_texts=query_texts,
+            return collection.query(
                 n_results=n_results,
                 where=where,
                 **kwargs,
@@ -175,6 +726,123 @@ class ChromaStore:
                 "Invalid dimension. Please check if the embedding function matches to the collection's embedding function"
             )
 
+    def _query_with_embeddings(
+        self,
+        collection_name: str,
+        query_embeddings: Embeddings,
+        n_results: int,
+        where: Optional[Where],
+        **kwargs: Any,
+    ) -> Tuple[QueryResult, float, Embeddings, Optional[str]]:
+        """Query a single collection with precomputed query embeddings and time the query.
+
+        Args:
+            collection_name (str): Name of the collection or alias
+            query_embeddings (Embeddings): Embeddings of the queries
+            n_results (int): Number of closest matches to return
+            where (Optional[Where]): Additional filtering using where
+            **kwargs (Dict): Additional keyword arguments
+
+        Returns:
+            Tuple[QueryResult, float, Embeddings, Optional[str]]: the query result, the time taken in seconds, the projected query embeddings
+                and the data version the alias resolved to, None if `collection_name` is not an alias
+
+        Raises:
+            ValueError: If the collection does not exist, or if the dimension of the query embeddings does not match the dimension of the collection
+        """
+        start = time.perf_counter()
+        # Use a local collection rather than self._collection, as this runs in several threads at once
+        physical_name, collection = self._resolve_query_collection(collection_name)
+        query_embeddings = self._project_queries(physical_name, query_embeddings)
+        try:
+            result = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                **kwargs,
+            )
+        except InvalidDimensionException:
+            raise ValueError(
+                f"Invalid dimension. Please check if the embedding function matches to the embedding function of {collection_name}"
+            )
+        data_version = None
+        if physical_name != collection_name:
+            data_version = (collection.metadata or {}).get("data_version")
+        return (
+            result,
+            time.perf_counter() - start,
+            query_embeddings,
+            str(data_version) if data_version is not None else None,
+        )
+
+    def query_many(
+        self,
+        collection_names: List[str],
+        query_texts: List[str],
+        embedding_function: EmbeddingFunction,
+        n_results: int = DEFAULT_N_RESULTS,
+        where: Optional[Where] = None,
+        max_workers: Optional[int] = None,
+        **kwargs: Any,
+    ) -> MultiCollectionQueryResult:
+        """Query several collections with several queries at once.
+
+        The query texts are embedded once and the collections are queried concurrently over the same client,
+        so adding a collection adds little latency.
+
+        Args:
+            collection_names (List[str]): Names of the collections or aliases to query
+            query_texts (List[str]): List of query texts
+            embedding_function (EmbeddingFunction): Embedding function used to embed the query texts
+            n_results (int, optional): Number of closest matches to return for each query. Defaults to DEFAULT_N_RESULTS.
+            where (Optional[Where], optional): Additional filtering using where, applied to every collection. Defaults to None.
+            max_workers (Optional[int], optional): Maximum number of collections queried at once. Defaults to None, which queries all collections at once.
+            **kwargs (Dict): Additional keyword arguments
+
+        Returns:
+            MultiCollectionQueryResult: the query results keyed by collection name, and the timings of the query
+        """
+        start = time.perf_counter()
+        query_embeddings = embedding_function(query_texts)
+        embedding_seconds = time.perf_counter() - start
+
+        results: Dict[str, QueryResult] = {}
+        collection_seconds: Dict[str, float] = {}
+        collection_query_embeddings: Dict[str, Embeddings] = {}
+        data_versions: Dict[str, Optional[str]] = {}
+        if collection_names:
+            with ThreadPoolExecutor(
+                max_workers=max_workers or len(collection_names)
+            ) as executor:
+                futures = {
+                    collection_name: executor.submit(
+                        self._query_with_embeddings,
+                        collection_name,
+                        query_embeddings,
+                        n_results,
+                        where,
+                        **kwargs,
+                    )
+                    for collection_name in collection_names
+                }
+                for collection_name, future in futures.items():
+                    (
+                        results[collection_name],
+                        collection_seconds[collection_name],
+                        collection_query_embeddings[collection_name],
+                        data_versions[collection_name],
+                    ) = future.result()
+
+        return MultiCollectionQueryResult(
+            results=results,
+            embedding_seconds=embedding_seconds,
+            collection_seconds=collection_seconds,
+            total_seconds=time.perf_counter() - start,
+            query_embeddings=query_embeddings,
+            collection_query_embeddings=collection_query_embeddings,
+            data_versions=data_versions,
+        )
+
     def add_texts(
         self,
         collection_name: str,
@@ -182,6 +850,7 @@ class ChromaStore:
         ids: List[str],
         metadatas: Optional[OneOrMany[Metadata]] = None,
         embedding_function: Optional[EmbeddingFunction] = None,
+        embeddings: Optional[Embeddings] = None,
     ) -> None:
         """Add documents to collection.
 
@@ -191,13 +860,109 @@ class ChromaStore:
             ids (List[str]): List of IDs for texts.
             metadatas (Optional[OneOrMany[Metadata]], optional): Optional list of metadatas for documents. Defaults to None.
             embedding_function (Optional[EmbeddingFunction], optional): Embedding function to be used by collection. Defaults to None.
+            embeddings (Optional[Embeddings], optional): Precomputed embeddings for texts. Defaults to None, in which case the collection's embedding function is used.
         """
         self._collection = self._get_or_create_collection(
             collection_name, embedding_function
         )
 
-        # Automatically tokenize and embed them with the collection's embedding function
-        self._collection.upsert(documents=texts, ids=ids, metadatas=metadatas)
+        # If no embeddings are given, automatically tokenize and embed them with the collection's embedding function
+        self._collection.upsert(
+            documents=texts, ids=ids, metadatas=metadatas, embeddings=embeddings
+        )
+
+    def get_ids(self, collection_name: str, where: Optional[Where] = None) -> List[str]:
+        """Fetch the IDs of all documents in a collection, without their embeddings.
+
+        Args:
+            collection_name (str): Name of collection
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+
+        Returns:
+            List[str]: IDs of the documents in the collection
+        """
+        self._collection = self._get_or_create_collection(collection_name)
+        ids: List[str] = self._collection.get(where=where, include=[])["ids"]
+        return ids
+
+    def group_ids_by_metadata(
+        self,
+        collection_name: str,
+        key: str,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Dict[str, List[str]]:
+        """Fetch the IDs of the documents of a collection grouped by a metadata field, without their embeddings.
+
+        Args:
+            collection_name (str): Name of collection
+            key (str): Metadata field to group by, e.g. "source"
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+            page_size (int, optional): Number of documents fetched per request. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            Dict[str, List[str]]: IDs of the documents keyed by the value of the field, an empty string for documents without it
+        """
+        groups: Dict[str, List[str]] = {}
+        for page in self._iter_get(collection_name, ["metadatas"], where, page_size):
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                groups.setdefault(str((metadata or {}).get(key, "")), []).append(
+                    chunk_id
+                )
+        return groups
+
+    def update_metadatas(
+        self,
+        collection_name: str,
+        ids: List[str],
+        metadatas: OneOrMany[Metadata],
+    ) -> None:
+        """Replace the metadata of existing documents without re-embedding them.
+
+        Args:
+            collection_name (str): Name of collection
+            ids (List[str]): IDs of the documents to update
+            metadatas (OneOrMany[Metadata]): New metadatas for the documents
+        """
+        self._collection = self._get_or_create_collection(collection_name)
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete_ids(self, collection_name: str, ids: List[str]) -> None:
+        """Delete documents from a collection.
+
+        Args:
+            collection_name (str): Name of collection
+            ids (List[str]): IDs of the documents to delete
+        """
+        self._collection = self._get_or_create_collection(collection_name)
+        self._collection.delete(ids=ids)
+
+    def fetch_embeddings_by_ids(
+        self, collection_name: str, ids: List[str]
+    ) -> npt.NDArray[np.float32]:
+        """Fetch the embeddings of documents, in the order of the given IDs.
+
+        Args:
+            collection_name (str): Name of collection
+            ids (List[str]): IDs of documents which exist in the collection
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (len(ids), dimension)
+
+        Raises:
+            ValueError: if any of the IDs is not in the collection
+        """
+        records = self._client.get_collection(collection_name).get(
+            ids=ids, include=["embeddings"]
+        )
+        # Chroma does not return the documents in the order of the requested IDs
+        position = {chunk_id: i for i, chunk_id in enumerate(records["ids"])}
+        missing = [chunk_id for chunk_id in ids if chunk_id not in position]
+        if missing:
+            raise ValueError(f"IDs {missing} not found in {collection_name}")
+
+        embeddings = np.asarray(records["embeddings"], dtype=np.float32)
+        return embeddings[[position[chunk_id] for chunk_id in ids]]
 
     def delete_collection(self, collection_name: str) -> None:
         """Delete a collection from Chroma database.
@@ -211,33 +976,306 @@ class ChromaStore:
         if collection_name not in self.list_collection_names():
             raise ValueError(f"Collection name {collection_name} not found")
         self._client.delete_collection(collection_name)
+        self._forget_collection(collection_name)
 
     def fetch_reference_and_current_embeddings(
         self,
         collection_name: str,
         reference_data_version: str,
         current_data_version: str,
-    ) -> Tuple[List[List[float]], List[List[float]]]:
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]:
         """Fetches the embeddings for the reference dataset and the current dataset.
 
         Args:
             collection_name (str): the name of the collection to fetch for
             reference_data_version (str): the name reference data version.
             current_data_version (str): the name current data version.
+            page_size (int, optional): Number of embeddings fetched per request. Defaults to DEFAULT_PAGE_SIZE.
 
         Returns:
-            Tuple[list, list]: the reference embeddings and the current embeddings
+            Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]: the reference embeddings and the current embeddings, of shape (n, dimension)
         """
+        # Each data version is either in its own versioned collection or in the shared collection
+        return tuple(  # type: ignore
+            self.fetch_embeddings(
+                self.collection_for_data_version(collection_name, data_version),
+                where={"data_version": data_version},
+                page_size=page_size,
+            )
+            for data_version in (reference_data_version, current_data_version)
+        )
+
+    def _iter_get(
+        self,
+        collection_name: str,
+        include: Include,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[GetResult]:
+        """Get the documents of a collection in pages of at most `page_size` documents.
+
+        Args:
+            collection_name (str): Name of collection
+            include (Include): Fields to include in each page, e.g. ["embeddings"]
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+            page_size (int, optional): Maximum number of documents in a page. Defaults to DEFAULT_PAGE_SIZE.
+
+        Yields:
+            Iterator[GetResult]: Non-empty pages of the collection
+
+        Raises:
+            ValueError: if `page_size` is less than 1
+        """
+        if page_size < 1:
+            raise ValueError(f"Page size must be at least 1, got {page_size}")
+
         collection = self._client.get_collection(collection_name)
+        offset = 0
+        while True:
+            page = collection.get(
+                where=where, include=include, limit=page_size, offset=offset
+            )
+            if not page["ids"]:
+                return
+
+            yield page
+
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+    def iter_embeddings(
+        self,
+        collection_name: str,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[npt.NDArray[np.float32]]:
+        """Stream the embeddings of a collection in contiguous blocks.
+
+        Each block is fetched with a separate request, so only one page of embeddings is held as Python lists at a time.
+
+        Args:
+            collection_name (str): Name of collection
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+            page_size (int, optional): Maximum number of embeddings in a block. Defaults to DEFAULT_PAGE_SIZE.
+
+        Yields:
+            Iterator[npt.NDArray[np.float32]]: Blocks of shape (n, dimension) with n <= page_size
+        """
+        for page in self._iter_get(
+            collection_name, include=["embeddings"], where=where, page_size=page_size
+        ):
+            yield np.asarray(page["embeddings"], dtype=np.float32)
+
+    def iter_labelled_embeddings(
+        self,
+        collection_name: str,
+        key: str,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[Tuple[List[str], List[str], npt.NDArray[np.float32]]]:
+        """Stream the embeddings of a collection with their IDs and the value of a metadata field.
+
+        Args:
+            collection_name (str): Name of collection
+            key (str): Metadata field to return with the embeddings, e.g. "source"
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+            page_size (int, optional): Maximum number of embeddings in a block. Defaults to DEFAULT_PAGE_SIZE.
+
+        Yields:
+            Iterator[Tuple[List[str], List[str], npt.NDArray[np.float32]]]: IDs, values of the field, an empty string for documents without it, and embeddings of shape (n, dimension) with n <= page_size
+        """
+        for page in self._iter_get(
+            collection_name,
+            include=["embeddings", "metadatas"],
+            where=where,
+            page_size=page_size,
+        ):
+            yield (
+                page["ids"],
+                [str((metadata or {}).get(key, "")) for metadata in page["metadatas"]],
+                np.asarray(page["embeddings"], dtype=np.float32),
+            )
+
+    def fetch_embeddings(
+        self,
+        collection_name: str,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> npt.NDArray[np.float32]:
+        """Fetch all the embeddings of a collection as a single array, page by page.
+
+        Args:
+            collection_name (str): Name of collection
+            where (Optional[Where], optional): Additional filtering using where. Defaults to None.
+            page_size (int, optional): Number of embeddings fetched per request. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (n, dimension), of shape (0, 0) if nothing matches
+        """
+        blocks = list(self.iter_embeddings(collection_name, where, page_size))
+        if not blocks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(blocks)
 
-        reference_dataset = collection.get(
-            where={"data_version": reference_data_version}, include=["embeddings"]
+    def _copy_documents(
+        self,
+        source_name: str,
+        target: Collection,
+        where: Optional[Where] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> int:
+        """Copy the documents of a collection, with their embeddings and metadata, page by page.
+
+        Args:
+            source_name (str): Name of the physical collection to copy from
+            target (Collection): Collection to copy to
+            where (Optional[Where], optional): Only copy the matching documents. Defaults to None.
+            page_size (int, optional): Number of documents copied at once. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            int: the number of copied documents
+        """
+        n_documents = 0
+        for page in self._iter_get(
+            source_name,
+            include=["embeddings", "documents", "metadatas"],
+            where=where,
+            page_size=page_size,
+        ):
+            target.upsert(
+                ids=page["ids"],
+                embeddings=page["embeddings"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+            )
+            n_documents += len(page["ids"])
+        return n_documents
+
+    def push_collection(
+        self,
+        collection_name: str,
+        target: "ChromaStore",
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> str:
+        """Copy a collection, with its embeddings, metadata and index parameters, to another store.
+
+        If `collection_name` is an alias, the collection it points to is copied and the alias is switched in the target store once the copy is complete.
+        The projection of the collection's embeddings, if any, is copied with it.
+
+        Args:
+            collection_name (str): Name of the collection or alias to copy
+            target (ChromaStore): Store to copy the collection to, e.g. the chroma server
+            page_size (int, optional): Number of documents copied at once. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            str: name of the copied physical collection
+        """
+        source_name = self.resolve_alias(collection_name)
+        source_metadata = self._client.get_collection(source_name).metadata
+        target_collection = target._get_or_create_collection(
+            source_name, metadata=source_metadata
         )
-        reference_embeddings = reference_dataset["embeddings"]
+        # Saved before any embedding, so that queries of the copy are never left unprojected
+        projection = self.load_projection(source_name)
+        if projection is not None:
+            target.save_projection(source_name, projection)
+
+        self._copy_documents(source_name, target_collection, page_size=page_size)
+
+        if source_name != collection_name:
+            target.swap_alias(collection_name, source_name)
+
+        return source_name
+
+    def export_snapshot(
+        self,
+        collection_name: str,
+        path: str,
+        data_version: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> int:
+        """Export the IDs, documents, metadata and embeddings of a collection to a compressed snapshot.
+
+        The collection is streamed page by page, so the export never holds more than `page_size` documents in memory.
+
+        Args:
+            collection_name (str): Name of the collection or alias to export
+            path (str): Path of the snapshot, ending in ".parquet" or ".npz"
+            data_version (Optional[str], optional): Only export the documents of this data version. Defaults to None, which exports the whole collection.
+            page_size (int, optional): Number of documents read and written at once. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            int: the number of exported documents
+        """
+        source_name = self.resolve_alias(collection_name)
+        where: Optional[Where] = None
+        if data_version is not None:
+            source_name = self.collection_for_data_version(
+                collection_name, data_version
+            )
+            where = {"data_version": data_version}
 
-        current_dataset = collection.get(
-            where={"data_version": current_data_version}, include=["embeddings"]
+        projection = self.load_projection(source_name)
+        header = {
+            "collection_name": source_name,
+            "collection_metadata": self._client.get_collection(source_name).metadata,
+            "projection": projection.to_string() if projection is not None else None,
+        }
+        batches = (
+            SnapshotBatch(
+                ids=page["ids"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+                embeddings=np.asarray(page["embeddings"], dtype=np.float32),
+            )
+            for page in self._iter_get(
+                source_name,
+                include=["embeddings", "documents", "metadatas"],
+                where=where,
+                page_size=page_size,
+            )
         )
-        current_embeddings = current_dataset["embeddings"]
+        return write_snapshot(path, header, batches)
+
+    def restore_snapshot(
+        self,
+        path: str,
+        collection_name: Optional[str] = None,
+        batch_size: int = DEFAULT_PAGE_SIZE,
+    ) -> str:
+        """Bulk load a snapshot into a collection, streaming it in batches.
+
+        The collection is created with the metadata of the exported collection, so index parameters are kept, and the projection of its embeddings is restored with it.
+        If the snapshot is of a versioned collection and restored under its own name, its alias is pointed at it.
+
+        Args:
+            path (str): Path of the snapshot, ending in ".parquet" or ".npz"
+            collection_name (Optional[str], optional): Name of the collection to restore into. Defaults to None, which uses the name of the exported collection.
+            batch_size (int, optional): Number of documents upserted at once. Defaults to DEFAULT_PAGE_SIZE.
+
+        Returns:
+            str: name of the restored collection
+        """
+        header, batches = read_snapshot(path, batch_size)
+        metadata = header["collection_metadata"]
+        target_name = collection_name or header["collection_name"]
+
+        collection = self._get_or_create_collection(target_name, metadata=metadata)
+        if header.get("projection") is not None:
+            self.save_projection(
+                target_name, EmbeddingProjection.from_string(header["projection"])
+            )
+        for batch in batches:
+            collection.upsert(
+                ids=batch.ids,
+                embeddings=batch.embeddings.tolist(),
+                documents=batch.documents,
+                metadatas=batch.metadatas,
+            )
+
+        if collection_name is None and metadata and "alias" in metadata:
+            self.swap_alias(metadata["alias"], target_name)
 
-        return reference_embeddings, current_embeddings  # type: ignore
+        return target_name
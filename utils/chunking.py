@@ -0,0 +1,266 @@
+"""Splitting of the pages of a dataset into chunks with deterministic IDs."""
+import hashlib
+import itertools
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+import pandas as pd
+
+from utils.near_duplicates import DEFAULT_THRESHOLD, NearDuplicateIndex
+from utils.text_splitter import DEFAULT_PROCESS_CHUNKSIZE, TextSplitter, TokenCounter
+
+logger = logging.getLogger(__name__)
+
+LENGTH_UNITS = ("characters", "tokens")
+# Metadata key of the JSON list of other pages which contain a near-duplicate of a chunk
+DUPLICATE_SOURCES_KEY = "duplicate_sources"
+
+T = TypeVar("T")
+
+
+@dataclass
+class ChunkingOptions:
+    """Dataclass for how pages are split into chunks, apart from the chunk size and overlap of each dataset.
+
+    Attributes:
+        length_unit (str): Unit of the chunk sizes and overlaps, one of LENGTH_UNITS
+        workers (Optional[int]): Number of processes splitting pages, None uses all CPU cores
+        process_chunksize (int): Number of pages sent to a splitting process at once
+        deduplicate (bool): Drop chunks which are near-duplicates of earlier chunks of the same dataset
+        deduplication_threshold (float): Minimum estimated Jaccard similarity of near-duplicate chunks
+    """
+
+    length_unit: str = "characters"
+    workers: Optional[int] = 1
+    process_chunksize: int = DEFAULT_PROCESS_CHUNKSIZE
+    deduplicate: bool = False
+    deduplication_threshold: float = DEFAULT_THRESHOLD
+
+    def __post_init__(self) -> None:
+        """Validate the length unit.
+
+        Raises:
+            ValueError: if `length_unit` is not one of LENGTH_UNITS
+        """
+        if self.length_unit not in LENGTH_UNITS:
+            raise ValueError(
+                f"{self.length_unit} is not supported. The list of supported length units is {LENGTH_UNITS}"
+            )
+
+
+def make_chunk_id(
+    text: str,
+    source: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    length_unit: str = "characters",
+) -> str:
+    """Derive a deterministic ID for a chunk from its content, its source and the chunking parameters.
+
+    The same chunk produced by the same chunking parameters always gets the same ID, so that unchanged chunks can be recognised across data versions.
+
+    Args:
+        text (str): Text of the chunk
+        source (str): URL of the page the chunk comes from
+        chunk_size (int): Chunk size used to produce the chunk
+        chunk_overlap (int): Chunk overlap used to produce the chunk
+        length_unit (str, optional): Unit of the chunk size and overlap, one of LENGTH_UNITS. Defaults to "characters".
+
+    Returns:
+        str: SHA-256 hex digest identifying the chunk
+    """
+    digest = hashlib.sha256()
+    parts = [str(chunk_size), str(chunk_overlap), source, text]
+    # Characters are left out so that the IDs of chunks measured in characters do not change
+    if length_unit != "characters":
+        parts.insert(0, length_unit)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        # Separate the parts so that different splits of the same string do not collide
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def batched(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """Split items into consecutive batches, consuming them lazily.
+
+    Args:
+        items (Iterable[T]): Items to split
+        batch_size (int): Maximum number of items in a batch
+
+    Yields:
+        Iterator[List[T]]: Consecutive batches of items
+    """
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def split_strided_sample(items: List[T], sample_size: int) -> Tuple[List[T], List[T]]:
+    """Split items into an evenly strided sample and the other items, both in their original order.
+
+    Args:
+        items (List[T]): Items to split
+        sample_size (int): Number of items sampled
+
+    Returns:
+        Tuple[List[T], List[T]]: the sampled items and the other items
+    """
+    if len(items) <= sample_size:
+        return items, []
+    sampled = {i * len(items) // sample_size for i in range(sample_size)}
+    return (
+        [item for i, item in enumerate(items) if i in sampled],
+        [item for i, item in enumerate(items) if i not in sampled],
+    )
+
+
+class DatasetChunker:
+    """Splits the pages of a dataset into chunks lazily, identifying each chunk by its content, source and chunking parameters.
+
+    Repeated chunks are skipped, and with `deduplicate` only the first chunk of each group of near-duplicates is kept,
+    with the sources of the others recorded in its metadata under DUPLICATE_SOURCES_KEY.
+
+    Attributes:
+        chunk_size (int): Size of the chunks, capped at the model window when measured in tokens
+        chunk_overlap (int): Overlap between the chunks
+        seen_ids (Set[str]): IDs of the chunks split so far, including dropped near-duplicates
+        representatives (Dict[str, Dict[str, Any]]): Metadata of the chunks kept so far by ID, when deduplicating
+        updated_ids (Set[str]): IDs of kept chunks whose metadata changed after they were yielded, when deduplicating
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        data_version: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        options: ChunkingOptions,
+        tokenizer: Any = None,
+        max_tokens: Optional[int] = None,
+    ) -> None:
+        """Set up the splitting of a dataset.
+
+        Args:
+            df (pd.DataFrame): Pages to split, with "text_scraped" and "url" columns
+            data_version (str): Data version added to the metadata of each chunk
+            chunk_size (int): Size of chunks to split the pages into
+            chunk_overlap (int): Number of characters, or tokens, to overlap between chunks
+            options (ChunkingOptions): How the pages are split
+            tokenizer (Any, optional): Tokenizer of the embedding model, which measures chunks in tokens. Defaults to None.
+            max_tokens (Optional[int], optional): Number of tokens of a chunk which fit in the model window. Defaults to None.
+
+        Raises:
+            ValueError: if the chunks are measured in tokens without a tokenizer
+        """
+        self._df = df
+        self.data_version = data_version
+        self.options = options
+
+        length_function = None
+        if options.length_unit == "tokens":
+            if tokenizer is None:
+                raise ValueError("Measuring chunks in tokens needs a tokenizer")
+            length_function = TokenCounter(tokenizer)
+            if max_tokens is not None and chunk_size > max_tokens:
+                logger.warning(
+                    f"chunk_size={chunk_size} tokens does not fit in the window of the embedding model, using {max_tokens}"
+                )
+                chunk_size = max_tokens
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._text_splitter = TextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function,
+        )
+
+        self.seen_ids: Set[str] = set()
+        self.representatives: Dict[str, Dict[str, Any]] = {}
+        self.updated_ids: Set[str] = set()
+
+    def __len__(self) -> int:
+        """Number of pages of the dataset.
+
+        Returns:
+            int: the number of pages
+        """
+        return len(self._df)
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Split the pages into chunks lazily.
+
+        Yields:
+            Iterator[Tuple[str, str, Dict[str, Any]]]: The ID, text and metadata of each kept chunk, including its character span in the page
+        """
+        chunks = self._iter_unique_chunks()
+        if self.options.deduplicate:
+            chunks = self._drop_near_duplicates(
+                chunks,
+                NearDuplicateIndex(threshold=self.options.deduplication_threshold),
+            )
+        yield from chunks
+
+    def _iter_unique_chunks(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Split the pages into chunks lazily, skipping repeated chunks.
+
+        Yields:
+            Iterator[Tuple[str, str, Dict[str, Any]]]: The ID, text and metadata of each unique chunk
+        """
+        chunks = self._text_splitter.iter_split_documents(
+            self._df["text_scraped"],
+            (
+                {"source": url, "data_version": self.data_version}
+                for url in self._df["url"]
+            ),
+            n_workers=self.options.workers,
+            chunksize=self.options.process_chunksize,
+            add_spans=True,
+        )
+        for chunk, metadata in chunks:
+            chunk_id = make_chunk_id(
+                chunk,
+                metadata["source"],
+                self.chunk_size,
+                self.chunk_overlap,
+                self.options.length_unit,
+            )
+            # A page can repeat the same chunk, which would otherwise produce duplicate IDs
+            if chunk_id in self.seen_ids:
+                continue
+            self.seen_ids.add(chunk_id)
+            yield chunk_id, chunk, metadata
+
+    def _drop_near_duplicates(
+        self,
+        chunks: Iterable[Tuple[str, str, Dict[str, Any]]],
+        index: NearDuplicateIndex[str],
+    ) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Keep the first chunk of each group of near-duplicate chunks, recording the sources of the others in its metadata.
+
+        Args:
+            chunks (Iterable[Tuple[str, str, Dict[str, Any]]]): The ID, text and metadata of each chunk
+            index (NearDuplicateIndex[str]): Index of the chunks kept so far
+
+        Yields:
+            Iterator[Tuple[str, str, Dict[str, Any]]]: The ID, text and metadata of each kept chunk
+        """
+        for chunk_id, chunk, metadata in chunks:
+            representative_id = index.find_or_add(chunk_id, chunk)
+            if representative_id is None:
+                self.representatives[chunk_id] = metadata
+                yield chunk_id, chunk, metadata
+                continue
+
+            representative = self.representatives[representative_id]
+            sources = json.loads(representative.get(DUPLICATE_SOURCES_KEY, "[]"))
+            if metadata["source"] != representative["source"] and (
+                metadata["source"] not in sources
+            ):
+                # Chroma metadata values must be scalars, so the list is stored as JSON
+                representative[DUPLICATE_SOURCES_KEY] = json.dumps(
+                    sources + [metadata["source"]]
+                )
+                self.updated_ids.add(representative_id)
@@ -0,0 +1,274 @@
+"""Columnar snapshots of vector collections."""
+import json
+import os
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SNAPSHOT_FORMATS = ("parquet", "npz")
+# Key of the snapshot header in the Parquet schema metadata, and name of the header entry in NPZ snapshots
+SNAPSHOT_HEADER_KEY = "snapshot.json"
+PARQUET_COMPRESSION = "zstd"
+
+
+@dataclass
+class SnapshotBatch:
+    """Dataclass for a batch of records read from or written to a snapshot."""
+
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    embeddings: npt.NDArray[np.float32]
+
+    def __len__(self) -> int:
+        """Number of records in the batch.
+
+        Returns:
+            int: the number of records
+        """
+        return len(self.ids)
+
+
+def snapshot_format(path: str) -> str:
+    """Find the format of a snapshot from its file extension.
+
+    Args:
+        path (str): Path of the snapshot, ending in ".parquet" or ".npz"
+
+    Returns:
+        str: the snapshot format, one of SNAPSHOT_FORMATS
+
+    Raises:
+        ValueError: if the extension is not a supported snapshot format
+    """
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in SNAPSHOT_FORMATS:
+        raise ValueError(
+            f"{path} is not a supported snapshot. The list of supported formats is {SNAPSHOT_FORMATS}"
+        )
+    return extension
+
+
+def _write_parquet(
+    path: str, header: Dict[str, Any], batches: Iterable[SnapshotBatch]
+) -> int:
+    """Write batches to a Parquet snapshot, one row group per batch.
+
+    Args:
+        path (str): Path of the snapshot
+        header (Dict[str, Any]): Description of the collection, stored in the schema metadata
+        batches (Iterable[SnapshotBatch]): Records to write
+
+    Returns:
+        int: the number of records written
+    """
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("document", pa.string()),
+            ("metadata", pa.string()),
+            ("embedding", pa.list_(pa.float32())),
+        ],
+        metadata={SNAPSHOT_HEADER_KEY: json.dumps(header)},
+    )
+
+    n_records = 0
+    with pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION) as writer:
+        for batch in batches:
+            embeddings = np.ascontiguousarray(batch.embeddings, dtype=np.float32)
+            offsets = np.arange(len(batch) + 1, dtype=np.int32) * embeddings.shape[-1]
+            table = pa.Table.from_arrays(
+                [
+                    pa.array(batch.ids, type=pa.string()),
+                    pa.array(batch.documents, type=pa.string()),
+                    pa.array(
+                        [json.dumps(metadata) for metadata in batch.metadatas],
+                        type=pa.string(),
+                    ),
+                    pa.ListArray.from_arrays(
+                        offsets, pa.array(embeddings.ravel(), type=pa.float32())
+                    ),
+                ],
+                schema=schema,
+            )
+            writer.write_table(table)
+            n_records += len(batch)
+    return n_records
+
+
+def _read_parquet(
+    path: str, batch_size: int
+) -> Tuple[Dict[str, Any], Iterator[SnapshotBatch]]:
+    """Read a Parquet snapshot in batches.
+
+    Args:
+        path (str): Path of the snapshot
+        batch_size (int): Maximum number of records in a batch
+
+    Returns:
+        Tuple[Dict[str, Any], Iterator[SnapshotBatch]]: the snapshot header and a lazy iterator over its records
+    """
+    parquet_file = pq.ParquetFile(path)
+    header = json.loads(
+        parquet_file.schema_arrow.metadata[SNAPSHOT_HEADER_KEY.encode()]
+    )
+
+    def batches() -> Iterator[SnapshotBatch]:
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+            embedding_column = record_batch.column("embedding")
+            yield SnapshotBatch(
+                ids=record_batch.column("id").to_pylist(),
+                documents=record_batch.column("document").to_pylist(),
+                metadatas=[
+                    json.loads(metadata)
+                    for metadata in record_batch.column("metadata").to_pylist()
+                ],
+                embeddings=embedding_column.flatten()
+                .to_numpy(zero_copy_only=False)
+                .reshape(len(record_batch), -1),
+            )
+
+    return header, batches()
+
+
+def _write_npy_entry(
+    archive: zipfile.ZipFile, name: str, array: npt.NDArray[Any]
+) -> None:
+    """Write an array to an NPZ archive.
+
+    Args:
+        archive (zipfile.ZipFile): Archive open for writing
+        name (str): Name of the array in the archive
+        array (npt.NDArray[Any]): Array to write
+    """
+    with archive.open(f"{name}.npy", "w", force_zip64=True) as f:
+        # numpy ships no annotations for its format module
+        np.lib.format.write_array(f, array, allow_pickle=False)  # type: ignore[no-untyped-call]
+
+
+def _write_npz(
+    path: str, header: Dict[str, Any], batches: Iterable[SnapshotBatch]
+) -> int:
+    """Write batches to a compressed NPZ snapshot, with one set of arrays per batch.
+
+    Args:
+        path (str): Path of the snapshot
+        header (Dict[str, Any]): Description of the collection, stored as a JSON entry of the archive
+        batches (Iterable[SnapshotBatch]): Records to write
+
+    Returns:
+        int: the number of records written
+    """
+    n_records = 0
+    n_batches = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for batch in batches:
+            suffix = f"{n_batches:08d}"
+            _write_npy_entry(archive, f"ids_{suffix}", np.array(batch.ids, dtype=str))
+            _write_npy_entry(
+                archive, f"documents_{suffix}", np.array(batch.documents, dtype=str)
+            )
+            _write_npy_entry(
+                archive,
+                f"metadatas_{suffix}",
+                np.array(
+                    [json.dumps(metadata) for metadata in batch.metadatas], dtype=str
+                ),
+            )
+            _write_npy_entry(
+                archive,
+                f"embeddings_{suffix}",
+                np.asarray(batch.embeddings, dtype=np.float32),
+            )
+            n_records += len(batch)
+            n_batches += 1
+
+        archive.writestr(
+            SNAPSHOT_HEADER_KEY, json.dumps({**header, "n_batches": n_batches})
+        )
+    return n_records
+
+
+def _read_npz(
+    path: str, batch_size: int
+) -> Tuple[Dict[str, Any], Iterator[SnapshotBatch]]:
+    """Read an NPZ snapshot in batches.
+
+    Args:
+        path (str): Path of the snapshot
+        batch_size (int): Maximum number of records in a batch
+
+    Returns:
+        Tuple[Dict[str, Any], Iterator[SnapshotBatch]]: the snapshot header and a lazy iterator over its records
+    """
+    with zipfile.ZipFile(path) as archive:
+        header = json.loads(archive.read(SNAPSHOT_HEADER_KEY))
+
+    def batches() -> Iterator[SnapshotBatch]:
+        # NpzFile only decompresses an array when it is accessed
+        with np.load(path, allow_pickle=False) as arrays:
+            for i in range(header["n_batches"]):
+                suffix = f"{i:08d}"
+                ids = arrays[f"ids_{suffix}"].tolist()
+                documents = arrays[f"documents_{suffix}"].tolist()
+                metadatas = [
+                    json.loads(metadata)
+                    for metadata in arrays[f"metadatas_{suffix}"].tolist()
+                ]
+                embeddings = arrays[f"embeddings_{suffix}"]
+                for start in range(0, len(ids), batch_size):
+                    end = start + batch_size
+                    yield SnapshotBatch(
+                        ids=ids[start:end],
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end],
+                        embeddings=embeddings[start:end],
+                    )
+
+    return header, batches()
+
+
+def write_snapshot(
+    path: str, header: Dict[str, Any], batches: Iterable[SnapshotBatch]
+) -> int:
+    """Stream batches of records to a snapshot, in the format given by the file extension.
+
+    Args:
+        path (str): Path of the snapshot, ending in ".parquet" or ".npz"
+        header (Dict[str, Any]): JSON serialisable description of the collection
+        batches (Iterable[SnapshotBatch]): Records to write
+
+    Returns:
+        int: the number of records written
+    """
+    if snapshot_format(path) == "parquet":
+        return _write_parquet(path, header, batches)
+    return _write_npz(path, header, batches)
+
+
+def read_snapshot(
+    path: str, batch_size: int
+) -> Tuple[Dict[str, Any], Iterator[SnapshotBatch]]:
+    """Open a snapshot and stream its records in batches.
+
+    Args:
+        path (str): Path of the snapshot, ending in ".parquet" or ".npz"
+        batch_size (int): Maximum number of records in a batch
+
+    Returns:
+        Tuple[Dict[str, Any], Iterator[SnapshotBatch]]: the snapshot header and a lazy iterator over its records
+
+    Raises:
+        ValueError: if `batch_size` is less than 1
+    """
+    if batch_size < 1:
+        raise ValueError(f"Batch size must be at least 1, got {batch_size}")
+
+    if snapshot_format(path) == "parquet":
+        return _read_parquet(path, batch_size)
+    return _read_npz(path, batch_size)
@@ -0,0 +1,509 @@
+"""Upload of the chunks of datasets to collections of the vector database, one window of chunks at a time."""
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import requests
+
+from utils.chroma_store import DEFAULT_RETAINED_VERSIONS, ChromaStore, HNSWConfig
+from utils.chunking import DatasetChunker, batched, split_strided_sample
+from utils.embedding import (
+    DEFAULT_BATCH_SIZE,
+    InstructorEmbedder,
+    length_sorted_batches,
+)
+from utils.embedding_projection import EmbeddingProjection, ProjectionConfig
+from utils.embedding_sketch import EmbeddingSketcher
+from utils.sketch_store import SketchStore
+
+logger = logging.getLogger(__name__)
+
+# Chunks are sorted by length within windows of this many batches, which bounds the number of chunks held in memory
+SORT_WINDOW_BATCHES = 16
+
+Chunk = Tuple[str, str, Dict[str, Any]]
+
+
+@dataclass
+class UploadOptions:
+    """Dataclass for the options of uploading a dataset to a collection which are shared by all collections of a step.
+
+    Attributes:
+        data_version (str): Data version of the datasets
+        batch_size (int): Number of chunks embedded and upserted at once
+        incremental (bool): Embed only new chunks and reuse the embeddings of unchanged chunks
+        versioned (bool): Upload to a physical collection per data version behind each collection name alias
+        retain_versions (int): Number of data versions kept in versioned mode
+        reference_data_version (Optional[str]): Data version copied out of a collection on its first versioned upload, if it is not versioned yet
+        hnsw_config (Optional[HNSWConfig]): HNSW index parameters used when the collections are created, None uses Chroma's defaults
+        resume (bool): Skip the chunks of the data version which are already in a collection, as uploaded by an interrupted run
+        projection (Optional[ProjectionConfig]): Projection of the embeddings to fewer dimensions, fitted separately for each collection
+        sketch (bool): Save a sketch of the embeddings of each data version for drift computation
+    """
+
+    data_version: str
+    batch_size: int = DEFAULT_BATCH_SIZE
+    incremental: bool = False
+    versioned: bool = False
+    retain_versions: int = DEFAULT_RETAINED_VERSIONS
+    reference_data_version: Optional[str] = None
+    hnsw_config: Optional[HNSWConfig] = None
+    resume: bool = True
+    projection: Optional[ProjectionConfig] = None
+    sketch: bool = True
+
+    @classmethod
+    def from_parameters(
+        cls, parameters: Optional[Dict[str, Any]] = None, **fields: Any
+    ) -> "UploadOptions":
+        """Create the options from step parameters, which hold the HNSW and projection configs as dictionaries.
+
+        Args:
+            parameters (Optional[Dict[str, Any]], optional): Options other than `fields`. Defaults to None.
+            **fields (Any): Options given as separate step parameters, such as the data version
+
+        Returns:
+            UploadOptions: the options
+        """
+        options = {**(parameters or {}), **fields}
+        if options.get("hnsw_config") is not None:
+            options["hnsw_config"] = HNSWConfig(**options["hnsw_config"])
+        if options.get("projection") is not None:
+            options["projection"] = ProjectionConfig(**options["projection"])
+        return cls(**options)
+
+
+def resolve_projection(
+    chroma_client: ChromaStore,
+    collection_name: str,
+    target_collection: str,
+    source_collection: str,
+    config: Optional[ProjectionConfig],
+    versioned: bool = False,
+) -> Tuple[Optional[EmbeddingProjection], bool]:
+    """Find the projection of a target collection, reusing the one of a previous run, of the source collection or of the active version when it matches.
+
+    Args:
+        chroma_client (ChromaStore): Vector database holding the collections
+        collection_name (str): Name of the logical collection, the alias in versioned mode
+        target_collection (str): Collection uploaded to
+        source_collection (str): Collection whose embeddings of unchanged chunks are reused
+        config (Optional[ProjectionConfig]): Projection of the embeddings, None if they are not projected
+        versioned (bool, optional): Whether the collection is versioned. Defaults to False.
+
+    Returns:
+        Tuple[Optional[EmbeddingProjection], bool]: the projection, None if the embeddings are not projected or the projection is still to be fitted,
+            and whether the embeddings of the source collection can be reused
+
+    Raises:
+        ValueError: if the target collection already holds embeddings which are projected differently
+    """
+    projection = chroma_client.load_projection(target_collection)
+    if projection is not None and config is not None and projection.matches(config):
+        return projection, True
+    if projection is not None or (
+        config is not None
+        and target_collection in chroma_client.list_collection_names()
+        and chroma_client.get_ids(target_collection)
+    ):
+        raise ValueError(
+            f"{target_collection} holds embeddings which are not projected with {config}, upload to a new collection or use versioned mode"
+        )
+
+    if source_collection != target_collection:
+        source_projection = chroma_client.load_projection(source_collection)
+        if source_projection is None or config is None:
+            source_matches = source_projection is None and config is None
+        else:
+            source_matches = source_projection.matches(config)
+        if not source_matches:
+            return None, False
+        if source_projection is not None:
+            chroma_client.save_projection(target_collection, source_projection)
+        return source_projection, True
+
+    if versioned and config is not None:
+        # All versions of a collection share the basis of the active version when they are projected alike, so their embeddings stay comparable
+        active_collection = chroma_client.resolve_alias(collection_name)
+        active_projection = (
+            chroma_client.load_projection(active_collection)
+            if active_collection != target_collection
+            else None
+        )
+        if active_projection is not None and active_projection.matches(config):
+            chroma_client.save_projection(target_collection, active_projection)
+            logger.info(
+                f"Reusing the projection of {active_collection} for {target_collection}"
+            )
+            return active_projection, True
+    return None, True
+
+
+class CollectionUpload:
+    """Uploads the chunks of a dataset to a collection, one window of chunks at a time.
+
+    The embedding of the new chunks of each window is left to the caller, so that the windows of several collections can be embedded together.
+    """
+
+    def __init__(
+        self,
+        chunker: DatasetChunker,
+        collection_name: str,
+        options: UploadOptions,
+        embedder: InstructorEmbedder,
+        chroma_client: ChromaStore,
+        sketch_store: Optional[SketchStore] = None,
+    ) -> None:
+        """Create the target collection, find the chunks uploaded by an interrupted run and start splitting the dataset.
+
+        Args:
+            chunker (DatasetChunker): Splitter of the dataset into chunks
+            collection_name (str): Name of the collection
+            options (UploadOptions): Options shared by all collections
+            embedder (InstructorEmbedder): Embedder of the chunks, used as the embedding function of the collection
+            chroma_client (ChromaStore): Vector database to upload to
+            sketch_store (Optional[SketchStore], optional): Store of the sketch of the embeddings, needed with `options.sketch`. Defaults to None.
+
+        Raises:
+            ValueError: if `options.sketch` is set without a sketch store, or if the collection holds embeddings which are projected differently
+        """
+        if options.sketch and sketch_store is None:
+            raise ValueError("Sketching the embeddings needs a sketch store")
+        self.chunker = chunker
+        self.collection_name = collection_name
+        self.options = options
+        self._embedder = embedder
+        self._chroma_client = chroma_client
+        self._sketch_store = sketch_store
+
+        logger.info(
+            f"Using chunk_size={chunker.chunk_size} and chunk_overlap={chunker.chunk_overlap} {chunker.options.length_unit} for {collection_name}"
+        )
+
+        # Upload into a new physical collection per data version, which the alias points to once it is complete
+        self.target_collection = collection_name
+        if options.versioned:
+            self._migrate_legacy_collection()
+            self.target_collection = chroma_client.create_versioned_collection(
+                collection_name,
+                options.data_version,
+                embedder,
+                hnsw_config=options.hnsw_config,
+            )
+        else:
+            chroma_client.create_collection(
+                collection_name, embedder, hnsw_config=options.hnsw_config
+            )
+
+        self.source_collection = self.target_collection
+        self.existing_ids: Set[str] = set()
+        if options.incremental:
+            if options.versioned:
+                self.source_collection = chroma_client.resolve_alias(collection_name)
+            if self.source_collection in chroma_client.list_collection_names():
+                self.existing_ids = set(chroma_client.get_ids(self.source_collection))
+
+        # Chunk IDs are derived from the text, source and chunking parameters of each chunk, so the chunks of this data version
+        # which are already in the target collection were uploaded by an interrupted run, and are not uploaded again
+        self.completed_ids: Set[str] = set()
+        if options.resume:
+            self.completed_ids = set(
+                chroma_client.get_ids(
+                    self.target_collection,
+                    where={"data_version": options.data_version},
+                )
+            )
+            if self.completed_ids:
+                logger.info(
+                    f"Resuming the upload to {self.target_collection}, skipping {len(self.completed_ids)} chunks of {options.data_version} which were already uploaded"
+                )
+
+        self.kept_ids: Set[str] = set()
+        self.n_embedded = 0
+        self.n_unchanged = 0
+
+        # Statistics of every embedding of the data version, including those of unchanged and previously uploaded chunks
+        self.sketcher = EmbeddingSketcher() if options.sketch else None
+
+        self.projection, source_reusable = resolve_projection(
+            chroma_client,
+            collection_name,
+            self.target_collection,
+            self.source_collection,
+            options.projection,
+            versioned=options.versioned,
+        )
+        if not source_reusable:
+            # The embeddings of the previous version cannot be copied, so every chunk is embedded again, mostly from the embedding cache
+            logger.info(
+                f"{self.source_collection} is projected differently, re-embedding all chunks of {collection_name}"
+            )
+            self.existing_ids = set()
+        # New batches are held back until there are enough embeddings to fit the projection
+        self._unfitted: Optional[List[Tuple[List[Chunk], npt.NDArray[np.float32]]]] = (
+            [] if options.projection is not None and self.projection is None else None
+        )
+
+        self._windows = self._make_windows(chunker.iter_chunks())
+
+    def _make_windows(self, chunks: Iterable[Chunk]) -> Iterator[List[Chunk]]:
+        """Split the chunks into the windows which are length-sorted and embedded together.
+
+        Args:
+            chunks (Iterable[Chunk]): The ID, text and metadata of each chunk
+
+        Returns:
+            Iterator[List[Chunk]]: the windows of chunks, lazily unless a PCA projection is still to be fitted
+        """
+        window_size = self.options.batch_size * SORT_WINDOW_BATCHES
+        config = self.options.projection
+        if self._unfitted is None or config is None or config.method != "pca":
+            return batched(chunks, window_size)
+        # Embed a strided sample of the whole data version first, so the PCA is not fitted on its first pages only
+        sample, rest = split_strided_sample(list(chunks), config.fit_size)
+        return itertools.chain(batched(sample, window_size), batched(rest, window_size))
+
+    def _migrate_legacy_collection(self) -> None:
+        """Copy the reference data version out of a collection which was uploaded before versioned mode, so it can still be compared with."""
+        reference_data_version = self.options.reference_data_version
+        if (
+            reference_data_version is None
+            or reference_data_version == self.options.data_version
+        ):
+            return
+        migrated = self._chroma_client.migrate_legacy_collection(
+            self.collection_name, reference_data_version
+        )
+        if migrated is not None:
+            logger.info(
+                f"Copied {reference_data_version} of {self.collection_name}, which is not versioned, to {migrated}. "
+                f"{self.collection_name} now names an alias, and its old collection can be deleted"
+            )
+
+    def next_window(self) -> Optional[List[List[Chunk]]]:
+        """Upload the unchanged chunks of the next window and return its new chunks, which must be embedded.
+
+        Returns:
+            Optional[List[List[Chunk]]]: length-sorted batches of the ID, text and metadata of the new chunks, None once all windows are processed
+        """
+        window = next(self._windows, None)
+        if window is None:
+            return None
+
+        batch_size = self.options.batch_size
+        self.kept_ids.update(chunk_id for chunk_id, _, _ in window)
+        pending = [record for record in window if record[0] not in self.completed_ids]
+        unchanged = [record for record in pending if record[0] in self.existing_ids]
+        new = [record for record in pending if record[0] not in self.existing_ids]
+
+        if self.sketcher is not None:
+            completed = [
+                chunk_id for chunk_id, _, _ in window if chunk_id in self.completed_ids
+            ]
+            for batch_ids in batched(completed, batch_size):
+                self.sketcher.update(
+                    self._chroma_client.fetch_embeddings_by_ids(
+                        self.target_collection, batch_ids
+                    )
+                )
+
+        for batch in batched(unchanged, batch_size):
+            batch_ids = [chunk_id for chunk_id, _, _ in batch]
+            batch_metadatas = [metadata for _, _, metadata in batch]
+            embeddings = None
+            if (
+                self.sketcher is not None
+                or self.source_collection != self.target_collection
+            ):
+                embeddings = self._chroma_client.fetch_embeddings_by_ids(
+                    self.source_collection, batch_ids
+                )
+                if self.sketcher is not None:
+                    self.sketcher.update(embeddings)
+            if self.source_collection == self.target_collection:
+                # Unchanged chunks keep their embeddings and only move to the new data version
+                self._chroma_client.update_metadatas(
+                    collection_name=self.target_collection,
+                    ids=batch_ids,
+                    metadatas=batch_metadatas,
+                )
+            else:
+                # Copy the embeddings of unchanged chunks from the active version
+                self._chroma_client.add_texts(
+                    collection_name=self.target_collection,
+                    texts=[chunk for _, chunk, _ in batch],
+                    ids=batch_ids,
+                    metadatas=batch_metadatas,
+                    embedding_function=self._embedder,
+                    embeddings=embeddings.tolist(),  # type: ignore
+                )
+        self.n_unchanged += len(unchanged)
+
+        # Embed similar-length chunks together to minimise padding
+        return [
+            [new[i] for i in batch_indices]
+            for batch_indices in length_sorted_batches(
+                [chunk for _, chunk, _ in new], batch_size
+            )
+        ]
+
+    def upload_batch(
+        self, batch: List[Chunk], embeddings: npt.NDArray[np.float32]
+    ) -> None:
+        """Upload a batch of new chunks with their embeddings.
+
+        Args:
+            batch (List[Chunk]): The ID, text and metadata of each chunk
+            embeddings (npt.NDArray[np.float32]): Embeddings of the chunks, before projection
+        """
+        config = self.options.projection
+        if self._unfitted is not None and config is not None:
+            self._unfitted.append((batch, embeddings))
+            # Truncation only needs the embedding dimension
+            n_unfitted = sum(len(unfitted) for unfitted, _ in self._unfitted)
+            if config.method == "truncate" or n_unfitted >= config.fit_size:
+                self._fit_projection()
+            return
+
+        if self.projection is not None:
+            embeddings = self.projection.apply(embeddings)
+        if self.sketcher is not None:
+            self.sketcher.update(embeddings)
+        self._chroma_client.add_texts(
+            collection_name=self.target_collection,
+            texts=[chunk for _, chunk, _ in batch],
+            ids=[chunk_id for chunk_id, _, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch],
+            embedding_function=self._embedder,
+            embeddings=embeddings.tolist(),
+        )
+        self.n_embedded += len(batch)
+
+    def _fit_projection(self) -> None:
+        """Fit the projection on the held back embeddings, save it with the target collection and upload the held back batches."""
+        assert self._unfitted is not None and self.options.projection is not None
+        unfitted, self._unfitted = self._unfitted, None
+        self.projection = EmbeddingProjection.fit(
+            self.options.projection,
+            np.concatenate([embeddings for _, embeddings in unfitted]),
+        )
+        self._chroma_client.save_projection(self.target_collection, self.projection)
+        logger.info(
+            f"Fitted a {self.projection.method} projection of {self.collection_name} from {self.projection.input_dimension} to {self.projection.output_dimension} dimensions"
+        )
+        for batch, embeddings in unfitted:
+            self.upload_batch(batch, embeddings)
+
+    def _save_sketch(self) -> None:
+        """Save the sketch of the uploaded embeddings with the fingerprint of their projection.
+
+        The upload does not fail if the metric service cannot be reached, drift is then computed from the embeddings.
+        """
+        assert self.sketcher is not None and self._sketch_store is not None
+        sketch = self.sketcher.sketch()
+        if self.projection is not None:
+            sketch.projection = self.projection.fingerprint()
+        try:
+            self._sketch_store.save_sketch(
+                self.collection_name, self.options.data_version, sketch
+            )
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(
+                f"Could not save the sketch of {self.options.data_version} of {self.collection_name}, its drift will be computed from its embeddings: {e}"
+            )
+
+    def finish(self) -> None:
+        """Record the sources of near-duplicates, delete removed chunks and switch the alias."""
+        batch_size = self.options.batch_size
+        chunker = self.chunker
+        # A collection with fewer new chunks than the fit size is fitted on all of them
+        if self._unfitted:
+            self._fit_projection()
+        logger.info(
+            f"Split {len(chunker)} texts into {len(chunker.seen_ids)} chunks for {self.collection_name}"
+        )
+
+        if chunker.options.deduplicate:
+            # Record the sources of near-duplicates found after their representative was uploaded
+            for batch_ids in batched(sorted(chunker.updated_ids), batch_size):
+                self._chroma_client.update_metadatas(
+                    collection_name=self.target_collection,
+                    ids=batch_ids,
+                    metadatas=[
+                        chunker.representatives[chunk_id] for chunk_id in batch_ids
+                    ],
+                )
+            logger.info(
+                f"Dropped {len(chunker.seen_ids) - len(self.kept_ids)} near-duplicate chunks, kept {len(self.kept_ids)}"
+            )
+
+        if self.options.incremental:
+            removed_ids = sorted(self.existing_ids.difference(self.kept_ids))
+            # Removed chunks are left behind in the previous version when uploading to a new collection
+            if self.source_collection == self.target_collection:
+                for removed_batch in batched(removed_ids, batch_size):
+                    self._chroma_client.delete_ids(
+                        collection_name=self.target_collection, ids=removed_batch
+                    )
+
+            logger.info(
+                f"{self.n_embedded} new, {self.n_unchanged} unchanged and {len(removed_ids)} removed chunks in {self.collection_name}"
+            )
+
+        logger.info(
+            f"Embedded and uploaded {self.n_embedded} chunks to {self.target_collection}"
+        )
+
+        if self.sketcher is not None and self.sketcher.count:
+            self._save_sketch()
+
+        if self.options.versioned:
+            self._chroma_client.swap_alias(self.collection_name, self.target_collection)
+            deleted = self._chroma_client.garbage_collect_versions(
+                self.collection_name, retain=self.options.retain_versions
+            )
+            logger.info(
+                f"{self.collection_name} now points to {self.target_collection}, deleted old versions {deleted}"
+            )
+
+
+def upload_collections(
+    uploads: List[CollectionUpload], embedder: InstructorEmbedder
+) -> None:
+    """Upload several collections, embedding a window of each collection at a time.
+
+    The new chunks of the current window of every collection are embedded together, so that the embedding workers are kept busy
+    and each collection is finished at about the same time.
+
+    Args:
+        uploads (List[CollectionUpload]): Collections to upload
+        embedder (InstructorEmbedder): Embedder of the chunks
+    """
+    active = list(uploads)
+    while active:
+        owners: List[CollectionUpload] = []
+        batches: List[List[Chunk]] = []
+        for upload in list(active):
+            new_batches = upload.next_window()
+            if new_batches is None:
+                active.remove(upload)
+                continue
+            owners.extend([upload] * len(new_batches))
+            batches.extend(new_batches)
+        if not batches:
+            continue
+
+        for upload, batch, embeddings in zip(
+            owners,
+            batches,
+            embedder.embed_batches(
+                [[chunk for _, chunk, _ in batch] for batch in batches]
+            ),
+        ):
+            upload.upload_batch(batch, embeddings)
+
+    for upload in uploads:
+        upload.finish()
@@ -0,0 +1,302 @@
+"""Attribution of the drift between two data versions to the sources the chunks were split from."""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from utils.embedding_drift import squared_distances
+
+# "changed" sources have different chunks in both versions, "added" and "removed" sources are in only one of them
+SOURCE_STATUSES = ("unchanged", "changed", "added", "removed")
+DEFAULT_TOP_K = 20
+
+
+class SourceCentroids:
+    """Accumulates the chunk IDs and the sum of the embeddings of each source of a data version, page by page.
+
+    Only one vector per source is held, so a version can be summarised without holding its embeddings.
+    """
+
+    def __init__(self) -> None:
+        """Start with no sources."""
+        self.ids: Dict[str, List[str]] = {}
+        self._sums: Dict[str, npt.NDArray[np.float64]] = {}
+
+    def update(
+        self, ids: List[str], sources: List[str], embeddings: npt.NDArray[np.float32]
+    ) -> None:
+        """Add a page of chunks.
+
+        Args:
+            ids (List[str]): IDs of the chunks
+            sources (List[str]): Source of each chunk
+            embeddings (npt.NDArray[np.float32]): Embeddings of the chunks of shape (n, d)
+        """
+        if not ids:
+            return
+        unique_sources, inverse = np.unique(np.asarray(sources), return_inverse=True)
+        sums = np.zeros((len(unique_sources), embeddings.shape[1]))
+        np.add.at(sums, inverse, np.asarray(embeddings, dtype=np.float64))
+        for i, source in enumerate(unique_sources.tolist()):
+            if source in self._sums:
+                self._sums[source] += sums[i]
+            else:
+                self._sums[source] = sums[i]
+        for chunk_id, source in zip(ids, sources):
+            self.ids.setdefault(source, []).append(chunk_id)
+
+    @property
+    def count(self) -> int:
+        """Number of chunks.
+
+        Returns:
+            int: the number of chunks of all sources
+        """
+        return sum(len(ids) for ids in self.ids.values())
+
+    def sum(self, source: str) -> npt.NDArray[np.float64]:
+        """Sum of the embeddings of a source.
+
+        Args:
+            source (str): Source of the chunks
+
+        Returns:
+            npt.NDArray[np.float64]: the sum of shape (d,)
+        """
+        return self._sums[source]
+
+    def centroid(self, source: str) -> npt.NDArray[np.float64]:
+        """Mean embedding of a source.
+
+        Args:
+            source (str): Source of the chunks
+
+        Returns:
+            npt.NDArray[np.float64]: the mean of shape (d,)
+        """
+        return self._sums[source] / len(self.ids[source])
+
+
+@dataclass
+class SourceDrift:
+    """Dataclass for the share of a source in the drift between two data versions.
+
+    Attributes:
+        source (str): Source of the chunks, e.g. the URL of a page
+        status (str): How the source changed, one of SOURCE_STATUSES
+        n_reference (int): Number of chunks of the source in the reference version
+        n_current (int): Number of chunks of the source in the current version
+        contribution (float): Part of the Euclidean distance between the means of the versions due to the source. The contributions of all sources sum to the distance, and negative ones pull the versions together.
+        centroid_shift (Optional[float]): Euclidean distance between the means of the source in both versions, None if it is only in one
+        chunk_distance (Optional[float]): Mean distance from the new chunks of a changed source to their nearest chunk of the source in the reference version, None if not computed
+        nearest_source (Optional[str]): Source of the other version whose mean is closest, for added and removed sources, which may have been moved
+        nearest_source_distance (Optional[float]): Euclidean distance to the mean of `nearest_source`
+    """
+
+    source: str
+    status: str
+    n_reference: int
+    n_current: int
+    contribution: float
+    centroid_shift: Optional[float] = None
+    chunk_distance: Optional[float] = None
+    nearest_source: Optional[str] = None
+    nearest_source_distance: Optional[float] = None
+
+
+@dataclass
+class DriftAttribution:
+    """Dataclass for the drift between two data versions broken down by source.
+
+    Attributes:
+        centroid_euclidean (float): Euclidean distance between the means of the versions
+        sources (List[SourceDrift]): Every source of either version, by decreasing contribution
+    """
+
+    centroid_euclidean: float
+    sources: List[SourceDrift]
+
+    def top(self, k: int = DEFAULT_TOP_K) -> List[SourceDrift]:
+        """The sources which contribute most to the drift, leaving out unchanged ones.
+
+        Args:
+            k (int, optional): Number of sources. Defaults to DEFAULT_TOP_K.
+
+        Returns:
+            List[SourceDrift]: at most `k` sources, by decreasing contribution
+        """
+        return [source for source in self.sources if source.status != "unchanged"][:k]
+
+
+def _mean_nearest_distance(
+    queries: npt.NDArray[np.float32], candidates: npt.NDArray[np.float32]
+) -> float:
+    """Mean distance from each query to its nearest candidate.
+
+    Args:
+        queries (npt.NDArray[np.float32]): Query embeddings of shape (n, d)
+        candidates (npt.NDArray[np.float32]): Candidate embeddings of shape (m, d)
+
+    Returns:
+        float: the mean nearest distance
+    """
+    distances = squared_distances(
+        np.asarray(queries, dtype=np.float64), np.asarray(candidates, dtype=np.float64)
+    )
+    return float(np.sqrt(distances.min(axis=1)).mean())
+
+
+def _nearest_sources(
+    sources: List[str],
+    centroids: npt.NDArray[np.float64],
+    other_sources: List[str],
+    other_centroids: npt.NDArray[np.float64],
+) -> Dict[str, Tuple[str, float]]:
+    """Find the source of the other version with the closest mean, for each source.
+
+    Args:
+        sources (List[str]): Sources to match
+        centroids (npt.NDArray[np.float64]): Means of the sources of shape (n, d)
+        other_sources (List[str]): Sources of the other version
+        other_centroids (npt.NDArray[np.float64]): Means of the sources of the other version of shape (m, d)
+
+    Returns:
+        Dict[str, Tuple[str, float]]: the closest source and the distance to its mean, keyed by source
+    """
+    if not sources or not other_sources:
+        return {}
+    distances = squared_distances(centroids, other_centroids)
+    nearest = distances.argmin(axis=1)
+    return {
+        source: (other_sources[j], float(np.sqrt(distances[i, j])))
+        for i, (source, j) in enumerate(zip(sources, nearest))
+    }
+
+
+def attribute_drift(
+    reference: SourceCentroids,
+    current: SourceCentroids,
+    fetch_reference: Optional[Callable[[List[str]], npt.NDArray[np.float32]]] = None,
+    fetch_current: Optional[Callable[[List[str]], npt.NDArray[np.float32]]] = None,
+) -> DriftAttribution:
+    """Break down the drift between two data versions by source.
+
+    The shift of the mean of the versions is the sum over sources of the current sum of a source over the number of current
+    chunks, minus its reference sum over the number of reference chunks. The contribution of a source is the projection
+    of its term onto the shift, so the contributions add up to the distance between the means.
+    Sources with the same chunk IDs in both versions are unchanged, as chunk IDs are derived from their text. The new chunks
+    of changed sources are matched to the chunks of the source in the reference version if both fetches are given, which
+    only fetches the embeddings of changed sources.
+
+    Args:
+        reference (SourceCentroids): Summary of the reference version
+        current (SourceCentroids): Summary of the current version
+        fetch_reference (Optional[Callable[[List[str]], npt.NDArray[np.float32]]], optional): Fetches the embeddings of reference chunks, in the order of their IDs. Defaults to None.
+        fetch_current (Optional[Callable[[List[str]], npt.NDArray[np.float32]]], optional): Fetches the embeddings of current chunks, in the order of their IDs. Defaults to None, which skips the chunk matching.
+
+    Returns:
+        DriftAttribution: the drift by source
+
+    Raises:
+        ValueError: if either version has no chunks
+    """
+    n_reference, n_current = reference.count, current.count
+    if n_reference == 0 or n_current == 0:
+        raise ValueError("Cannot attribute the drift of a data version without chunks")
+
+    sources = sorted(set(reference.ids) | set(current.ids))
+    dimension = len(reference.sum(next(iter(reference.ids))))
+    terms = np.zeros((len(sources), dimension))
+    for i, source in enumerate(sources):
+        if source in current.ids:
+            terms[i] += current.sum(source) / n_current
+        if source in reference.ids:
+            terms[i] -= reference.sum(source) / n_reference
+    shift = terms.sum(axis=0)
+    distance = float(np.linalg.norm(shift))
+    contributions = terms @ shift / distance if distance > 0 else np.zeros(len(sources))
+
+    changed = [
+        source
+        for source in sources
+        if source in reference.ids
+        and source in current.ids
+        and set(reference.ids[source]) != set(current.ids[source])
+    ]
+    changed_sources = set(changed)
+    chunk_distances: Dict[str, float] = {}
+    if changed and fetch_reference is not None and fetch_current is not None:
+        # The chunks of all changed sources are fetched at once, and matched source by source
+        new_ids = {
+            source: sorted(set(current.ids[source]) - set(reference.ids[source]))
+            for source in changed
+        }
+        # Sources which only lost chunks have no new chunks to match
+        matched = [source for source in changed if new_ids[source]]
+        if matched:
+            new_embeddings = fetch_current(
+                [chunk_id for source in matched for chunk_id in new_ids[source]]
+            )
+            reference_embeddings = fetch_reference(
+                [chunk_id for source in matched for chunk_id in reference.ids[source]]
+            )
+            new_offset = reference_offset = 0
+            for source in matched:
+                n_new, n_old = len(new_ids[source]), len(reference.ids[source])
+                chunk_distances[source] = _mean_nearest_distance(
+                    new_embeddings[new_offset : new_offset + n_new],
+                    reference_embeddings[reference_offset : reference_offset + n_old],
+                )
+                new_offset += n_new
+                reference_offset += n_old
+
+    added_sources = [source for source in sources if source not in reference.ids]
+    removed_sources = [source for source in sources if source not in current.ids]
+    reference_sources, current_sources = sorted(reference.ids), sorted(current.ids)
+    nearest = {
+        **_nearest_sources(
+            added_sources,
+            np.array([current.centroid(source) for source in added_sources]),
+            reference_sources,
+            np.array([reference.centroid(source) for source in reference_sources]),
+        ),
+        **_nearest_sources(
+            removed_sources,
+            np.array([reference.centroid(source) for source in removed_sources]),
+            current_sources,
+            np.array([current.centroid(source) for source in current_sources]),
+        ),
+    }
+
+    source_drifts = []
+    for source, contribution in zip(sources, contributions):
+        if source not in reference.ids:
+            status = "added"
+        elif source not in current.ids:
+            status = "removed"
+        else:
+            status = "changed" if source in changed_sources else "unchanged"
+        in_both = status in ("changed", "unchanged")
+        nearest_source, nearest_distance = nearest.get(source, (None, None))
+        source_drifts.append(
+            SourceDrift(
+                source=source,
+                status=status,
+                n_reference=len(reference.ids.get(source, [])),
+                n_current=len(current.ids.get(source, [])),
+                contribution=float(contribution),
+                centroid_shift=float(
+                    np.linalg.norm(
+                        current.centroid(source) - reference.centroid(source)
+                    )
+                )
+                if in_both
+                else None,
+                chunk_distance=chunk_distances.get(source),
+                nearest_source=nearest_source,
+                nearest_source_distance=nearest_distance,
+            )
+        )
+    source_drifts.sort(key=lambda source_drift: -source_drift.contribution)
+    return DriftAttribution(centroid_euclidean=distance, sources=source_drifts)
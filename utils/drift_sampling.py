@@ -0,0 +1,368 @@
+"""Approximate drift between two data versions, computed on stratified samples of their embeddings with bootstrap confidence intervals."""
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from utils.embedding_drift import (
+    EmbeddingDrift,
+    maximum_mean_discrepancy,
+    mean_distances,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of embeddings first sampled from each version, doubled every round until the interval is tight enough
+DEFAULT_INITIAL_SAMPLE_SIZE = 500
+DEFAULT_MAX_SAMPLE_SIZE = 16000
+# Largest width of the confidence interval of the centroid distance, relative to the estimate, at which sampling stops
+DEFAULT_TOLERANCE = 0.1
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_N_BOOTSTRAP = 200
+
+
+def _quotas(
+    stratum_sizes: npt.NDArray[np.int64], sample_size: int
+) -> npt.NDArray[np.float64]:
+    """Split a sample between strata in proportion to their sizes.
+
+    Args:
+        stratum_sizes (npt.NDArray[np.int64]): Number of items in each stratum
+        sample_size (int): Total number of items to sample, capped at the number of items
+
+    Returns:
+        npt.NDArray[np.float64]: Fractional number of items to sample from each stratum
+    """
+    total = int(stratum_sizes.sum())
+    if total == 0:
+        return np.zeros(len(stratum_sizes))
+    return stratum_sizes * (min(sample_size, total) / total)
+
+
+def allocate_sample(
+    stratum_sizes: npt.NDArray[np.int64],
+    sample_size: int,
+    offsets: npt.NDArray[np.float64],
+) -> npt.NDArray[np.int64]:
+    """Split a sample between strata in proportion to their sizes, rounding every quota up or down at random.
+
+    A stratum with quota q and offset u gets ceil(q - u) items, so uniform offsets round it up with probability equal
+    to its fractional part and the expected number of items is the quota. The total is only the sample size on average,
+    but with fixed offsets the allocation of every stratum grows with the sample size, so samples can be nested.
+
+    Args:
+        stratum_sizes (npt.NDArray[np.int64]): Number of items in each stratum
+        sample_size (int): Expected total number of items to sample, capped at the number of items
+        offsets (npt.NDArray[np.float64]): Offset of each stratum, drawn uniformly from [0, 1)
+
+    Returns:
+        npt.NDArray[np.int64]: Number of items to sample from each stratum
+    """
+    quotas = _quotas(stratum_sizes, sample_size)
+    return np.maximum(np.ceil(quotas - offsets), 0).astype(np.int64)  # type: ignore
+
+
+class StratifiedSampler:
+    """Draws nested random samples of the IDs of a data version, stratified by the source the chunks were split from.
+
+    Each stratum is shuffled once, and larger samples extend the previous ones, so the embeddings of earlier rounds are reused.
+    """
+
+    def __init__(self, ids_by_stratum: Dict[str, List[str]], seed: int = 0) -> None:
+        """Shuffle the IDs of every stratum.
+
+        Args:
+            ids_by_stratum (Dict[str, List[str]]): IDs of the chunks, keyed by source
+            seed (int, optional): Seed of the shuffles. Defaults to 0.
+
+        Raises:
+            ValueError: if there are no IDs
+        """
+        rng = np.random.default_rng(seed)
+        self._strata = [
+            [ids[i] for i in rng.permutation(len(ids))]
+            for _, ids in sorted(ids_by_stratum.items())
+            if ids
+        ]
+        if not self._strata:
+            raise ValueError("Cannot sample from a data version without chunks")
+        self._offsets = rng.random(len(self._strata))
+        self._quotas = np.zeros(len(self._strata))
+        self.stratum_sizes = np.array([len(ids) for ids in self._strata])
+        self.allocation = np.zeros(len(self._strata), dtype=np.int64)
+        self.strata: List[int] = []
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether every ID has been sampled.
+
+        Returns:
+            bool: True if the sample is the whole data version
+        """
+        return bool((self.allocation == self.stratum_sizes).all())
+
+    def extend(self, sample_size: int) -> List[str]:
+        """Grow the sample to about `sample_size` IDs.
+
+        Args:
+            sample_size (int): Expected number of IDs the sample should hold
+
+        Returns:
+            List[str]: the IDs added to the sample, whose strata are appended to `strata`
+        """
+        # The offsets are fixed, so the allocation of every stratum only grows and earlier draws are kept
+        allocation = allocate_sample(self.stratum_sizes, sample_size, self._offsets)
+        self._quotas = _quotas(self.stratum_sizes, sample_size)
+        added = []
+        for stratum, (start, end) in enumerate(zip(self.allocation, allocation)):
+            added.extend(self._strata[stratum][start:end])
+            self.strata.extend([stratum] * int(end - start))
+        self.allocation = allocation
+        return added
+
+    def row_weights(self) -> npt.NDArray[np.float64]:
+        """Weight of every sampled ID in the mean of the data version.
+
+        Each stratum expected to be sampled weighs its share of the IDs, split evenly between its sampled IDs. Strata with
+        quotas below one are sampled at most once, with probability proportional to their size, so they are collapsed into
+        one stratum whose sampled IDs weigh the same. A collapsed stratum without sampled IDs is left out of the mean.
+
+        Returns:
+            npt.NDArray[np.float64]: Weights of shape (n,), in the order the IDs were sampled, which sum to 1
+        """
+        shares = self.stratum_sizes / np.maximum(self.allocation, 1)
+        collapsed = self._quotas < 1
+        n_collapsed = int(self.allocation[collapsed].sum())
+        if n_collapsed:
+            shares[collapsed] = self.stratum_sizes[collapsed].sum() / n_collapsed
+        weights = shares[np.asarray(self.strata)]
+        return weights / weights.sum()  # type: ignore
+
+    def row_fractions(self) -> npt.NDArray[np.float64]:
+        """Sampled fraction of the stratum of every sampled ID.
+
+        The strata with quotas below one are collapsed into one stratum of sources, of which it is the fraction sampled.
+
+        Returns:
+            npt.NDArray[np.float64]: Fractions of shape (n,), in the order the IDs were sampled
+        """
+        fractions = self.allocation / self.stratum_sizes
+        collapsed = self._quotas < 1
+        if collapsed.any():
+            fractions[collapsed] = np.mean(self.allocation[collapsed] > 0)
+        return fractions[np.asarray(self.strata)]  # type: ignore
+
+
+@dataclass
+class StratifiedSample:
+    """Dataclass for the embeddings of a stratified sample of a data version.
+
+    Attributes:
+        embeddings (npt.NDArray[np.float32]): Sampled embeddings of shape (n, d)
+        strata (npt.NDArray[np.int64]): Stratum of each embedding of shape (n,)
+        weights (npt.NDArray[np.float64]): Weight of each embedding in the mean of the data version of shape (n,)
+        fractions (npt.NDArray[np.float64]): Sampled fraction of the stratum of each embedding of shape (n,)
+    """
+
+    embeddings: npt.NDArray[np.float32]
+    strata: npt.NDArray[np.int64]
+    weights: npt.NDArray[np.float64]
+    fractions: npt.NDArray[np.float64]
+
+    def mean(self) -> npt.NDArray[np.float64]:
+        """Estimate of the mean embedding of the data version.
+
+        Returns:
+            npt.NDArray[np.float64]: the weighted mean of the sample of shape (d,)
+        """
+        return self.weights @ self.embeddings.astype(np.float64)
+
+    def bootstrap_means(
+        self, n_bootstrap: int, rng: np.random.Generator
+    ) -> npt.NDArray[np.float64]:
+        """Means of stratified bootstrap resamples, where every stratum is resampled with replacement to its own size.
+
+        Strata with a single embedding have no variance of their own, so they are pooled: the weight of each of them is
+        given to an embedding drawn from the pool. The resamples are shrunk towards the sample by the square root of one
+        minus the sampled fraction, as resampling with replacement overstates the variance of sampling without it.
+
+        Args:
+            n_bootstrap (int): Number of resamples
+            rng (np.random.Generator): Random generator of the resamples
+
+        Returns:
+            npt.NDArray[np.float64]: Means of the resamples of shape (n_bootstrap, d)
+        """
+        resample_weights = np.zeros((n_bootstrap, len(self.strata)))
+        fractions = self.fractions.copy()
+        strata, sizes = np.unique(self.strata, return_counts=True)
+        for stratum in strata[sizes > 1]:
+            rows = np.flatnonzero(self.strata == stratum)
+            # The number of times each embedding of the stratum is drawn in each resample
+            counts = rng.multinomial(
+                len(rows), np.full(len(rows), 1 / len(rows)), size=n_bootstrap
+            )
+            resample_weights[:, rows] = counts * self.weights[rows]
+
+        pooled = np.flatnonzero(np.isin(self.strata, strata[sizes == 1]))
+        if len(pooled):
+            draws = pooled[rng.integers(len(pooled), size=(n_bootstrap, len(pooled)))]
+            np.add.at(
+                resample_weights,
+                (np.arange(n_bootstrap)[:, np.newaxis], draws),
+                self.weights[pooled],
+            )
+            fractions[pooled] = np.average(
+                fractions[pooled], weights=self.weights[pooled]
+            )
+        resample_weights = self.weights + np.sqrt(1 - fractions) * (
+            resample_weights - self.weights
+        )
+        return resample_weights @ self.embeddings.astype(np.float64)
+
+
+def _basic_interval(
+    estimate: float, bootstrap_estimates: npt.NDArray[np.float64], confidence: float
+) -> Tuple[float, float]:
+    """Basic bootstrap interval of a distance, the percentiles of the bootstrap estimates reflected around the estimate.
+
+    Distances between sample means are biased upwards, and the bootstrap estimates are biased upwards again from the
+    estimate, so reflecting the percentiles removes the bias which percentile intervals would double.
+
+    Args:
+        estimate (float): Distance between the sample means
+        bootstrap_estimates (npt.NDArray[np.float64]): Distances between the means of the bootstrap resamples
+        confidence (float): Confidence level of the interval
+
+    Returns:
+        Tuple[float, float]: the lower and upper bounds of the interval, which are not negative
+    """
+    tail = 100 * (1 - confidence) / 2
+    lower, upper = (
+        max(2 * estimate - float(np.percentile(bootstrap_estimates, q)), 0.0)
+        for q in (100 - tail, tail)
+    )
+    return lower, upper
+
+
+def approximate_drift(
+    reference_ids: Dict[str, List[str]],
+    current_ids: Dict[str, List[str]],
+    fetch_reference: Callable[[List[str]], npt.NDArray[np.float32]],
+    fetch_current: Callable[[List[str]], npt.NDArray[np.float32]],
+    initial_sample_size: int = DEFAULT_INITIAL_SAMPLE_SIZE,
+    max_sample_size: int = DEFAULT_MAX_SAMPLE_SIZE,
+    tolerance: float = DEFAULT_TOLERANCE,
+    confidence: float = DEFAULT_CONFIDENCE,
+    n_bootstrap: int = DEFAULT_N_BOOTSTRAP,
+    mmd_samples: Optional[int] = None,
+    seed: int = 0,
+) -> EmbeddingDrift:
+    """Estimate the drift between two data versions from stratified samples of their embeddings.
+
+    Both versions are sampled in proportion to the number of chunks of each source, and the centroid distances are computed
+    from the weighted means of the samples, with basic intervals from a stratified bootstrap. The samples are doubled
+    until the interval of the Euclidean distance is narrower than `tolerance` times the estimate, `max_sample_size` is
+    reached or both versions are sampled whole, so the cost is bounded whatever the size of the versions. An interval of
+    zero width says nothing about the error of the estimate, so it never stops the sampling.
+
+    Args:
+        reference_ids (Dict[str, List[str]]): IDs of the chunks of the reference version, keyed by source
+        current_ids (Dict[str, List[str]]): IDs of the chunks of the current version, keyed by source
+        fetch_reference (Callable[[List[str]], npt.NDArray[np.float32]]): Fetches the embeddings of reference chunks, in the order of their IDs
+        fetch_current (Callable[[List[str]], npt.NDArray[np.float32]]): Fetches the embeddings of current chunks, in the order of their IDs
+        initial_sample_size (int, optional): Number of embeddings first sampled from each version. Defaults to DEFAULT_INITIAL_SAMPLE_SIZE.
+        max_sample_size (int, optional): Largest number of embeddings sampled from each version. Defaults to DEFAULT_MAX_SAMPLE_SIZE.
+        tolerance (float, optional): Width of the interval relative to the estimate at which sampling stops. Defaults to DEFAULT_TOLERANCE.
+        confidence (float, optional): Confidence level of the intervals. Defaults to DEFAULT_CONFIDENCE.
+        n_bootstrap (int, optional): Number of bootstrap resamples. Defaults to DEFAULT_N_BOOTSTRAP.
+        mmd_samples (Optional[int], optional): Maximum number of sampled embeddings of each version the MMD is computed on. Defaults to None, which skips the MMD.
+        seed (int, optional): Seed of the samples and resamples. Defaults to 0.
+
+    Returns:
+        EmbeddingDrift: the estimated drift, with the sample sizes as the numbers of embeddings and the confidence intervals of the centroid distances
+
+    Raises:
+        ValueError: if the sampling parameters are invalid, or the embeddings of the versions are of different dimensions
+    """
+    if initial_sample_size < 2 or max_sample_size < initial_sample_size:
+        raise ValueError(
+            f"Sample sizes must satisfy 2 <= initial_sample_size <= max_sample_size, got {initial_sample_size} and {max_sample_size}"
+        )
+    if tolerance <= 0 or not 0 < confidence < 1 or n_bootstrap < 1:
+        raise ValueError(
+            f"tolerance must be positive, confidence in (0, 1) and n_bootstrap at least 1, got {tolerance}, {confidence} and {n_bootstrap}"
+        )
+
+    rng = np.random.default_rng(seed)
+    samplers = (
+        StratifiedSampler(reference_ids, seed),
+        StratifiedSampler(current_ids, seed + 1),
+    )
+    fetched: Tuple[List[npt.NDArray[np.float32]], List[npt.NDArray[np.float32]]] = (
+        [],
+        [],
+    )
+    sample_size = initial_sample_size
+    while True:
+        for sampler, fetch, batches in zip(
+            samplers, (fetch_reference, fetch_current), fetched
+        ):
+            added = sampler.extend(sample_size)
+            if added:
+                batches.append(np.asarray(fetch(added), dtype=np.float32))
+        reference, current = (
+            StratifiedSample(
+                embeddings=np.concatenate(batches),
+                strata=np.asarray(sampler.strata),
+                weights=sampler.row_weights(),
+                fractions=sampler.row_fractions(),
+            )
+            for sampler, batches in zip(samplers, fetched)
+        )
+        if reference.embeddings.shape[1] != current.embeddings.shape[1]:
+            raise ValueError(
+                f"The reference embeddings are of dimension {reference.embeddings.shape[1]} but the current embeddings are of dimension {current.embeddings.shape[1]}"
+            )
+
+        euclidean, cosine = mean_distances(reference.mean(), current.mean())
+        if all(sampler.exhausted for sampler in samplers):
+            # The whole of both versions was sampled, so the distances are exact
+            euclidean_interval = cosine_interval = None
+            break
+
+        bootstrap_euclidean, bootstrap_cosine = mean_distances(
+            reference.bootstrap_means(n_bootstrap, rng),
+            current.bootstrap_means(n_bootstrap, rng),
+        )
+        euclidean_interval, cosine_interval = (
+            _basic_interval(float(estimate), distances, confidence)
+            for estimate, distances in (
+                (euclidean, bootstrap_euclidean),
+                (cosine, bootstrap_cosine),
+            )
+        )
+        logger.info(
+            f"Sampled {len(reference.strata)} reference and {len(current.strata)} current embeddings, "
+            f"the Euclidean distance between the means is {float(euclidean)} in {euclidean_interval}"
+        )
+        width = euclidean_interval[1] - euclidean_interval[0]
+        if 0 < width <= tolerance * euclidean or sample_size >= max_sample_size:
+            break
+        sample_size = min(2 * sample_size, max_sample_size)
+
+    return EmbeddingDrift(
+        n_reference=len(reference.strata),
+        n_current=len(current.strata),
+        centroid_euclidean=float(euclidean),
+        centroid_cosine=float(cosine),
+        mmd=maximum_mean_discrepancy(
+            reference.embeddings, current.embeddings, mmd_samples, seed
+        )
+        if mmd_samples is not None
+        else None,
+        euclidean_interval=euclidean_interval,
+        cosine_interval=cosine_interval,
+    )
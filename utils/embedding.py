@@ -0,0 +1,466 @@
+"""Client-side batch embedding using Instructor models."""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import torch
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from InstructorEmbedding import INSTRUCTOR
+
+from utils.embedding_cache import DEFAULT_CACHE_CAPACITY, EmbeddingCache
+from utils.onnx_encoder import DEFAULT_ONNX_DIR, OnnxEncoder, onnx_model_path
+
+DEFAULT_BATCH_SIZE = 32
+# "torch" runs the model in full precision with PyTorch, "onnx" with ONNX Runtime and "onnx-int8" with ONNX Runtime on int8 weights
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EmbeddingModelConfig:
+    """Dataclass for an Instructor model and the backend which runs it."""
+
+    model_name: str
+    backend: str = "torch"
+
+    def __post_init__(self) -> None:
+        """Validate the backend.
+
+        Raises:
+            ValueError: if the backend is not one of EMBEDDING_BACKENDS
+        """
+        if self.backend not in EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"{self.backend} is not supported. The list of supported backends is {EMBEDDING_BACKENDS}"
+            )
+
+
+def length_sorted_batches(texts: Sequence[str], batch_size: int) -> Iterator[List[int]]:
+    """Group the indices of the input texts into batches of texts with similar lengths.
+
+    Texts of similar lengths are embedded together so that the tokenizer pads each batch as little as possible.
+
+    Args:
+        texts (Sequence[str]): Texts to batch
+        batch_size (int): Maximum number of texts in a batch
+
+    Yields:
+        Iterator[List[int]]: Indices into `texts` for each batch, ordered by text length.
+
+    Raises:
+        ValueError: if `batch_size` is less than 1
+    """
+    if batch_size < 1:
+        raise ValueError(f"Batch size must be at least 1, got {batch_size}")
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), batch_size):
+        yield order[start : start + batch_size]
+
+
+_worker_embedder: Optional["InstructorEmbedder"] = None
+
+
+def _init_worker(
+    model_name: str, instruction: str, num_threads: int, backend: str, onnx_dir: str
+) -> None:
+    """Load the model used by a worker process.
+
+    Args:
+        model_name (str): Name of the Instructor model
+        instruction (str): Instruction prepended to every text
+        num_threads (int): Number of threads used by the worker
+        backend (str): Backend running the model, one of EMBEDDING_BACKENDS
+        onnx_dir (str): Directory of the ONNX exports of the models
+    """
+    global _worker_embedder  # noqa: PLW0603
+    _worker_embedder = InstructorEmbedder(
+        model_name,
+        instruction,
+        num_threads=num_threads,
+        backend=backend,
+        onnx_dir=onnx_dir,
+    )
+
+
+def _read_model(model: Any, attribute: str) -> Any:
+    """Read the embedding dimension, or another attribute, of a loaded model.
+
+    Args:
+        model (Any): Loaded INSTRUCTOR model
+        attribute (str): "dimension" or the name of an attribute of the model, e.g. "tokenizer"
+
+    Returns:
+        Any: the value of the attribute
+    """
+    if attribute == "dimension":
+        return int(model.get_sentence_embedding_dimension())
+    return getattr(model, attribute)
+
+
+def _read_worker_model(attribute: str) -> Any:
+    """Read an attribute of the model of the worker process, so that the parent process does not load the model.
+
+    Args:
+        attribute (str): "dimension" or the name of an attribute of the model, e.g. "tokenizer"
+
+    Returns:
+        Any: the value of the attribute
+    """
+    assert _worker_embedder is not None
+    return _read_model(_worker_embedder._model, attribute)
+
+
+def _encode_in_worker(texts: List[str]) -> npt.NDArray[np.float32]:
+    """Embed texts with the model of the worker process.
+
+    Args:
+        texts (List[str]): Texts to embed
+
+    Returns:
+        npt.NDArray[np.float32]: Array of shape (len(texts), dimension)
+    """
+    assert _worker_embedder is not None
+    return _worker_embedder._encode(texts)
+
+
+class InstructorEmbedder(EmbeddingFunction):
+    """Instructor embedding function which computes embeddings in explicit batches."""
+
+    def __init__(
+        self,
+        model_name: str,
+        instruction: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        num_threads: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        cache_dtype: str = "float32",
+        cache_capacity: int = DEFAULT_CACHE_CAPACITY,
+        backend: str = "torch",
+        onnx_dir: str = DEFAULT_ONNX_DIR,
+        n_workers: Optional[int] = 1,
+    ) -> None:
+        """Load the Instructor model and optionally open an embedding cache for it.
+
+        With an ONNX backend, the transformer of the model is exported to `onnx_dir` the first time it is used and run with ONNX Runtime.
+
+        With more than one worker, batches are embedded in a pool of processes which each load the model once, and the cache is only used by this process.
+        This process then only loads the model to export it to ONNX if it has not been exported yet, and reads the dimension and tokenizer of the model from a worker.
+        Each worker uses `num_threads` threads, or an equal share of the CPU cores if it is None, so that the workers do not oversubscribe the CPU,
+        while the threads of this process are left alone. The pool must be shut down with `close`, or by using the embedder as a context manager.
+
+        Args:
+            model_name (str): Name of the Instructor model, e.g. "hkunlp/instructor-base"
+            instruction (str): Instruction prepended to every text
+            batch_size (int, optional): Number of texts embedded in a single forward pass. Defaults to DEFAULT_BATCH_SIZE.
+            num_threads (Optional[int], optional): Number of threads used by torch. Defaults to None, which keeps the torch default.
+            cache_dir (Optional[str], optional): Directory of the on-disk embedding cache. Defaults to None, which disables caching.
+                Caching is also disabled, with a warning, while another process uses the cache.
+            cache_dtype (str, optional): Data type used to store cached embeddings. Defaults to "float32".
+            cache_capacity (int, optional): Maximum number of cached embeddings. Defaults to DEFAULT_CACHE_CAPACITY.
+            backend (str, optional): Backend running the model, one of EMBEDDING_BACKENDS. Defaults to "torch".
+            onnx_dir (str, optional): Directory of the ONNX exports of the models. Defaults to DEFAULT_ONNX_DIR.
+            n_workers (Optional[int], optional): Number of processes embedding batches. Defaults to 1, which embeds in this process.
+                None uses a process per CPU core.
+
+        Raises:
+            ValueError: if the backend is not supported or `n_workers` is less than 1
+        """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(
+                f"{backend} is not supported. The list of supported backends is {EMBEDDING_BACKENDS}"
+            )
+        if n_workers is not None and n_workers < 1:
+            raise ValueError(f"Number of workers must be at least 1, got {n_workers}")
+
+        self.model_name = model_name
+        self.instruction = instruction
+        self.batch_size = batch_size
+        self.backend = backend
+        self._num_threads = num_threads
+        self._onnx_dir = onnx_dir
+        self._loaded_model: Optional[Any] = None
+        self._loaded_onnx_encoder: Optional[OnnxEncoder] = None
+        # Attributes of the model read from a worker, see `_read_model`
+        self._model_attributes: Dict[str, Any] = {}
+
+        if n_workers == 1:
+            if num_threads is not None:
+                torch.set_num_threads(num_threads)
+            self._loaded_model = INSTRUCTOR(model_name)
+            self._get_onnx_encoder()
+        elif backend != "torch" and not os.path.exists(
+            onnx_model_path(onnx_dir, model_name, quantise=backend == "onnx-int8")
+        ):
+            # Export once here, so the workers never export it concurrently, and free the model as this process does not embed
+            OnnxEncoder.export(
+                self._model,
+                onnx_model_path(onnx_dir, model_name),
+                quantise=backend == "onnx-int8",
+            )
+            self._loaded_model = None
+
+        self._executor: Optional[Executor] = None
+        if n_workers != 1:
+            n_workers = n_workers or os.cpu_count() or 1
+            self._executor = ProcessPoolExecutor(
+                max_workers=n_workers,
+                # Forked workers can deadlock on the thread pools torch has already started in this process
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    model_name,
+                    instruction,
+                    num_threads or max(1, (os.cpu_count() or 1) // n_workers),
+                    backend,
+                    onnx_dir,
+                ),
+            )
+
+        self.cache: Optional[EmbeddingCache] = None
+        if cache_dir is not None:
+            try:
+                self.cache = EmbeddingCache(
+                    cache_dir,
+                    # Embeddings of the ONNX backends differ slightly, so they are cached separately
+                    model_name=model_name
+                    if backend == "torch"
+                    else f"{model_name}:{backend}",
+                    instruction=instruction,
+                    dimension=self.dimension,
+                    dtype=cache_dtype,
+                    capacity=cache_capacity,
+                )
+            except RuntimeError as e:
+                logger.warning(f"{e}, embedding without a cache")
+
+    @property
+    def _model(self) -> Any:
+        """INSTRUCTOR model, loaded on first use.
+
+        Returns:
+            Any: the loaded model
+        """
+        if self._loaded_model is None:
+            self._loaded_model = INSTRUCTOR(self.model_name)
+        return self._loaded_model
+
+    def _get_onnx_encoder(self) -> Optional[OnnxEncoder]:
+        """ONNX Runtime encoder of the model, started on first use.
+
+        Returns:
+            Optional[OnnxEncoder]: the encoder, None with the torch backend
+        """
+        if self.backend != "torch" and self._loaded_onnx_encoder is None:
+            self._loaded_onnx_encoder = OnnxEncoder(
+                self._model,
+                self.model_name,
+                onnx_dir=self._onnx_dir,
+                quantise=self.backend == "onnx-int8",
+                num_threads=self._num_threads,
+            )
+        return self._loaded_onnx_encoder
+
+    def _read_model(self, attribute: str) -> Any:
+        """Read an attribute of the model, from a worker if this process has not loaded the model.
+
+        Args:
+            attribute (str): "dimension" or the name of an attribute of the model, e.g. "tokenizer"
+
+        Returns:
+            Any: the value of the attribute
+        """
+        if self._executor is None or self._loaded_model is not None:
+            return _read_model(self._model, attribute)
+        if attribute not in self._model_attributes:
+            self._model_attributes[attribute] = self._executor.submit(
+                _read_worker_model, attribute
+            ).result()
+        return self._model_attributes[attribute]
+
+    @property
+    def dimension(self) -> int:
+        """Dimension of the embeddings produced by the model.
+
+        Returns:
+            int: the embedding dimension
+        """
+        return int(self._read_model("dimension"))
+
+    @property
+    def tokenizer(self) -> Any:
+        """Tokenizer of the model.
+
+        Returns:
+            Any: the Hugging Face tokenizer
+        """
+        return self._read_model("tokenizer")
+
+    @property
+    def max_text_tokens(self) -> int:
+        """Number of tokens of a text which fit in the model window next to the instruction.
+
+        Longer texts are truncated by the model.
+
+        Returns:
+            int: the maximum number of tokens of a text
+        """
+        instruction_tokens = len(
+            self.tokenizer(self.instruction, add_special_tokens=False)["input_ids"]
+        )
+        return int(
+            self._read_model("max_seq_length")
+            - instruction_tokens
+            - self.tokenizer.num_special_tokens_to_add()
+        )
+
+    def _encode(self, texts: Sequence[str]) -> npt.NDArray[np.float32]:
+        """Embed texts with the model in one forward pass.
+
+        Args:
+            texts (Sequence[str]): Texts to embed
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (len(texts), dimension)
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        pairs = [[self.instruction, text] for text in texts]
+        onnx_encoder = self._get_onnx_encoder()
+        if onnx_encoder is not None:
+            return onnx_encoder.encode(pairs)
+
+        embeddings = self._model.encode(
+            pairs,
+            batch_size=len(texts),
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _lookup(
+        self, texts: Sequence[str]
+    ) -> Tuple[npt.NDArray[np.float32], List[int]]:
+        """Look up the cached embeddings of texts.
+
+        Args:
+            texts (Sequence[str]): Texts to look up
+
+        Returns:
+            Tuple[npt.NDArray[np.float32], List[int]]: Array of shape (len(texts), dimension) holding the cached embeddings, and the indices of the texts which are not cached
+        """
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if self.cache is None:
+            return embeddings, list(range(len(texts)))
+
+        misses = []
+        for i, cached in enumerate(self.cache.get_many(texts)):
+            if cached is None:
+                misses.append(i)
+            else:
+                embeddings[i] = cached
+        return embeddings, misses
+
+    def embed_batches(
+        self, batches: Iterable[Sequence[str]]
+    ) -> Iterator[npt.NDArray[np.float32]]:
+        """Embed batches of texts, computing only the embeddings which are not cached.
+
+        All batches are looked up in the cache first, then the texts which are not cached are embedded, in parallel with a pool of workers.
+        Embeddings are yielded in the order of the batches as soon as they are ready.
+
+        Args:
+            batches (Iterable[Sequence[str]]): Batches of texts to embed
+
+        Yields:
+            Iterator[npt.NDArray[np.float32]]: Array of shape (len(batch), dimension) for each batch
+        """
+        batches = list(batches)
+        lookups = [self._lookup(texts) for texts in batches]
+        missed_batches = [
+            [texts[i] for i in misses] for texts, (_, misses) in zip(batches, lookups)
+        ]
+
+        # Executor.map returns results in the order of the inputs, whichever worker finishes first
+        computed_batches: Iterator[npt.NDArray[np.float32]] = (
+            self._executor.map(_encode_in_worker, missed_batches)
+            if self._executor is not None
+            else map(self._encode, missed_batches)
+        )
+        for (embeddings, misses), missed_texts, computed in zip(
+            lookups, missed_batches, computed_batches
+        ):
+            if misses:
+                embeddings[misses] = computed
+                if self.cache is not None:
+                    self.cache.put_many(missed_texts, computed)
+            yield embeddings
+
+    def embed_batch(self, texts: Sequence[str]) -> npt.NDArray[np.float32]:
+        """Embed a single batch of texts, computing only the embeddings which are not cached.
+
+        Args:
+            texts (Sequence[str]): Texts to embed
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (len(texts), dimension)
+        """
+        return next(self.embed_batches([texts]))
+
+    def embed(self, texts: Sequence[str]) -> npt.NDArray[np.float32]:
+        """Embed texts in length-sorted batches and return the embeddings in input order.
+
+        Args:
+            texts (Sequence[str]): Texts to embed
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (len(texts), dimension)
+        """
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        batches = list(length_sorted_batches(texts, self.batch_size))
+        for batch, batch_embeddings in zip(
+            batches,
+            self.embed_batches([[texts[i] for i in batch] for batch in batches]),
+        ):
+            embeddings[batch] = batch_embeddings
+        return embeddings
+
+    def close(self) -> None:
+        """Shut down the pool of workers, if any."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "InstructorEmbedder":
+        """Use the embedder in a with statement, which shuts down its workers on exit.
+
+        Returns:
+            InstructorEmbedder: the embedder
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Shut down the pool of workers, if any.
+
+        Args:
+            *exc_info (Any): Exception raised in the with statement, if any
+        """
+        self.close()
+
+    def __call__(self, texts: Documents) -> Embeddings:
+        """Embed texts, so that the embedder can be used as a Chroma embedding function.
+
+        Args:
+            texts (Documents): Documents to embed
+
+        Returns:
+            Embeddings: Embeddings of the documents
+        """
+        return self.embed(texts).tolist()
@@ -0,0 +1,348 @@
+"""Persistent on-disk cache for text embeddings."""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, TextIO, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_CAPACITY = 200_000
+# Rows allocated when a cache is created, the arrays are doubled as the cache fills up until they reach its capacity
+INITIAL_CACHE_ROWS = 4096
+SUPPORTED_CACHE_DTYPES = ("float32", "float16")
+# Keys are stored as hex encoded SHA-256 digests, empty keys mark free slots
+KEY_DTYPE = "S64"
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Dataclass for reporting the usage of an embedding cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups which were found in the cache.
+
+        Returns:
+            float: the hit rate, 0 if there were no lookups
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _open_array(
+    path: str,
+    mode: str,
+    dtype: Any = None,
+    shape: Optional[Tuple[int, ...]] = None,
+) -> "np.memmap[Any, np.dtype[Any]]":
+    """Memory-map an NPY file, creating it with the given data type and shape in "w+" mode.
+
+    Args:
+        path (str): Path of the NPY file
+        mode (str): "r+" to open an existing file, "w+" to create it
+        dtype (Any, optional): Data type of a new array. Defaults to None.
+        shape (Optional[Tuple[int, ...]], optional): Shape of a new array. Defaults to None.
+
+    Returns:
+        np.memmap[Any, np.dtype[Any]]: the memory-mapped array
+    """
+    # numpy ships no annotations for its format module
+    array: "np.memmap[Any, np.dtype[Any]]" = np.lib.format.open_memmap(  # type: ignore[no-untyped-call]
+        path, mode=mode, dtype=dtype, shape=shape
+    )
+    return array
+
+
+def hash_text(text: str) -> bytes:
+    """Hash a text to the key used by the embedding cache.
+
+    Args:
+        text (str): Text to hash
+
+    Returns:
+        bytes: hex encoded SHA-256 digest of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest().encode("ascii")
+
+
+class EmbeddingCache:
+    """Embedding cache backed by memory-mapped arrays on disk.
+
+    Each pair of model name and instruction gets its own directory containing three arrays of up to `capacity` rows:
+    the embeddings, the text hash stored in each row, and when each row was last used.
+    The arrays start with INITIAL_CACHE_ROWS rows and are doubled as the cache fills up, so a large capacity costs no disk until it is used.
+    The text hashes form the index of the cache, and the least recently used rows are evicted once the cache is full.
+
+    A cache directory has a single writer: an open cache holds an exclusive lock on its directory until it is closed,
+    and opening it from another process, or a second time from the same process, fails. Threads may share an open cache.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        instruction: str,
+        dimension: int,
+        dtype: str = "float32",
+        capacity: int = DEFAULT_CACHE_CAPACITY,
+    ) -> None:
+        """Open the cache for the given model and instruction, creating it if it does not exist.
+
+        Args:
+            cache_dir (str): Root directory of the cache
+            model_name (str): Name of the embedding model
+            instruction (str): Instruction used with the embedding model
+            dimension (int): Dimension of the embeddings
+            dtype (str, optional): Data type used to store the embeddings, "float32" or "float16". Defaults to "float32".
+            capacity (int, optional): Maximum number of embeddings kept in the cache. Defaults to DEFAULT_CACHE_CAPACITY.
+
+        Raises:
+            ValueError: if `dtype` is not supported or `capacity` is less than 1
+            RuntimeError: if the cache is open elsewhere
+        """
+        if dtype not in SUPPORTED_CACHE_DTYPES:
+            raise ValueError(
+                f"{dtype} is not supported. The list of supported dtypes is {SUPPORTED_CACHE_DTYPES}"
+            )
+        if capacity < 1:
+            raise ValueError(f"Cache capacity must be at least 1, got {capacity}")
+
+        namespace = hashlib.sha256(f"{model_name}\0{instruction}".encode()).hexdigest()[
+            :16
+        ]
+        self.directory = os.path.join(cache_dir, namespace)
+        self.capacity = capacity
+        self._array_paths = [
+            os.path.join(self.directory, name)
+            for name in ("embeddings.npy", "keys.npy", "last_used.npy")
+        ]
+
+        os.makedirs(self.directory, exist_ok=True)
+        # The lock is held until the cache is closed, so the file stays open
+        self._lock_file: Optional[TextIO] = open(  # noqa: SIM115
+            os.path.join(self.directory, "lock"), "w"
+        )
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                f"Embedding cache at {self.directory} is open in another process or embedder"
+            )
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._open(
+            {
+                "model_name": model_name,
+                "instruction": instruction,
+                "dimension": dimension,
+                "dtype": dtype,
+                "capacity": capacity,
+            }
+        )
+
+    def _open(self, metadata: Dict[str, Any]) -> None:
+        """Memory-map the cache arrays and rebuild the in-memory index from the stored keys.
+
+        Args:
+            metadata (Dict[str, Any]): Description of the cache, the cache is recreated if it does not match the stored one.
+        """
+        metadata_path = os.path.join(self.directory, "metadata.json")
+
+        arrays = None
+        if os.path.exists(metadata_path) and all(
+            map(os.path.exists, self._array_paths)
+        ):
+            with open(metadata_path) as f:
+                if json.load(f) == metadata:
+                    arrays = [_open_array(path, "r+") for path in self._array_paths]
+                else:
+                    logger.warning(
+                        f"Embedding cache at {self.directory} does not match {metadata}, recreating it"
+                    )
+        # An interrupted resize leaves arrays of different lengths behind
+        if arrays is not None and len({len(array) for array in arrays}) > 1:
+            logger.warning(
+                f"Embedding cache at {self.directory} was not resized completely, recreating it"
+            )
+            arrays = None
+
+        if arrays is None:
+            n_rows = min(metadata["capacity"], INITIAL_CACHE_ROWS)
+            arrays = [
+                _open_array(path, "w+", dtype=dtype, shape=(n_rows,) + row_shape)
+                for path, dtype, row_shape in zip(
+                    self._array_paths,
+                    (metadata["dtype"], KEY_DTYPE, np.int64),
+                    ((metadata["dimension"],), (), ()),
+                )
+            ]
+            with open(metadata_path, "w") as f:
+                json.dump(metadata, f)
+        self._embeddings, self._keys, self._last_used = arrays
+
+        occupied = self._keys != b""
+        self._index = {
+            bytes(self._keys[slot]): int(slot) for slot in np.flatnonzero(occupied)
+        }
+        self._free_slots = np.flatnonzero(~occupied)[::-1].tolist()
+        self._clock = int(self._last_used.max())
+
+    def _grow(self, n_slots: int) -> None:
+        """Enlarge the arrays to at least twice their length, or by `n_slots` rows, without exceeding the capacity.
+
+        Each array is copied to a new file which then replaces it, so the cache is recreated rather than corrupted if this is interrupted.
+
+        Args:
+            n_slots (int): Number of slots needed in addition to the free ones
+        """
+        n_rows = len(self._keys)
+        new_n_rows = min(self.capacity, max(2 * n_rows, n_rows + n_slots))
+        grown = []
+        for path, array in zip(
+            self._array_paths, (self._embeddings, self._keys, self._last_used)
+        ):
+            new_array = _open_array(
+                f"{path}.tmp",
+                "w+",
+                dtype=array.dtype,
+                shape=(new_n_rows,) + array.shape[1:],
+            )
+            new_array[:n_rows] = array
+            new_array.flush()
+            grown.append(new_array)
+        # The maps follow the files when they are renamed
+        for path in self._array_paths:
+            os.replace(f"{path}.tmp", path)
+        self._embeddings, self._keys, self._last_used = grown
+        self._free_slots[:0] = range(new_n_rows - 1, n_rows - 1, -1)
+
+    def __len__(self) -> int:
+        """Number of embeddings in the cache.
+
+        Returns:
+            int: the number of cached embeddings
+        """
+        return len(self._index)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[npt.NDArray[np.float32]]]:
+        """Look up the cached embeddings of texts.
+
+        Args:
+            texts (Sequence[str]): Texts to look up
+
+        Returns:
+            List[Optional[npt.NDArray[np.float32]]]: the cached embedding of each text, None if it is not cached
+        """
+        with self._lock:
+            slots = [self._index.get(hash_text(text)) for text in texts]
+            hit_slots = [slot for slot in slots if slot is not None]
+
+            self._hits += len(hit_slots)
+            self._misses += len(slots) - len(hit_slots)
+
+            if hit_slots:
+                self._clock += 1
+                self._last_used[hit_slots] = self._clock
+
+            return [
+                None if slot is None else self._embeddings[slot].astype(np.float32)
+                for slot in slots
+            ]
+
+    def _evict(self, n_slots: int) -> None:
+        """Free the least recently used slots.
+
+        Args:
+            n_slots (int): Number of slots to free
+        """
+        # Rank only occupied slots, free ones are ranked last so they are never evicted
+        last_used = np.where(self._keys != b"", self._last_used, np.iinfo(np.int64).max)
+        victims = np.argpartition(last_used, n_slots - 1)[:n_slots]
+        for slot in victims.tolist():
+            del self._index[bytes(self._keys[slot])]
+            self._keys[slot] = b""
+            self._free_slots.append(slot)
+        self._evictions += n_slots
+
+    def put_many(self, texts: Sequence[str], embeddings: npt.NDArray[Any]) -> None:
+        """Store the embeddings of texts, evicting the least recently used embeddings if the cache is full.
+
+        Args:
+            texts (Sequence[str]): Texts which were embedded
+            embeddings (npt.NDArray[Any]): Embeddings of the texts, of shape (len(texts), dimension)
+        """
+        with self._lock:
+            new_rows: Dict[bytes, int] = {}
+            for row, text in enumerate(texts):
+                key = hash_text(text)
+                if key not in self._index:
+                    new_rows[key] = row
+
+            # If there are more new texts than the cache can hold, keep the last ones
+            rows = list(new_rows.items())[-self.capacity :]
+            if not rows:
+                return
+
+            n_missing_slots = len(rows) - len(self._free_slots)
+            if n_missing_slots > 0 and len(self._keys) < self.capacity:
+                self._grow(n_missing_slots)
+                n_missing_slots = len(rows) - len(self._free_slots)
+            if n_missing_slots > 0:
+                self._evict(n_missing_slots)
+
+            slots = [self._free_slots.pop() for _ in rows]
+            # Clear the keys first, so that an interrupted write never pairs a key with another text's embedding
+            self._keys[slots] = b""
+            self._embeddings[slots] = embeddings[[row for _, row in rows]]
+            self._keys[slots] = [key for key, _ in rows]
+
+            self._clock += 1
+            self._last_used[slots] = self._clock
+            for (key, _), slot in zip(rows, slots):
+                self._index[key] = slot
+
+    def flush(self) -> None:
+        """Write any changes to the cache to disk."""
+        with self._lock:
+            for array in (self._embeddings, self._keys, self._last_used):
+                array.flush()
+
+    def close(self) -> None:
+        """Write any changes to the cache to disk and release its directory, so that it can be opened again."""
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> EmbeddingCacheStats:
+        """Report the usage of the cache since it was opened.
+
+        Returns:
+            EmbeddingCacheStats: the hits, misses, evictions, size and capacity of the cache
+        """
+        return EmbeddingCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._index),
+            capacity=self.capacity,
+        )
@@ -0,0 +1,292 @@
+"""Drift between the embeddings of two data versions, computed on (n, d) arrays."""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from utils.embedding_sketch import EmbeddingSketch
+
+# Number of embeddings of each version the MMD kernel is computed on, as the kernel matrices grow with the square of it
+DEFAULT_MMD_SAMPLES = 1000
+
+
+@dataclass
+class EmbeddingDrift:
+    """Dataclass for the drift between reference and current embeddings.
+
+    Attributes:
+        n_reference (int): Number of reference embeddings
+        n_current (int): Number of current embeddings
+        centroid_euclidean (float): Euclidean distance between the per-dimension means of the versions
+        centroid_cosine (float): Cosine distance between the per-dimension means of the versions
+        mmd (Optional[float]): Unbiased estimate of the squared maximum mean discrepancy with a Gaussian kernel, None if not computed
+        frechet (Optional[float]): Squared Fréchet distance between Gaussians fitted to the versions, None if not computed
+        euclidean_interval (Optional[Tuple[float, float]]): Confidence interval of `centroid_euclidean` when it is estimated from samples, None if exact
+        cosine_interval (Optional[Tuple[float, float]]): Confidence interval of `centroid_cosine` when it is estimated from samples, None if exact
+    """
+
+    n_reference: int
+    n_current: int
+    centroid_euclidean: float
+    centroid_cosine: float
+    mmd: Optional[float] = None
+    frechet: Optional[float] = None
+    euclidean_interval: Optional[Tuple[float, float]] = None
+    cosine_interval: Optional[Tuple[float, float]] = None
+
+
+def as_embedding_array(embeddings: Any, name: str) -> npt.NDArray[np.float32]:
+    """Convert embeddings to a float32 array of shape (n, d).
+
+    Args:
+        embeddings (Any): Embeddings as an array or a list of lists of numbers
+        name (str): Name of the embeddings in error messages, e.g. "reference"
+
+    Returns:
+        npt.NDArray[np.float32]: the embeddings
+
+    Raises:
+        TypeError: if the embeddings are not a two-dimensional array of numbers
+        ValueError: if there are no embeddings
+    """
+    try:
+        array = np.asarray(embeddings)
+    except ValueError:
+        # Raised for ragged lists
+        array = np.empty(0, dtype=object)
+    if array.ndim != 2 or not np.issubdtype(array.dtype, np.number):
+        raise TypeError(
+            f"The {name} embeddings should be a two-dimensional array of numbers."
+        )
+    if len(array) == 0:
+        raise ValueError(f"There are no {name} embeddings.")
+    return array.astype(np.float32, copy=False)
+
+
+def mean_distances(
+    reference_means: npt.NDArray[np.float64], current_means: npt.NDArray[np.float64]
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Euclidean and cosine distances between pairs of means.
+
+    Args:
+        reference_means (npt.NDArray[np.float64]): Reference means of shape (..., d)
+        current_means (npt.NDArray[np.float64]): Current means of shape (..., d)
+
+    Returns:
+        Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]: the Euclidean and cosine distances of shape (...)
+    """
+    euclidean = np.linalg.norm(reference_means - current_means, axis=-1)
+    norms = np.linalg.norm(reference_means, axis=-1) * np.linalg.norm(
+        current_means, axis=-1
+    )
+    similarity = np.sum(reference_means * current_means, axis=-1)
+    cosine = np.where(norms > 0, 1.0 - similarity / np.where(norms > 0, norms, 1), 0.0)
+    return euclidean, cosine
+
+
+def centroid_distances(
+    reference: npt.NDArray[np.float32], current: npt.NDArray[np.float32]
+) -> Tuple[float, float]:
+    """Distances between the per-dimension means of two sets of embeddings, which may be of different sizes.
+
+    Args:
+        reference (npt.NDArray[np.float32]): Reference embeddings of shape (n, d)
+        current (npt.NDArray[np.float32]): Current embeddings of shape (m, d)
+
+    Returns:
+        Tuple[float, float]: the Euclidean and cosine distances between the means
+    """
+    # Accumulate in float64, as float32 sums of many embeddings lose precision
+    euclidean, cosine = mean_distances(
+        reference.mean(axis=0, dtype=np.float64),
+        current.mean(axis=0, dtype=np.float64),
+    )
+    return float(euclidean), float(cosine)
+
+
+def squared_distances(
+    x: npt.NDArray[np.float64], y: npt.NDArray[np.float64]
+) -> npt.NDArray[np.float64]:
+    """Pairwise squared Euclidean distances.
+
+    Args:
+        x (npt.NDArray[np.float64]): Array of shape (n, d)
+        y (npt.NDArray[np.float64]): Array of shape (m, d)
+
+    Returns:
+        npt.NDArray[np.float64]: Array of shape (n, m)
+    """
+    distances = np.sum(x**2, axis=1)[:, None] + np.sum(y**2, axis=1) - 2 * x @ y.T
+    return np.maximum(distances, 0)  # type: ignore
+
+
+def maximum_mean_discrepancy(
+    reference: npt.NDArray[np.float32],
+    current: npt.NDArray[np.float32],
+    max_samples: int = DEFAULT_MMD_SAMPLES,
+    seed: int = 0,
+) -> float:
+    """Unbiased estimate of the squared maximum mean discrepancy between two sets of embeddings with a Gaussian kernel.
+
+    Each set is subsampled to at most `max_samples` embeddings. The kernel bandwidth is the median squared distance between
+    the subsampled embeddings of both sets.
+
+    Args:
+        reference (npt.NDArray[np.float32]): Reference embeddings of shape (n, d)
+        current (npt.NDArray[np.float32]): Current embeddings of shape (m, d)
+        max_samples (int, optional): Maximum number of embeddings of each set. Defaults to DEFAULT_MMD_SAMPLES.
+        seed (int, optional): Seed of the subsampling. Defaults to 0.
+
+    Returns:
+        float: the squared MMD, close to 0 when both sets come from the same distribution
+
+    Raises:
+        ValueError: if either set has fewer than 2 embeddings, or `max_samples` is less than 2
+    """
+    if max_samples < 2:
+        raise ValueError(f"max_samples must be at least 2, got {max_samples}")
+    if len(reference) < 2 or len(current) < 2:
+        raise ValueError("MMD needs at least 2 embeddings of each version")
+
+    rng = np.random.default_rng(seed)
+    x, y = (
+        np.asarray(
+            embeddings[rng.choice(len(embeddings), max_samples, replace=False)]
+            if len(embeddings) > max_samples
+            else embeddings,
+            dtype=np.float64,
+        )
+        for embeddings in (reference, current)
+    )
+
+    xx, yy, xy = (
+        squared_distances(x, x),
+        squared_distances(y, y),
+        squared_distances(x, y),
+    )
+    bandwidth = float(np.median(np.concatenate([xx.ravel(), yy.ravel(), xy.ravel()])))
+    if bandwidth == 0:
+        bandwidth = 1.0
+    kxx, kyy, kxy = (np.exp(-d / bandwidth) for d in (xx, yy, xy))
+
+    n, m = len(x), len(y)
+    # The diagonals compare embeddings with themselves and are left out of the unbiased estimate
+    return float(
+        (kxx.sum() - np.trace(kxx)) / (n * (n - 1))
+        + (kyy.sum() - np.trace(kyy)) / (m * (m - 1))
+        - 2 * kxy.mean()
+    )
+
+
+def compute_drift(
+    reference: Any,
+    current: Any,
+    mmd_samples: Optional[int] = None,
+    seed: int = 0,
+) -> EmbeddingDrift:
+    """Compute the drift between reference and current embeddings.
+
+    Args:
+        reference (Any): Reference embeddings of shape (n, d), as an array or a list of lists of numbers
+        current (Any): Current embeddings of shape (m, d), as an array or a list of lists of numbers
+        mmd_samples (Optional[int], optional): Maximum number of embeddings of each version the MMD is computed on. Defaults to None, which skips the MMD.
+        seed (int, optional): Seed of the MMD subsampling. Defaults to 0.
+
+    Returns:
+        EmbeddingDrift: the drift
+
+    Raises:
+        ValueError: if the embeddings of the versions are of different dimensions
+    """
+    reference = as_embedding_array(reference, "reference")
+    current = as_embedding_array(current, "current")
+    if reference.shape[1] != current.shape[1]:
+        raise ValueError(
+            f"The reference embeddings are of dimension {reference.shape[1]} but the current embeddings are of dimension {current.shape[1]}"
+        )
+
+    euclidean, cosine = centroid_distances(reference, current)
+    return EmbeddingDrift(
+        n_reference=len(reference),
+        n_current=len(current),
+        centroid_euclidean=euclidean,
+        centroid_cosine=cosine,
+        mmd=maximum_mean_discrepancy(reference, current, mmd_samples, seed)
+        if mmd_samples is not None
+        else None,
+    )
+
+
+def frechet_distance(reference: EmbeddingSketch, current: EmbeddingSketch) -> float:
+    """Squared Fréchet distance between Gaussians with the means and covariances of two sketches.
+
+    The cross term is computed from the leading eigenpairs kept in the sketches, in O(d r^2), so the distance is
+    slightly overestimated when the covariances have much variance outside them.
+
+    Args:
+        reference (EmbeddingSketch): Sketch of the reference embeddings
+        current (EmbeddingSketch): Sketch of the current embeddings
+
+    Returns:
+        float: the squared Fréchet distance
+    """
+    # With C = U diag(l) U^T, the trace of (C1^1/2 C2 C1^1/2)^1/2 is the nuclear norm of diag(l1^1/2) U1^T U2 diag(l2^1/2)
+    cross = (
+        np.sqrt(reference.eigenvalues)[:, None]
+        * (reference.components.T.astype(np.float64) @ current.components)
+        * np.sqrt(current.eigenvalues)
+    )
+    return float(
+        np.sum((reference.mean - current.mean) ** 2)
+        + reference.trace
+        + current.trace
+        - 2 * np.linalg.svd(cross, compute_uv=False).sum()
+    )
+
+
+def compare_sketches(
+    reference: EmbeddingSketch,
+    current: EmbeddingSketch,
+    mmd_samples: Optional[int] = None,
+    seed: int = 0,
+) -> EmbeddingDrift:
+    """Compute the drift between two versions from their sketches, without their embeddings.
+
+    The centroid distances are exact. The MMD is computed on the samples of the sketches.
+
+    Args:
+        reference (EmbeddingSketch): Sketch of the reference embeddings
+        current (EmbeddingSketch): Sketch of the current embeddings
+        mmd_samples (Optional[int], optional): Maximum number of sampled embeddings of each version the MMD is computed on. Defaults to None, which skips the MMD.
+        seed (int, optional): Seed of the MMD subsampling. Defaults to 0.
+
+    Returns:
+        EmbeddingDrift: the drift
+
+    Raises:
+        ValueError: if the embeddings of the versions are of different dimensions, or were projected by different fits
+    """
+    if len(reference.mean) != len(current.mean):
+        raise ValueError(
+            f"The reference embeddings are of dimension {len(reference.mean)} but the current embeddings are of dimension {len(current.mean)}"
+        )
+    if reference.projection != current.projection:
+        raise ValueError(
+            f"The reference embeddings were projected by {reference.projection} but the current embeddings by {current.projection}, "
+            "so they are not in the same space"
+        )
+
+    euclidean, cosine = mean_distances(reference.mean, current.mean)
+    return EmbeddingDrift(
+        n_reference=reference.count,
+        n_current=current.count,
+        centroid_euclidean=float(euclidean),
+        centroid_cosine=float(cosine),
+        mmd=maximum_mean_discrepancy(
+            reference.sample, current.sample, mmd_samples, seed
+        )
+        if mmd_samples is not None
+        else None,
+        frechet=frechet_distance(reference, current),
+    )
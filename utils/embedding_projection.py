@@ -0,0 +1,207 @@
+"""Projections of embeddings to fewer dimensions, applied before they are stored and to the queries of the collection."""
+import base64
+import hashlib
+import io
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+# "pca" projects onto the principal components of a sample of the corpus, "truncate" keeps the leading dimensions as with Matryoshka embeddings
+PROJECTION_METHODS = ("pca", "truncate")
+DEFAULT_OUTPUT_DIMENSION = 256
+DEFAULT_FIT_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class ProjectionConfig:
+    """Dataclass for how the embeddings of a collection are projected.
+
+    Attributes:
+        method (str): Projection method, one of PROJECTION_METHODS
+        output_dimension (int): Dimension of the projected embeddings
+        fit_size (int): Number of embeddings the PCA projection is fitted on, sampled evenly across the data version
+    """
+
+    method: str = "pca"
+    output_dimension: int = DEFAULT_OUTPUT_DIMENSION
+    fit_size: int = DEFAULT_FIT_SIZE
+
+    def __post_init__(self) -> None:
+        """Validate the projection parameters.
+
+        Raises:
+            ValueError: if the method is not supported, the output dimension is less than 1 or the fit size is less than the output dimension
+        """
+        if self.method not in PROJECTION_METHODS:
+            raise ValueError(
+                f"{self.method} is not supported. The list of supported projection methods is {PROJECTION_METHODS}"
+            )
+        if self.output_dimension < 1:
+            raise ValueError(
+                f"Output dimension must be at least 1, got {self.output_dimension}"
+            )
+        if self.fit_size < self.output_dimension:
+            raise ValueError(
+                f"Fit size {self.fit_size} must be at least the output dimension {self.output_dimension}"
+            )
+
+
+@dataclass
+class EmbeddingProjection:
+    """Linear projection of embeddings to fewer dimensions.
+
+    Attributes:
+        method (str): Projection method, one of PROJECTION_METHODS
+        input_dimension (int): Dimension of the embeddings of the model
+        output_dimension (int): Dimension of the projected embeddings
+        mean (Optional[npt.NDArray[np.float32]]): Mean embedding subtracted before a PCA projection, None when truncating
+        components (Optional[npt.NDArray[np.float32]]): Principal components of shape (input_dimension, output_dimension), None when truncating
+    """
+
+    method: str
+    input_dimension: int
+    output_dimension: int
+    mean: Optional[npt.NDArray[np.float32]] = None
+    components: Optional[npt.NDArray[np.float32]] = None
+
+    @classmethod
+    def fit(
+        cls, config: ProjectionConfig, embeddings: npt.NDArray[np.float32]
+    ) -> "EmbeddingProjection":
+        """Fit a projection to a sample of embeddings.
+
+        Args:
+            config (ProjectionConfig): Projection to fit
+            embeddings (npt.NDArray[np.float32]): Sample of embeddings of shape (n, d)
+
+        Returns:
+            EmbeddingProjection: the fitted projection
+
+        Raises:
+            ValueError: if the output dimension is larger than the dimension of the embeddings, or a PCA projection is fitted on fewer embeddings than its output dimension
+        """
+        n_samples, input_dimension = embeddings.shape
+        if config.output_dimension > input_dimension:
+            raise ValueError(
+                f"Output dimension {config.output_dimension} is larger than the embedding dimension {input_dimension}"
+            )
+        if config.method == "truncate":
+            return cls("truncate", input_dimension, config.output_dimension)
+
+        if n_samples < config.output_dimension:
+            raise ValueError(
+                f"A PCA projection to {config.output_dimension} dimensions needs at least as many embeddings, got {n_samples}"
+            )
+        sample = np.asarray(embeddings, dtype=np.float64)
+        mean = sample.mean(axis=0)
+        # The right singular vectors of the centred sample are its principal components, by decreasing variance
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        return cls(
+            "pca",
+            input_dimension,
+            config.output_dimension,
+            mean=mean.astype(np.float32),
+            components=np.ascontiguousarray(
+                vt[: config.output_dimension].T, dtype=np.float32
+            ),
+        )
+
+    def matches(self, config: ProjectionConfig) -> bool:
+        """Whether the projection was fitted with the method and output dimension of a config.
+
+        `fit_size` is not compared, and is not stored with the projection. It only sets how many embeddings a new projection
+        is fitted on, and the embeddings of a collection are all projected with its saved projection, so a collection keeps
+        its projection when only `fit_size` changes rather than being embedded again.
+
+        Args:
+            config (ProjectionConfig): Config to compare with
+
+        Returns:
+            bool: True if the method and output dimension are the same
+        """
+        return (
+            self.method == config.method
+            and self.output_dimension == config.output_dimension
+        )
+
+    def apply(self, embeddings: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        """Project embeddings.
+
+        Args:
+            embeddings (npt.NDArray[np.float32]): Embeddings of shape (n, input_dimension)
+
+        Returns:
+            npt.NDArray[np.float32]: Projected embeddings of shape (n, output_dimension)
+
+        Raises:
+            ValueError: if the embeddings are not of the input dimension
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[-1] != self.input_dimension:
+            raise ValueError(
+                f"Expected embeddings of dimension {self.input_dimension}, got {embeddings.shape[-1]}"
+            )
+
+        if self.method == "truncate":
+            truncated = embeddings[..., : self.output_dimension]
+            # Truncated embeddings are normalised again, so that L2 distances between them still rank as cosine distances
+            norms = np.linalg.norm(truncated, axis=-1, keepdims=True)
+            return truncated / np.where(norms > 0, norms, 1)  # type: ignore
+
+        assert self.mean is not None and self.components is not None
+        return (embeddings - self.mean) @ self.components
+
+    def fingerprint(self) -> str:
+        """Short hash of the fitted projection, which tells apart embeddings projected by different fits.
+
+        Returns:
+            str: the hexadecimal fingerprint
+        """
+        digest = hashlib.sha256(
+            f"{self.method}:{self.input_dimension}:{self.output_dimension}".encode()
+        )
+        for array in (self.mean, self.components):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_string(self) -> str:
+        """Serialise the projection, to be stored as a Chroma document or in a snapshot header.
+
+        Returns:
+            str: the base64 encoded NPZ archive of the projection
+        """
+        arrays = {
+            "method": np.array(self.method),
+            "dimensions": np.array([self.input_dimension, self.output_dimension]),
+        }
+        if self.mean is not None and self.components is not None:
+            arrays.update(mean=self.mean, components=self.components)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    @classmethod
+    def from_string(cls, serialised: str) -> "EmbeddingProjection":
+        """Deserialise a projection.
+
+        Args:
+            serialised (str): Projection serialised with `to_string`
+
+        Returns:
+            EmbeddingProjection: the projection
+        """
+        with np.load(
+            io.BytesIO(base64.b64decode(serialised)), allow_pickle=False
+        ) as arrays:
+            input_dimension, output_dimension = arrays["dimensions"].tolist()
+            return cls(
+                str(arrays["method"]),
+                input_dimension,
+                output_dimension,
+                mean=arrays.get("mean"),
+                components=arrays.get("components"),
+            )
@@ -0,0 +1,211 @@
+"""Compact statistics of the embeddings of a data version, from which versions can be compared without fetching their embeddings."""
+import base64
+import io
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+# Number of principal components of the covariance kept in a sketch
+DEFAULT_SKETCH_RANK = 64
+# Number of embeddings kept in the reservoir sample of a sketch
+DEFAULT_SAMPLE_SIZE = 256
+
+
+@dataclass
+class EmbeddingSketch:
+    """Sufficient statistics of a set of embeddings.
+
+    The covariance is kept as its leading eigenpairs, together with its trace so that the variance outside them is known.
+
+    Attributes:
+        count (int): Number of embeddings
+        mean (npt.NDArray[np.float64]): Per-dimension mean of shape (d,)
+        trace (float): Trace of the covariance, the total variance of the embeddings
+        eigenvalues (npt.NDArray[np.float64]): Leading eigenvalues of the covariance of shape (r,), in decreasing order
+        components (npt.NDArray[np.float32]): Eigenvectors of the leading eigenvalues of shape (d, r)
+        sample (npt.NDArray[np.float32]): Uniform sample of the embeddings of shape (s, d)
+        projection (Optional[str]): Fingerprint of the projection of the embeddings, see `EmbeddingProjection.fingerprint`, None if they are not projected
+    """
+
+    count: int
+    mean: npt.NDArray[np.float64]
+    trace: float
+    eigenvalues: npt.NDArray[np.float64]
+    components: npt.NDArray[np.float32]
+    sample: npt.NDArray[np.float32]
+    projection: Optional[str] = None
+
+    @classmethod
+    def from_embeddings(
+        cls,
+        embeddings: npt.NDArray[np.float32],
+        rank: int = DEFAULT_SKETCH_RANK,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+        seed: int = 0,
+    ) -> "EmbeddingSketch":
+        """Sketch a set of embeddings held in memory.
+
+        Args:
+            embeddings (npt.NDArray[np.float32]): Embeddings of shape (n, d)
+            rank (int, optional): Number of eigenpairs of the covariance kept. Defaults to DEFAULT_SKETCH_RANK.
+            sample_size (int, optional): Number of embeddings sampled. Defaults to DEFAULT_SAMPLE_SIZE.
+            seed (int, optional): Seed of the sample. Defaults to 0.
+
+        Returns:
+            EmbeddingSketch: the sketch
+        """
+        sketcher = EmbeddingSketcher(rank, sample_size, seed)
+        sketcher.update(embeddings)
+        return sketcher.sketch()
+
+    def to_string(self) -> str:
+        """Serialise the sketch, to be stored in the metric database.
+
+        Returns:
+            str: the base64 encoded NPZ archive of the sketch
+        """
+        arrays = {
+            "count": np.array(self.count),
+            "mean": self.mean,
+            "trace": np.array(self.trace),
+            "eigenvalues": self.eigenvalues,
+            "components": self.components,
+            "sample": self.sample,
+        }
+        if self.projection is not None:
+            arrays["projection"] = np.array(self.projection)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+    @classmethod
+    def from_string(cls, serialised: str) -> "EmbeddingSketch":
+        """Deserialise a sketch.
+
+        Args:
+            serialised (str): Sketch serialised with `to_string`
+
+        Returns:
+            EmbeddingSketch: the sketch
+        """
+        with np.load(
+            io.BytesIO(base64.b64decode(serialised)), allow_pickle=False
+        ) as arrays:
+            return cls(
+                count=int(arrays["count"]),
+                mean=arrays["mean"],
+                trace=float(arrays["trace"]),
+                eigenvalues=arrays["eigenvalues"],
+                components=arrays["components"],
+                sample=arrays["sample"],
+                projection=str(arrays["projection"])
+                if "projection" in arrays
+                else None,
+            )
+
+
+class EmbeddingSketcher:
+    """Accumulates the statistics of embeddings batch by batch, in one pass and without holding the embeddings.
+
+    The mean and scatter matrix are merged batch by batch with the parallel variance algorithm of Chan et al., and the
+    sample is a reservoir sample, so the sketch does not depend on how the embeddings are batched.
+    """
+
+    def __init__(
+        self,
+        rank: int = DEFAULT_SKETCH_RANK,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+        seed: int = 0,
+    ) -> None:
+        """Start an empty sketch.
+
+        Args:
+            rank (int, optional): Number of eigenpairs of the covariance kept. Defaults to DEFAULT_SKETCH_RANK.
+            sample_size (int, optional): Number of embeddings sampled. Defaults to DEFAULT_SAMPLE_SIZE.
+            seed (int, optional): Seed of the sample. Defaults to 0.
+
+        Raises:
+            ValueError: if `rank` or `sample_size` is less than 1
+        """
+        if rank < 1 or sample_size < 1:
+            raise ValueError(
+                f"rank and sample_size must be at least 1, got {rank} and {sample_size}"
+            )
+        self.rank = rank
+        self.sample_size = sample_size
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+        self._mean: Optional[npt.NDArray[np.float64]] = None
+        self._scatter: Optional[npt.NDArray[np.float64]] = None
+        self._sample: Optional[npt.NDArray[np.float32]] = None
+
+    def update(self, embeddings: npt.NDArray[np.float32]) -> None:
+        """Add a batch of embeddings to the sketch.
+
+        Args:
+            embeddings (npt.NDArray[np.float32]): Embeddings of shape (n, d)
+
+        Raises:
+            ValueError: if the embeddings are not of the dimension of the previous ones
+        """
+        batch = np.asarray(embeddings, dtype=np.float64)
+        if len(batch) == 0:
+            return
+        if self._mean is None:
+            dimension = batch.shape[1]
+            self._mean = np.zeros(dimension)
+            self._scatter = np.zeros((dimension, dimension))
+            self._sample = np.empty((0, dimension), dtype=np.float32)
+        elif batch.shape[1] != len(self._mean):
+            raise ValueError(
+                f"Expected embeddings of dimension {len(self._mean)}, got {batch.shape[1]}"
+            )
+        assert self._scatter is not None and self._sample is not None
+
+        n, batch_mean = len(batch), batch.mean(axis=0)
+        centred = batch - batch_mean
+        delta = batch_mean - self._mean
+        total = self.count + n
+        self._scatter += centred.T @ centred + np.outer(delta, delta) * (
+            self.count * n / total
+        )
+        self._mean += delta * (n / total)
+
+        # Algorithm R: the i-th embedding replaces a random slot with probability sample_size / i
+        n_free = min(max(self.sample_size - len(self._sample), 0), n)
+        sample = np.concatenate([self._sample, batch[:n_free].astype(np.float32)])
+        positions = np.arange(self.count + n_free, total) + 1
+        slots = (self._rng.random(len(positions)) * positions).astype(np.int64)
+        for i, slot in zip(range(n_free, n), slots):
+            if slot < self.sample_size:
+                sample[slot] = batch[i]
+        self._sample = sample
+        self.count = total
+
+    def sketch(self) -> EmbeddingSketch:
+        """Summarise the embeddings added so far.
+
+        Returns:
+            EmbeddingSketch: the sketch
+
+        Raises:
+            ValueError: if no embeddings were added
+        """
+        if self._mean is None or self._scatter is None or self._sample is None:
+            raise ValueError("Cannot sketch an empty set of embeddings")
+
+        covariance = self._scatter / self.count
+        # eigh returns the eigenvalues in increasing order
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][: self.rank]
+        return EmbeddingSketch(
+            count=self.count,
+            mean=self._mean.copy(),
+            trace=float(np.trace(covariance)),
+            eigenvalues=np.maximum(eigenvalues[order], 0),
+            components=eigenvectors[:, order].astype(np.float32),
+            sample=self._sample.copy(),
+        )
@@ -13,6 +13,9 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()],
 )
 
+# Width of the time buckets the query drift is aggregated over, as a Postgres date_trunc field
+QUERY_DRIFT_BUCKET = "hour"
+
 
 @dataclass
 class DatabaseCredentials:
@@ -239,6 +242,209 @@ class SQLQueries:
 
         return sql_query
 
+    @staticmethod
+    def create_query_drift_relation_query() -> str:
+        """SQL query for creating the query_drift relation, which holds running aggregates of the sampled user queries per time bucket.
+
+        The offsets are the query embeddings minus the mean embedding of the corpus, so the centroid distance of a bucket is the
+        norm of the mean offset, the distance between the centroid of its queries and the centroid of the corpus.
+
+        Columns:
+            - bucket_start (Primary Key)
+            - dataset (Primary Key, Foreign Key referencing datasets.name)
+            - data_version (Primary Key, the version of the corpus queried)
+            - n_queries
+            - offset_sum (element-wise sum of the offsets)
+            - centroid_distance
+            - nearest_distance_sum (sum of the distances from the queries to their nearest chunk)
+            - nearest_distance_sum_sq
+            - nearest_distance_max
+            - nearest_distance_mean (generated)
+            - nearest_distance_std (generated)
+
+        Returns:
+            str: SQL query for creating the query_drift relation
+        """
+        sql_query = """
+            CREATE TABLE query_drift (
+                bucket_start TIMESTAMP,
+                dataset VARCHAR(50) REFERENCES datasets(name),
+                data_version VARCHAR(100),
+                n_queries INTEGER,
+                offset_sum FLOAT8[],
+                centroid_distance FLOAT8,
+                nearest_distance_sum FLOAT8,
+                nearest_distance_sum_sq FLOAT8,
+                nearest_distance_max FLOAT8,
+                nearest_distance_mean FLOAT8 GENERATED ALWAYS AS (nearest_distance_sum / n_queries) STORED,
+                nearest_distance_std FLOAT8 GENERATED ALWAYS AS (
+                    sqrt(greatest(nearest_distance_sum_sq / n_queries - (nearest_distance_sum / n_queries) ^ 2, 0))
+                ) STORED,
+                PRIMARY KEY (bucket_start, dataset, data_version)
+            );
+            """
+
+        return sql_query
+
+    @staticmethod
+    def insert_query_drift_data() -> str:
+        """SQL query for adding the aggregates of a batch of sampled queries to the aggregates of its bucket in the query_drift relation.
+
+        The first batch of a bucket inserts its row, and later batches update the row in place, so no previous queries are read.
+        An offset sum of another dimension than the others of its bucket is ignored.
+
+        Returns:
+            str: SQL query for adding a batch of queries to the query_drift relation.
+        """
+        sql_query = """
+            INSERT INTO query_drift AS drift (
+                bucket_start, dataset, data_version, n_queries, offset_sum, centroid_distance,
+                nearest_distance_sum, nearest_distance_sum_sq, nearest_distance_max
+            )
+            VALUES (
+                date_trunc(%(bucket)s, LOCALTIMESTAMP), %(dataset)s, %(data_version)s, %(n_queries)s, %(offset_sum)s::FLOAT8[],
+                (SELECT sqrt(sum((x / %(n_queries)s) ^ 2)) FROM unnest(%(offset_sum)s::FLOAT8[]) AS x),
+                %(nearest_distance_sum)s, %(nearest_distance_sum_sq)s, %(nearest_distance_max)s
+            )
+            ON CONFLICT (bucket_start, dataset, data_version) DO UPDATE SET
+                n_queries = drift.n_queries + EXCLUDED.n_queries,
+                offset_sum = ARRAY(
+                    SELECT a + b FROM unnest(drift.offset_sum, EXCLUDED.offset_sum) WITH ORDINALITY AS t(a, b, i) ORDER BY i
+                ),
+                centroid_distance = (
+                    SELECT sqrt(sum(((a + b) / (drift.n_queries + EXCLUDED.n_queries)) ^ 2))
+                    FROM unnest(drift.offset_sum, EXCLUDED.offset_sum) AS t(a, b)
+                ),
+                nearest_distance_sum = drift.nearest_distance_sum + EXCLUDED.nearest_distance_sum,
+                nearest_distance_sum_sq = drift.nearest_distance_sum_sq + EXCLUDED.nearest_distance_sum_sq,
+                nearest_distance_max = greatest(drift.nearest_distance_max, EXCLUDED.nearest_distance_max)
+            WHERE cardinality(drift.offset_sum) = cardinality(EXCLUDED.offset_sum);
+            """
+
+        return sql_query
+
+    @staticmethod
+    def create_drift_attribution_relation_query() -> str:
+        """SQL query for creating the drift_attribution relation, which holds the sources contributing most to the drift between two data versions.
+
+        Columns:
+            - id (Primary Key)
+            - time_stamp
+            - reference_dataset (Version Number)
+            - current_dataset (Version Number)
+            - dataset (Foreign Key referencing datasets.name)
+            - rank (1 for the largest contribution)
+            - source (the URL of the page)
+            - status ("changed", "added", "removed" or "unchanged")
+            - n_reference
+            - n_current
+            - contribution
+            - centroid_shift
+            - chunk_distance
+            - nearest_source
+            - nearest_source_distance
+
+        Returns:
+            str: SQL query for creating the drift_attribution relation
+        """
+        sql_query = """
+            CREATE TABLE drift_attribution (
+                id SERIAL PRIMARY KEY,
+                time_stamp TIMESTAMP,
+                reference_dataset VARCHAR(50),
+                current_dataset VARCHAR(50),
+                dataset VARCHAR(50) REFERENCES datasets(name),
+                rank INTEGER,
+                source TEXT,
+                status VARCHAR(10),
+                n_reference INTEGER,
+                n_current INTEGER,
+                contribution FLOAT8,
+                centroid_shift FLOAT8,
+                chunk_distance FLOAT8,
+                nearest_source TEXT,
+                nearest_source_distance FLOAT8
+            );
+            """
+
+        return sql_query
+
+    @staticmethod
+    def insert_drift_attribution_data() -> str:
+        """SQL query for inserting a row of data into the drift_attribution relation.
+
+        Returns:
+            str: SQL query for inserting a row of data into the drift_attribution relation.
+        """
+        sql_query = """
+            INSERT INTO drift_attribution (
+                time_stamp, reference_dataset, current_dataset, dataset, rank, source, status, n_reference, n_current,
+                contribution, centroid_shift, chunk_distance, nearest_source, nearest_source_distance
+            )
+            VALUES (
+                NOW(), %(reference_dataset)s, %(current_dataset)s, %(dataset)s, %(rank)s, %(source)s, %(status)s, %(n_reference)s, %(n_current)s,
+                %(contribution)s, %(centroid_shift)s, %(chunk_distance)s, %(nearest_source)s, %(nearest_source_distance)s
+            );
+            """
+
+        return sql_query
+
+    @staticmethod
+    def create_embedding_sketch_relation_query() -> str:
+        """SQL query for creating the embedding_sketch relation, which holds the sketch of the embeddings of each data version of a collection.
+
+        Columns:
+            - collection_name (Primary Key)
+            - data_version (Primary Key)
+            - time_stamp
+            - sketch (the NPZ archive of the sketch)
+
+        Returns:
+            str: SQL query for creating the embedding_sketch relation
+        """
+        sql_query = """
+            CREATE TABLE embedding_sketch (
+                collection_name VARCHAR(100),
+                data_version VARCHAR(100),
+                time_stamp TIMESTAMP,
+                sketch BYTEA,
+                PRIMARY KEY (collection_name, data_version)
+            );
+            """
+
+        return sql_query
+
+    @staticmethod
+    def insert_embedding_sketch_data() -> str:
+        """SQL query for inserting the sketch of a data version into the embedding_sketch relation, replacing any previous one.
+
+        Returns:
+            str: SQL query for inserting a sketch into the embedding_sketch relation.
+        """
+        sql_query = """
+            INSERT INTO embedding_sketch (collection_name, data_version, time_stamp, sketch)
+            VALUES (%(collection_name)s, %(data_version)s, NOW(), %(sketch)s)
+            ON CONFLICT (collection_name, data_version) DO UPDATE SET
+                time_stamp = EXCLUDED.time_stamp,
+                sketch = EXCLUDED.sketch;
+            """
+
+        return sql_query
+
+    @staticmethod
+    def get_embedding_sketch() -> str:
+        """SQL query for getting the sketch of a data version from the embedding_sketch relation.
+
+        Returns:
+            str: SQL query for getting a sketch from the embedding_sketch relation.
+        """
+        sql_query = """
+            SELECT sketch FROM embedding_sketch
+            WHERE collection_name = %(collection_name)s AND data_version = %(data_version)s;
+            """
+
+        return sql_query
+
     @staticmethod
     def relation_existence_query() -> str:
         """SQL query for checking whether the relation specified exists or not.
@@ -279,6 +485,9 @@ class DatabaseInterface:
         "embedding_drift",
         "user_feedback",
         "readability_threshold",
+        "query_drift",
+        "drift_attribution",
+        "embedding_sketch",
     }
     # The datasets relation MUST be created first as the other two relations reference to it.
 
@@ -402,6 +611,9 @@ class DatabaseInterface:
             "embedding_drift": SQLQueries.create_embedding_drift_relation_query(),
             "user_feedback": SQLQueries.create_user_feedback_relation_query(),
             "readability_threshold": SQLQueries.create_readability_threshold_relation_query(),
+            "query_drift": SQLQueries.create_query_drift_relation_query(),
+            "drift_attribution": SQLQueries.create_drift_attribution_relation_query(),
+            "embedding_sketch": SQLQueries.create_embedding_sketch_relation_query(),
         }
         self.execute_query(str(query_map.get(relation_name)))
 
@@ -479,6 +691,91 @@ class DatabaseInterface:
             },
         )
 
+    def insert_query_drift_data(
+        self, data: Dict[str, Union[str, int, float, List[float]]]
+    ) -> None:
+        """This function adds the aggregates of a batch of sampled user queries to the aggregates of the current time bucket in the query_drift relation.
+
+        Args:
+            data (Dict[str, Union[str, int, float, List[float]]]): a dictionary containing the dataset and data version queried, the number of queries,
+                the sum of the offsets of their embeddings from the corpus mean, and the sum, sum of squares and maximum of their distances to the nearest chunk.
+        """
+        self.execute_query(
+            SQLQueries.insert_query_drift_data(),
+            {
+                "bucket": QUERY_DRIFT_BUCKET,
+                "dataset": data["dataset"],
+                "data_version": data["data_version"],
+                "n_queries": data["n_queries"],
+                "offset_sum": data["offset_sum"],
+                "nearest_distance_sum": data["nearest_distance_sum"],
+                "nearest_distance_sum_sq": data["nearest_distance_sum_sq"],
+                "nearest_distance_max": data["nearest_distance_max"],
+            },
+        )
+
+    def insert_drift_attribution_data(self, data: Dict[str, Any]) -> None:
+        """This function inserts a row of data into the drift_attribution relation for each source of a drift attribution report.
+
+        Args:
+            data (Dict[str, Any]): a dictionary containing the data versions and dataset compared, and the sources by decreasing contribution.
+        """
+        for rank, source in enumerate(data["sources"], start=1):
+            self.execute_query(
+                SQLQueries.insert_drift_attribution_data(),
+                {
+                    "reference_dataset": data["reference_dataset"],
+                    "current_dataset": data["current_dataset"],
+                    "dataset": data["dataset"],
+                    "rank": rank,
+                    "source": source["source"],
+                    "status": source["status"],
+                    "n_reference": source["n_reference"],
+                    "n_current": source["n_current"],
+                    "contribution": source["contribution"],
+                    "centroid_shift": source.get("centroid_shift"),
+                    "chunk_distance": source.get("chunk_distance"),
+                    "nearest_source": source.get("nearest_source"),
+                    "nearest_source_distance": source.get("nearest_source_distance"),
+                },
+            )
+
+    def insert_embedding_sketch_data(self, data: Dict[str, Union[str, bytes]]) -> None:
+        """This function inserts the sketch of a data version of a collection into the embedding_sketch relation, replacing any previous one.
+
+        Args:
+            data (Dict[str, Union[str, bytes]]): a dictionary containing the collection name, the data version and the NPZ archive of the sketch.
+        """
+        self.execute_query(
+            SQLQueries.insert_embedding_sketch_data(),
+            {
+                "collection_name": data["collection_name"],
+                "data_version": data["data_version"],
+                "sketch": data["sketch"],
+            },
+        )
+
+    def fetch_embedding_sketch(
+        self, collection_name: str, data_version: str
+    ) -> Optional[bytes]:
+        """This function fetches the sketch of a data version of a collection from the embedding_sketch relation.
+
+        Args:
+            collection_name (str): the name of the collection
+            data_version (str): the data version
+
+        Returns:
+            Optional[bytes]: the NPZ archive of the sketch, None if the data version was not sketched
+        """
+        result = self.execute_query(
+            SQLQueries.get_embedding_sketch(),
+            {"collection_name": collection_name, "data_version": data_version},
+            fetch=True,
+        )
+        if not result:
+            return None
+        return bytes(result[0][0])
+
     def query_relation(self, relation_name: str) -> List[Tuple[Any, ...]]:
         """This function queries a specific relation in the database, based on the provided relation name.
 
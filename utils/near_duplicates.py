@@ -0,0 +1,157 @@
+"""Near-duplicate detection of texts with MinHash and locality-sensitive hashing."""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Generic, Hashable, List, Optional, Set, TypeVar
+
+import numpy as np
+import numpy.typing as npt
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERMUTATIONS = 64
+DEFAULT_NUM_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 5
+# Mersenne prime used by the universal hash functions, larger than any 32-bit shingle hash
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+K = TypeVar("K", bound=Hashable)
+
+
+def shingle(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> Set[str]:
+    """Split a text into the set of its overlapping word n-grams, ignoring case and whitespace.
+
+    Args:
+        text (str): Text to split
+        size (int, optional): Number of words in a shingle. Defaults to DEFAULT_SHINGLE_SIZE.
+
+    Returns:
+        Set[str]: the shingles of the text, the whole text if it has fewer than `size` words
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Computes MinHash signatures, whose agreement estimates the Jaccard similarity of shingle sets."""
+
+    def __init__(
+        self, num_permutations: int = DEFAULT_NUM_PERMUTATIONS, seed: int = 42
+    ) -> None:
+        """Draw the random hash functions of the signatures.
+
+        Args:
+            num_permutations (int, optional): Number of hash functions, i.e. the length of a signature. Defaults to DEFAULT_NUM_PERMUTATIONS.
+            seed (int, optional): Seed of the hash functions. Defaults to 42.
+        """
+        rng = np.random.default_rng(seed)
+        # Coefficients below 2**32 keep a * x + b within 64 bits for 32-bit shingle hashes
+        self._a = rng.integers(1, 1 << 32, size=num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, shingles: Set[str]) -> npt.NDArray[np.uint64]:
+        """Compute the MinHash signature of a set of shingles.
+
+        Args:
+            shingles (Set[str]): Shingles of a text
+
+        Returns:
+            npt.NDArray[np.uint64]: the signature, of length `num_permutations`
+        """
+        hashes = np.array(
+            [
+                int.from_bytes(
+                    hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(),
+                    "little",
+                )
+                for item in shingles
+            ],
+            dtype=np.uint64,
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME
+        return permuted.min(axis=0)  # type: ignore
+
+
+class NearDuplicateIndex(Generic[K]):
+    """Index of texts which finds, for each new text, an indexed text of estimated Jaccard similarity above a threshold.
+
+    Signatures are split into bands and texts sharing any band are compared, so a text is only compared with likely near-duplicates.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+        num_bands: int = DEFAULT_NUM_BANDS,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    ) -> None:
+        """Create an empty index.
+
+        Args:
+            threshold (float, optional): Minimum estimated Jaccard similarity of near-duplicates. Defaults to DEFAULT_THRESHOLD.
+            num_permutations (int, optional): Length of the MinHash signatures. Defaults to DEFAULT_NUM_PERMUTATIONS.
+            num_bands (int, optional): Number of bands of the signatures, which must divide `num_permutations`. Defaults to DEFAULT_NUM_BANDS.
+            shingle_size (int, optional): Number of words in a shingle. Defaults to DEFAULT_SHINGLE_SIZE.
+
+        Raises:
+            ValueError: if `threshold` is not in (0, 1] or `num_bands` does not divide `num_permutations`
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Threshold must be in (0, 1], got {threshold}")
+        if num_bands < 1 or num_permutations % num_bands:
+            raise ValueError(
+                f"The number of bands {num_bands} must divide the number of permutations {num_permutations}"
+            )
+
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.shingle_size = shingle_size
+        self._hasher = MinHasher(num_permutations)
+        self._signatures: Dict[K, npt.NDArray[np.uint64]] = {}
+        self._buckets: List[Dict[bytes, List[K]]] = [
+            defaultdict(list) for _ in range(num_bands)
+        ]
+
+    def __len__(self) -> int:
+        """Number of indexed texts.
+
+        Returns:
+            int: the number of indexed texts
+        """
+        return len(self._signatures)
+
+    def find_or_add(self, key: K, text: str) -> Optional[K]:
+        """Find an indexed near-duplicate of a text, or index the text if there is none.
+
+        Args:
+            key (K): Key of the text, e.g. its chunk ID
+            text (str): Text to look up
+
+        Returns:
+            Optional[K]: the key of the most similar indexed near-duplicate, None if the text was added to the index
+        """
+        signature = self._hasher.signature(shingle(text, self.shingle_size))
+        bands = [band.tobytes() for band in np.split(signature, self.num_bands)]
+
+        # Keep the candidates in a deterministic order, so that ties are broken the same way in every run
+        candidates = dict.fromkeys(
+            candidate
+            for band, buckets in zip(bands, self._buckets)
+            for candidate in buckets.get(band, [])
+        )
+        if candidates:
+            candidate_keys = list(candidates)
+            similarities = np.mean(
+                np.stack([self._signatures[candidate] for candidate in candidate_keys])
+                == signature,
+                axis=1,
+            )
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return candidate_keys[best]
+
+        self._signatures[key] = signature
+        for band, buckets in zip(bands, self._buckets):
+            buckets[band].append(key)
+        return None
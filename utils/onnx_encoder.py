@@ -0,0 +1,165 @@
+"""ONNX Runtime encoder for the transformer of Instructor models."""
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+ONNX_OPSET_VERSION = 14
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".onnx_models")
+FLOAT32_FILE_NAME = "encoder.onnx"
+INT8_FILE_NAME = "encoder-int8.onnx"
+
+
+class _EncoderOutput(torch.nn.Module):
+    """Wrapper returning only the token embeddings of a Hugging Face encoder, so that it can be exported to ONNX."""
+
+    def __init__(self, encoder: torch.nn.Module) -> None:
+        """Wrap an encoder.
+
+        Args:
+            encoder (torch.nn.Module): Hugging Face encoder, e.g. the T5 encoder of an Instructor model
+        """
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        """Compute the token embeddings.
+
+        Args:
+            input_ids (torch.Tensor): Token IDs of shape (batch, sequence)
+            attention_mask (torch.Tensor): Attention mask of shape (batch, sequence)
+
+        Returns:
+            torch.Tensor: Token embeddings of shape (batch, sequence, hidden)
+        """
+        return self.encoder(
+            input_ids=input_ids, attention_mask=attention_mask, return_dict=False
+        )[0]
+
+
+def onnx_model_path(onnx_dir: str, model_name: str, quantise: bool = False) -> str:
+    """Path of the ONNX export of a model.
+
+    Args:
+        onnx_dir (str): Directory of the ONNX exports
+        model_name (str): Name of the Instructor model, e.g. "hkunlp/instructor-base"
+        quantise (bool, optional): Whether the path is of the int8 variant. Defaults to False.
+
+    Returns:
+        str: the path of the ONNX file
+    """
+    file_name = INT8_FILE_NAME if quantise else FLOAT32_FILE_NAME
+    return os.path.join(onnx_dir, model_name.replace("/", "--"), file_name)
+
+
+class OnnxEncoder:
+    """Runs the transformer of an Instructor model with ONNX Runtime, optionally dynamically quantised to int8.
+
+    The transformer is exported once per model and reused from `onnx_dir`. Tokenisation, instruction masking, pooling and
+    normalisation are still done by the modules of the sentence-transformers model, which are cheap next to the transformer.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        model_name: str,
+        onnx_dir: str = DEFAULT_ONNX_DIR,
+        quantise: bool = False,
+        num_threads: Optional[int] = None,
+    ) -> None:
+        """Export the transformer of the model if it has not been exported yet and start an inference session.
+
+        Args:
+            model (Any): Loaded INSTRUCTOR model
+            model_name (str): Name of the Instructor model, e.g. "hkunlp/instructor-base"
+            onnx_dir (str, optional): Directory of the ONNX exports. Defaults to DEFAULT_ONNX_DIR.
+            quantise (bool, optional): Quantise the weights of the transformer to int8. Defaults to False.
+            num_threads (Optional[int], optional): Number of threads used by ONNX Runtime. Defaults to None, which keeps the ONNX Runtime default.
+        """
+        self._model = model
+        self.path = onnx_model_path(onnx_dir, model_name, quantise)
+        if not os.path.exists(self.path):
+            self.export(model, onnx_model_path(onnx_dir, model_name), quantise)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(
+            self.path, options, providers=["CPUExecutionProvider"]
+        )
+
+    @staticmethod
+    def export(model: Any, path: str, quantise: bool = False) -> None:
+        """Export the transformer of an Instructor model to ONNX, and its int8 variant if requested.
+
+        Files are written under temporary names and renamed once complete, so an interrupted export is never loaded.
+
+        Args:
+            model (Any): Loaded INSTRUCTOR model
+            path (str): Path of the full-precision ONNX file
+            quantise (bool, optional): Also write the dynamically quantised int8 variant next to it. Defaults to False.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            features = model.tokenize([["Represent the text: ", "An example text."]])
+            encoder = _EncoderOutput(model[0].auto_model).eval()
+            with torch.no_grad():
+                torch.onnx.export(
+                    encoder,
+                    (features["input_ids"], features["attention_mask"]),
+                    f"{path}.tmp",
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["token_embeddings"],
+                    dynamic_axes={
+                        name: {0: "batch", 1: "sequence"}
+                        for name in ["input_ids", "attention_mask", "token_embeddings"]
+                    },
+                    opset_version=ONNX_OPSET_VERSION,
+                )
+            os.replace(f"{path}.tmp", path)
+
+        if quantise:
+            quantised_path = os.path.join(os.path.dirname(path), INT8_FILE_NAME)
+            quantize_dynamic(path, f"{quantised_path}.tmp", weight_type=QuantType.QInt8)
+            os.replace(f"{quantised_path}.tmp", quantised_path)
+
+    def encode(self, pairs: List[List[str]]) -> npt.NDArray[np.float32]:
+        """Embed [instruction, text] pairs in one forward pass.
+
+        Args:
+            pairs (List[List[str]]): Pairs of instruction and text
+
+        Returns:
+            npt.NDArray[np.float32]: Array of shape (len(pairs), dimension)
+        """
+        features: Dict[str, torch.Tensor] = self._model.tokenize(pairs)
+        (token_embeddings,) = self._session.run(
+            ["token_embeddings"],
+            {
+                "input_ids": features["input_ids"].numpy(),
+                "attention_mask": features["attention_mask"].numpy(),
+            },
+        )
+
+        # As in the INSTRUCTOR transformer, the instruction tokens are left out of the pooled embedding
+        attention_mask = features["attention_mask"].clone()
+        for i, context_length in enumerate(features["context_masks"].tolist()):
+            attention_mask[i, :context_length] = 0
+        features.update(
+            token_embeddings=torch.from_numpy(token_embeddings),
+            attention_mask=attention_mask,
+        )
+        with torch.no_grad():
+            for module in list(self._model)[1:]:
+                features = module(features)
+        embeddings: npt.NDArray[np.float32] = (
+            features["sentence_embedding"].numpy().astype(np.float32)
+        )
+        return embeddings
@@ -0,0 +1,80 @@
+"""Storage of the sketches of the embeddings of data versions in the metric database, through the metric service."""
+from typing import Optional
+
+import requests
+
+from utils.embedding_sketch import EmbeddingSketch
+
+# Seconds to wait for the metric service, which receives sketches of several megabytes
+DEFAULT_TIMEOUT = 30.0
+
+
+class SketchStore:
+    """Client of the metric service routes which store and return sketches, keyed by collection name and data version.
+
+    Sketches are kept after the versioned collections they describe are garbage collected, so old versions can still be compared.
+    """
+
+    def __init__(
+        self, metric_service_endpoint: str, timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        """Initialise the client.
+
+        Args:
+            metric_service_endpoint (str): the metric service endpoint, e.g. "http://localhost:5000"
+            timeout (float, optional): Seconds to wait for the metric service. Defaults to DEFAULT_TIMEOUT.
+        """
+        self.metric_service_endpoint = metric_service_endpoint
+        self.timeout = timeout
+
+    def save_sketch(
+        self, collection_name: str, data_version: str, sketch: EmbeddingSketch
+    ) -> None:
+        """Store the sketch of the embeddings of a data version of a collection, replacing any previous one.
+
+        Args:
+            collection_name (str): Name of the logical collection, the alias in versioned mode
+            data_version (str): Data version of the embeddings
+            sketch (EmbeddingSketch): Sketch of the embeddings
+
+        Raises:
+            ValueError: if the metric service rejects the sketch
+        """
+        response = requests.post(
+            f"{self.metric_service_endpoint}/embedding_sketch",
+            json={
+                "collection_name": collection_name,
+                "data_version": data_version,
+                "sketch": sketch.to_string(),
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body["status_code"] != 200:
+            raise ValueError(
+                f"The metric service rejected the sketch: {body['message']}"
+            )
+
+    def load_sketch(
+        self, collection_name: str, data_version: str
+    ) -> Optional[EmbeddingSketch]:
+        """Load the sketch of the embeddings of a data version of a collection.
+
+        Args:
+            collection_name (str): Name of the logical collection, the alias in versioned mode
+            data_version (str): Data version of the embeddings
+
+        Returns:
+            Optional[EmbeddingSketch]: the sketch, None if the data version was not sketched
+        """
+        response = requests.get(
+            f"{self.metric_service_endpoint}/query_embedding_sketch",
+            params={"collection_name": collection_name, "data_version": data_version},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body["status_code"] != 200:
+            return None
+        return EmbeddingSketch.from_string(body["sketch"])
@@ -1,17 +1,46 @@
 """Text splitter class."""
 # Modified from : https://github.com/langchain-ai/langchain/blob/37aade19da2f4c974e95d0758a796467cdccf1b1/libs/langchain/langchain/text_splitter.py
+import itertools
 import logging
+import multiprocessing
+import os
 import re
-from typing import Iterable, List, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+)
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+DEFAULT_TOKEN_CACHE_SIZE = 100_000
+# Number of documents sent to a worker process at once when splitting in parallel
+DEFAULT_PROCESS_CHUNKSIZE = 8
+# Number of chunks of documents queued per worker process, which bounds the documents and chunks held in memory
+PENDING_CHUNKS_PER_WORKER = 2
+# Metadata keys of the character span of a chunk in its source text
+SPAN_START_KEY = "start_index"
+SPAN_END_KEY = "end_index"
 
-def join_docs(docs: List[str], separator: str) -> Optional[str]:
+
+def join_docs(docs: Iterable[str], separator: str) -> Optional[str]:
     """Join input texts using input separator.
 
     Args:
-        docs (List[str]): List of texts to join
+        docs (Iterable[str]): Texts to join
         separator (str): Separator to use for joining.
 
     Returns:
@@ -22,6 +51,20 @@ def join_docs(docs: List[str], separator: str) -> Optional[str]:
     return text if text else None
 
 
+@lru_cache(maxsize=None)
+def compile_separator(separator: str) -> Pattern[str]:
+    """Compile a separator into a pattern which keeps the separator when splitting.
+
+    Args:
+        separator (str): Separator regular expression
+
+    Returns:
+        Pattern[str]: the compiled pattern
+    """
+    # The parentheses in the pattern keep the delimiters in the result.
+    return re.compile(f"({separator})")
+
+
 def split_text_with_regex(text: str, separator: str) -> List[str]:
     """Split text using input separator.
 
@@ -32,8 +75,7 @@ def split_text_with_regex(text: str, separator: str) -> List[str]:
     Returns:
         List[str]: List of split text.
     """
-    # The parentheses in the pattern keep the delimiters in the result.
-    _splits = re.split(f"({separator})", text)
+    _splits = compile_separator(separator).split(text)
     splits = [_splits[i] + _splits[i + 1] for i in range(1, len(_splits), 2)]
     if len(_splits) % 2 == 0:
         splits += _splits[-1:]
@@ -41,38 +83,234 @@ def split_text_with_regex(text: str, separator: str) -> List[str]:
     return [s for s in splits if s]
 
 
+# Splitter of each worker process, sent once when the process starts rather than with every document
+_worker_splitter: Optional["TextSplitter"] = None
+
+
+def _contiguous_starts(splits: Sequence[str], offset: int) -> List[int]:
+    """Start offsets of consecutive pieces of a text.
+
+    Args:
+        splits (Sequence[str]): Consecutive pieces of a text, e.g. as returned by `split_text_with_regex`
+        offset (int): Start offset of the first piece
+
+    Returns:
+        List[int]: the start offset of each piece
+    """
+    return list(itertools.accumulate(map(len, splits[:-1]), initial=offset))
+
+
+def _init_worker(text_splitter: "TextSplitter") -> None:
+    """Store the splitter used by a worker process.
+
+    Args:
+        text_splitter (TextSplitter): Splitter to use in the worker
+    """
+    global _worker_splitter  # noqa: PLW0603
+    _worker_splitter = text_splitter
+
+
+def _split_texts_in_worker(
+    texts: List[str], separators: List[str]
+) -> List[List[Tuple[str, int, int]]]:
+    """Split texts with the splitter of the worker process.
+
+    Args:
+        texts (List[str]): Input texts to split
+        separators (List[str]): List of separator to use for splitting
+
+    Returns:
+        List[List[Tuple[str, int, int]]]: List of chunks of each text with their start and end offsets
+    """
+    assert _worker_splitter is not None
+    return [
+        list(_worker_splitter.iter_split_text_with_spans(text, separators))
+        for text in texts
+    ]
+
+
+def merge_overlapping_chunks(
+    chunks: Sequence[str], metadatas: Sequence[Optional[Mapping[str, Any]]]
+) -> List[str]:
+    """Merge chunks of the same source whose character spans overlap or touch, keeping the overlapping text once.
+
+    Merged chunks take the place of their first chunk. Chunks without a span in their metadata are kept as they are.
+
+    Args:
+        chunks (Sequence[str]): Chunks, e.g. the documents retrieved for a query
+        metadatas (Sequence[Optional[Mapping[str, Any]]]): Metadata of each chunk, with its "source" and span
+
+    Returns:
+        List[str]: the merged chunks
+    """
+    # Each entry is [rank, source, start, end, text]
+    spanned: List[List[Any]] = []
+    merged: List[Tuple[int, str]] = []
+    for rank, (chunk, metadata) in enumerate(zip(chunks, metadatas)):
+        if metadata and SPAN_START_KEY in metadata and SPAN_END_KEY in metadata:
+            spanned.append(
+                [
+                    rank,
+                    metadata.get("source"),
+                    metadata[SPAN_START_KEY],
+                    metadata[SPAN_END_KEY],
+                    chunk,
+                ]
+            )
+        else:
+            merged.append((rank, chunk))
+
+    current: Optional[List[Any]] = None
+    for entry in sorted(spanned, key=lambda entry: (str(entry[1]), entry[2])):
+        rank, source, start, end, chunk = entry
+        if current is not None and source == current[1] and start <= current[3]:
+            if end > current[3]:
+                current[4] += chunk[current[3] - start :]
+                current[3] = end
+            current[0] = min(current[0], rank)
+            continue
+
+        if current is not None:
+            merged.append((current[0], current[4]))
+        current = entry
+
+    if current is not None:
+        merged.append((current[0], current[4]))
+
+    return [chunk for _, chunk in sorted(merged, key=lambda item: item[0])]
+
+
+class TokenCounter:
+    """Length function which counts the tokens of texts with a Hugging Face tokenizer.
+
+    Counts are cached, so the splits which the TextSplitter measures several times are only tokenized once.
+    """
+
+    def __init__(
+        self, tokenizer: Any, cache_size: int = DEFAULT_TOKEN_CACHE_SIZE
+    ) -> None:
+        """Constructor for TokenCounter.
+
+        Args:
+            tokenizer (Any): Hugging Face tokenizer, preferably a fast tokenizer
+            cache_size (int, optional): Maximum number of cached counts. Defaults to DEFAULT_TOKEN_CACHE_SIZE.
+        """
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._counts: OrderedDict[str, int] = OrderedDict()
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Count the tokens of texts, tokenizing all uncached texts in one batch.
+
+        Args:
+            texts (Sequence[str]): Texts to measure
+
+        Returns:
+            List[int]: the number of tokens in each text, excluding special tokens
+        """
+        missing = list({text for text in texts if text not in self._counts})
+        if missing:
+            input_ids = self.tokenizer(missing, add_special_tokens=False)["input_ids"]
+            for text, ids in zip(missing, input_ids):
+                self._counts[text] = len(ids)
+
+        counts = []
+        for text in texts:
+            self._counts.move_to_end(text)
+            counts.append(self._counts[text])
+
+        while len(self._counts) > self.cache_size:
+            self._counts.popitem(last=False)
+        return counts
+
+    def __call__(self, text: str) -> int:
+        """Count the tokens of a text.
+
+        Args:
+            text (str): Text to measure
+
+        Returns:
+            int: the number of tokens in the text, excluding special tokens
+        """
+        return self.count_many([text])[0]
+
+
 class TextSplitter:
     """Text splitter class."""
 
-    def __init__(self, chunk_size: int, chunk_overlap: int) -> None:
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        length_function: Optional[Callable[[str], int]] = None,
+    ) -> None:
         """Constructor for TextSplitter.
 
         Args:
             chunk_size (int): Chunk size to use.
             chunk_overlap (int): Chunk overlap to use.
+            length_function (Optional[Callable[[str], int]], optional): Function measuring the size of texts,
+                e.g. a TokenCounter to measure chunks in tokens. Defaults to None, which measures in characters.
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.length_function = length_function or len
 
-    def merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
-        """Merge splits into larger chunks using given separator.
+    def measure(self, texts: Sequence[str]) -> List[int]:
+        """Measure the size of texts with the length function.
+
+        Args:
+            texts (Sequence[str]): Texts to measure
+
+        Returns:
+            List[int]: the size of each text
+        """
+        if isinstance(self.length_function, TokenCounter):
+            return self.length_function.count_many(texts)
+        return [self.length_function(text) for text in texts]
+
+    def iter_merge_splits(self, splits: Iterable[str], separator: str) -> Iterator[str]:
+        """Merge splits into larger chunks using given separator, yielding each chunk once it is complete.
+
+        The splits in the current chunk are kept in a window with a running length,
+        so each split is added and evicted once and merging takes linear time.
 
         Args:
             splits (Iterable[str]): Splits to merge.
             separator (str): Separator to use for merging.
 
-        Returns:
-            List[str]: Merged splits.
+        Yields:
+            Iterator[str]: Merged splits.
+        """
+        splits = list(splits)
+        for doc, _, _ in self._iter_merge_splits_with_spans(
+            splits, [0] * len(splits), separator
+        ):
+            yield doc
+
+    def _iter_merge_splits_with_spans(
+        self, splits: Sequence[str], starts: Sequence[int], separator: str
+    ) -> Iterator[Tuple[str, int, int]]:
+        """Merge splits into larger chunks as `iter_merge_splits` does, yielding each chunk with its span.
+
+        Args:
+            splits (Sequence[str]): Splits to merge.
+            starts (Sequence[int]): Start offset of each split in the text, the spans are only exact for contiguous splits merged without a separator.
+            separator (str): Separator to use for merging.
+
+        Yields:
+            Iterator[Tuple[str, int, int]]: Merged splits with their start and end offsets.
         """
         # Combine these smaller pieces into medium size chunks to send to the LLM.
-        separator_len = len(separator)
-        docs = []
-        current_doc: List[str] = []
+        separator_len = self.measure([separator])[0] if separator else 0
+        current_doc: Deque[str] = deque()
+        # Sizes of the splits in current_doc, so that evicting a split does not measure it again
+        current_lengths: Deque[int] = deque()
+        current_starts: Deque[int] = deque()
         total = 0
 
-        for split in splits:
-            _len = len(split)
-            separator_length = separator_len if len(current_doc) > 0 else 0
+        for split, _len, split_start in zip(splits, self.measure(splits), starts):
+            separator_length = separator_len if current_doc else 0
             total_length = total + _len + separator_length
 
             if total_length > self.chunk_size:
@@ -82,10 +320,12 @@ class TextSplitter:
                         f"which is longer than the specified {self.chunk_size}"
                     )
 
-                if len(current_doc) > 0:
+                if current_doc:
                     doc = join_docs(current_doc, separator)
                     if doc is not None:
-                        docs.append(doc)
+                        yield self._with_span(
+                            doc, current_doc, current_starts[0], separator
+                        )
 
                     # Keep on popping if:
                     # - we have a larger chunk than in the chunk overlap
@@ -95,71 +335,155 @@ class TextSplitter:
                         total_length > self.chunk_size and total > 0
                     ):
                         separator_length = separator_len if len(current_doc) > 1 else 0
-                        total -= len(current_doc[0]) + separator_length
-                        current_doc = current_doc[1:]
-                        total_length = total + _len + (separator_len if len(current_doc) > 0 else 0)  # fmt: skip
+                        current_doc.popleft()
+                        current_starts.popleft()
+                        total -= current_lengths.popleft() + separator_length
+                        total_length = total + _len + (separator_len if current_doc else 0)  # fmt: skip
 
             current_doc.append(split)
+            current_lengths.append(_len)
+            current_starts.append(split_start)
             total += _len + (separator_len if len(current_doc) > 1 else 0)
 
         doc = join_docs(current_doc, separator)
 
         if doc is not None:
-            docs.append(doc)
+            yield self._with_span(doc, current_doc, current_starts[0], separator)
 
-        return docs
+    @staticmethod
+    def _with_span(
+        doc: str, docs: Iterable[str], start: int, separator: str
+    ) -> Tuple[str, int, int]:
+        """Add its span to a chunk joined from splits.
 
-    def recursively_merge_and_split(
+        Args:
+            doc (str): Chunk, the joined and stripped splits
+            docs (Iterable[str]): Splits of the chunk
+            start (int): Start offset of the first split
+            separator (str): Separator the splits were joined with
+
+        Returns:
+            Tuple[str, int, int]: the chunk with its start and end offsets, after the whitespace stripped from its start
+        """
+        joined = separator.join(docs)
+        start += len(joined) - len(joined.lstrip())
+        return doc, start, start + len(doc)
+
+    def merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+        """Merge splits into larger chunks using given separator.
+
+        Args:
+            splits (Iterable[str]): Splits to merge.
+            separator (str): Separator to use for merging.
+
+        Returns:
+            List[str]: Merged splits.
+        """
+        return list(self.iter_merge_splits(splits, separator))
+
+    def iter_merge_and_split(
         self, splits: List[str], new_separators: List[str]
-    ) -> List[str]:
-        """Recursively merge and split splits from longer texts to medium chunks keeping separator.
+    ) -> Iterator[str]:
+        """Recursively merge and split splits from longer texts to medium chunks keeping separator, yielding chunks in order.
 
         Args:
             splits (List[str]): List of splits to merge and split.
             new_separators (List[str]): List of separators
 
-        Returns:
-            List[str]: Final merged and split chunks.
+        Yields:
+            Iterator[str]: Final merged and split chunks.
+        """
+        for chunk, _, _ in self._iter_merge_and_split_with_spans(
+            splits, _contiguous_starts(splits, 0), new_separators
+        ):
+            yield chunk
+
+    def _iter_merge_and_split_with_spans(
+        self, splits: List[str], starts: List[int], new_separators: List[str]
+    ) -> Iterator[Tuple[str, int, int]]:
+        """Recursively merge and split splits as `iter_merge_and_split` does, yielding each chunk with its span.
+
+        Args:
+            splits (List[str]): List of splits to merge and split.
+            starts (List[int]): Start offset of each split in the text
+            new_separators (List[str]): List of separators
+
+        Yields:
+            Iterator[Tuple[str, int, int]]: Final merged and split chunks with their start and end offsets.
         """
-        final_chunks = []
-        _good_splits = []
+        _good_splits: List[str] = []
+        _good_starts: List[int] = []
         _separator = ""
 
         # Now go merging things, recursively splitting longer texts.
-        for split in splits:
-            if len(split) < self.chunk_size:
+        for split, length, start in zip(splits, self.measure(splits), starts):
+            if length < self.chunk_size:
                 _good_splits.append(split)
+                _good_starts.append(start)
 
             else:
                 if _good_splits:
-                    merged_text = self.merge_splits(_good_splits, _separator)
-                    final_chunks.extend(merged_text)
+                    yield from self._iter_merge_splits_with_spans(
+                        _good_splits, _good_starts, _separator
+                    )
                     _good_splits = []
+                    _good_starts = []
 
                 if not new_separators:
-                    final_chunks.append(split)
+                    yield split, start, start + len(split)
 
                 else:
-                    other_info = self.split_text(split, new_separators)
-                    final_chunks.extend(other_info)
+                    yield from self._iter_split_text_with_spans(
+                        split, new_separators, start
+                    )
 
         if _good_splits:
-            merged_text = self.merge_splits(_good_splits, _separator)
-            final_chunks.extend(merged_text)
-        return final_chunks
+            yield from self._iter_merge_splits_with_spans(
+                _good_splits, _good_starts, _separator
+            )
 
-    def split_text(
-        self, text: str, separators: List[str] = ["\n\n", "\n", " ", ""]
+    def recursively_merge_and_split(
+        self, splits: List[str], new_separators: List[str]
     ) -> List[str]:
-        r"""Split incoming text and return chunks.
+        """Recursively merge and split splits from longer texts to medium chunks keeping separator.
+
+        Args:
+            splits (List[str]): List of splits to merge and split.
+            new_separators (List[str]): List of separators
+
+        Returns:
+            List[str]: Final merged and split chunks.
+        """
+        return list(self.iter_merge_and_split(splits, new_separators))
+
+    def iter_split_text(
+        self, text: str, separators: List[str] = DEFAULT_SEPARATORS
+    ) -> Iterator[str]:
+        r"""Split incoming text and yield chunks lazily.
 
         Args:
             text (str): Input text to split
             separators (List[str], optional): List of separator to use for splitting.
                 Defaults to ["\n\n", "\n", " ", ""].
 
-        Returns:
-            List[str]: List of chunks
+        Yields:
+            Iterator[str]: Chunks of the text, in order
+        """
+        for chunk, _, _ in self._iter_split_text_with_spans(text, separators, 0):
+            yield chunk
+
+    def _iter_split_text_with_spans(
+        self, text: str, separators: List[str], offset: int
+    ) -> Iterator[Tuple[str, int, int]]:
+        """Split a text as `iter_split_text` does, yielding each chunk with its span.
+
+        Args:
+            text (str): Input text to split
+            separators (List[str]): List of separator to use for splitting.
+            offset (int): Start offset of the text in the document it was split from
+
+        Yields:
+            Iterator[Tuple[str, int, int]]: Chunks of the text with their start and end offsets in the document, in order
         """
         # Get appropriate separator to use
         separator = separators[-1]
@@ -169,7 +493,7 @@ class TextSplitter:
             if sep == "":  # noqa : PLC1901
                 separator = sep
                 break
-            if re.search(sep, text):
+            if compile_separator(sep).search(text):
                 separator = sep
                 new_separators = separators[i + 1 :]
                 break
@@ -178,4 +502,163 @@ class TextSplitter:
         splits = split_text_with_regex(text, separator)
 
         # Merge longer text into medium chunks
-        return self.recursively_merge_and_split(splits, new_separators)
+        yield from self._iter_merge_and_split_with_spans(
+            splits, _contiguous_starts(splits, offset), new_separators
+        )
+
+    def split_text(
+        self, text: str, separators: List[str] = DEFAULT_SEPARATORS
+    ) -> List[str]:
+        r"""Split incoming text and return chunks.
+
+        Args:
+            text (str): Input text to split
+            separators (List[str], optional): List of separator to use for splitting.
+                Defaults to ["\n\n", "\n", " ", ""].
+
+        Returns:
+            List[str]: List of chunks
+        """
+        return list(self.iter_split_text(text, separators))
+
+    def iter_split_text_with_spans(
+        self, text: str, separators: List[str] = DEFAULT_SEPARATORS
+    ) -> Iterator[Tuple[str, int, int]]:
+        r"""Split incoming text and yield each chunk with its character span in the text.
+
+        Chunks are contiguous pieces of the text, so `text[start:end] == chunk` for every chunk.
+        The offsets of the splits are tracked while splitting, so repeated passages get the span of their own occurrence.
+
+        Args:
+            text (str): Input text to split
+            separators (List[str], optional): List of separator to use for splitting.
+                Defaults to ["\n\n", "\n", " ", ""].
+
+        Yields:
+            Iterator[Tuple[str, int, int]]: Each chunk with its start and end offsets, in order
+        """
+        yield from self._iter_split_text_with_spans(text, separators, 0)
+
+    def split_spans(
+        self, text: str, separators: List[str] = DEFAULT_SEPARATORS
+    ) -> List[Tuple[int, int]]:
+        r"""Split incoming text and return the character span of each chunk instead of its text.
+
+        Args:
+            text (str): Input text to split
+            separators (List[str], optional): List of separator to use for splitting.
+                Defaults to ["\n\n", "\n", " ", ""].
+
+        Returns:
+            List[Tuple[int, int]]: Start and end offsets of each chunk in the text
+        """
+        return [
+            (start, end)
+            for _, start, end in self.iter_split_text_with_spans(text, separators)
+        ]
+
+    def iter_split_documents(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[Iterable[Dict[str, Any]]] = None,
+        separators: List[str] = DEFAULT_SEPARATORS,
+        n_workers: Optional[int] = 1,
+        chunksize: int = DEFAULT_PROCESS_CHUNKSIZE,
+        add_spans: bool = False,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        r"""Split documents and yield each chunk with the metadata of its document.
+
+        With a single worker, only one document is split at a time, so memory does not grow with the number of documents.
+        With several workers, documents are split in a pool of processes and the chunks are still yielded in document order.
+        Documents are read as the workers need them, at most PENDING_CHUNKS_PER_WORKER chunks of documents per worker ahead of the chunks yielded.
+
+        Args:
+            texts (Iterable[str]): Texts of the documents
+            metadatas (Optional[Iterable[Dict[str, Any]]], optional): Metadata of each document, e.g. its source. Defaults to None.
+            separators (List[str], optional): List of separator to use for splitting.
+                Defaults to ["\n\n", "\n", " ", ""].
+            n_workers (Optional[int], optional): Number of processes splitting documents. Defaults to 1, which splits in this process.
+                None uses a process per CPU core.
+            chunksize (int, optional): Number of documents sent to a worker process at once. Defaults to DEFAULT_PROCESS_CHUNKSIZE.
+            add_spans (bool, optional): Add the character span of each chunk in its document to its metadata,
+                under SPAN_START_KEY and SPAN_END_KEY. Defaults to False.
+
+        Yields:
+            Iterator[Tuple[str, Dict[str, Any]]]: Each chunk and a copy of the metadata of its document, in document order
+
+        Raises:
+            ValueError: if `n_workers` or `chunksize` is less than 1
+        """
+        if n_workers is not None and n_workers < 1:
+            raise ValueError(f"Number of workers must be at least 1, got {n_workers}")
+        if chunksize < 1:
+            raise ValueError(f"Chunksize must be at least 1, got {chunksize}")
+
+        if metadatas is None:
+            metadatas = itertools.repeat({})
+
+        if n_workers == 1:
+            for text, metadata in zip(texts, metadatas):
+                for chunk, start, end in self.iter_split_text_with_spans(
+                    text, separators
+                ):
+                    yield chunk, self._chunk_metadata(metadata, start, end, add_spans)
+            return
+
+        n_workers = n_workers or os.cpu_count() or 1
+        documents = zip(texts, metadatas)
+        # Spawn rather than fork the workers, as forking a process which runs torch threads can deadlock
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as executor:
+            # Unlike Executor.map, which reads all documents up front, only a window of chunks of documents is submitted,
+            # and the oldest one is awaited first so the chunks are yielded in document order
+            pending: Deque[
+                Tuple[Future[List[List[Tuple[str, int, int]]]], Tuple[Any, ...]]
+            ] = deque()
+            while True:
+                while len(pending) < n_workers * PENDING_CHUNKS_PER_WORKER:
+                    batch = list(itertools.islice(documents, chunksize))
+                    if not batch:
+                        break
+                    batch_texts, batch_metadatas = zip(*batch)
+                    pending.append(
+                        (
+                            executor.submit(
+                                _split_texts_in_worker, list(batch_texts), separators
+                            ),
+                            batch_metadatas,
+                        )
+                    )
+                if not pending:
+                    return
+                future, batch_metadatas = pending.popleft()
+                for chunks, metadata in zip(future.result(), batch_metadatas):
+                    for chunk, start, end in chunks:
+                        yield chunk, self._chunk_metadata(
+                            metadata, start, end, add_spans
+                        )
+
+    @staticmethod
+    def _chunk_metadata(
+        metadata: Mapping[str, Any], start: int, end: int, add_spans: bool
+    ) -> Dict[str, Any]:
+        """Copy the metadata of a document for one of its chunks.
+
+        Args:
+            metadata (Mapping[str, Any]): Metadata of the document
+            start (int): Start offset of the chunk in the document
+            end (int): End offset of the chunk in the document
+            add_spans (bool): Add the span of the chunk to the copy
+
+        Returns:
+            Dict[str, Any]: the metadata of the chunk
+        """
+        chunk_metadata = dict(metadata)
+        if add_spans:
+            chunk_metadata[SPAN_START_KEY] = start
+            chunk_metadata[SPAN_END_KEY] = end
+        return chunk_metadata